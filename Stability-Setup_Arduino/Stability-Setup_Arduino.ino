@@ -45,6 +45,7 @@ int light_status = 0;
 
 
 volatile bool measurement_running = !scan_done || !mppt_done;
+bool binary_output = false;
 // TODO: implement blinking for ID
 void setup(void)
 {
@@ -53,7 +54,7 @@ void setup(void)
 
     // System setup
     Wire.begin();
-    Serial.begin(115200);
+    Serial.begin(BOOT_BAUD_RATE);
     while (!Serial)
     {
         delay(10);
@@ -120,6 +121,7 @@ void loop(void)
         scan_done = true;
         light_control(0);
         Serial.println(F("Done!"));
+        resetCommandParser();
     }
     else if (!mppt_done)
     {
@@ -128,5 +130,6 @@ void loop(void)
         mppt_done = true;
         light_control(0);
         Serial.println(F("Done!"));
+        resetCommandParser();
     }
 }
\ No newline at end of file
@@ -5,6 +5,13 @@
 #include <Arduino.h>
 #define NUM_CHARS 55
 #define MAX_MODE_LEN 5
+// rate after a reset, "baud,<rate>" switches to a faster one (see switchBaudRate)
+#define BOOT_BAUD_RATE 115200
+#define MAX_BAUD_RATE 2000000
+#define BAUD_PROBE_TIMEOUT_MS 1000
+// "blk" parameter block: largest block and how long its bytes may take to arrive
+#define PARAM_BLOCK_SIZE 192
+#define PARAM_BLOCK_TIMEOUT_MS 500
 
 
 // --- Declare global variables used across files using extern ---
@@ -32,6 +39,9 @@ extern volatile bool mppt_done;
 
 extern volatile bool measurement_running;
 
+// set by the "fmt,1" parameter: send data as binary frames (see sendDataFrame)
+extern bool binary_output;
+
 
 enum serialCommResult {
     NONE,
@@ -40,5 +50,8 @@ enum serialCommResult {
 
 serialCommResult recvWithLineTermination();
 void showParsedData();
+void sendDataFrame(uint32_t time_ms, const float *values, uint8_t count);
+bool switchBaudRate(unsigned long rate);
+void resetCommandParser();
 
 #endif
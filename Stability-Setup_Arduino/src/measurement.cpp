@@ -136,19 +136,32 @@ void perturbAndObserveClassic()
             prev_power[ID] = smoothed_power;
         }
 
-        Serial.print((millis() - start_millis) / 1000.0, 4);
-        Serial.print(F(", "));
-        for (int ID = 0; ID < 8; ++ID)
+        if (binary_output)
         {
-            Serial.print(load_voltageArr[ID], 10);
-            Serial.print(F(", "));
-            Serial.print(current_mA_flipped_arr[ID], 5);
-            Serial.print(F(", "));
+            float values[16];
+            for (int ID = 0; ID < 8; ++ID)
+            {
+                values[2 * ID] = load_voltageArr[ID];
+                values[2 * ID + 1] = current_mA_flipped_arr[ID];
+            }
+            sendDataFrame(millis() - start_millis, values, 16);
         }
+        else
+        {
+            Serial.print((millis() - start_millis) / 1000.0, 4);
+            Serial.print(F(", "));
+            for (int ID = 0; ID < 8; ++ID)
+            {
+                Serial.print(load_voltageArr[ID], 10);
+                Serial.print(F(", "));
+                Serial.print(current_mA_flipped_arr[ID], 5);
+                Serial.print(F(", "));
+            }
 
-        Serial.print(uniqueID);
+            Serial.print(uniqueID);
 
-        Serial.println(F(""));
+            Serial.println(F(""));
+        }
     }
 
     mppt_done = true;
@@ -218,19 +231,33 @@ void scan(ScanDirection dir)
         {
             unsigned long curr_millis = millis() - start_millis;
 
-            Serial.print(curr_millis / 1000.0, 4);
-            Serial.print(F(","));
-            Serial.print(voltage_val);
-            Serial.print(F(","));
-            for (int ID = 0; ID < 8; ++ID)
+            if (binary_output)
+            {
+                float values[17];
+                values[0] = voltage_val;
+                for (int ID = 0; ID < 8; ++ID)
+                {
+                    values[1 + 2 * ID] = avg_volt[ID] / volt_step_count;
+                    values[2 + 2 * ID] = avg_curr[ID] / volt_step_count;
+                }
+                sendDataFrame(curr_millis, values, 17);
+            }
+            else
             {
-                Serial.print(avg_volt[ID] / volt_step_count, 10);
+                Serial.print(curr_millis / 1000.0, 4);
                 Serial.print(F(","));
-                Serial.print(avg_curr[ID] / volt_step_count, 5);
+                Serial.print(voltage_val);
                 Serial.print(F(","));
+                for (int ID = 0; ID < 8; ++ID)
+                {
+                    Serial.print(avg_volt[ID] / volt_step_count, 10);
+                    Serial.print(F(","));
+                    Serial.print(avg_curr[ID] / volt_step_count, 5);
+                    Serial.print(F(","));
+                }
+                Serial.print(uniqueID);
+                Serial.println(F(""));
             }
-            Serial.print(uniqueID);
-            Serial.println(F(""));
 
             // reset all values in array to 0
             memset(avg_volt, 0.0, sizeof(avg_volt));
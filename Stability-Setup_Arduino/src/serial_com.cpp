@@ -22,164 +22,308 @@ extern volatile bool scan_done;
 extern volatile bool mppt_done;
 
 extern volatile bool measurement_running;
+extern bool binary_output;
+extern uint32_t uniqueID;
+extern bool init_success;
+
 volatile bool done_recv = false;
 volatile bool mode_received = false;
+// parameters of a block upload, acknowledged and waiting for "go"
+static bool block_received = false;
+static uint8_t param_block[PARAM_BLOCK_SIZE];
 
-serialCommResult recvWithLineTermination()
-{
+static uint16_t crc16_update(uint16_t crc, const uint8_t *data, size_t len);
+static void receiveParameterBlock(unsigned int length, uint16_t crc);
 
-    serialCommResult result = serialCommResult::NONE;
-    while (Serial.available() > 0 && !done_recv)
+/**
+ * @brief Handles one command line, parameters are stored until "done" or "go".
+ */
+static void handleCommandLine(char *line)
+{
+    char *param = strtok(line, ",");
+    if (param == NULL)
     {
-        // Read the incoming string until newline
-        String incomingString = Serial.readStringUntil('\n');
-        // Serial.print(F("Received line (before error check): ");
-        // Serial.println(F(incomingString));
+        Serial.println(F("Warning: Received empty or invalid line after trimming."));
+        return;
+    }
 
-        incomingString.trim(); // Remove any leading/trailing whitespace
-        // Check if the trimmed string will fit in the buffer
-        if (incomingString.length() >= NUM_CHARS)
+    strncpy(str_param, param, MAX_MODE_LEN - 1);
+    // Ensure null termination in case the token was longer than MAX_MODE_LEN - 1
+    str_param[MAX_MODE_LEN - 1] = '\0';
+
+    if (strcmp(str_param, "baud") == 0)
+    {
+        // link speed negotiation, only between measurements
+        param = strtok(NULL, ",");
+        if (param != NULL && !measurement_running)
         {
-            Serial.print(F("Error: Received line too long (max "));
-            Serial.print(NUM_CHARS - 1); // num_chars includes space for null terminator
-            Serial.println(F(" characters). Skipping."));
-            continue; // Skip this line and check for the next one
+            switchBaudRate(strtoul(param, NULL, 10));
         }
+        return;
+    }
 
-        // Copy the string to received_chars buffer
-        incomingString.toCharArray(received_chars, NUM_CHARS);
-
-        Serial.print(F("Received line: "));
-        Serial.println(received_chars); // Print the buffer content
-
-
-        char *param = strtok(received_chars, ",");
-        if (param == NULL)
+    if (strcmp(str_param, "blk") == 0)
+    {
+        // parameter block: "blk,<length>,<crc16 hex>" followed by length bytes
+        char *length = strtok(NULL, ",");
+        char *crc = strtok(NULL, ",");
+        if (length != NULL && crc != NULL)
         {
-            Serial.println(F("Warning: Received empty or invalid line after trimming."));
-            continue;
+            receiveParameterBlock(strtoul(length, NULL, 10), (uint16_t)strtoul(crc, NULL, 16));
+        }
+        else
+        {
+            Serial.println(F("Block error: header"));
         }
+        return;
+    }
 
-        strncpy(str_param, param, MAX_MODE_LEN - 1);
-        // Ensure null termination in case the token was longer than MAX_MODE_LEN - 1
-        str_param[MAX_MODE_LEN - 1] = '\0';
+    if (strcmp(str_param, "id") == 0)
+    {
+        // lets the host check an idle board without resetting it,
+        // parameters of an interrupted upload are dropped
+        resetCommandParser();
+        Serial.print(F("HW_ID:"));
+        Serial.println(uniqueID, HEX);
+        if (init_success)
+        {
+            Serial.println(F("Arduino Ready"));
+        }
+        else
+        {
+            Serial.println(F("Sensor Initialization Failed. Please Check Connection."));
+        }
+        return;
+    }
 
-        if (!mode_received)
+    if (!mode_received)
+    {
+        if (strcmp(str_param, "scan") == 0 || strcmp(str_param, "mppt") == 0)
         {
-            if (strcmp(str_param, "scan") == 0 || strcmp(str_param, "mppt") == 0)
-            {
-                Serial.print(F("Mode Received: "));
-                Serial.println(str_param);
-                mode_received = true;
-                strncpy(mode, str_param, MAX_MODE_LEN - 1);
-            }
-            else
-            {
-                Serial.print(F("Warning: Expected 'scan' or 'mppt' mode, but received '"));
-                Serial.print(str_param);
-                Serial.println(F("'. Ignoring line."));
-                continue;
-            }
+            Serial.print(F("Mode Received: "));
+            Serial.println(str_param);
+            mode_received = true;
+            strncpy(mode, str_param, MAX_MODE_LEN - 1);
+            binary_output = false;
         }
-        else if (strcmp(str_param, "done") == 0)
+        else
         {
-            Serial.println(F("'done' command received."));
-            done_recv = true;
+            Serial.print(F("Warning: Expected 'scan' or 'mppt' mode, but received '"));
+            Serial.print(str_param);
+            Serial.println(F("'. Ignoring line."));
+            return;
         }
-        else if (strcmp(mode, "scan") == 0)
+    }
+    else if (strcmp(str_param, "done") == 0)
+    {
+        Serial.println(F("'done' command received."));
+        done_recv = true;
+    }
+    else if (strcmp(str_param, "go") == 0)
+    {
+        // starts the measurement of an acknowledged block, without further
+        // output so the boards started together begin together
+        done_recv = true;
+    }
+    else if (strcmp(str_param, "fmt") == 0)
+    {
+        param = strtok(NULL, ",");
+        binary_output = param != NULL && atoi(param) == 1;
+    }
+    else if (strcmp(mode, "scan") == 0)
+    {
+        param = strtok(NULL, ",");
+        if (param == NULL) {
+            Serial.println(F("Warning: Missing value for scan parameter."));
+            return;
+        }
+        if (strcmp(str_param, "1") == 0)
+        {
+            scan_range = atof(param);
+        }
+        else if (strcmp(str_param, "2") == 0)
+        {
+            scan_step_size = atof(param);
+        }
+        else if (strcmp(str_param, "3") == 0)
+        {
+            scan_read_count = atoi(param);
+        }
+        else if (strcmp(str_param, "4") == 0)
+        {
+            scan_rate = atoi(param);
+        }
+        else if (strcmp(str_param, "5") == 0)
+        {
+            light_status = atoi(param);
+        }
+        else {
+            Serial.print(F("Warning: Unknown scan parameter identifier "));
+            Serial.print(str_param);
+            Serial.println(F("'. Ignoring line."));
+       }
+    }
+    else if (strcmp(mode, "mppt") == 0)
+    {
+        if (strcmp(str_param, "1") == 0) // vset[8]
+        {
+            for (uint8_t ID = 0; ID < 8; ID++)
+            {
+                param = strtok(NULL, ","); // Get the next Vset value
+                if (param != NULL) {
+                    vset[ID] = atof(param);
+                } else {
+                    // Handle case where not enough vset values are provided
+                    Serial.print(F("Warning: Missing vset value(s) from ID "));
+                    Serial.println(ID);
+                    // Fill rest of vset
+                    for (uint8_t j = ID; j < 8; j++) vset[j] = 0;
+                    break;
+                }
+            }
+        }
+        else
         {
+            // Single value parameters
             param = strtok(NULL, ",");
             if (param == NULL) {
-                Serial.println(F("Warning: Missing value for scan parameter."));
-                continue;
-            }
-            if (strcmp(str_param, "1") == 0)
-            {
-                scan_range = atof(param);
+                Serial.println(F("Warning: Missing value for MPPT parameter."));
+                return;
             }
-            else if (strcmp(str_param, "2") == 0)
+
+            if (strcmp(str_param, "2") == 0)
             {
-                scan_step_size = atof(param);
+                mppt_step_size_V = atof(param);
             }
             else if (strcmp(str_param, "3") == 0)
             {
-                scan_read_count = atoi(param);
+                mppt_time_mins = atoi(param);
             }
             else if (strcmp(str_param, "4") == 0)
             {
-                scan_rate = atoi(param);
+                mppt_measurements_per_step = atoi(param);
             }
             else if (strcmp(str_param, "5") == 0)
             {
-                light_status = atoi(param);
+                mppt_delay = atoi(param);
+            }
+            else if (strcmp(str_param, "6") == 0)
+            {
+                mppt_measurement_interval = atoi(param);
             }
             else {
-                Serial.print(F("Warning: Unknown scan parameter identifier "));
+                Serial.print(F("Warning: Unknown MPPT parameter identifier '"));
                 Serial.print(str_param);
                 Serial.println(F("'. Ignoring line."));
-           }
+            }
         }
-        else if (strcmp(mode, "mppt") == 0)
+    }
+}
+
+/**
+ * @brief Receives a parameter block announced by "blk": answers "Block ready",
+ * reads length bytes of parameter lines into param_block, checks their CRC-16
+ * and parses them like single lines. "Block ok: <crc>" acknowledges the block,
+ * the measurement then starts on "go".
+ */
+static void receiveParameterBlock(unsigned int length, uint16_t crc)
+{
+    if (measurement_running || length == 0 || length >= PARAM_BLOCK_SIZE)
+    {
+        Serial.println(F("Block error: size"));
+        return;
+    }
+    Serial.print(F("Block ready: "));
+    Serial.println(length);
+
+    unsigned int received = 0;
+    unsigned long start = millis();
+    while (received < length && millis() - start < PARAM_BLOCK_TIMEOUT_MS)
+    {
+        if (Serial.available() > 0)
         {
-            if (strcmp(str_param, "1") == 0) // vset[8]
-            {
-                for (uint8_t ID = 0; ID < 8; ID++)
-                {
-                    param = strtok(NULL, ","); // Get the next Vset value
-                    if (param != NULL) {
-                        vset[ID] = atof(param);
-                    } else {
-                        // Handle case where not enough vset values are provided
-                        Serial.print(F("Warning: Missing vset value(s) from ID "));
-                        Serial.println(ID);
-                        // Fill rest of vset
-                        for (uint8_t j = ID; j < 8; j++) vset[j] = 0;
-                        break;
-                    }
-                }
-            }
-            else
-            {
-                // Single value parameters
-                param = strtok(NULL, ",");
-                if (param == NULL) {
-                    Serial.println(F("Warning: Missing value for MPPT parameter."));
-                    continue;
-                }
+            param_block[received++] = Serial.read();
+        }
+    }
+    if (received < length)
+    {
+        Serial.println(F("Block error: timeout"));
+        return;
+    }
+    if (crc16_update(0xFFFF, param_block, length) != crc)
+    {
+        Serial.println(F("Block error: crc"));
+        return;
+    }
+    param_block[length] = '\0';
 
-                if (strcmp(str_param, "2") == 0)
-                {
-                    mppt_step_size_V = atof(param);
-                }
-                else if (strcmp(str_param, "3") == 0)
-                {
-                    mppt_time_mins = atoi(param);
-                }
-                else if (strcmp(str_param, "4") == 0)
-                {
-                    mppt_measurements_per_step = atoi(param);
-                }
-                else if (strcmp(str_param, "5") == 0)
-                {
-                    mppt_delay = atoi(param);
-                }
-                else if (strcmp(str_param, "6") == 0)
-                {
-                    mppt_measurement_interval = atoi(param);
-                }
-                else {
-                    Serial.print(F("Warning: Unknown MPPT parameter identifier '"));
-                    Serial.print(str_param);
-                    Serial.println(F("'. Ignoring line."));
-                }
-            }
+    resetCommandParser();
+    char *next = (char *)param_block;
+    while (next != NULL)
+    {
+        char *end = strchr(next, '\n');
+        if (end != NULL)
+        {
+            *end = '\0';
+        }
+        strncpy(received_chars, next, NUM_CHARS - 1);
+        received_chars[NUM_CHARS - 1] = '\0';
+        next = end != NULL ? end + 1 : NULL;
+        if (received_chars[0] != '\0')
+        {
+            handleCommandLine(received_chars);
+        }
+    }
+    if (!mode_received)
+    {
+        Serial.println(F("Block error: no mode"));
+        return;
+    }
+    showParsedData();
+    block_received = true;
+    Serial.print(F("Block ok: "));
+    Serial.println(crc, HEX);
+}
+
+serialCommResult recvWithLineTermination()
+{
+
+    serialCommResult result = serialCommResult::NONE;
+    while (Serial.available() > 0 && !done_recv)
+    {
+        // Read the incoming string until newline
+        String incomingString = Serial.readStringUntil('\n');
+        // Serial.print(F("Received line (before error check): ");
+        // Serial.println(F(incomingString));
+
+        incomingString.trim(); // Remove any leading/trailing whitespace
+        // Check if the trimmed string will fit in the buffer
+        if (incomingString.length() >= NUM_CHARS)
+        {
+            Serial.print(F("Error: Received line too long (max "));
+            Serial.print(NUM_CHARS - 1); // num_chars includes space for null terminator
+            Serial.println(F(" characters). Skipping."));
+            continue; // Skip this line and check for the next one
         }
+
+        // Copy the string to received_chars buffer
+        incomingString.toCharArray(received_chars, NUM_CHARS);
+
+        Serial.print(F("Received line: "));
+        Serial.println(received_chars); // Print the buffer content
+
+        handleCommandLine(received_chars);
+
         // If measurement is not running and values have been read
         if (done_recv) {
             if (!measurement_running)
             {
-                Serial.println(F("Parameters successfully received and parsed."));
-                showParsedData();
+                if (!block_received)
+                {
+                    Serial.println(F("Parameters successfully received and parsed."));
+                    showParsedData();
+                }
+                block_received = false;
                 result = serialCommResult::START;
             } else {
                 // Measurement already running
@@ -192,6 +336,16 @@ serialCommResult recvWithLineTermination()
     return result;
 }
 
+/**
+ * @brief Accepts the parameters of a new measurement, called when one is done.
+ */
+void resetCommandParser()
+{
+    mode_received = false;
+    done_recv = false;
+    block_received = false;
+}
+
 /**
  * @brief Displays the parsed data via serial output.
  */
@@ -237,5 +391,93 @@ void showParsedData()
         Serial.println(light_status);
 
     }
+    // the host switches to binary frames when it reads this line
+    if (binary_output) {
+        Serial.println(F("Data format: binary"));
+    }
     Serial.println(F(""));
 }
+
+/**
+ * @brief Switches the serial link to rate for the host's link check (see
+ * controller/baud_negotiation.py on the host): echoes "ping,<payload>" lines
+ * as "pong,<payload>" until "baud ok" confirms the rate, and falls back to
+ * BOOT_BAUD_RATE if no ping arrives within BAUD_PROBE_TIMEOUT_MS.
+ */
+bool switchBaudRate(unsigned long rate)
+{
+    if (rate < BOOT_BAUD_RATE || rate > MAX_BAUD_RATE)
+    {
+        Serial.println(F("Baud: unsupported"));
+        return false;
+    }
+    Serial.print(F("Baud: "));
+    Serial.println(rate);
+    Serial.flush();
+    Serial.end();
+    Serial.begin(rate);
+
+    unsigned long last_ping = millis();
+    while (millis() - last_ping < BAUD_PROBE_TIMEOUT_MS)
+    {
+        if (Serial.available() <= 0)
+        {
+            continue;
+        }
+        String line = Serial.readStringUntil('\n');
+        line.trim();
+        if (line.startsWith("ping,"))
+        {
+            Serial.print(F("pong,"));
+            Serial.println(line.substring(5));
+            last_ping = millis();
+        }
+        else if (line == "baud ok")
+        {
+            Serial.println(F("Baud confirmed"));
+            return true;
+        }
+    }
+
+    Serial.flush();
+    Serial.end();
+    Serial.begin(BOOT_BAUD_RATE);
+    Serial.println(F("Baud reverted"));
+    return false;
+}
+
+/**
+ * @brief CRC-16/CCITT (poly 0x1021, init 0xFFFF) of a frame, continued over len bytes.
+ */
+static uint16_t crc16_update(uint16_t crc, const uint8_t *data, size_t len)
+{
+    while (len--)
+    {
+        crc ^= (uint16_t)(*data++) << 8;
+        for (uint8_t bit = 0; bit < 8; bit++)
+        {
+            crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+        }
+    }
+    return crc;
+}
+
+/**
+ * @brief Sends one sample as a little-endian binary frame instead of a text line:
+ * sync word 0xA55A, time in ms, count float32 values, uniqueID, CRC-16 of the
+ * bytes between sync word and crc (see controller/binary_frames.py on the host).
+ */
+void sendDataFrame(uint32_t time_ms, const float *values, uint8_t count)
+{
+    const uint8_t sync[2] = {0x5A, 0xA5};
+    uint16_t crc = 0xFFFF;
+
+    Serial.write(sync, sizeof(sync));
+    crc = crc16_update(crc, (const uint8_t *)&time_ms, sizeof(time_ms));
+    Serial.write((const uint8_t *)&time_ms, sizeof(time_ms));
+    crc = crc16_update(crc, (const uint8_t *)values, count * sizeof(float));
+    Serial.write((const uint8_t *)values, count * sizeof(float));
+    crc = crc16_update(crc, (const uint8_t *)&uniqueID, sizeof(uniqueID));
+    Serial.write((const uint8_t *)&uniqueID, sizeof(uniqueID));
+    Serial.write((const uint8_t *)&crc, sizeof(crc));
+}
@@ -1,5 +1,6 @@
 # app.py
 import json
+import multiprocessing
 import os
 import threading
 from datetime import datetime
@@ -13,7 +14,7 @@ from PySide6.QtWidgets import (
     QStatusBar,
     QSplitter,
     QStyleFactory,
-    QTextEdit,
+    QPlainTextEdit,
     QPushButton,
     QVBoxLayout,
     QWidget
@@ -119,14 +120,16 @@ class MainWindow(QMainWindow):
         # Logger
 
         self.logger = get_logger()
+        # full log goes to rotating files, the widget only keeps recent lines
+        self.logger.set_log_file(os.path.join(self.logs_dir(), "stability_setup.log"))
 
-        self.text_edit = QTextEdit()
+        self.text_edit = QPlainTextEdit()
         self.text_edit.setReadOnly(True)
         self.clear_button = QPushButton("Clear Logs")
         self.save_button = QPushButton("Save Logs")
 
         # Connect button signals
-        self.clear_button.clicked.connect(self.text_edit.clear)
+        self.clear_button.clicked.connect(self.logger.clear)
         self.save_button.clicked.connect(self.save_logs)
 
         logger_layout = QVBoxLayout()
@@ -158,6 +161,11 @@ class MainWindow(QMainWindow):
         self.marquee_text = "  Running...  "
         self.marquee_index = 0
 
+        # continue runs that were cut off by a crash or reboot, their boards are
+        # re-attached in the background and skipped by initializeArduinoConnections
+        self.multi_controller.run_resumed.connect(self.on_run_resumed)
+        self.multi_controller.resume_finished.connect(self.on_resume_finished)
+        self.multi_controller.resume_unfinished(self.data_dir)
         self.initializeArduinoConnections()
 
     def initializeArduinoConnections(self):
@@ -176,17 +184,30 @@ class MainWindow(QMainWindow):
         self.ID_widget.refresh_ui()
         self.ID_widget.save_json()
 
-    def save_logs(self):
-        # Generate timestamped filename
-        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        filename = f"log_{timestamp}.log"
+    @Slot(int, str)
+    def on_run_resumed(self, ID, path):
+        get_logger().log(f"Resumed run of Arduino {ID}: {path}")
+
+    @Slot(bool)
+    def on_resume_finished(self, all_resumed):
+        # boards that could not be re-attached were skipped above, connect them now
+        if not all_resumed and self.running_preset is None:
+            self.initializeArduinoConnections()
 
+    def logs_dir(self):
         # Find root directory of the package and create Logs folder
         root_dir = os.path.dirname(os.path.abspath(__file__))  # location of main_window.py
         logs_dir = os.path.join(root_dir, "Logs")
 
         # Create Logs directory if it doesn't exist
         os.makedirs(logs_dir, exist_ok=True)
+        return logs_dir
+
+    def save_logs(self):
+        # Generate timestamped filename
+        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        filename = f"log_{timestamp}.log"
+        logs_dir = self.logs_dir()
 
         # Save to file
         full_path = os.path.join(logs_dir, filename)
@@ -259,7 +280,9 @@ class MainWindow(QMainWindow):
 
     @Slot(Trial)
     def start_next_trial(self, trial: Trial):
-        self.multi_controller.reset_arduinos()
+        # boards that answer "id" as idle take the next run as they are, the others
+        # (stopped, failed, firmware still holding the last run) are reset and connected again
+        self.multi_controller.refresh_connections()
         self.running_mode = trial.trial_type
         self.run_action(trial.trial_type, trial.params)
 
@@ -358,6 +381,9 @@ if __name__ == "__main__":
 
     import sys
 
+    # the Results Viewer analyses files in a process pool, needed for frozen builds
+    multiprocessing.freeze_support()
+
     app = QApplication(sys.argv)
 
     # Force Light mode
@@ -0,0 +1,323 @@
+# acquisition_benchmark.py
+"""
+Acquisition throughput benchmark for the controller layer.
+
+Runs scans and MPPT runs against simulated boards (controller/board_emulator.py)
+through SingleController directly or through MultiController.run, and reports
+per board count:
+
+- lines/s written to the run csv files
+- latency from the board sending a data line to the row being in the csv
+  file (sampled every --poll-ms)
+- host CPU per board, i.e. process CPU minus the simulated boards and this
+  benchmark's own sampling threads
+- RSS growth over the run, use --hours for a long simulated MPPT run
+
+Example (from Stability-Setup_Python):
+
+    python -m benchmarks.acquisition_benchmark --boards 1 4 16 64 --mode mppt --hours 2 --json acq.json
+"""
+import argparse
+import copy
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from benchmarks.common import ResourceMonitor, percentiles, print_table, write_results
+from constants import Constants, Mode
+from controller import arduino_assignment
+from controller.board_emulator import simulated_hw_id, simulated_port
+from controller.run_clock import RunClock
+from controller.single_arduino_controller import SingleController
+from helper.global_helpers import DATA, get_logger
+
+# firmware time per MPPT line for the default parameters (settling + interval)
+MPPT_LINE_S = 0.5
+
+
+class CsvTail:
+    """Counts the data rows of a growing run csv file by reading only the appended bytes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.offset = 0
+        self.rows = 0
+        self._in_data = False
+        self._partial = b""
+
+    def poll(self) -> int:
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(self.offset)
+                chunk = f.read()
+        except OSError:
+            return self.rows
+        self.offset += len(chunk)
+        if not chunk:
+            return self.rows
+        if self._in_data:
+            self.rows += chunk.count(b"\n")
+            return self.rows
+        lines = (self._partial + chunk).split(b"\n")
+        self._partial = lines.pop()
+        for idx, line in enumerate(lines):
+            if line.startswith(b"Time,"):
+                # the rows after the header, a trailing partial row is counted
+                # once its newline arrives
+                self._in_data = True
+                self.rows += len(lines) - idx - 1
+                break
+        return self.rows
+
+
+class DiskMonitor:
+    """Records (time, rows on disk) for the run file of each controller."""
+
+    def __init__(self, controllers: Dict[int, SingleController], interval: float):
+        self.controllers = controllers
+        self.interval = interval
+        self.observations: Dict[int, List] = {ID: [] for ID in controllers}
+        self._tails: Dict[int, CsvTail] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="DiskMonitor", daemon=True)
+        self.cpu_seconds = 0.0
+
+    def start(self) -> "DiskMonitor":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.poll()
+
+    def poll(self) -> None:
+        now = time.monotonic()
+        for ID, controller in self.controllers.items():
+            path = controller.file_path
+            if not path:
+                continue
+            tail = self._tails.get(ID)
+            if tail is None or tail.path != path:
+                tail = self._tails[ID] = CsvTail(path)
+            rows = tail.poll()
+            observed = self.observations[ID]
+            if not observed or observed[-1][1] != rows:
+                observed.append((now, rows))
+
+    def _run(self) -> None:
+        cpu_start = time.thread_time()
+        while not self._stop.wait(self.interval):
+            self.poll()
+        self.cpu_seconds = time.thread_time() - cpu_start
+
+
+def row_latencies(emit_times: List[float], observations: List) -> np.ndarray:
+    """Seconds between each data line being sent and its row being seen in the csv file."""
+    if not emit_times or not observations:
+        return np.empty(0)
+    times, rows = (np.array(values) for values in zip(*observations))
+    emitted = np.asarray(emit_times)[: rows[-1]]
+    # first observation that contains row i
+    seen = np.searchsorted(rows, np.arange(len(emitted)), side="right")
+    return times[seen] - emitted
+
+
+def run_params(mode: Mode, hours: float) -> Dict:
+    params = copy.deepcopy(Constants.params[mode])
+    if mode == Mode.MPPT:
+        params[Constants.time_param] = str(max(1, round(hours * 60)))
+    return params
+
+
+def connect_single(count: int, rate: Optional[float], data_dir: str) -> Dict[int, SingleController]:
+    ids = arduino_assignment.simulated_arduino_ids(count)
+    controllers = {
+        ids[simulated_hw_id(i)]: SingleController(
+            simulated_port(simulated_hw_id(i), rate=_rate_option(rate)), "__bench", data_dir, ids
+        )
+        for i in range(count)
+    }
+    threads = [threading.Thread(target=controller.connect) for controller in controllers.values()]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return controllers
+
+
+def _rate_option(rate: Optional[float]) -> str:
+    return "firmware" if rate is None else str(rate)
+
+
+def run_single(controllers: Dict[int, SingleController], mode: Mode, params: Dict) -> None:
+    """One thread per board calling SingleController.scan/mppt, like MultiController's threads."""
+    run_clock = RunClock()
+    threads = []
+    for controller in controllers.values():
+        controller.run_clock = run_clock
+        target = controller.scan if mode == Mode.SCAN else controller.mppt
+        threads.append(threading.Thread(target=target, args=(copy.deepcopy(params),)))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+class MultiRun:
+    """Connects boards through MultiController.initializeMeasurement and runs them with run()."""
+
+    def __init__(self, count: int, rate: Optional[float], data_dir: str, backend: str):
+        from PySide6.QtCore import Qt
+        from controller.multi_arduino_controller import MultiController
+
+        os.environ[arduino_assignment.SIMULATED_BOARDS_ENV] = str(count)
+        os.environ[arduino_assignment.SIMULATED_RATE_ENV] = _rate_option(rate)
+        ids_path = os.path.join(data_dir, "arduino_ids.json")
+        with open(ids_path, "w") as f:
+            json.dump({"arduino_ids": arduino_assignment.simulated_arduino_ids(count)}, f)
+
+        self.multi = MultiController(backend=backend)
+        self.done = threading.Event()
+        # finished is emitted from a worker thread and there is no Qt event loop here
+        self.multi.finished.connect(self.done.set, Qt.DirectConnection)
+        self.multi.initializeMeasurement(
+            "bench", data_dir, "", "", "", time.strftime("%b-%d-%Y_%H-%M-%S"), ids_path
+        )
+        self.controllers = self.multi.controllers
+
+    def run(self, mode: Mode, params: Dict) -> None:
+        self.done.clear()
+        self.multi.run(mode, params)
+        self.done.wait()
+
+    def close(self) -> None:
+        for controller in self.controllers.values():
+            controller.disconnect()
+        if self.multi.async_backend is not None:
+            self.multi.async_backend.shutdown()
+        os.environ.pop(arduino_assignment.SIMULATED_BOARDS_ENV, None)
+        os.environ.pop(arduino_assignment.SIMULATED_RATE_ENV, None)
+
+
+def benchmark(count: int, mode: Mode, driver: str, backend: str, rate: Optional[float],
+              hours: float, poll_ms: float, keep_dir: Optional[str]) -> Dict:
+    data_dir = keep_dir or tempfile.mkdtemp(prefix="acq_bench_")
+    os.makedirs(data_dir, exist_ok=True)
+    multi = None
+    controllers: Dict[int, SingleController] = {}
+    try:
+        if driver == "multi":
+            multi = MultiRun(count, rate, data_dir, backend)
+            controllers = multi.controllers
+        else:
+            controllers = connect_single(count, rate, data_dir)
+        boards = [controller.ser.board for controller in controllers.values() if controller.ser]
+        if len(boards) != count:
+            raise RuntimeError(f"only {len(boards)} of {count} simulated boards connected")
+        for board in boards:
+            board.emit_times = []
+
+        params = run_params(mode, hours)
+        disk = DiskMonitor(controllers, poll_ms / 1000)
+        resources = ResourceMonitor()
+        resources.start()
+        disk.start()
+        if multi is not None:
+            multi.run(mode, params)
+        else:
+            run_single(controllers, mode, params)
+        disk.stop()
+        usage = resources.stop()
+
+        lines = sum(observed[-1][1] for observed in disk.observations.values() if observed)
+        latencies = np.concatenate([
+            row_latencies(controller.ser.board.emit_times, disk.observations[ID])
+            for ID, controller in controllers.items()
+        ])
+        board_cpu = sum(board.cpu_seconds for board in boards)
+        host_cpu = max(resources.cpu_seconds - board_cpu - disk.cpu_seconds, 0.0)
+        result = {
+            "boards": count,
+            "mode": mode.name.lower(),
+            "driver": driver if driver == "single" else f"multi-{backend}",
+            "line_rate": rate,
+            "lines": int(lines),
+            "lines_expected": int(sum(board.lines_sent for board in boards)),
+            "elapsed_s": resources.wall_seconds,
+            "lines_per_s": lines / resources.wall_seconds,
+            "latency_ms": percentiles(latencies, scale=1000),
+            "cpu_s": resources.cpu_seconds,
+            "board_cpu_s": board_cpu,
+            "host_cpu_s_per_board": host_cpu / count,
+            "host_cpu_pct_per_board": 100 * host_cpu / count / resources.wall_seconds,
+        }
+        result.update(usage)
+        return result
+    finally:
+        if multi is not None:
+            multi.close()
+        else:
+            for controller in controllers.values():
+                controller.disconnect()
+        if keep_dir is None:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def main(argv=None) -> List[Dict]:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--boards", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--mode", choices=["scan", "mppt", "both"], default="both")
+    parser.add_argument("--driver", choices=["single", "multi"], default="multi",
+                        help="call SingleController.scan/mppt directly or go through MultiController.run")
+    parser.add_argument("--backend", choices=["thread", "asyncio"], default=Constants.controller_backend,
+                        help="MultiController backend")
+    parser.add_argument("--rate", default="0",
+                        help="data lines per second per board, 0 for as fast as possible or 'firmware'")
+    parser.add_argument("--hours", type=float, default=0.25,
+                        help=f"simulated MPPT duration, {3600 / MPPT_LINE_S:.0f} lines per board and hour")
+    parser.add_argument("--poll-ms", type=float, default=10, help="csv sampling interval for the latency")
+    parser.add_argument("--log-data", action="store_true", help="keep logging every received line")
+    parser.add_argument("--text", action="store_true",
+                        help="receive text data lines instead of binary frames (Constants.serial_binary_frames)")
+    parser.add_argument("--keep-dir", help="write the run files here instead of a temporary directory")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args(argv)
+
+    if not args.log_data:
+        get_logger().mute(DATA)
+    if args.text:
+        Constants.serial_binary_frames = False
+    rate = None if args.rate == "firmware" else float(args.rate)
+    modes = [Mode.SCAN, Mode.MPPT] if args.mode == "both" else [Mode[args.mode.upper()]]
+
+    results = []
+    for count in args.boards:
+        for mode in modes:
+            keep_dir = os.path.join(args.keep_dir, f"{count}_{mode.name.lower()}") if args.keep_dir else None
+            results.append(benchmark(count, mode, args.driver, args.backend, rate,
+                                     args.hours, args.poll_ms, keep_dir))
+
+    table = [
+        dict(result, latency_p50_ms=result["latency_ms"]["p50"], latency_p95_ms=result["latency_ms"]["p95"])
+        for result in results
+    ]
+    print_table(table, ["boards", "mode", "driver", "lines", "lines_per_s", "latency_p50_ms",
+                          "latency_p95_ms", "host_cpu_pct_per_board", "rss_growth_mb", "rss_peak_mb"])
+    if args.json:
+        write_results(args.json, "acquisition", results, vars(args))
+    return results
+
+
+if __name__ == "__main__":
+    main()
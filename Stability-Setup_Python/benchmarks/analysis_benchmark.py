@@ -0,0 +1,169 @@
+# analysis_benchmark.py
+"""
+Analysis and plotting benchmark on synthetic run files.
+
+For every requested file size, synthetic scan and MPPT runs are generated
+(benchmarks/synthetic_runs.py) and each entry point is timed:
+
+- load:   core.run_data.load_run on the csv (and on the binary copy with --binary)
+- stats:  ScanCalculations.calculate_scan_stats_batch, MPPTCalculations.calculate_mppt_file_stats
+- stitch: combine_plots.stitch_mppt_files over the MPPT parts
+- render: PlotterWidget._plot_mppt plus a canvas draw, data_plotter.create_scan_graph
+
+The run cache is cleared before every repetition, so each timing includes
+parsing the files. With --binary the entry points other than load/*_csv
+read the binary copies, as the application does. Results are written as JSON (--json) and can be compared
+with an earlier result file (--compare).
+
+Example (from Stability-Setup_Python):
+
+    python -m benchmarks.analysis_benchmark --sizes 100KB 10MB 1GB --json analysis.json
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+sys.path.append(str(Path(__file__).parent.parent))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+from benchmarks.common import MB, ResourceMonitor, print_table, write_results
+from benchmarks.synthetic_runs import generate, parse_size
+from constants import Mode
+from core.run_cache import get_run_cache
+from core.run_data import load_run
+from helper.global_helpers import get_logger
+
+
+def time_call(func: Callable[[], object], repeat: int) -> Dict[str, float]:
+    """Runs func repeat times with a cold run cache, returns min/median seconds and peak RSS."""
+    seconds = []
+    monitor = ResourceMonitor(interval=0.05).start()
+    for _ in range(repeat):
+        get_run_cache().clear()
+        start = time.perf_counter()
+        func()
+        seconds.append(time.perf_counter() - start)
+        plt.close("all")
+    usage = monitor.stop()
+    return {
+        "min_s": min(seconds),
+        "median_s": statistics.median(seconds),
+        "rss_peak_mb": usage["rss_peak_mb"],
+    }
+
+
+def entry_points(scan_files: List[str], mppt_files: List[str], binary: bool) -> Dict[str, Callable[[], object]]:
+    from data_visualization import data_plotter
+    from gui.results_viewer import combine_plots
+    from gui.results_viewer.calculations import MPPTCalculations, ScanCalculations
+    from gui.results_viewer.plotter_widget import PlotterWidget
+
+    widget = PlotterWidget()
+
+    def render_mppt():
+        fig, ax = plt.subplots()
+        widget._plot_mppt(ax, mppt_files, "benchmark")
+        fig.canvas.draw()
+
+    points = {
+        "load/scan_csv": lambda: [load_run(path, prefer_binary=False) for path in scan_files],
+        "load/mppt_csv": lambda: [load_run(path, prefer_binary=False) for path in mppt_files],
+        "stats/scan": lambda: ScanCalculations.calculate_scan_stats_batch(scan_files),
+        "stats/mppt": lambda: [MPPTCalculations.calculate_mppt_file_stats(path) for path in mppt_files],
+        "stitch/mppt": lambda: combine_plots.stitch_mppt_files(mppt_files),
+        "render/plot_mppt": render_mppt,
+        "render/create_scan_graph": lambda: [data_plotter.create_scan_graph(path) for path in scan_files],
+    }
+    if binary:
+        points["load/mppt_binary"] = lambda: [load_run(path) for path in mppt_files]
+    return points
+
+
+def benchmark_size(size: str, data_dir: str, parts: int, repeat: int, binary: bool,
+                   only: Optional[List[str]]) -> List[Dict]:
+    size_bytes = parse_size(size)
+    directory = os.path.join(data_dir, size)
+    start = time.perf_counter()
+    scan_files = generate(directory, Mode.SCAN, size_bytes, binary=binary)
+    mppt_files = generate(directory, Mode.MPPT, size_bytes // parts, count=parts, binary=binary)
+    print(f"{size}: generated {1 + parts} files in {time.perf_counter() - start:.1f} s")
+
+    results = []
+    for name, func in entry_points(scan_files, mppt_files, binary).items():
+        if only and not any(name.startswith(prefix) for prefix in only):
+            continue
+        files = scan_files if "scan" in name else mppt_files
+        result = {
+            "size": size,
+            "entry_point": name,
+            "files": len(files),
+            "input_mb": sum(os.path.getsize(path) for path in files) / MB,
+        }
+        result.update(time_call(func, repeat))
+        result["mb_per_s"] = result["input_mb"] / result["min_s"] if result["min_s"] else None
+        results.append(result)
+        print(f"  {name}: {result['min_s']:.3f} s")
+    return results
+
+
+def compare(results: List[Dict], baseline_path: str) -> None:
+    """Prints the speedup of each result over the same size/entry point in a baseline JSON."""
+    with open(baseline_path) as f:
+        baseline = {
+            (result["size"], result["entry_point"]): result for result in json.load(f)["results"]
+        }
+    for result in results:
+        base = baseline.get((result["size"], result["entry_point"]))
+        result["baseline_min_s"] = base["min_s"] if base else None
+        result["speedup"] = base["min_s"] / result["min_s"] if base and result["min_s"] else None
+
+
+def main(argv=None) -> List[Dict]:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", default=["100KB", "1MB", "10MB", "100MB"],
+                        help="total size of the scan file and of the MPPT parts, e.g. 100KB 10MB 1GB")
+    parser.add_argument("--parts", type=int, default=3, help="MPPT files the size is split over")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--binary", action="store_true", help="also write and time the binary run copies")
+    parser.add_argument("--only", nargs="+", help="entry point prefixes to run, e.g. load stats")
+    parser.add_argument("--data-dir", help="keep the generated files here instead of a temporary directory")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="earlier result JSON to compute speedups against")
+    args = parser.parse_args(argv)
+
+    from PySide6.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication([])  # PlotterWidget needs one
+    get_logger().include_caller = False
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="analysis_bench_")
+    try:
+        results = []
+        for size in args.sizes:
+            results.extend(benchmark_size(size, data_dir, args.parts, args.repeat, args.binary, args.only))
+    finally:
+        if args.data_dir is None:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    columns = ["size", "entry_point", "input_mb", "min_s", "median_s", "mb_per_s", "rss_peak_mb"]
+    if args.compare:
+        compare(results, args.compare)
+        columns += ["baseline_min_s", "speedup"]
+    print_table(results, columns)
+    if args.json:
+        write_results(args.json, "analysis", results, vars(args))
+    return results
+
+
+if __name__ == "__main__":
+    main()
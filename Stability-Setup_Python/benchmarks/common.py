@@ -0,0 +1,127 @@
+# common.py
+"""Helpers shared by the benchmark scripts: resource sampling and JSON results."""
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+MB = 1024 * 1024
+
+
+def rss_bytes() -> Optional[int]:
+    """Current resident set size of this process, None where it cannot be read."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def percentiles(values: Iterable[float], scale: float = 1.0) -> Dict[str, Optional[float]]:
+    """p50/p95/p99/max of values multiplied by scale, None for an empty input."""
+    values = np.asarray(list(values) if not isinstance(values, np.ndarray) else values, dtype=float)
+    if values.size == 0:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99]) * scale
+    return {"p50": float(p50), "p95": float(p95), "p99": float(p99), "max": float(values.max() * scale)}
+
+
+class ResourceMonitor:
+    """Samples process RSS and CPU time in a background thread between start() and stop()."""
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.rss: List[int] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._cpu_start = 0.0
+        self._wall_start = 0.0
+        self.cpu_seconds = 0.0
+        self.wall_seconds = 0.0
+
+    def start(self) -> "ResourceMonitor":
+        self._cpu_start = time.process_time()
+        self._wall_start = time.perf_counter()
+        self._sample()
+        self._thread = threading.Thread(target=self._run, name="ResourceMonitor", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> Dict[str, Optional[float]]:
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+        self.cpu_seconds = time.process_time() - self._cpu_start
+        self.wall_seconds = time.perf_counter() - self._wall_start
+        return self.summary()
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        if not self.rss:
+            return {"rss_start_mb": None, "rss_peak_mb": None, "rss_end_mb": None, "rss_growth_mb": None}
+        return {
+            "rss_start_mb": self.rss[0] / MB,
+            "rss_peak_mb": max(self.rss) / MB,
+            "rss_end_mb": self.rss[-1] / MB,
+            "rss_growth_mb": (self.rss[-1] - self.rss[0]) / MB,
+        }
+
+    def _sample(self) -> None:
+        rss = rss_bytes()
+        if rss is not None:
+            self.rss.append(rss)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(path: str, benchmark: str, results: List[Dict], settings: Dict) -> None:
+    """Writes results with the commit and machine they were measured on, for comparing runs."""
+    document = {
+        "benchmark": benchmark,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_revision(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": settings,
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(document, f, indent=2)
+
+
+def print_table(results: List[Dict], columns: List[str]) -> None:
+    """Prints the given result columns as an aligned table."""
+    def fmt(value):
+        if isinstance(value, float):
+            return f"{value:.4g}"
+        return "-" if value is None else str(value)
+
+    rows = [[fmt(result.get(column)) for column in columns] for result in results]
+    widths = [max(len(column), *(len(row[i]) for row in rows)) for i, column in enumerate(columns)]
+    print("  ".join(column.rjust(width) for column, width in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(value.rjust(width) for value, width in zip(row, widths)))
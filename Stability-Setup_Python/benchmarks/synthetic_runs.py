@@ -0,0 +1,200 @@
+# synthetic_runs.py
+"""
+Generates synthetic scan and MPPT run files in the on-disk layout written by
+SingleController: the metadata rows padded with "None", the "Time" header
+row and one data row per measurement for 8 pixels. Pixel currents come from
+the diode model of the board emulator. Files are written in chunks, so
+sizes from a few KB up to several GB only need a bounded amount of memory.
+
+Example (from Stability-Setup_Python):
+
+    python -m benchmarks.synthetic_runs /tmp/runs --mode mppt --size 1GB --count 3
+"""
+import argparse
+import copy
+import os
+import re
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from constants import Constants, Mode
+from controller.acquisition_buffer import header_for_mode
+from core.row_buffer import DATA_FMT
+from controller.board_emulator import NUM_PIXELS, PixelModel, simulated_hw_id
+from core.run_data import binary_path_for, ChunkedRunWriter
+
+CHUNK_ROWS = 100_000
+# firmware time between MPPT rows and default scan range for the default parameters
+MPPT_STEP_S = 0.5
+SCAN_RANGE_V = 1.2
+DATE = "Jan-01-2025_00-00-00"
+
+_SIZE_UNITS = {"": 1, "B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3}
+
+
+def parse_size(text: str) -> int:
+    """Bytes in a size like "500KB", "10MB" or "1.5GB"."""
+    match = re.fullmatch(r"\s*([\d.]+)\s*([KMG]?B?)\s*", text.upper())
+    if not match:
+        raise ValueError(f"invalid size {text!r}")
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2)])
+
+
+def run_file_name(mode: Mode, board: int, trial_name: str = "__synthetic", date: str = DATE) -> str:
+    base = f"{date}{trial_name}__ID{board}__"
+    return base + ("light__scan.csv" if mode == Mode.SCAN else "mppt.csv")
+
+
+def metadata_for(mode: Mode, vset: Optional[np.ndarray] = None, date: str = DATE) -> Dict[str, str]:
+    params = copy.deepcopy(Constants.params[mode])
+    if vset is not None:
+        params[Constants.mppt_voltage_range_param] = " ".join(f"{value:.2f}" for value in vset)
+    params["Start Date"] = date
+    return {key: str(value) for key, value in params.items()}
+
+
+def _write_header(f, metadata: Dict[str, str], headers: List[str]) -> None:
+    block = np.full((len(metadata) + 1, len(headers)), "None", dtype=object)
+    for idx, (key, value) in enumerate(metadata.items()):
+        block[idx, :2] = key, value
+    block[-1] = headers
+    np.savetxt(f, block, delimiter=",", fmt="%s")
+
+
+def _mpp_voltage(pixels: PixelModel) -> np.ndarray:
+    V = np.linspace(0, 1.3, 1301)[:, np.newaxis] * np.ones(NUM_PIXELS)
+    power = V * pixels.current_mA(V, 0.0)
+    return V[np.argmax(power, axis=0), np.arange(NUM_PIXELS)]
+
+
+def _board_id(board: int) -> float:
+    """ARUDUINOID column value, the firmware prints its uniqueID in decimal."""
+    return float(int(simulated_hw_id(board - 1), 16))
+
+
+def mppt_rows(pixels: PixelModel, vmpp: np.ndarray, start: int, count: int,
+              board: int = 1, step_V: float = 0.005) -> np.ndarray:
+    """Rows start..start+count of an MPPT run dithering around the maximum power point."""
+    index = np.arange(start, start + count)
+    t = (index + 1) * MPPT_STEP_S
+    # perturb and observe settles into a +-step oscillation around Vmpp
+    dither = np.where(index % 4 < 2, 1.0, -1.0)[:, np.newaxis] * step_V
+    V = vmpp + dither + pixels.rng.normal(0, 0.0005, (count, NUM_PIXELS))
+    I = pixels.current_mA(V, t[:, np.newaxis]) + pixels.rng.normal(0, 1, (count, NUM_PIXELS)) * pixels.noise_mA
+
+    rows = np.empty((count, 2 + 2 * NUM_PIXELS))
+    rows[:, 0] = t
+    rows[:, 1:-1:2] = V
+    rows[:, 2:-1:2] = I
+    rows[:, -1] = _board_id(board)
+    return rows
+
+
+def scan_rows(pixels: PixelModel, points: int, board: int = 1, light: bool = True) -> np.ndarray:
+    """A forward then backward sweep over 0..SCAN_RANGE_V with points per direction."""
+    sweep = np.linspace(0, SCAN_RANGE_V, points)
+    applied = np.concatenate([sweep, sweep[::-1]])
+    t = np.tile(np.arange(1, points + 1) * 0.6, 2)
+    V = applied[:, np.newaxis] + pixels.rng.normal(0, 0.0005, (len(applied), NUM_PIXELS))
+    I = pixels.current_mA(V, 0.0, light) + pixels.rng.normal(0, 1, V.shape) * pixels.noise_mA
+
+    rows = np.empty((len(applied), 3 + 2 * NUM_PIXELS))
+    rows[:, 0] = t
+    rows[:, 1] = applied
+    rows[:, 2:-1:2] = V
+    rows[:, 3:-1:2] = I
+    rows[:, -1] = _board_id(board)
+    return rows
+
+
+def _bytes_per_row(rows: np.ndarray) -> float:
+    sample = rows[: min(len(rows), 1000)]
+    return sum(len(DATA_FMT % value) for value in sample.ravel()) / len(sample) + sample.shape[1]
+
+
+def write_mppt_run(path: str, size_bytes: int = 0, rows: int = 0, board: int = 1,
+                   binary: bool = False) -> str:
+    """Writes an MPPT run of about size_bytes (or exactly rows rows) to path."""
+    pixels = PixelModel(np.random.default_rng(board))
+    vmpp = _mpp_voltage(pixels)
+    headers = header_for_mode(Mode.MPPT)
+    metadata = metadata_for(Mode.MPPT, vmpp)
+    writer = ChunkedRunWriter(binary_path_for(path), metadata, headers) if binary else None
+
+    with open(path, "wb") as f:
+        _write_header(f, metadata, headers)
+        written = 0
+        while (rows and written < rows) or (not rows and f.tell() < size_bytes):
+            count = min(CHUNK_ROWS, rows - written) if rows else CHUNK_ROWS
+            chunk = mppt_rows(pixels, vmpp, written, count, board)
+            if not rows:
+                # don't overshoot the requested size by most of a chunk
+                remaining = (size_bytes - f.tell()) / _bytes_per_row(chunk)
+                chunk = chunk[: max(1, int(np.ceil(remaining)))]
+            np.savetxt(f, chunk, delimiter=",", fmt=DATA_FMT)
+            if writer is not None:
+                writer.append(chunk)
+            written += len(chunk)
+    if writer is not None:
+        writer.close()
+    return path
+
+
+def write_scan_run(path: str, size_bytes: int = 0, points: int = 41, board: int = 1,
+                   binary: bool = False) -> str:
+    """Writes a scan of points per direction (or enough points for size_bytes) to path."""
+    pixels = PixelModel(np.random.default_rng(board))
+    headers = header_for_mode(Mode.SCAN)
+    metadata = metadata_for(Mode.SCAN)
+    if size_bytes:
+        per_row = _bytes_per_row(scan_rows(pixels, 100, board))
+        points = max(2, int(size_bytes / per_row / 2))
+    rows = scan_rows(pixels, points, board)
+
+    with open(path, "wb") as f:
+        _write_header(f, metadata, headers)
+        for start in range(0, len(rows), CHUNK_ROWS):
+            np.savetxt(f, rows[start:start + CHUNK_ROWS], delimiter=",", fmt=DATA_FMT)
+    if binary:
+        writer = ChunkedRunWriter(binary_path_for(path), metadata, headers)
+        writer.append(rows)
+        writer.close()
+    return path
+
+
+def generate(directory: str, mode: Mode, size_bytes: int, count: int = 1,
+             binary: bool = False, trial_name: str = "__synthetic") -> List[str]:
+    """count run files of about size_bytes each, one per board ID, in directory."""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for board in range(1, count + 1):
+        path = os.path.join(directory, run_file_name(mode, board, trial_name))
+        if mode == Mode.SCAN:
+            write_scan_run(path, size_bytes, board=board, binary=binary)
+        else:
+            write_mppt_run(path, size_bytes, board=board, binary=binary)
+        paths.append(path)
+    return paths
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory")
+    parser.add_argument("--mode", choices=["scan", "mppt"], default="mppt")
+    parser.add_argument("--size", default="1MB", help="approximate size of each file, e.g. 500KB, 10MB, 2GB")
+    parser.add_argument("--count", type=int, default=1, help="number of files (boards)")
+    parser.add_argument("--binary", action="store_true", help="also write the binary (.npz) copies")
+    args = parser.parse_args(argv)
+
+    for path in generate(args.directory, Mode[args.mode.upper()], parse_size(args.size),
+                         args.count, args.binary):
+        print(f"{path}: {os.path.getsize(path) / 1024 / 1024:.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
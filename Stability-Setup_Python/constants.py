@@ -68,4 +68,82 @@ class Constants:
        },
     }
     line_per_save = 20
+    # compressed MPPT files written next to the full run, see controller/mppt_compressor.py:
+    # (file suffix, bucket width in seconds, "mean" | "minmax" | "lttb"), the "" suffix is
+    # the __compressedmppt.csv file the Results Viewer reads. e.g. add ("1min", 60, "minmax")
+    # and ("10min", 600, "lttb") for coarser tiers written side by side
+    mppt_compression_tiers = [("", 10, "mean")]
+    # "thread": one reader thread per board, "asyncio": all boards on one event loop
+    controller_backend = "thread"
+    # ask the boards to send binary data frames instead of text lines (controller/binary_frames.py);
+    # firmware without binary support ignores the command and keeps sending text lines
+    serial_binary_frames = True
+    binary_frames_command = "fmt,1\n"
+    # upload the parameters of a run as one block (controller/parameter_block.py), how long the board
+    # may take to answer the block (longer than PARAM_BLOCK_TIMEOUT_MS of the firmware), and how long
+    # boards that have their parameters wait for the others
+    serial_parameter_blocks = True
+    parameter_block_timeout_s = 1.0
+    start_barrier_timeout_s = 10.0
+    # how long a board may take to report "Measurement Started" once its run was started, a board
+    # that does not is connected again (SingleController._start_measurement)
+    measurement_start_timeout_s = 5.0
+    # controller/run_clock.py: how often the board times are checked against the host clock, how
+    # many of the checks the drift is fitted to, and the largest drift taken for a board's clock
+    clock_sync_interval_s = 60.0
+    clock_sync_points = 10
+    clock_max_drift = 0.005
+    # controller/baud_negotiation.py: echo rounds that must pass at a new baud rate, and how long
+    # to wait for each answer of the board (the rates offered are ArduinoConfig.baud_rates)
+    baud_probe_rounds = 20
+    baud_probe_timeout_s = 0.5
+    # connecting to a board (reset, boot, baud rate negotiation) gives up after connect_timeout_s;
+    # a board known to the device registry (controller/device_registry.py) is first asked for its
+    # HW_ID without a reset and must answer within fast_connect_timeout_s
+    connect_timeout_s = 10.0
+    fast_connect_timeout_s = 0.5
+    device_registry_file = "deviceRegistry.json"
+    # also write a chunked binary (.npz) copy of every run file, see core/run_data.py
+    write_binary_runs = True
+    # Results Viewer cache of parsed runs, see core/run_cache.py
+    run_cache_max_mb = 512
+    run_cache_sidecar = False
+    # points per line of an MPPT plot, zooming re-queries a min/max pyramid, see core/series_pyramid.py
+    mppt_plot_max_points = 5000
+    # Results Viewer live view: how often the plotted files are checked for new rows
+    live_plot_interval_ms = 1000
+    # controller/sample_bus.py: blocks queued per board and subscriber, blocks kept per board for
+    # subscribers that join a running measurement, longest a BLOCK subscriber may stall a controller
+    sample_bus_queue_blocks = 256
+    sample_bus_history_blocks = 64
+    sample_bus_block_timeout_s = 0.5
+    # controller/run_writer.py: rows are appended to the run files in batches at this interval (or
+    # once max_batch_rows are waiting), fsync'ed at the fsync interval (0: only flushed, never synced)
+    run_writer_flush_interval_s = 0.5
+    run_writer_max_batch_rows = 10000
+    run_writer_fsync_interval_s = 30.0
+    # blocks the writer may fall behind before it logs an error (it keeps the rest in memory, controllers
+    # never wait for it), wait for the files at the end of a run
+    run_writer_queue_blocks = 100000
+    run_writer_finish_timeout_s = 60.0
+    # controller/run_journal.py: a checkpoint (file offsets, row count, crc32) is added to the
+    # journal of a run at this interval and at every fsync; a restarted app re-attaches to boards
+    # still measuring if their first data line arrives within the attach timeout
+    run_journal_interval_s = 5.0
+    resume_attach_timeout_s = 10.0
+    # a run is ended instead of recovered again once its board failed this many attaches, or once
+    # its last checkpoint is older than the maximum age
+    resume_max_attach_attempts = 3
+    resume_max_age_s = 24 * 3600.0
+    # log only every n-th line received from an arduino (1 logs all of them, which costs a
+    # formatted stdout/file/widget line per data line)
+    data_log_every_n = 100
+    # Log Viewer: lines kept in the widget, how often new lines are shown,
+    # and size/count of the rotating log files on disk
+    log_view_max_lines = 5000
+    log_flush_interval_ms = 200
+    log_file_max_mb = 10
+    log_file_backups = 5
+    # data lines per second sent by simulated boards (controller/board_emulator.py)
+    simulated_line_rate = 200.0
     unknown_Arduino_ID = -1
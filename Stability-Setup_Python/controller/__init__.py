@@ -0,0 +1,7 @@
+# Controller package
+# serial.serial_for_url opens "<scheme>://" urls through controller/protocol_<scheme>.py,
+# this is how the controllers reach simulated boards (sim://, see controller/protocol_sim.py)
+import serial
+
+if __name__ not in serial.protocol_handler_packages:
+    serial.protocol_handler_packages.append(__name__)
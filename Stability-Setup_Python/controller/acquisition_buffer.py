@@ -0,0 +1,25 @@
+# acquisition_buffer.py
+from typing import List
+
+from constants import Mode
+
+NUM_PIXELS = 8
+
+
+def header_for_mode(mode: Mode) -> List[str]:
+    """
+    Column layout of the data section written by the Arduino for a given mode.
+
+    MPPT rows use the fixed 18 column schema (Time, 8x V, 8x mA, ID),
+    scan rows carry an extra Voltage_Applied column after Time.
+    """
+    voltage_lambda = lambda value: "Pixel_" + str(value + 1) + " V"
+    amperage_lambda = lambda value: "Pixel_" + str(value + 1) + " mA"
+    header_arr = ["Time"]
+    if mode == Mode.SCAN:
+        header_arr.append("Voltage_Applied")
+    header_arr.extend(
+        [f(value) for value in range(NUM_PIXELS) for f in (voltage_lambda, amperage_lambda)]
+    )
+    header_arr.append("ARUDUINOID")
+    return header_arr
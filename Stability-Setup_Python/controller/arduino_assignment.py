@@ -1,8 +1,15 @@
+import os
 import serial.tools.list_ports
 from typing import Dict, List
 
+from controller.board_emulator import simulated_hw_id, simulated_port
 from helper.global_helpers import get_logger
 
+# Set to a number of boards to connect to simulated boards instead of COM ports,
+# e.g. STABILITY_SIMULATED_BOARDS=4 (optionally STABILITY_SIMULATED_RATE=<lines/s>)
+SIMULATED_BOARDS_ENV = "STABILITY_SIMULATED_BOARDS"
+SIMULATED_RATE_ENV = "STABILITY_SIMULATED_RATE"
+
 
 def _show_all_com_devices() -> List[serial.tools.list_ports.comports]:
     ports = [p for p in serial.tools.list_ports.comports()]
@@ -12,8 +19,27 @@ def _show_all_com_devices() -> List[serial.tools.list_ports.comports]:
     return ports
 
 
+def simulated_boards() -> List[str]:
+    """sim:// ports requested through STABILITY_SIMULATED_BOARDS, empty if unset."""
+    try:
+        count = int(os.environ.get(SIMULATED_BOARDS_ENV, "0"))
+    except ValueError:
+        get_logger().log(f"Ignoring invalid {SIMULATED_BOARDS_ENV}={os.environ[SIMULATED_BOARDS_ENV]!r}")
+        return []
+    rate = os.environ.get(SIMULATED_RATE_ENV)
+    return [simulated_port(simulated_hw_id(i), rate=rate) for i in range(count)]
+
+
+def simulated_arduino_ids(count: int) -> Dict[str, int]:
+    """HW_ID to Arduino ID mapping for the first count simulated boards."""
+    return {simulated_hw_id(i): i + 1 for i in range(count)}
+
+
 def get() -> List[str]:
     """Get a list of connected Arduino devices."""
+    simulated = simulated_boards()
+    if simulated:
+        return simulated
     try:
         return [
             device.device
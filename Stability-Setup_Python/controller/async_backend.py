@@ -0,0 +1,488 @@
+# async_backend.py
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Iterable, List, Optional
+
+import serial
+
+from constants import Constants, Mode
+from controller.device_registry import get_device_registry
+from controller.parameter_block import START_COMMAND, block_reply, encode_block
+from controller.serial_reader import SerialLineReader
+from helper.global_helpers import get_logger
+
+# Used when the port has no selectable file descriptor (Windows COM ports)
+POLL_INTERVAL_S = 0.005
+COMMAND_DELAY_S = 0.1
+RESET_DELAY_S = 0.1
+
+
+class AsyncSerialPort:
+    """
+    Non-blocking serial transport for an asyncio loop.
+
+    The pyserial port is opened with timeout=0 so reads never block. On
+    POSIX the loop is woken by the port's file descriptor becoming readable,
+    elsewhere the port is polled every POLL_INTERVAL_S without occupying a
+    thread.
+    """
+
+    def __init__(self, ser, port: str):
+        self.ser = ser
+        self.port = port
+        self.reader = SerialLineReader(ser, port)
+        self._data_ready: Optional[asyncio.Event] = None
+        self._fileno = None
+
+    @classmethod
+    def open(cls, port: str, baud_rate: int) -> "AsyncSerialPort":
+        ser = serial.serial_for_url(port, baud_rate, timeout=0)
+        return cls(ser, port)
+
+    def _attach_reader(self) -> None:
+        if self._data_ready is not None:
+            return
+        self._data_ready = asyncio.Event()
+        try:
+            self._fileno = self.ser.fileno()
+            asyncio.get_running_loop().add_reader(self._fileno, self._data_ready.set)
+        except (AttributeError, NotImplementedError, OSError, ValueError):
+            self._fileno = None
+
+    async def _wait_for_data(self, timeout: float) -> None:
+        if self._fileno is None:
+            await asyncio.sleep(POLL_INTERVAL_S)
+            return
+        try:
+            await asyncio.wait_for(self._data_ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._data_ready.clear()
+
+    async def read_lines(self, timeout: float = 1.0) -> List[str]:
+        """
+        Wait for serial data and return the complete lines received, rows of
+        binary frames are left in self.reader for take_rows().
+
+        Returns an empty list if nothing complete arrived within timeout.
+        """
+        self._attach_reader()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            waiting = self.ser.in_waiting
+            if waiting:
+                lines = self.reader.feed(self.ser.read(waiting))
+                if lines or self.reader.has_rows():
+                    return lines
+            if loop.time() >= deadline:
+                return []
+            await self._wait_for_data(deadline - loop.time())
+
+    async def write(self, data: bytes) -> None:
+        self.ser.write(data)
+
+    async def reset(self) -> None:
+        """Resets the arduino by toggling DTR without blocking the loop."""
+        try:
+            self.ser.setDTR(False)
+            await asyncio.sleep(RESET_DELAY_S)
+            self.ser.setDTR(True)
+            get_logger().log("Arduino has been reset.")
+        except (serial.SerialException, OSError) as e:
+            get_logger().log(f"Failed to reset Arduino: {e}")
+
+    def close(self) -> None:
+        if self._fileno is not None:
+            try:
+                asyncio.get_running_loop().remove_reader(self._fileno)
+            except RuntimeError:
+                pass
+            self._fileno = None
+        self.ser.close()
+
+
+class _StartBarrier:
+    """StartBarrier (controller/parameter_block.py) for the measurement tasks on the backend loop."""
+
+    def __init__(self, parties: int):
+        self._parties = parties
+        # the tasks that reached wait()
+        self._arrived = set()
+        self._released = asyncio.Event()
+
+    def _release_if_complete(self) -> None:
+        if len(self._arrived) >= self._parties:
+            self._released.set()
+
+    async def wait(self) -> None:
+        self._arrived.add(asyncio.current_task())
+        self._release_if_complete()
+        try:
+            await asyncio.wait_for(self._released.wait(), Constants.start_barrier_timeout_s)
+        except asyncio.TimeoutError:
+            get_logger().log("Not every arduino got its parameters in time, starting without them")
+            self._released.set()
+
+    def reached(self, task: asyncio.Task) -> bool:
+        return task in self._arrived
+
+    def leave(self) -> None:
+        """A task that will not reach wait(), the others no longer wait for it."""
+        self._parties -= 1
+        self._release_if_complete()
+
+
+class AsyncControllerBackend:
+    """
+    Drives every SingleController on one asyncio event loop.
+
+    The loop runs in a single background thread, so connecting, sending
+    parameters and streaming data for all boards costs one OS thread
+    instead of one per COM port plus a monitor thread. The protocol and
+    file handling are shared with the threaded path through the
+    SingleController helpers (_handle_boot_line, _build_commands,
+    _handle_line, _save_data).
+    """
+
+    def __init__(self):
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ports: Dict[str, AsyncSerialPort] = {}
+        # the running measurement task of each controller, by ID, for stop()
+        self._tasks: Dict[int, asyncio.Task] = {}
+        # the stop() of each controller that is still cancelling its task or resetting its board
+        self._stopping: Dict[int, asyncio.Task] = {}
+
+    def start(self) -> None:
+        if self.loop is not None:
+            return
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self.loop.run_forever, name="AsyncControllerBackend", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, coro) -> Future:
+        """Schedules a coroutine on the backend loop from any thread."""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def shutdown(self) -> None:
+        if self.loop is None:
+            return
+        self.submit(self._close_all()).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+        self.loop = None
+        self._thread = None
+
+    # --- connect ---------------------------------------------------------
+
+    def connect_all(self, controllers: Iterable) -> List:
+        """Connects all controllers concurrently, returns connect() style results."""
+        return self.submit(self._connect_all(list(controllers))).result()
+
+    async def _connect_all(self, controllers) -> List:
+        return await asyncio.gather(
+            *(self._connect(controller) for controller in controllers)
+        )
+
+    async def _connect(self, controller):
+        old_port = self._ports.pop(controller.port, None)
+        if old_port is not None:
+            old_port.close()
+        loop = asyncio.get_running_loop()
+        record = get_device_registry().lookup(controller.port)
+        if record is not None and await loop.run_in_executor(None, controller.fast_connect, record):
+            controller.ser.timeout = 0
+            self._ports[controller.port] = AsyncSerialPort(controller.ser, controller.port)
+            return (controller.HW_ID, controller.arduinoID)
+
+        deadline = loop.time() + Constants.connect_timeout_s
+        try:
+            port = AsyncSerialPort.open(controller.port, controller.baud_rate)
+        except serial.SerialException as e:
+            get_logger().log(f"Failed to connect to {controller.port}. Error: {e}")
+            return ()
+        self._ports[controller.port] = port
+        controller.ser = port.ser
+
+        boot_result = None
+        try:
+            await port.reset()
+            while boot_result is None and loop.time() < deadline:
+                for line in await port.read_lines(deadline - loop.time()):
+                    boot_result = controller._handle_boot_line(line)
+                    if boot_result is not None:
+                        break
+            port.ser.reset_input_buffer()
+            port.reader.clear()
+            if boot_result:
+                # the link check waits for the board's answers, keep it off the loop
+                await loop.run_in_executor(None, controller.negotiate_baud_rate)
+        except serial.SerialException as e:
+            get_logger().log(f"Failed to connect to {controller.port}. Error: {e}")
+            return ()
+
+        if not boot_result:
+            if boot_result is None:
+                get_logger().log(f"No boot banner on {controller.port} within {Constants.connect_timeout_s} s")
+            get_logger().log(f"Arduino Connection to {controller.arduinoID} Failed. Disconnecting...")
+            get_device_registry().forget(controller.port)
+            self._close_port(controller)
+            return ()
+        controller.remember_device()
+        controller.ready = True
+        return (controller.HW_ID, controller.arduinoID)
+
+    def check_idle_all(self, controllers: Iterable) -> List[bool]:
+        """SingleController.check_idle() of every controller, concurrently on the loop."""
+        return self.submit(self._check_idle_all(list(controllers))).result()
+
+    async def _check_idle_all(self, controllers) -> List[bool]:
+        return await asyncio.gather(*(self._check_idle(controller) for controller in controllers))
+
+    async def _check_idle(self, controller) -> bool:
+        port = self._ports.get(controller.port)
+        hw_id = controller.HW_ID
+        boot_result = None
+        if port is not None:
+            try:
+                port.ser.reset_input_buffer()
+                port.reader.clear()
+                await port.write(b"id\n")
+                loop = asyncio.get_running_loop()
+                deadline = loop.time() + Constants.fast_connect_timeout_s
+                while boot_result is None and loop.time() < deadline:
+                    for line in await port.read_lines(deadline - loop.time()):
+                        boot_result = controller._handle_boot_line(line)
+                        if boot_result is not None:
+                            break
+            except serial.SerialException as e:
+                get_logger().log(f"Communication error on {controller.port}. Error: {e}")
+        idle = bool(boot_result) and controller.HW_ID == hw_id
+        if not idle:
+            get_logger().log(f"ARDUINO {controller.arduinoID} on {controller.port} is not idle, connecting it again")
+            controller.ready = False
+        return idle
+
+    # --- measurements ----------------------------------------------------
+
+    def run(self, controllers: Dict[int, object], mode: Mode, params,
+            on_finished: Optional[Callable[[], None]] = None) -> Future:
+        """
+        Starts mode on every controller and returns a future that completes
+        once all of them have finished. A measurement still running on one of
+        the controllers is stopped first. on_finished is called in an executor,
+        so it may block (e.g. send an email) without holding up the loop.
+        """
+        return self.submit(self._run_all(controllers, mode, params, on_finished))
+
+    async def _run_all(self, controllers, mode, params, on_finished):
+        # like MultiController.run_command joining the old thread: a controller runs one
+        # measurement at a time, a running one is stopped and a stop() in progress finishes
+        # resetting the board before the new one starts
+        stops = []
+        for ID, controller in controllers.items():
+            task = self._tasks.get(ID)
+            if ID in self._stopping:
+                stops.append(self._stopping[ID])
+            elif task is not None and not task.done():
+                get_logger().log(f"Stopping current command on controller {ID}.")
+                stops.append(self._stop(ID, controller))
+        await asyncio.gather(*stops, return_exceptions=True)
+        for controller in controllers.values():
+            controller.should_run = True
+
+        # the boards start together once all of them have their parameters
+        barrier = _StartBarrier(len(controllers))
+        # the tasks of this run, registered in self._tasks for stop() while they run
+        tasks = {}
+        for ID, controller in controllers.items():
+            tasks[ID] = asyncio.ensure_future(
+                self._run_measurement(ID, controller, mode, params, barrier)
+            )
+            # a task that ends before the start, by error or cancelled, is not waited for
+            tasks[ID].add_done_callback(lambda task: barrier.reached(task) or barrier.leave())
+        self._tasks.update(tasks)
+        results = await asyncio.gather(*tasks.values(), return_exceptions=True)
+        for ID, result in zip(list(tasks), results):
+            if isinstance(result, Exception):
+                get_logger().log(f"Failed to run command '{mode}' on controller {ID}: {result}")
+            # a later run may have registered its own task for the controller
+            if self._tasks.get(ID) is tasks[ID]:
+                del self._tasks[ID]
+        if on_finished is not None:
+            await asyncio.get_running_loop().run_in_executor(None, on_finished)
+
+    async def _run_measurement(self, ID, controller, mode, params, barrier):
+        port = self._ports.get(controller.port)
+        if port is None:
+            raise RuntimeError(f"controller {ID} is not connected")
+
+        controller._begin_run()
+        if mode == Mode.SCAN:
+            run_params, header_arr = controller._prepare_scan(params)
+        elif mode == Mode.MPPT:
+            run_params, header_arr = controller._prepare_mppt(params)
+        else:
+            get_logger().log(f"Unknown command: {mode}")
+            return
+
+        controller.run_finished = False
+        controller.ready = False
+        try:
+            lines = await self._start_measurement(port, controller, mode, run_params, header_arr, barrier)
+            if lines is None and controller.should_run:
+                # like SingleController._start_measurement
+                get_logger().log(f"ARDUINO {controller.arduinoID} did not start the measurement within "
+                                 f"{Constants.measurement_start_timeout_s} s, connecting it again")
+                if await self._connect(controller):
+                    port = self._ports[controller.port]
+                    lines = await self._start_measurement(port, controller, mode, run_params, header_arr)
+                if lines is None:
+                    get_logger().log(f"ARDUINO {controller.arduinoID} did not start the measurement, "
+                                     f"leaving it out of this run")
+            if lines is None:
+                return
+            controller.binary_frames = port.reader.decoder is not None
+
+            controller._create_array(run_params, header_arr)
+            controller._save_data()
+
+            while controller.should_run:
+                controller._handle_rows(port.reader.take_rows())
+                for line in lines:
+                    if controller._handle_line(line):
+                        await self._wait_for_run_files(controller, controller.ended_run)
+                        controller.ready = True
+                        return
+                controller._publish_rows()
+                lines = await port.read_lines()
+            # Save any partial data
+            await self._wait_for_run_files(controller, controller._end_run())
+        except serial.SerialException as e:
+            get_logger().log(f"Communication error on {controller.port}. Error: {e}")
+            await self._wait_for_run_files(controller, controller._abandon_run())
+        except asyncio.CancelledError:
+            # stopped: keep the rows received so far and close the files, so the run is not recovered
+            if controller.bus_run is not None:
+                await self._wait_for_run_files(controller, controller._end_run())
+            raise
+        finally:
+            controller.run_finished = True
+
+    async def _start_measurement(self, port, controller, mode, run_params, header_arr,
+                                 barrier: Optional[_StartBarrier] = None) -> Optional[List[str]]:
+        """
+        Uploads the parameters and starts the run (SingleController._send_command on the loop).
+
+        Returns the lines received after "Measurement Started" (already data),
+        None if the board did not report it within Constants.measurement_start_timeout_s
+        """
+        controller.ready = False
+        commands = controller._build_commands(mode, run_params)
+        # the last command ("done") starts the run
+        start_command = commands.pop()
+        if Constants.serial_binary_frames:
+            port.reader.expect_frames(len(header_arr))
+        get_logger().log("Sending Commands to Arduino: ", commands)
+        if Constants.serial_parameter_blocks and await self._upload_block(port, controller, commands):
+            start_command = START_COMMAND
+        else:
+            for command in commands:
+                await port.write(command.encode())
+                await asyncio.sleep(COMMAND_DELAY_S)
+        if barrier is not None:
+            await barrier.wait()
+        controller.clock.run.mark_start()
+        await port.write(start_command.encode())
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + Constants.measurement_start_timeout_s
+        while controller.should_run and loop.time() < deadline:
+            lines = await port.read_lines(min(1.0, deadline - loop.time()))
+            while lines:
+                line = lines.pop(0)
+                get_logger().log(f"INIT STAGE ARDUINO {controller.arduinoID} OUTPUT:", line)
+                if "Measurement Started" in line:
+                    controller.clock.started()
+                    return lines
+        return None
+
+    async def _wait_for_run_files(self, controller, run) -> None:
+        """SingleController._wait_for_run_files() in an executor, the loop keeps reading the other boards."""
+        await asyncio.get_running_loop().run_in_executor(None, controller._wait_for_run_files, run)
+
+    async def _upload_block(self, port, controller, commands) -> bool:
+        """SingleController._upload_block() on the loop."""
+        header, payload = encode_block(commands)
+        await port.write(header)
+        accepted = await self._read_block_reply(port, controller)
+        if accepted:
+            await port.write(payload)
+            accepted = await self._read_block_reply(port, controller)
+        if not accepted:
+            get_logger().log(f"ARDUINO {controller.arduinoID} did not take the parameter block, sending the lines one by one")
+        return bool(accepted)
+
+    async def _read_block_reply(self, port, controller) -> Optional[bool]:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + Constants.parameter_block_timeout_s
+        while loop.time() < deadline:
+            for line in await port.read_lines(deadline - loop.time()):
+                get_logger().log(f"INIT STAGE ARDUINO {controller.arduinoID} OUTPUT:", line)
+                reply = block_reply(line)
+                if reply is not None:
+                    return reply
+        return None
+
+    def stop(self, ID: int, controller) -> Future:
+        """Cancels the running measurement task of a controller, if any, and resets its board."""
+        return self.submit(self._stop(ID, controller))
+
+    async def _stop(self, ID: int, controller) -> None:
+        self._stopping[ID] = asyncio.current_task()
+        try:
+            await self._stop_and_reset(ID, controller)
+        finally:
+            if self._stopping.get(ID) is asyncio.current_task():
+                del self._stopping[ID]
+
+    async def _stop_and_reset(self, ID: int, controller) -> None:
+        task = self._tasks.get(ID)
+        if task is not None and not task.done():
+            task.cancel()
+            # the task finishes its run before the board is reset
+            await asyncio.wait([task])
+        controller.ready = False
+        port = self._ports.get(controller.port)
+        if port is None:
+            get_logger().log("Arduino is not connected.")
+            return
+        # the arduino boots at the boot rate again
+        port.ser.baudrate = controller.baud_rate
+        await port.reset()
+        if controller.HW_ID:
+            controller.remember_device()
+
+    def disconnect(self, controller) -> None:
+        """Closes the port of a controller from any thread."""
+        async def close():
+            self._close_port(controller)
+        self.submit(close()).result()
+
+    def _close_port(self, controller) -> None:
+        port = self._ports.pop(controller.port, None)
+        if port is not None:
+            port.close()
+        controller.ready = False
+        controller.ser = None
+
+    async def _close_all(self) -> None:
+        for port in self._ports.values():
+            port.close()
+        self._ports.clear()
@@ -0,0 +1,130 @@
+# baud_negotiation.py
+"""
+Switching a connected board to a faster serial link.
+
+Boards boot at the boot rate (ArduinoConfig.baud_rate), so the bootloader,
+the boot banner and firmware without negotiation keep working. After
+"Arduino Ready" the host offers the rates of ArduinoConfig.baud_rates,
+fastest first:
+
+    host:  baud,1000000          board: Baud: 1000000   (then switches)
+    host:  ping,<payload>        board: pong,<payload>  (Constants.baud_probe_rounds times)
+    host:  baud ok               board: Baud confirmed
+
+The echo of the probe checks both directions at the new rate. If a probe
+round fails the host goes back to the boot rate; the board does the same
+when it receives no ping for BAUD_PROBE_TIMEOUT_MS (src/serial_com.cpp)
+and prints "Baud reverted", then the next slower rate is tried. Firmware
+that does not know "baud" ignores it with a warning and the link stays at
+the boot rate.
+
+The answers are polled, so this works on ports opened with any read
+timeout; the asyncio backend runs it in an executor thread.
+"""
+import time
+from typing import Iterable, Optional
+
+from constants import Constants
+from helper.global_helpers import get_logger
+
+# firmware's BAUD_PROBE_TIMEOUT_MS plus margin, how long a board takes to fall back
+REVERT_TIMEOUT_S = 1.5
+PROBE_PAYLOAD_LEN = 40
+POLL_INTERVAL_S = 0.002
+
+
+class _LinkLines:
+    """Reads lines from a serial port until a deadline, polling in_waiting whatever the port timeout."""
+
+    def __init__(self, ser):
+        self.ser = ser
+        self._buffer = bytearray()
+
+    def readline(self, timeout: float) -> Optional[str]:
+        """The next non-empty line, None if there was none within timeout."""
+        deadline = time.monotonic() + timeout
+        while True:
+            end = self._buffer.find(b"\n")
+            if end >= 0:
+                raw = bytes(self._buffer[:end])
+                del self._buffer[: end + 1]
+                line = raw.decode(errors="replace").strip()
+                if line:
+                    return line
+                continue
+            if time.monotonic() >= deadline:
+                return None
+            waiting = self.ser.in_waiting
+            if waiting:
+                self._buffer += self.ser.read(waiting)
+            else:
+                time.sleep(POLL_INTERVAL_S)
+
+    def wait_for(self, prefix: str, timeout: float) -> Optional[str]:
+        """The first line starting with prefix, None if none arrived within timeout."""
+        deadline = time.monotonic() + timeout
+        while True:
+            line = self.readline(max(deadline - time.monotonic(), 0))
+            if line is None or line.startswith(prefix):
+                return line
+
+    def clear(self) -> None:
+        self._buffer.clear()
+        self.ser.reset_input_buffer()
+
+
+def _probe_payload(round_index: int) -> str:
+    # printable characters shifted every round, so every bit of a byte is exercised
+    return "".join(chr(33 + (i * 7 + round_index) % 94) for i in range(PROBE_PAYLOAD_LEN))
+
+
+def _probe(link: _LinkLines, rounds: int, timeout: float) -> bool:
+    for round_index in range(rounds):
+        payload = _probe_payload(round_index)
+        link.ser.write(f"ping,{payload}\n".encode())
+        if link.wait_for("pong,", timeout) != f"pong,{payload}":
+            return False
+    return True
+
+
+def _try_rate(link: _LinkLines, rate: int, boot_rate: int, port: str) -> Optional[bool]:
+    """True if the link now runs at rate, False if the probe failed, None if the board does not negotiate."""
+    link.ser.write(f"baud,{rate}\n".encode())
+    answer = link.wait_for("Baud:", Constants.baud_probe_timeout_s)
+    if answer is None:
+        return None
+    if answer != f"Baud: {rate}":
+        get_logger().log(f"{port}: board declined {rate} baud: {answer}")
+        return False
+
+    link.ser.baudrate = rate
+    link.clear()
+    if _probe(link, Constants.baud_probe_rounds, Constants.baud_probe_timeout_s):
+        link.ser.write(b"baud ok\n")
+        if link.wait_for("Baud confirmed", Constants.baud_probe_timeout_s) is not None:
+            return True
+
+    get_logger().log(f"{port}: link check at {rate} baud failed, falling back to {boot_rate}")
+    link.ser.baudrate = boot_rate
+    link.clear()
+    link.wait_for("Baud reverted", REVERT_TIMEOUT_S)
+    link.clear()
+    return False
+
+
+def negotiate_baud_rate(ser, rates: Iterable[int], boot_rate: int, port: str = "") -> int:
+    """
+    Switches the board on ser (at boot_rate, idle after its boot banner) to
+    the fastest of rates that passes the link check, returns the rate the
+    link runs at now.
+    """
+    link = _LinkLines(ser)
+    for rate in sorted({int(rate) for rate in rates if int(rate) > boot_rate}, reverse=True):
+        result = _try_rate(link, rate, boot_rate, port)
+        if result is None:
+            get_logger().log(f"{port}: board does not negotiate the baud rate, staying at {boot_rate}")
+            break
+        if result:
+            get_logger().log(f"{port}: link running at {rate} baud")
+            return rate
+    return boot_rate
@@ -0,0 +1,136 @@
+# binary_frames.py
+"""
+Binary data frames, the compact alternative to the text data lines.
+
+When the host adds Constants.binary_frames_command to the parameters it
+uploads, firmware that supports it answers "Data format: binary" (see
+BINARY_ACK) and sends every sample as one fixed size little-endian frame
+instead of a line of ASCII floats:
+
+    uint16   sync word 0xA55A
+    uint32   time since the measurement started, in ms
+    float32  [Voltage_Applied (scan only),] V and mA of pixel 1..8
+    uint32   unique ID of the board
+    uint16   CRC-16/CCITT (poly 0x1021, init 0xFFFF) of the bytes between
+             the sync word and the crc
+
+An MPPT sample takes 76 bytes instead of about 200 as text. Time is sent
+as integer milliseconds, float32 seconds would lose resolution on
+multi-day runs. Status messages ("Delay: ...", "Done!") stay text lines
+between the frames. Firmware without binary support ignores the command
+with a warning, the host then keeps parsing text lines.
+"""
+import binascii
+from typing import Tuple
+
+import numpy as np
+
+SYNC_WORD = 0xA55A
+SYNC = SYNC_WORD.to_bytes(2, "little")
+CRC_INIT = 0xFFFF
+BINARY_ACK = "Data format: binary"
+# bytes that can not be part of the ASCII status lines between frames
+_NON_TEXT = bytes(b for b in range(256) if not (32 <= b < 127 or b in b"\t\r\n"))
+
+
+def frame_dtype(width: int) -> np.dtype:
+    """Frame layout for runs with width columns (see acquisition_buffer.header_for_mode)."""
+    return np.dtype([
+        ("sync", "<u2"),
+        ("time_ms", "<u4"),
+        ("values", "<f4", (width - 2,)),
+        ("id", "<u4"),
+        ("crc", "<u2"),
+    ])
+
+
+def encode_frame(time_ms: int, values, unique_id: int) -> bytes:
+    """One frame as the firmware sends it, used by the board emulator."""
+    payload = (
+        int(time_ms).to_bytes(4, "little")
+        + np.asarray(values, dtype="<f4").tobytes()
+        + int(unique_id).to_bytes(4, "little")
+    )
+    return SYNC + payload + binascii.crc_hqx(payload, CRC_INIT).to_bytes(2, "little")
+
+
+class FrameDecoder:
+    """
+    Splits the bytes received from a board in binary mode into data rows
+    and the text between the frames.
+
+    Runs of consecutive frames are unpacked with one numpy.frombuffer call;
+    only the crc is checked frame by frame. A sync word whose frame fails
+    the crc is passed on as text, so a corrupted frame costs that frame and
+    the decoder re-synchronizes on the next sync word. Its binary bytes are
+    dropped from the text, the rest ends up in front of the next status
+    line, which is why status lines are matched with "in".
+    """
+
+    def __init__(self, width: int):
+        self.width = width
+        self.dtype = frame_dtype(width)
+        self.frame_size = self.dtype.itemsize
+        self.frames_total = 0
+        self.crc_errors = 0
+        self._buffer = bytearray()
+
+    def feed(self, data: bytes) -> Tuple[np.ndarray, bytes]:
+        """(rows, text) for the frames completed by data and the text bytes around them."""
+        self._buffer += data
+        # the frames are views into an immutable copy, the buffer itself is trimmed below
+        buffer = bytes(self._buffer)
+        view = memoryview(buffer)
+        blocks = []
+        text = bytearray()
+        pos = 0
+        while True:
+            start = buffer.find(SYNC, pos)
+            if start < 0:
+                # a trailing first byte of the sync word may be the start of a frame
+                end = len(buffer) - 1 if buffer.endswith(SYNC[:1]) else len(buffer)
+                text += view[pos:end]
+                pos = end
+                break
+            text += view[pos:start]
+            pos = start
+            count = (len(buffer) - start) // self.frame_size
+            if count == 0:
+                break
+            frames = np.frombuffer(buffer, self.dtype, count=count, offset=start)
+            valid = self._valid_prefix(view, start, frames)
+            if valid == 0:
+                # not a frame after all (or a corrupted one): skip its sync word
+                self.crc_errors += 1
+                text += view[start:start + 1]
+                pos = start + 1
+                continue
+            blocks.append(frames[:valid])
+            pos = start + valid * self.frame_size
+        del self._buffer[:pos]
+
+        text = bytes(text).translate(None, _NON_TEXT)
+        if not blocks:
+            return np.empty((0, self.width)), text
+        frames = np.concatenate(blocks) if len(blocks) > 1 else blocks[0]
+        self.frames_total += len(frames)
+        rows = np.empty((len(frames), self.width))
+        rows[:, 0] = frames["time_ms"] / 1000.0
+        rows[:, 1:-1] = frames["values"]
+        rows[:, -1] = frames["id"]
+        return rows, text
+
+    def _valid_prefix(self, view: memoryview, start: int, frames: np.ndarray) -> int:
+        """Number of leading frames with a sync word and a matching crc."""
+        size = self.frame_size
+        syncs = frames["sync"] == SYNC_WORD
+        count = len(frames) if syncs.all() else int(np.argmin(syncs))
+        crcs = frames["crc"]
+        for index in range(count):
+            offset = start + index * size
+            if binascii.crc_hqx(view[offset + 2:offset + size - 2], CRC_INIT) != crcs[index]:
+                return index
+        return count
+
+    def clear(self) -> None:
+        self._buffer.clear()
@@ -0,0 +1,874 @@
+# board_emulator.py
+"""
+Software stand-in for a Stability-Setup Arduino board.
+
+BoardEmulator reimplements the serial protocol of Stability-Setup_Arduino
+(main.ino, src/serial_com.cpp, src/measurement.cpp) line for line: the
+HW_ID / "Arduino Ready" boot banner, the "scan,null" / "mppt,null"
+parameter upload with its echo lines, "Measurement Started", the data
+lines (or binary frames, see controller/binary_frames.py) and "Done!".
+Pixel currents come from a diode model, so scans have
+a realistic J-V shape and MPPT tracks a slowly degrading maximum power
+point with the firmware's perturb and observe loop.
+
+Two transports are provided:
+
+- sim://<HW_ID>[?rate=<lines/s>&seed=<int>&dead=<pixel,...>&fail=1&binary=0&baud=0&maxbaud=<rate>&blocks=0&id=0]
+  an in-process pyserial URL handler, so anything that opens its port
+  with serial.serial_for_url (SingleController, the asyncio backend) can
+  target a board without hardware. Opening the port or toggling DTR
+  reboots the board, like the USB reset of a real Arduino. A board keeps
+  running when its port is closed, a measurement waits for a host to read
+  its output; opening the port with DTR deasserted attaches to it without
+  a reboot, the way a restarted app re-attaches to its boards
+  (SingleController.attach) or checks an idle board with "id"
+  (controller/device_registry.py).
+- PtyBoard: the same board behind a pseudo terminal (POSIX only) for
+  programs that open a device path with serial.Serial.
+
+rate is the number of data lines per second the board sends, 0 sends
+them as fast as the host reads them and "firmware" uses the timing the
+real firmware would have for the uploaded parameters. The Time column
+always follows the firmware timing, so the data is independent of rate.
+binary=0 emulates firmware from before binary frames, which ignores the
+"fmt" parameter and always sends text lines, baud=0 firmware from before
+baud rate negotiation (controller/baud_negotiation.py), blocks=0 firmware
+from before parameter blocks (controller/parameter_block.py), id=0 firmware
+from before "id", which also keeps the parameters of its last run and ignores
+new ones until it is reset. The board and the
+port each have a baud rate, bytes sent while they differ arrive garbled,
+and so do some bytes at rates above maxbaud, like on a cable that can not
+carry them.
+"""
+import binascii
+import math
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Union
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+from serial.serialutil import PortNotOpenError, SerialBase, SerialException
+
+from constants import Constants
+from controller.binary_frames import BINARY_ACK, CRC_INIT, encode_frame
+
+URL_SCHEME = "sim"
+NUM_PIXELS = 8
+# limits from include/serial_com.h
+NUM_CHARS = 55
+MAX_MODE_LEN = 5
+# time the bootloader and setup() take before the banner is printed, longer
+# than the DTR pulse of SingleController.reset_arduino so opening the port
+# and resetting it right after prints a single banner
+BOOT_DELAY_S = 0.25
+# bytes the host may leave unread before the board blocks, like a full USB buffer
+OUTPUT_BUFFER_BYTES = 64 * 1024
+# measurement timing constants from measurement.cpp (ms)
+SCAN_MEASUREMENT_MS = 21
+MPPT_MEASUREMENT_MS = 15
+# thermal voltage times ideality factor of the simulated cells (V)
+DIODE_SLOPE_V = 0.05
+# baud rate limits and link check timeout from include/serial_com.h
+BOOT_BAUD_RATE = 115200
+MAX_BAUD_RATE = 2000000
+BAUD_PROBE_TIMEOUT_S = 1.0
+PARAM_BLOCK_SIZE = 192
+PARAM_BLOCK_TIMEOUT_S = 0.5
+
+
+def simulated_port(hw_id: str, **options) -> str:
+    """sim:// url for a simulated board, options are added as query parameters."""
+    query = "&".join(f"{key}={value}" for key, value in options.items() if value is not None)
+    return f"{URL_SCHEME}://{hw_id}" + (f"?{query}" if query else "")
+
+
+def simulated_hw_id(index: int) -> str:
+    """HW_ID of the index-th simulated board, printed like the firmware prints uniqueID."""
+    return format(0x51A00000 + index + 1, "X")
+
+
+class PixelModel:
+    """
+    Diode model of the eight cells on a board.
+
+    The photocurrent decays exponentially with a per pixel lifetime, so
+    long MPPT runs show degradation. Dead pixels carry no current.
+    """
+
+    def __init__(self, rng: np.random.Generator, dead_pixels: Iterable[int] = ()):
+        self.rng = rng
+        self.isc_mA = rng.uniform(2.0, 3.0, NUM_PIXELS)
+        self.voc_V = rng.uniform(0.95, 1.15, NUM_PIXELS)
+        self.lifetime_s = rng.uniform(200.0, 2000.0, NUM_PIXELS) * 3600
+        self.noise_mA = 0.005 * self.isc_mA
+        self.dead = np.zeros(NUM_PIXELS, dtype=bool)
+        for pixel in dead_pixels:
+            self.dead[pixel] = True
+
+    def current_mA(self, V: np.ndarray, t: float, light: bool = True) -> np.ndarray:
+        photocurrent = self.isc_mA * np.exp(-t / self.lifetime_s) if light else 0.0
+        saturation = self.isc_mA / np.expm1(self.voc_V / DIODE_SLOPE_V)
+        current = photocurrent - saturation * np.expm1(V / DIODE_SLOPE_V)
+        return np.where(self.dead, 0.0, current)
+
+    def measure(self, V: np.ndarray, t: float, light: bool = True,
+                reads: int = 1) -> "tuple[np.ndarray, np.ndarray]":
+        """Averaged (load voltage, flipped current) of reads sensor reads at set voltages V."""
+        scale = 1 / math.sqrt(max(reads, 1))
+        voltage = V + self.rng.normal(0, 0.0005 * scale, NUM_PIXELS)
+        current = self.current_mA(V, t, light) + self.rng.normal(0, 1, NUM_PIXELS) * self.noise_mA * scale
+        return voltage, current
+
+
+class _Reset(Exception):
+    """Raised inside the board thread when the board is reset or closed."""
+
+
+class BoardEmulator:
+    """
+    Protocol state machine of one board, run on its own thread.
+
+    The host side calls feed() with the bytes it writes and reset() when
+    it toggles DTR. Everything the board prints is passed to write, which
+    may block to apply back pressure.
+    """
+
+    def __init__(self, hw_id: str, write: Callable[[bytes], None],
+                 line_rate: Optional[float] = Constants.simulated_line_rate,
+                 seed: Optional[int] = None, dead_pixels: Iterable[int] = (),
+                 fail_init: bool = False, binary_frames: bool = True,
+                 baud_negotiation: bool = True, max_baud: Optional[int] = None,
+                 param_blocks: bool = True, id_command: bool = True):
+        self.hw_id = hw_id
+        self.unique_id = int(hw_id, 16)
+        self.line_rate = line_rate
+        self.seed = self.unique_id if seed is None else seed
+        self.dead_pixels = list(dead_pixels)
+        self.fail_init = fail_init
+        self.binary_frames = binary_frames
+        self.baud_negotiation = baud_negotiation
+        self.max_baud = max_baud
+        self.param_blocks = param_blocks
+        self.id_command = id_command
+        self.baud_rate = BOOT_BAUD_RATE
+        self._write = write
+        self.pixels = PixelModel(np.random.default_rng(self.seed), self.dead_pixels)
+        self.lines_sent = 0
+        self.boots = 0
+        # set to a list to record the time.monotonic() at which each data line is sent
+        self.emit_times: Optional[List[float]] = None
+        # thread CPU time spent generating measurements
+        self.cpu_seconds = 0.0
+
+        self.measuring = False
+        # the sim:// url options the board was created from
+        self.url_options: Optional[Dict] = None
+        self._cond = threading.Condition()
+        self._input = bytearray()
+        self._reset_pending = False
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self._next_line = 0.0
+        self._clear_state()
+
+    # --- host side -------------------------------------------------------
+
+    def start(self) -> None:
+        """Powers the board up, it prints its boot banner after BOOT_DELAY_S."""
+        self.reset()
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._main, name=f"BoardEmulator-{self.hw_id}", daemon=True
+            )
+            self._thread.start()
+
+    def reset(self) -> None:
+        """Reboots the board, aborting any measurement (DTR toggle)."""
+        with self._cond:
+            self._reset_pending = True
+            self._cond.notify_all()
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1)
+        self._thread = None
+
+    def attach(self, write: Optional[Callable[[bytes], None]]) -> None:
+        """Sends the output to write from now on, None holds it until a host attaches again."""
+        with self._cond:
+            self._write = write
+            self._cond.notify_all()
+
+    def feed(self, data: bytes) -> None:
+        """Bytes written by the host."""
+        with self._cond:
+            self._input += data
+            self._cond.notify_all()
+
+    # --- board thread ----------------------------------------------------
+
+    def _main(self) -> None:
+        while True:
+            with self._cond:
+                while not (self._closed or self._reset_pending):
+                    self._cond.wait()
+                if self._closed:
+                    return
+                self._reset_pending = False
+                self._input.clear()
+            self._clear_state()
+            self.baud_rate = BOOT_BAUD_RATE
+            # measurements repeat after a power cycle, so runs are reproducible
+            self.pixels = PixelModel(np.random.default_rng(self.seed), self.dead_pixels)
+            self.boots += 1
+            try:
+                self._boot()
+                while True:
+                    self._loop()
+            except _Reset:
+                continue
+
+    def _clear_state(self) -> None:
+        # globals of main.ino and serial_com.cpp
+        self.mode = ""
+        self.mode_received = False
+        self.done_recv = False
+        self.block_received = False
+        self.binary_output = False
+        self.vset = [0.0] * NUM_PIXELS
+        self.mppt_step_size_V = 0.0
+        self.mppt_measurements_per_step = 0
+        self.mppt_delay = 0
+        self.mppt_measurement_interval = 0
+        self.mppt_time_mins = 0
+        self.scan_range = 0.0
+        self.scan_step_size = 0.0
+        self.scan_read_count = 0
+        self.scan_rate = 0
+        self.light_status = 0
+
+    def _check(self) -> None:
+        if self._reset_pending or self._closed:
+            raise _Reset()
+
+    def _sleep(self, seconds: float) -> None:
+        with self._cond:
+            self._cond.wait_for(lambda: self._reset_pending or self._closed, seconds)
+        self._check()
+
+    def _println(self, text: str = "") -> None:
+        self._send(text.encode() + b"\r\n")
+
+    def _send(self, data: bytes) -> None:
+        with self._cond:
+            while self._write is None and not (self._reset_pending or self._closed):
+                self._cond.wait()
+            self._check()
+            write = self._write
+        write(data)
+
+    def _boot(self) -> None:
+        self._sleep(BOOT_DELAY_S)
+        self._println(f"HW_ID:{self.hw_id}")
+        if self.fail_init:
+            self._println("Failed to find INA219 at 0x40")
+            self._println("Sensor Initialization Failed. Please Check Connection.")
+        else:
+            self._println("Arduino Ready")
+
+    def _loop(self) -> None:
+        """One pass of loop() in main.ino, blocks until there is input."""
+        with self._cond:
+            while not (self._closed or self._reset_pending) and (
+                self.done_recv or b"\n" not in self._input
+            ):
+                self._cond.wait()
+            self._check()
+            end = self._input.index(b"\n")
+            raw = bytes(self._input[:end])
+            del self._input[: end + 1]
+
+        if not self._receive_line(raw.decode(errors="replace").strip()):
+            return
+        self._println("Measurement Started")
+        self._next_line = time.monotonic()
+        cpu_start = time.thread_time()
+        self.measuring = True
+        try:
+            if self.mode == "scan":
+                self._scan(forward=True)
+                self._scan(forward=False)
+            elif self.mode == "mppt":
+                self._mppt()
+        finally:
+            self.measuring = False
+            self.cpu_seconds += time.thread_time() - cpu_start
+        self._println("Done!")
+        if self.id_command:
+            self._reset_command_parser()
+
+    def _reset_command_parser(self) -> None:
+        """resetCommandParser() in serial_com.cpp."""
+        self.mode_received = False
+        self.done_recv = False
+        self.block_received = False
+
+    def _receive_line(self, line: str) -> bool:
+        """
+        recvWithLineTermination() for one line, True once "done" (or "go"
+        after a parameter block) completes the parameters. Like the firmware, commands are only read again once
+        the measurement is done.
+        """
+        if len(line) >= NUM_CHARS:
+            self._println(f"Error: Received line too long (max {NUM_CHARS - 1} characters). Skipping.")
+            return False
+        self._println(f"Received line: {line}")
+        self._handle_command_line(line)
+
+        if not self.done_recv:
+            return False
+        if not self.block_received:
+            self._println("Parameters successfully received and parsed.")
+            self._show_parsed_data()
+        self.block_received = False
+        return True
+
+    def _handle_command_line(self, line: str) -> None:
+        """handleCommandLine() in serial_com.cpp."""
+        tokens = [token for token in line.split(",") if token]
+        if not tokens:
+            self._println("Warning: Received empty or invalid line after trimming.")
+            return
+        str_param = tokens[0][: MAX_MODE_LEN - 1]
+        values = tokens[1:]
+
+        if str_param == "baud" and self.baud_negotiation:
+            if values:
+                self._switch_baud_rate(_atoi(values[0]))
+            return
+        if str_param == "blk" and self.param_blocks:
+            try:
+                self._receive_parameter_block(_atoi(values[0]), int(values[1], 16))
+            except (IndexError, ValueError):
+                self._println("Block error: header")
+            return
+        if str_param == "id" and self.id_command:
+            self._reset_command_parser()
+            self._println(f"HW_ID:{self.hw_id}")
+            if self.fail_init:
+                self._println("Sensor Initialization Failed. Please Check Connection.")
+            else:
+                self._println("Arduino Ready")
+            return
+
+        if not self.mode_received:
+            if str_param in ("scan", "mppt"):
+                self._println(f"Mode Received: {str_param}")
+                self.mode_received = True
+                self.mode = str_param
+                self.binary_output = False
+            else:
+                self._println(f"Warning: Expected 'scan' or 'mppt' mode, but received '{str_param}'. Ignoring line.")
+        elif str_param == "done":
+            self._println("'done' command received.")
+            self.done_recv = True
+        elif str_param == "go" and self.param_blocks:
+            self.done_recv = True
+        elif str_param == "fmt" and self.binary_frames:
+            self.binary_output = bool(values) and _atoi(values[0]) == 1
+        elif self.mode == "scan":
+            self._set_scan_param(str_param, values)
+        elif self.mode == "mppt":
+            self._set_mppt_param(str_param, values)
+
+    def _receive_parameter_block(self, length: int, crc: int) -> None:
+        """receiveParameterBlock() in serial_com.cpp."""
+        if length <= 0 or length >= PARAM_BLOCK_SIZE:
+            self._println("Block error: size")
+            return
+        self._println(f"Block ready: {length}")
+        data = self._read_bytes(length, PARAM_BLOCK_TIMEOUT_S)
+        if len(data) < length:
+            self._println("Block error: timeout")
+            return
+        if binascii.crc_hqx(data, CRC_INIT) != crc:
+            self._println("Block error: crc")
+            return
+
+        self._reset_command_parser()
+        for line in data.decode(errors="replace").split("\n"):
+            if line:
+                self._handle_command_line(line[: NUM_CHARS - 1])
+        if not self.mode_received:
+            self._println("Block error: no mode")
+            return
+        self._show_parsed_data()
+        self.block_received = True
+        self._println(f"Block ok: {crc:X}")
+
+    def _read_bytes(self, count: int, timeout: float) -> bytes:
+        """Serial.read() of up to count bytes arriving within timeout."""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self._reset_pending or self._closed or len(self._input) >= count, timeout
+            )
+            self._check()
+            data = bytes(self._input[:count])
+            del self._input[:count]
+        return data
+
+    def _read_line(self, timeout: float) -> Optional[str]:
+        """Serial.readStringUntil('\\n') after waiting up to timeout for a line, None if none arrived."""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self._reset_pending or self._closed or b"\n" in self._input, timeout
+            )
+            self._check()
+            end = self._input.find(b"\n")
+            if end < 0:
+                return None
+            raw = bytes(self._input[:end])
+            del self._input[: end + 1]
+        return raw.decode(errors="replace").strip()
+
+    def _switch_baud_rate(self, rate: int) -> None:
+        """switchBaudRate() in serial_com.cpp."""
+        if not BOOT_BAUD_RATE <= rate <= MAX_BAUD_RATE:
+            self._println("Baud: unsupported")
+            return
+        self._println(f"Baud: {rate}")
+        self.baud_rate = rate
+        deadline = time.monotonic() + BAUD_PROBE_TIMEOUT_S
+        while True:
+            line = self._read_line(deadline - time.monotonic())
+            if line is None:
+                break
+            if line.startswith("ping,"):
+                self._println("pong," + line[5:])
+                deadline = time.monotonic() + BAUD_PROBE_TIMEOUT_S
+            elif line == "baud ok":
+                self._println("Baud confirmed")
+                return
+        self.baud_rate = BOOT_BAUD_RATE
+        self._println("Baud reverted")
+
+    def _set_scan_param(self, str_param: str, values: List[str]) -> None:
+        if not values:
+            self._println("Warning: Missing value for scan parameter.")
+            return
+        setters = {
+            "1": ("scan_range", _atof),
+            "2": ("scan_step_size", _atof),
+            "3": ("scan_read_count", _atoi),
+            "4": ("scan_rate", _atoi),
+            "5": ("light_status", _atoi),
+        }
+        if str_param not in setters:
+            self._println(f"Warning: Unknown scan parameter identifier {str_param}'. Ignoring line.")
+            return
+        name, parse = setters[str_param]
+        setattr(self, name, parse(values[0]))
+
+    def _set_mppt_param(self, str_param: str, values: List[str]) -> None:
+        if str_param == "1":
+            for ID in range(NUM_PIXELS):
+                if ID < len(values):
+                    self.vset[ID] = _atof(values[ID])
+                else:
+                    self._println(f"Warning: Missing vset value(s) from ID {ID}")
+                    self.vset[ID:] = [0.0] * (NUM_PIXELS - ID)
+                    break
+            return
+        if not values:
+            self._println("Warning: Missing value for MPPT parameter.")
+            return
+        setters = {
+            "2": ("mppt_step_size_V", _atof),
+            "3": ("mppt_time_mins", _atoi),
+            "4": ("mppt_measurements_per_step", _atoi),
+            "5": ("mppt_delay", _atoi),
+            "6": ("mppt_measurement_interval", _atoi),
+        }
+        if str_param not in setters:
+            self._println(f"Warning: Unknown MPPT parameter identifier '{str_param}'. Ignoring line.")
+            return
+        name, parse = setters[str_param]
+        setattr(self, name, parse(values[0]))
+
+    def _show_parsed_data(self) -> None:
+        if self.mode == "mppt":
+            vset = ", ".join(f"{value:.4f}" for value in self.vset)
+            self._println(f"Mode: {self.mode}, Vset: [{vset}] ")
+            self._println(f"mppt_step_size_V: {self.mppt_step_size_V:.4f}")
+            self._println(f"mppt_measurements_per_step: {self.mppt_measurements_per_step}")
+            self._println(f"mppt_delay: {self.mppt_delay}")
+            self._println(f"mppt_measurement_interval: {self.mppt_measurement_interval}")
+            self._println(f"mppt_time_mins: {self.mppt_time_mins}")
+        elif self.mode == "scan":
+            self._println(f"Mode: {self.mode}")
+            self._println(f"scan_range: {self.scan_range:.4f}")
+            self._println(f"scan_step_size: {self.scan_step_size:.4f}")
+            self._println(f"scan_read_count: {self.scan_read_count}")
+            self._println(f"scan_rate: {self.scan_rate}")
+            self._println(f"light_status: {self.light_status}")
+        if self.binary_output:
+            self._println(BINARY_ACK)
+        self._println("")
+
+    def _data_line(self, firmware_period_s: float, line: Union[str, bytes]) -> None:
+        """Sends a data line or frame, paced by line_rate (or the firmware timing if it is None)."""
+        if self.line_rate is None:
+            self._next_line += firmware_period_s
+        elif self.line_rate > 0:
+            self._next_line += 1 / self.line_rate
+        wait = self._next_line - time.monotonic()
+        if wait > 0:
+            self._sleep(wait)
+        elif wait < -1:
+            # the host fell behind, don't try to catch up with a burst
+            self._next_line = time.monotonic()
+        self._send(line if isinstance(line, bytes) else line.encode() + b"\r\n")
+        self.lines_sent += 1
+        if self.emit_times is not None:
+            self.emit_times.append(time.monotonic())
+
+    def _pixel_fields(self, voltage: np.ndarray, current: np.ndarray, v_fmt: str, i_fmt: str,
+                      sep: str) -> str:
+        return "".join(
+            f"{v:{v_fmt}}{sep}{i:{i_fmt}}{sep}" for v, i in zip(voltage.tolist(), current.tolist())
+        )
+
+    def _scan(self, forward: bool) -> None:
+        """scan() in measurement.cpp."""
+        seconds = int(self.scan_range * 1000 / self.scan_rate) if self.scan_rate else 0
+        steps = int(self.scan_range * 1000 / (self.scan_step_size * 1000)) if self.scan_step_size else 0
+        ms_per_measurement = 1000.0 * seconds / steps if steps else 0.0
+        read_count = max(self.scan_read_count, 1)
+        delay_time_ms = max(int(ms_per_measurement / read_count - SCAN_MEASUREMENT_MS), 0)
+        point_s = read_count * (delay_time_ms + SCAN_MEASUREMENT_MS) / 1000
+        light = self.light_status != 0
+
+        self._println(f"Started scan with delay time: {delay_time_ms}")
+        voltage_val = np.float32(0.0 if forward else self.scan_range)
+        direction = np.float32(1.0 if forward else -1.0)
+        step = np.float32(self.scan_step_size)
+        scan_range = np.float32(self.scan_range)
+        t = 0.0
+        while scan_range >= voltage_val >= 0 and step > 0:
+            t += point_s
+            V, I = self.pixels.measure(np.full(NUM_PIXELS, float(voltage_val)), 0.0, light, read_count)
+            if self.binary_output:
+                values = np.concatenate(([voltage_val], np.column_stack((V, I)).ravel()))
+                self._data_line(point_s, encode_frame(round(t * 1000), values, self.unique_id))
+            else:
+                self._data_line(
+                    point_s,
+                    f"{t:.4f},{float(voltage_val):.2f},"
+                    + self._pixel_fields(V, I, ".10f", ".5f", ",")
+                    + str(self.unique_id),
+                )
+            voltage_val = np.float32(voltage_val + direction * step)
+        total = t if t > 0 else 1.0
+        self._println(f"mV/s: {1000.0 * self.scan_range / total:.2f}")
+
+    def _mppt(self) -> None:
+        """perturbAndObserveClassic() in measurement.cpp."""
+        per_step = max(self.mppt_measurements_per_step, 1)
+        delay_per_measurement = max(
+            int(self.mppt_measurement_interval / per_step) - MPPT_MEASUREMENT_MS, 0
+        )
+        self._println(f"Delay: {delay_per_measurement}")
+        self._println(f"measurement_time (min): {self.mppt_time_mins}")
+        step_s = (
+            self.mppt_delay
+            + min(self.mppt_measurement_interval, per_step * (delay_per_measurement + MPPT_MEASUREMENT_MS))
+        ) / 1000
+        step_s = max(step_s, 0.001)
+
+        vset = np.array(self.vset, dtype=np.float64)
+        prev_power = np.zeros(NUM_PIXELS)
+        direction = np.ones(NUM_PIXELS)
+        t = 0.0
+        while t / 60 < self.mppt_time_mins:
+            t += step_s
+            V, I = self.pixels.measure(vset, t, True, per_step)
+            power = V * I
+            direction = np.where(power > prev_power, direction, -direction)
+            vset = vset + direction * self.mppt_step_size_V
+            prev_power = power
+            if self.binary_output:
+                values = np.column_stack((V, I)).ravel()
+                self._data_line(step_s, encode_frame(round(t * 1000), values, self.unique_id))
+            else:
+                self._data_line(
+                    step_s,
+                    f"{t:.4f}, " + self._pixel_fields(V, I, ".10f", ".5f", ", ") + str(self.unique_id),
+                )
+
+
+def _atof(text: str) -> float:
+    try:
+        return float(text)
+    except ValueError:
+        return 0.0
+
+
+def _atoi(text: str) -> int:
+    try:
+        return int(float(text))
+    except ValueError:
+        return 0
+
+
+def _parse_url_options(url: str) -> Dict:
+    parts = urlparse(url)
+    if parts.scheme != URL_SCHEME or not parts.netloc:
+        raise SerialException(f"expected a url of the form {URL_SCHEME}://<HW_ID>[?options], got {url!r}")
+    options = {"hw_id": parts.netloc.upper()}
+    try:
+        int(options["hw_id"], 16)
+        for key, values in parse_qs(parts.query).items():
+            value = values[-1]
+            if key == "rate":
+                options["line_rate"] = None if value == "firmware" else float(value)
+            elif key == "seed":
+                options["seed"] = int(value)
+            elif key == "dead":
+                options["dead_pixels"] = [int(pixel) - 1 for pixel in value.split(",") if pixel]
+            elif key == "fail":
+                options["fail_init"] = value not in ("0", "false")
+            elif key == "binary":
+                options["binary_frames"] = value not in ("0", "false")
+            elif key == "baud":
+                options["baud_negotiation"] = value not in ("0", "false")
+            elif key == "maxbaud":
+                options["max_baud"] = int(value)
+            elif key == "blocks":
+                options["param_blocks"] = value not in ("0", "false")
+            elif key == "id":
+                options["id_command"] = value not in ("0", "false")
+            else:
+                raise ValueError(f"unknown option {key!r}")
+    except (ValueError, IndexError) as e:
+        raise SerialException(f"invalid {URL_SCHEME}:// url {url!r}: {e}")
+    return options
+
+
+def _garble(data: bytes, board_rate: int, host_rate: int, max_baud: Optional[int]) -> bytes:
+    """Bytes sent between a board and a port at board_rate and host_rate."""
+    if board_rate != host_rate:
+        # framing errors: nothing of it is readable, not even the line ends
+        return bytes(byte ^ 0xA5 for byte in data)
+    if max_baud is not None and board_rate > max_baud:
+        garbled = bytearray(data)
+        for index in range(7, len(garbled), 16):
+            garbled[index] ^= 0x10
+        return bytes(garbled)
+    return data
+
+
+# boards whose port was closed, they keep running like a board that stays plugged in, by HW_ID
+_detached_boards: Dict[str, BoardEmulator] = {}
+_detached_boards_lock = threading.Lock()
+
+
+class SimulatedSerial(SerialBase):
+    """pyserial port backed by a BoardEmulator, opened through sim:// urls."""
+
+    def __init__(self, *args, **kwargs):
+        self.board: Optional[BoardEmulator] = None
+        self._rx = bytearray()
+        self._rx_cond = threading.Condition()
+        super().__init__(*args, **kwargs)
+
+    def open(self) -> None:
+        if self.is_open:
+            raise SerialException("Port is already open.")
+        if self._port is None:
+            raise SerialException("Port must be configured before it can be used.")
+        options = _parse_url_options(self.portstr)
+        self._rx.clear()
+        with _detached_boards_lock:
+            board = _detached_boards.pop(options["hw_id"], None)
+        if board is not None and board.url_options != options:
+            # another url for the same HW_ID: a different simulated board
+            board.close()
+            board = None
+        self.is_open = True
+        self.reset_input_buffer()
+        if board is not None:
+            self.board = board
+            board.attach(self._push)
+            if self._dtr_state:
+                board.reset()
+            return
+        self.board = BoardEmulator(write=self._push, **options)
+        self.board.url_options = options
+        self.board.start()
+
+    def close(self) -> None:
+        self.is_open = False
+        with self._rx_cond:
+            self._rx_cond.notify_all()
+        board, self.board = self.board, None
+        if board is None:
+            return
+        board.attach(None)
+        with _detached_boards_lock:
+            previous = _detached_boards.get(board.hw_id)
+            _detached_boards[board.hw_id] = board
+        if previous is not None and previous is not board:
+            previous.close()
+
+    def _reconfigure_port(self) -> None:
+        pass
+
+    def _update_dtr_state(self) -> None:
+        # the reset circuit of the Arduino reboots it when DTR is asserted
+        if self.is_open and self._dtr_state and self.board is not None:
+            self.board.reset()
+
+    def _update_rts_state(self) -> None:
+        pass
+
+    def _update_break_state(self) -> None:
+        pass
+
+    def _link(self, data: bytes) -> bytes:
+        """data as it arrives at the other end of the cable."""
+        board = self.board
+        if board is None:
+            return data
+        return _garble(data, board.baud_rate, self._baudrate, board.max_baud)
+
+    def _push(self, data: bytes) -> None:
+        """Called from the board thread for everything it prints."""
+        data = self._link(data)
+        with self._rx_cond:
+            while self.is_open and len(self._rx) > OUTPUT_BUFFER_BYTES:
+                self._rx_cond.wait(0.1)
+                if self.board is not None:
+                    self.board._check()
+            self._rx += data
+            self._rx_cond.notify_all()
+
+    @property
+    def in_waiting(self) -> int:
+        return len(self._rx)
+
+    def read(self, size: int = 1) -> bytes:
+        if not self.is_open:
+            raise PortNotOpenError()
+        deadline = None if self._timeout is None else time.monotonic() + self._timeout
+        with self._rx_cond:
+            while len(self._rx) < size and self.is_open:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._rx_cond.wait(remaining)
+            data = bytes(self._rx[:size])
+            del self._rx[:size]
+            self._rx_cond.notify_all()
+        return data
+
+    def write(self, data) -> int:
+        if not self.is_open:
+            raise PortNotOpenError()
+        data = bytes(data)
+        self.board.feed(self._link(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def reset_input_buffer(self) -> None:
+        with self._rx_cond:
+            self._rx.clear()
+            self._rx_cond.notify_all()
+
+    def reset_output_buffer(self) -> None:
+        pass
+
+
+class PtyBoard:
+    """
+    A BoardEmulator behind a pseudo terminal, for programs that need a
+    device path. A pty carries no DTR line, so instead of rebooting when
+    the port is opened the board repeats its boot banner every
+    banner_interval seconds until it receives a command.
+    """
+
+    def __init__(self, hw_id: str, banner_interval: float = 1.0, **options):
+        import pty
+        import tty
+
+        self._master, slave = pty.openpty()
+        tty.setraw(slave)
+        self.port = os.ttyname(slave)
+        os.close(slave)
+        self.banner_interval = banner_interval
+        self.board = BoardEmulator(hw_id, self._push, **options)
+        self._running = False
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> "PtyBoard":
+        self._running = True
+        self.board.start()
+        for target in (self._read_input, self._announce):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self) -> None:
+        self._running = False
+        self.board.close()
+        os.close(self._master)
+
+    def _push(self, data: bytes) -> None:
+        try:
+            os.write(self._master, data)
+        except OSError:
+            self.board._check()
+
+    def _read_input(self) -> None:
+        while self._running:
+            try:
+                data = os.read(self._master, 4096)
+            except OSError:
+                # no process has the pty open
+                time.sleep(0.05)
+                continue
+            self.board.feed(data)
+
+    def _announce(self) -> None:
+        while self._running:
+            time.sleep(self.banner_interval)
+            if self._running and not self.board.mode_received:
+                self.board.reset()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve simulated boards on pseudo terminals.")
+    parser.add_argument("--boards", type=int, default=1)
+    parser.add_argument("--rate", default=str(Constants.simulated_line_rate),
+                        help="data lines per second, 0 for unthrottled or 'firmware'")
+    args = parser.parse_args()
+
+    rate = None if args.rate == "firmware" else float(args.rate)
+    boards = [PtyBoard(simulated_hw_id(i), line_rate=rate).start() for i in range(args.boards)]
+    for board in boards:
+        print(f"{board.board.hw_id}: {board.port}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        for board in boards:
+            board.stop()
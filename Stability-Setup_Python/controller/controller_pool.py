@@ -0,0 +1,75 @@
+# controller_pool.py
+"""
+The SingleControllers of the connected boards, kept across presets and trials.
+
+MultiController.initializeMeasurement used to build a new controller for
+every port before each preset, reopening the port and resetting the board.
+The pool keeps the controllers instead. checkout() hands back the ready
+ones pointed at the new trial, and only the boards that need a handshake
+are connected again:
+
+- ports added to the assignment,
+- controllers that are not ready: never connected, a communication error,
+  a run that was stopped before the board reported "Done!".
+
+Ports removed from the assignment are closed.
+"""
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from helper.global_helpers import get_logger
+
+
+class ControllerPool:
+    """SingleControllers by port, see the module docstring."""
+
+    def __init__(self, close: Optional[Callable] = None):
+        # how a controller leaving the pool is closed, SingleController.disconnect by default
+        self._close = close if close is not None else (lambda controller: controller.disconnect())
+        self.controllers: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def is_ready(controller) -> bool:
+        """The board behind controller is connected and idle, waiting for parameters."""
+        return controller.ready and controller.ser is not None and controller.ser.is_open
+
+    def checkout(self, ports: Iterable[str], create: Callable[[str], object]) -> Tuple[List, List]:
+        """
+        Makes the pool match ports, controllers for new ports are made with create(port).
+
+        Returns (reused, stale): reused controllers are ready, stale ones must be connected
+        """
+        ports = list(ports)
+        with self._lock:
+            removed = [port for port in self.controllers if port not in ports]
+            for port in removed:
+                get_logger().log(f"{port} is no longer assigned, closing it")
+                self._close(self.controllers.pop(port))
+
+            reused, stale = [], []
+            for port in ports:
+                controller = self.controllers.get(port)
+                if controller is None:
+                    controller = create(port)
+                    self.controllers[port] = controller
+                    stale.append(controller)
+                elif self.is_ready(controller):
+                    reused.append(controller)
+                else:
+                    stale.append(controller)
+            return reused, stale
+
+    def discard(self, controller) -> None:
+        """Drops a controller whose board could not be connected."""
+        with self._lock:
+            if self.controllers.get(controller.port) is controller:
+                del self.controllers[controller.port]
+        self._close(controller)
+
+    def close_all(self) -> None:
+        with self._lock:
+            controllers = list(self.controllers.values())
+            self.controllers.clear()
+        for controller in controllers:
+            self._close(controller)
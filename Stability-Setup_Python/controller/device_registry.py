@@ -0,0 +1,145 @@
+# device_registry.py
+"""
+Cache of the boards seen on each serial port, for connecting without a reset.
+
+Every successful SingleController.connect() remembers the board behind the
+port: its HW_ID and the baud rate the link was left at. The entry is keyed
+by the USB identity of the port (the USB serial number, else VID:PID and
+the USB location), so a board is found again when the OS gives it another
+port name. The Arduino ID follows from the HW_ID through the arduino_ids of
+the user settings, like after a normal connect.
+
+connect() tries a known board first with an "id" command instead of the
+DTR reset: an idle board answers with its HW_ID and "Arduino Ready" in a
+few ms, while a reset costs the bootloader delay and the boot of the
+sketch. Boards that do not answer in time (measuring, rebooted to another
+baud rate, older firmware) are connected the normal way.
+
+The registry is kept in memory and saved to a JSON file next to the user
+settings (Constants.device_registry_file), so it survives restarts.
+"""
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, Optional
+
+import serial.tools.list_ports
+
+from helper.global_helpers import get_logger
+
+
+@dataclass
+class DeviceRecord:
+    """The board last connected on a port."""
+    usb_id: str
+    port: str
+    hw_id: str
+    baud_rate: int
+    last_seen: float
+
+
+def _usb_ids() -> Dict[str, str]:
+    """USB identity of every serial port present, by port name."""
+    ids = {}
+    try:
+        ports = serial.tools.list_ports.comports()
+    except Exception as e:
+        get_logger().log(f"Cannot list serial ports: {e}")
+        return ids
+    for info in ports:
+        if info.serial_number:
+            ids[info.device] = f"SN:{info.serial_number}"
+        elif info.vid is not None and info.location:
+            ids[info.device] = f"{info.vid:04X}:{info.pid:04X}@{info.location}"
+    return ids
+
+
+class DeviceRegistry:
+    """Thread safe map of USB identity to DeviceRecord, see the module docstring."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._records: Dict[str, DeviceRecord] = {}
+        self._usb_ids: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        if path is not None:
+            self.load(path)
+
+    def load(self, path: str) -> None:
+        """Reads the registry file at path (unless it is already loaded) and saves to it from now on."""
+        with self._lock:
+            if path == self.path and self._records:
+                return
+            self.path = path
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                self._records = {
+                    usb_id: DeviceRecord(**record) for usb_id, record in data.get("devices", {}).items()
+                }
+            except FileNotFoundError:
+                self._records = {}
+            except (OSError, ValueError, TypeError) as e:
+                get_logger().log(f"Ignoring device registry {path}: {e}")
+                self._records = {}
+
+    def save(self) -> None:
+        with self._lock:
+            if self.path is None:
+                return
+            data = {"devices": {usb_id: asdict(record) for usb_id, record in self._records.items()}}
+            try:
+                with open(self.path, "w", encoding="utf-8") as f:
+                    json.dump(data, f, indent=4)
+            except OSError as e:
+                get_logger().log(f"Cannot save device registry {self.path}: {e}")
+
+    def refresh_ports(self) -> None:
+        """Re-reads the USB identities of the serial ports, call before connecting to the boards."""
+        usb_ids = _usb_ids()
+        with self._lock:
+            self._usb_ids = usb_ids
+
+    def usb_id(self, port: str) -> str:
+        """USB identity of port, the port name itself for ports without one (e.g. sim:// boards)."""
+        with self._lock:
+            return self._usb_ids.get(port, port)
+
+    def lookup(self, port: str) -> Optional[DeviceRecord]:
+        usb_id = self.usb_id(port)
+        with self._lock:
+            return self._records.get(usb_id)
+
+    def remember(self, port: str, hw_id: str, baud_rate: int) -> None:
+        usb_id = self.usb_id(port)
+        with self._lock:
+            self._records[usb_id] = DeviceRecord(usb_id, port, str(hw_id), int(baud_rate), time.time())
+
+    def forget(self, port: str) -> None:
+        usb_id = self.usb_id(port)
+        with self._lock:
+            self._records.pop(usb_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._records.clear()
+
+
+_device_registry: Optional[DeviceRegistry] = None
+_device_registry_lock = threading.Lock()
+
+
+def get_device_registry() -> DeviceRegistry:
+    """The process wide device registry (in memory until MultiController loads its file)."""
+    global _device_registry
+    with _device_registry_lock:
+        if _device_registry is None:
+            _device_registry = DeviceRegistry()
+        return _device_registry
+
+
+def registry_path_for(json_location: str, file_name: str) -> str:
+    """Registry file stored next to the user settings file."""
+    return os.path.join(os.path.dirname(os.path.abspath(json_location)), file_name)
@@ -0,0 +1,193 @@
+# mppt_compressor.py
+"""
+Streaming downsampling of MPPT rows into fixed time buckets.
+
+Rows are grouped by floor(Time / bucket_s), so the resolution of a
+compressed file only depends on the bucket width and not on how often the
+controller flushes its buffer. A bucket is emitted once a row of a later
+bucket arrives (or the run finishes). Policies:
+
+- "mean":   one row per bucket with the mean of every column (nan values,
+            e.g. sensor overflows, are ignored)
+- "minmax": two rows per bucket, the per column minimum at the time of the
+            bucket's first row and the maximum at the time of its last row,
+            so spikes and dips survive any amount of decimation
+- "lttb":   one original row per bucket chosen by Largest-Triangle-Three-
+            Buckets on the pixel power traces (V * mA summed over pixels),
+            which keeps the visual shape of the run
+
+Each entry of Constants.mppt_compression_tiers becomes one file written
+side by side with the full run, see compressed_path_for.
+"""
+import os
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from constants import Constants
+
+MEAN = "mean"
+MINMAX = "minmax"
+LTTB = "lttb"
+POLICIES = (MEAN, MINMAX, LTTB)
+
+Tier = Tuple[str, float, str]  # (file suffix, bucket width in seconds, policy)
+
+
+def compressed_path_for(mppt_path: str, suffix: str = "") -> str:
+    """
+    File a compression tier of an "...__mppt.csv" run is written to:
+    "...__compressedmppt.csv" for the default tier, otherwise
+    "...__compressedmppt_<suffix>.csv".
+    """
+    base = mppt_path[: -len("mppt.csv")] if mppt_path.endswith("mppt.csv") else os.path.splitext(mppt_path)[0] + "__"
+    return f"{base}compressedmppt{'_' + suffix if suffix else ''}.csv"
+
+
+class MPPTCompressor:
+    """
+    Downsamples a stream of MPPT rows (Time in column 0) with one policy.
+
+    push() takes any number of rows and returns the rows of the buckets
+    that are complete, finish() returns whatever is still pending.
+    """
+
+    def __init__(self, bucket_s: float, policy: str = MEAN, time_column: int = 0,
+                 power_columns: Optional[Sequence[Tuple[int, int]]] = None):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown compression policy {policy!r}, expected one of {POLICIES}")
+        if bucket_s <= 0:
+            raise ValueError("bucket width must be positive")
+        self.bucket_s = float(bucket_s)
+        self.policy = policy
+        self.time_column = time_column
+        # (voltage, current) column pairs used by lttb, defaults to the mppt layout
+        self.power_columns = power_columns
+        self._pending: Optional[np.ndarray] = None
+        # lttb: last emitted row and the complete bucket waiting for its successor
+        self._last_selected: Optional[np.ndarray] = None
+        self._held: Optional[np.ndarray] = None
+
+    def push(self, rows: np.ndarray) -> np.ndarray:
+        rows = np.asarray(rows, dtype=np.float64)
+        if rows.ndim == 1:
+            rows = rows[np.newaxis]
+        if self._pending is not None and len(self._pending):
+            rows = np.concatenate([self._pending, rows])
+        if not len(rows):
+            return rows
+
+        buckets = np.floor(rows[:, self.time_column] / self.bucket_s)
+        # the last bucket may still receive rows
+        complete = np.searchsorted(buckets, buckets[-1], side="left")
+        self._pending = rows[complete:].copy()
+        if complete == 0:
+            return rows[:0]
+        return self._reduce(rows[:complete], buckets[:complete])
+
+    def finish(self) -> np.ndarray:
+        """Rows for the incomplete last bucket, call once the run is over."""
+        width = 0 if self._pending is None else self._pending.shape[1]
+        out = []
+        if self._pending is not None and len(self._pending):
+            out.append(self._reduce(self._pending, np.zeros(len(self._pending)), final=True))
+        elif self.policy == LTTB and self._held is not None:
+            out.append(self._lttb_flush())
+        self._pending = None
+        out = [block for block in out if len(block)]
+        return np.concatenate(out) if out else np.empty((0, width))
+
+    # --- policies --------------------------------------------------------
+
+    def _reduce(self, rows: np.ndarray, buckets: np.ndarray, final: bool = False) -> np.ndarray:
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        if self.policy == MEAN:
+            return self._mean(rows, starts)
+        if self.policy == MINMAX:
+            return self._minmax(rows, starts)
+        return self._lttb(rows, starts, final)
+
+    @staticmethod
+    def _mean(rows: np.ndarray, starts: np.ndarray) -> np.ndarray:
+        valid = ~np.isnan(rows)
+        sums = np.add.reduceat(np.where(valid, rows, 0.0), starts, axis=0)
+        counts = np.add.reduceat(valid, starts, axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = sums / counts
+        # a column without a single valid value in the bucket is written as 0 like before
+        return np.nan_to_num(means, nan=0.0)
+
+    def _minmax(self, rows: np.ndarray, starts: np.ndarray) -> np.ndarray:
+        ends = np.r_[starts[1:], len(rows)] - 1
+        with np.errstate(invalid="ignore"):
+            low = np.fmin.reduceat(rows, starts, axis=0)
+            high = np.fmax.reduceat(rows, starts, axis=0)
+        low[:, self.time_column] = rows[starts, self.time_column]
+        high[:, self.time_column] = rows[ends, self.time_column]
+        out = np.empty((2 * len(starts), rows.shape[1]))
+        out[0::2] = low
+        out[1::2] = high
+        return np.nan_to_num(out, nan=0.0)
+
+    def _power(self, rows: np.ndarray) -> np.ndarray:
+        pairs = self.power_columns
+        if pairs is None:
+            pairs = [(col, col + 1) for col in range(1, rows.shape[1] - 1, 2)]
+        voltage = rows[:, [v for v, _ in pairs]]
+        current = rows[:, [i for _, i in pairs]]
+        return np.nansum(voltage * current, axis=1)
+
+    def _lttb(self, rows: np.ndarray, starts: np.ndarray, final: bool) -> np.ndarray:
+        out = []
+        for bucket in np.split(rows, starts[1:]):
+            if self._last_selected is None:
+                # LTTB always keeps the first row of the series
+                self._last_selected = bucket[0]
+                out.append(bucket[0])
+                bucket = bucket[1:]
+                if not len(bucket):
+                    continue
+            if self._held is not None:
+                out.append(self._select(self._held, bucket.mean(axis=0)))
+            self._held = bucket
+        if final and self._held is not None:
+            out.append(self._lttb_flush())
+        if not out:
+            return rows[:0]
+        return np.vstack(out)
+
+    def _lttb_flush(self) -> np.ndarray:
+        # the last bucket has no successor, the series' last row is its third point
+        held, self._held = self._held, None
+        if len(held) == 1:
+            return held[:1]
+        selected = self._select(held[:-1], held[-1])
+        return np.vstack([selected, held[-1]])
+
+    def _select(self, bucket: np.ndarray, next_point: np.ndarray) -> np.ndarray:
+        t = self.time_column
+        a = self._last_selected
+        a_t, a_p = a[t], self._power(a[np.newaxis])[0]
+        c_t, c_p = next_point[t], self._power(next_point[np.newaxis])[0]
+        b_t, b_p = bucket[:, t], self._power(bucket)
+        area = np.abs((a_t - c_t) * (b_p - a_p) - (a_t - b_t) * (c_p - a_p))
+        selected = bucket[int(np.nanargmax(area)) if np.isfinite(area).any() else 0]
+        self._last_selected = selected
+        return selected
+
+
+class TieredCompressor:
+    """One MPPTCompressor per tier, fed the same rows."""
+
+    def __init__(self, tiers: Sequence[Tier] = Constants.mppt_compression_tiers):
+        self.tiers = [(suffix, MPPTCompressor(bucket_s, policy)) for suffix, bucket_s, policy in tiers]
+
+    def paths(self, mppt_path: str) -> List[str]:
+        return [compressed_path_for(mppt_path, suffix) for suffix, _ in self.tiers]
+
+    def push(self, rows: np.ndarray) -> List[np.ndarray]:
+        """Completed output rows of each tier, in the order of paths()."""
+        return [compressor.push(rows) for _, compressor in self.tiers]
+
+    def finish(self) -> List[np.ndarray]:
+        return [compressor.finish() for _, compressor in self.tiers]
@@ -4,11 +4,17 @@ import os
 import time
 import json
 from controller.email_service import EmailSender
-from datetime import datetime
 
 from controller.single_arduino_controller import SingleController
+from controller.run_journal import end_journal, give_up_reason, record_attach_failure, recover_unfinished_runs
+from controller.async_backend import AsyncControllerBackend
+from controller.controller_pool import ControllerPool
+from controller.parameter_block import StartBarrier
+from controller.run_clock import RunClock
+from controller.device_registry import get_device_registry, registry_path_for
 from controller import arduino_assignment
 from constants import Mode, Constants
+from core.config_manager import ArduinoConfig, ConfigManager
 from data_visualization import data_plotter
 from helper.global_helpers import get_logger
 from PySide6.QtCore import QObject, Signal, Slot, Qt
@@ -16,8 +22,19 @@ from PySide6.QtCore import QObject, Signal, Slot, Qt
 class MultiController(QObject):
     started = Signal()
     finished = Signal()
-    def __init__(self):
+    run_resumed = Signal(int, str)  # Arduino ID, run file
+    resume_finished = Signal(bool)  # True if every recovered run was resumed
+    def __init__(self, backend: str = Constants.controller_backend):
         super().__init__()
+        self.backend = backend
+        self.async_backend = AsyncControllerBackend() if backend == "asyncio" else None
+        # runs continued after a restart, {Arduino ID: (controller, thread)}
+        self.resumed = {}
+        # ports of recovered runs whose boards are being re-attached
+        self.attaching = set()
+        self.resume_lock = threading.Lock()
+        # controllers of the connected boards, kept across presets
+        self.pool = ControllerPool(close=self._close_controller)
 
     def initializeMeasurement(
         self,
@@ -39,6 +56,11 @@ class MultiController(QObject):
 
         self.trial_date = None
         self.arduino_ids = self.load_arduino_ids(json_location)
+        self.link_config = self.load_link_config(json_location)
+        registry = get_device_registry()
+        if json_location:
+            registry.load(registry_path_for(json_location, Constants.device_registry_file))
+        registry.refresh_ports()
         self.assigned_connected_arduinos = []
         self.connected_arduinos_HWID = []
         self.controllers = {}
@@ -54,63 +76,249 @@ class MultiController(QObject):
         self.unknownID = []
         unique_Arduino_ID = True
 
-        # Initialize controllers
-        threads = []
-
-        # Define a worker function for each thread.
-        def init_controller(ID, COM):
-            nonlocal unique_Arduino_ID
-
-            self.arduino_ids = self.load_arduino_ids(json_location)
-            controller = SingleController(
+        def create_controller(COM):
+            get_logger().log(f"Trying to connect to {COM}")
+            return SingleController(
                 COM=COM,
                 trial_name=self.trial_name,
                 trial_dir=self.trial_dir,
                 arduino_ids=self.arduino_ids,
+                link_config=self.link_config,
             )
-            connected_result = controller.connect()
+
+        def register_controller(controller, connected_result):
+            nonlocal unique_Arduino_ID
             if connected_result:
                 HW_ID, Arduino_ID = connected_result
                 Arduino_ID = int(Arduino_ID)
-                # Ensure thread-safe modifications to shared variables.
-                with self.lock:
-                    self.connected_arduinos_HWID.append(HW_ID)
-                    if Arduino_ID in self.controllers:
-                        unique_Arduino_ID = False
-                    elif (Arduino_ID is not None) and Arduino_ID == -1:
-                        self.unknownID.append(HW_ID)
-                    elif (Arduino_ID is not None) and Arduino_ID > -1:
-                        get_logger().log(f"Connected to {controller.port}.")
-                        self.assigned_connected_arduinos.append((HW_ID, Arduino_ID))
-                        self.controllers[Arduino_ID] = controller
-                    else:
-                        get_logger().log(f"Connection to {controller.port} failed.")
+                self.connected_arduinos_HWID.append(HW_ID)
+                if Arduino_ID in self.controllers:
+                    unique_Arduino_ID = False
+                elif (Arduino_ID is not None) and Arduino_ID == -1:
+                    self.unknownID.append(HW_ID)
+                elif (Arduino_ID is not None) and Arduino_ID > -1:
+                    get_logger().log(f"Connected to {controller.port}.")
+                    self.assigned_connected_arduinos.append((HW_ID, Arduino_ID))
+                    self.controllers[Arduino_ID] = controller
+                else:
+                    get_logger().log(f"Connection to {controller.port} failed.")
             else:
+                self.pool.discard(controller)
                 return False
 
-        # Start a thread for each COM port in the assignment.
-        for ID, COM in enumerate(arduino_assignment.get()):
-            get_logger().log(f"Trying to connect to {COM}")
-            thread = threading.Thread(target=init_controller, args=(ID, COM))
-            thread.start()
-            threads.append(thread)
+        # boards still measuring a resumed run must not be reset
+        busy_ports = self.resumed_ports()
+        ports = [COM for COM in arduino_assignment.get() if COM not in busy_ports]
 
-        # Wait for all threads to finish.
-        for thread in threads:
-            thread.join()
+        # controllers of idle boards are kept from the previous preset, only
+        # new ports and controllers that are not ready, or whose board does
+        # not answer "id" as an idle board, get a handshake
+        reused, stale = self.pool.checkout(ports, create_controller)
+        for controller in reused + stale:
+            controller.set_trial(self.trial_name, self.trial_dir, self.arduino_ids, self.link_config)
+        busy = self._check_idle(reused)
+        reused = [controller for controller in reused if controller not in busy]
+        stale += busy
+        for controller in reused:
+            get_logger().log(f"Reusing the connection to {controller.port}")
+        connected = self._connect_controllers(stale)
+        for controller in reused:
+            register_controller(controller, (controller.HW_ID, controller.arduinoID))
+        for controller, connected_result in zip(stale, connected):
+            register_controller(controller, connected_result)
+        registry.save()
 
         if self.unknownID or not unique_Arduino_ID:
             return False
         else:
             return True
 
+    def resume_unfinished(self, data_dir: str):
+        """
+        Re-attaches to the boards that are still measuring a run this app was
+        writing when it was closed or crashed (see controller/run_journal.py)
+        and continues appending to the run files.
+
+        The journals are read here, the boards are attached on a background
+        thread: their ports count as busy (resumed_ports) until it is done,
+        run_resumed is emitted for every resumed run and resume_finished once
+        all boards were tried. Runs give_up_reason() rejects, and older runs
+        on the port of a newer one, are ended instead of attached.
+
+        Returns
+        -------
+        the attaching thread
+        """
+        runs_by_port = {}
+        for run in recover_unfinished_runs(data_dir):
+            reason = give_up_reason(run)
+            if reason is not None:
+                self._give_up(run, reason)
+            else:
+                runs_by_port.setdefault(run.port, []).append(run)
+
+        recovered_runs = []
+        for port, runs in runs_by_port.items():
+            # a board measures one run at a time, only the newest can still be going
+            runs.sort(key=lambda run: run.checkpoint_time)
+            for older in runs[:-1]:
+                self._give_up(older, f"{runs[-1].path} is a newer run on {port}")
+            recovered_runs.append(runs[-1])
+
+        with self.resume_lock:
+            self.attaching.update(runs_by_port)
+        thread = threading.Thread(target=self._attach_recovered, args=(recovered_runs,), daemon=True)
+        thread.start()
+        return thread
+
+    def _give_up(self, run, reason):
+        get_logger().log(f"Not resuming {run.path}: {reason}")
+        end_journal(run, reason)
+
+    def _attach_recovered(self, recovered_runs):
+        controllers = [
+            SingleController(
+                COM=run.port,
+                trial_name="",
+                trial_dir=os.path.dirname(run.path),
+                arduino_ids={run.hw_id: run.board},
+            )
+            for run in recovered_runs
+        ]
+        results = [None] * len(controllers)
+
+        def attach(index):
+            results[index] = controllers[index].attach(recovered_runs[index])
+
+        # attach concurrently, a board that does not answer takes the whole timeout
+        threads = [threading.Thread(target=attach, args=(index,)) for index in range(len(controllers))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        all_resumed = True
+        for run, controller, attached in zip(recovered_runs, controllers, results):
+            if attached:
+                thread = threading.Thread(target=controller.resume, args=(run,), daemon=True)
+                thread.start()
+                with self.resume_lock:
+                    self.resumed[int(run.board)] = (controller, thread)
+                    self.attaching.discard(run.port)
+                self.run_resumed.emit(int(run.board), run.path)
+                continue
+
+            all_resumed = False
+            controller.disconnect()
+            if attached is False:
+                self._give_up(run, "board no longer measuring")
+            else:
+                # the board did not answer or its port is gone, tried again at the next start
+                record_attach_failure(run, f"no data from {run.port}")
+                reason = give_up_reason(run)
+                if reason is not None:
+                    self._give_up(run, reason)
+            with self.resume_lock:
+                self.attaching.discard(run.port)
+        self.resume_finished.emit(all_resumed)
+
+    def resumed_ports(self):
+        """Ports of the boards being re-attached or whose resumed runs are still going."""
+        with self.resume_lock:
+            return set(self.attaching) | {
+                controller.port for controller, thread in self.resumed.values() if thread.is_alive()
+            }
+
+    def stop_resumed(self):
+        with self.resume_lock:
+            resumed, self.resumed = self.resumed, {}
+        for ID, (controller, thread) in resumed.items():
+            get_logger().log(f"STOPPING RESUMED RUN OF CONTROLLER {ID}")
+            controller.should_run = False
+            controller.reset_arduino()
+            thread.join()
+            controller.disconnect()
+
+    def _connect_controllers(self, controllers):
+        """connect() results of controllers, all boards are connected concurrently."""
+        if self.async_backend is not None:
+            # Connect every board on the backend's event loop.
+            return self.async_backend.connect_all(controllers)
+        results = [()] * len(controllers)
+
+        def init_controller(index):
+            results[index] = controllers[index].connect()
+
+        # Start a thread for each COM port, wait for all of them to finish.
+        threads = [threading.Thread(target=init_controller, args=(index,)) for index in range(len(controllers))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def _check_idle(self, controllers):
+        """The controllers whose board does not answer "id" as an idle board (SingleController.check_idle)."""
+        if not controllers:
+            return []
+        if self.async_backend is not None:
+            idle = self.async_backend.check_idle_all(controllers)
+        else:
+            idle = [False] * len(controllers)
+
+            def check(index):
+                idle[index] = controllers[index].check_idle()
+
+            threads = [threading.Thread(target=check, args=(index,)) for index in range(len(controllers))]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        return [controller for controller, answered in zip(controllers, idle) if not answered]
+
+    def _close_controller(self, controller):
+        if self.async_backend is not None:
+            self.async_backend.disconnect(controller)
+        else:
+            controller.disconnect()
+
+    def refresh_connections(self):
+        """
+        Connects again the boards whose controller is not ready (stopped run,
+        communication error) or that do not answer "id" as an idle board
+        (older firmware still holding its last run), used between the trials
+        of a preset. Boards that can not be connected are left out of the next runs.
+        """
+        ready = [controller for controller in self.controllers.values() if self.pool.is_ready(controller)]
+        stale = [controller for controller in self.controllers.values() if controller not in ready]
+        stale += self._check_idle(ready)
+        for controller, connected_result in zip(stale, self._connect_controllers(stale)):
+            if connected_result:
+                continue
+            get_logger().log(f"Lost the arduino on {controller.port}, leaving it out.")
+            self.pool.discard(controller)
+            self.controllers = {ID: c for ID, c in self.controllers.items() if c is not controller}
+            self.assigned_connected_arduinos = [
+                (HW_ID, ID) for HW_ID, ID in self.assigned_connected_arduinos if ID in self.controllers
+            ]
+
     def reset_arduinos(self):
+        if self.async_backend is not None:
+            self.async_backend.connect_all(self.controllers.values())
+            return
         for ID in self.controllers:
             self.controllers[ID].disconnect()
             self.controllers[ID].connect()
             #TODO: thread
 
 
+    def get_throughput(self):
+        """Per-port serial throughput of the connected controllers, keyed by Arduino ID."""
+        return {
+            ID: controller.get_throughput()
+            for ID, controller in self.controllers.items()
+        }
+
     def get_valid(self):
         return bool(self.assigned_connected_arduinos) or self.plotting_mode
 
@@ -121,10 +329,26 @@ class MultiController(QObject):
         if not os.path.exists(self.trial_dir):
             os.mkdir(self.trial_dir)
         self.mode = mode
+        if mode == Mode.STOP:
+            self.stop_resumed()
+
+        if self.async_backend is not None:
+            self._run_async(mode, params)
+            return
 
         kwargs = {
             "params": params,
         }
+        # the boards start together once all of them have their parameters,
+        # and their files share the date and time base of the run
+        start_barrier = None
+        run_clock = None
+        if mode in (Mode.SCAN, Mode.MPPT) and self.controllers:
+            start_barrier = StartBarrier(len(self.controllers))
+            run_clock = RunClock()
+        for controller in self.controllers.values():
+            controller.start_barrier = start_barrier
+            controller.run_clock = run_clock
         for controller_id in self.controllers:
             try:
                 self.run_command(controller_id, mode, **kwargs)
@@ -156,7 +380,6 @@ class MultiController(QObject):
                 del self.active_threads[ID]
 
             # Define the target function based on the command
-            # TODO: put date here
             if command == Mode.SCAN:
                 target = lambda: self.controllers[ID].scan(**kwargs)
             elif command == Mode.MPPT:
@@ -170,11 +393,52 @@ class MultiController(QObject):
             if not (command == Mode.STOP):
                 # Start the new command in a new thread
                 get_logger().log(f"Started command {command} on controller {ID}.")
-                self.controllers[ID].date = datetime.now().strftime("%b-%d-%Y_%H-%M-%S")
+                # the controller may have been stopped in an earlier run
+                self.controllers[ID].should_run = True
+                run = target
+                controller = self.controllers[ID]
+                start_barrier = controller.start_barrier
+
+                def target():
+                    try:
+                        run()
+                    finally:
+                        # the controller takes the barrier when it waits on it, one
+                        # that ended before (by error, or stopped) is not waited for
+                        if start_barrier is not None and controller.start_barrier is start_barrier:
+                            controller.start_barrier = None
+                            start_barrier.leave()
+
                 thread = threading.Thread(target=target, daemon=True)
                 thread.start()
                 self.active_threads[ID] = thread
 
+    def _run_async(self, mode, params):
+        """
+        Runs mode on all controllers through the asyncio backend.
+        The backend loop reports completion, so no monitor thread is needed.
+        """
+        if mode == Mode.STOP:
+            for ID, controller in self.controllers.items():
+                get_logger().log(f"STOPPING SINGLE CONTROLLER {ID}")
+                controller.should_run = False
+                # the port belongs to the backend loop, which resets the board
+                self.async_backend.stop(ID, controller)
+            return
+        if mode not in (Mode.SCAN, Mode.MPPT):
+            get_logger().log(f"Unknown command: {mode}")
+            return
+
+        run_clock = RunClock()
+        for ID, controller in self.controllers.items():
+            get_logger().log(f"Started command {mode} on controller {ID}.")
+            # should_run is set by the backend once a previous run of the controller has ended
+            controller.run_clock = run_clock
+        self.started.emit()
+        self.async_backend.run(
+            self.controllers, mode, params, on_finished=self._notify_finished
+        )
+
     def monitor_controllers(self):
         self.started.emit()
         while True:
@@ -188,6 +452,9 @@ class MultiController(QObject):
                 if not self.active_threads:
                     break
             time.sleep(0.1)
+        self._notify_finished()
+
+    def _notify_finished(self):
         self.finished.emit()
         if self.email:
             self.email_sender.send_email(
@@ -206,3 +473,9 @@ class MultiController(QObject):
             get_logger().log(f"Error loading JSON: {e}")
             return {}
 
+    def load_link_config(self, json_location) -> ArduinoConfig:
+        """Serial link settings (boot and negotiated baud rates) of the config file, see core/config_manager.py."""
+        if not json_location or not os.path.exists(json_location):
+            return ArduinoConfig()
+        return ConfigManager(json_location).arduino
+
@@ -0,0 +1,111 @@
+# parameter_block.py
+"""
+Uploading the parameters of a run as one block, and the start barrier.
+
+Uploading the parameter lines one by one needs a pause after every line
+(the board echoes each line and its serial buffer holds 64 bytes), about
+0.8 s for an MPPT run. Firmware that supports blocks takes all of them at
+once:
+
+    host:  blk,<length>,<crc>          board: Block ready: <length>
+    host:  <length> bytes of parameter lines
+                                       board: (parsed parameters)
+                                       board: Block ok: <crc>
+    host:  go                          board: Measurement Started
+
+The crc is the CRC-16/CCITT of the lines (as for the binary data frames,
+controller/binary_frames.py). "Block error: <reason>" rejects the block.
+Firmware without block support answers the header with a warning about
+"blk", the host then uploads the lines one by one as before.
+
+The board only starts on "go" (or "done" for line uploads). The host sends
+it once every board of a run has its parameters, see StartBarrier, so the
+boards begin measuring within milliseconds of each other.
+"""
+import binascii
+import threading
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from constants import Constants
+from controller.binary_frames import CRC_INIT
+from helper.global_helpers import get_logger
+
+BLOCK_READY = "Block ready"
+BLOCK_OK = "Block ok"
+BLOCK_ERROR = "Block error"
+# firmware without block support warns about the "blk" it does not know
+BLOCK_UNSUPPORTED = "blk'"
+START_COMMAND = "go\n"
+
+
+def encode_block(commands: Sequence[str]) -> Tuple[bytes, bytes]:
+    """(header line, payload) uploading commands, the parameter lines without "done"."""
+    payload = "".join(command.strip() + "\n" for command in commands).encode()
+    crc = binascii.crc_hqx(payload, CRC_INIT)
+    return f"blk,{len(payload)},{crc:04X}\n".encode(), payload
+
+
+def block_reply(line: str) -> Optional[bool]:
+    """
+    True if line accepts the block (or its header), False if it rejects it
+    or the firmware does not know blocks, None for other output.
+    """
+    if BLOCK_READY in line or BLOCK_OK in line:
+        return True
+    if BLOCK_ERROR in line or BLOCK_UNSUPPORTED in line:
+        return False
+    return None
+
+
+class StartBarrier:
+    """
+    Lets the boards of a threaded run start together: every controller
+    calls wait(start) once its board has the parameters, the last one to
+    arrive then calls all the start functions back to back. A controller
+    that ends before it gets there calls leave() instead, and the others
+    no longer wait for it. After Constants.start_barrier_timeout_s the
+    boards that arrived start without the missing ones. The asyncio
+    backend has its own barrier on the event loop.
+    """
+
+    def __init__(self, parties: int):
+        self._parties = parties
+        self._starts: List[Callable[[], None]] = []
+        self._released = False
+        self._condition = threading.Condition()
+
+    def _release(self) -> List[Callable[[], None]]:
+        """Releases the barrier, returns the start functions to call (under the lock)."""
+        self._released = True
+        self._condition.notify_all()
+        starts, self._starts = self._starts, []
+        return starts
+
+    def _release_if_complete(self) -> List[Callable[[], None]]:
+        if self._released or len(self._starts) < self._parties:
+            return []
+        return self._release()
+
+    def wait(self, start: Callable[[], None]) -> None:
+        """Calls start (which must not raise) together with those of the other controllers."""
+        with self._condition:
+            if self._released:
+                starts = [start]
+            else:
+                self._starts.append(start)
+                starts = self._release_if_complete()
+                if not starts and not self._condition.wait_for(
+                    lambda: self._released, Constants.start_barrier_timeout_s
+                ):
+                    get_logger().log("Not every arduino got its parameters in time, starting without them")
+                    starts = self._release()
+        for start in starts:
+            start()
+
+    def leave(self) -> None:
+        """The calling controller will not reach wait(), the others no longer wait for it."""
+        with self._condition:
+            self._parties -= 1
+            starts = self._release_if_complete()
+        for start in starts:
+            start()
@@ -0,0 +1,5 @@
+# protocol_sim.py
+# pyserial url handler for sim:// ports, see controller/board_emulator.py
+from controller.board_emulator import SimulatedSerial as Serial
+
+__all__ = ["Serial"]
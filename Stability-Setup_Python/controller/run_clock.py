@@ -0,0 +1,174 @@
+# run_clock.py
+"""
+The clock of a run, shared by all of its boards.
+
+Each board stamps its rows with the time since it started measuring, from
+its own millis(). The start barrier (controller/parameter_block.py) starts
+the boards within milliseconds of each other, but their resonators run up
+to a few 0.1 % fast or slow, so over a long MPPT run the times of the boards
+drift apart, and away from the host clock.
+
+MultiController creates one RunClock per run. Its epoch is the moment the
+start command goes to the first board, on the host's time.monotonic(). The
+files of the run share its "Start Date", and carry the epoch as "Run Epoch"
+(UTC, ISO 8601). The Time column is written in seconds since the epoch,
+"Start Offset (s)" is when the board reported it started, on the run clock.
+
+BoardClock maps the times of one board onto the run clock,
+
+    run time = run time at b0 + rate * (board time - b0)
+
+piece by piece, the pieces joining up so the times keep increasing. The host
+notes when it receives the rows of a board. A row arrives later than it was
+measured, by the serial and host latency, so the offset (receipt - board
+time) of the row with the smallest latency of every
+Constants.clock_sync_interval_s is the best estimate of the board's offset
+(the latency is measured against the current piece, so the drift does not
+pick the row). A line fitted through the last Constants.clock_sync_points
+of them gives the drift of the board. Each new piece runs at that drift,
+plus what takes out the remaining offset error over the next interval.
+A fitted drift above Constants.clock_max_drift is not a clock error (the
+emulator sends faster than real time with rate=0, or the board buffered
+data) and leaves the mapping as it is.
+
+A run resumed after a restart of the app (controller/run_journal.py) finds
+its epoch from "Run Epoch" and the wall clock. If the first rows received
+then would land before the rows already written, the board does not keep
+time with the host and its times continue from "Start Offset (s)" as before.
+"""
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+import numpy as np
+
+from constants import Constants
+from helper.global_helpers import get_logger
+
+DATE_FORMAT = "%b-%d-%Y_%H-%M-%S"
+RUN_EPOCH = "Run Epoch"
+START_OFFSET = "Start Offset (s)"
+
+
+class RunClock:
+    """The date and epoch of one run, see the module docstring."""
+
+    def __init__(self, date: Optional[str] = None):
+        self.date = date if date is not None else datetime.now().strftime(DATE_FORMAT)
+        self.epoch_monotonic: Optional[float] = None
+        self.epoch_wall: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_metadata(cls, metadata: Dict[str, str]) -> Optional["RunClock"]:
+        """
+        The clock of a recovered run, its epoch moved onto the monotonic clock
+        of this process. None for runs written before the run clock.
+        """
+        epoch = metadata.get(RUN_EPOCH)
+        if not epoch:
+            return None
+        clock = cls(metadata.get("Start Date"))
+        clock.epoch_wall = datetime.fromisoformat(epoch).timestamp()
+        clock.epoch_monotonic = time.monotonic() - (time.time() - clock.epoch_wall)
+        return clock
+
+    def mark_start(self) -> None:
+        """Sets the epoch to now, unless a board of the run started before."""
+        with self._lock:
+            if self.epoch_monotonic is None:
+                self.epoch_monotonic = time.monotonic()
+                self.epoch_wall = time.time()
+
+    def now(self) -> float:
+        """Seconds since the epoch."""
+        self.mark_start()
+        return time.monotonic() - self.epoch_monotonic
+
+    def epoch(self) -> str:
+        """The epoch as stored in the run files."""
+        self.mark_start()
+        return datetime.fromtimestamp(self.epoch_wall, timezone.utc).isoformat(timespec="milliseconds")
+
+
+class BoardClock:
+    """Maps the times of one board onto its RunClock, see the module docstring."""
+
+    def __init__(self, run: RunClock, start_offset: Optional[float] = None,
+                 not_before: Optional[float] = None):
+        """start_offset and not_before (the last run time written) are those of a resumed run."""
+        self.run = run
+        self.start_offset = start_offset
+        self._not_before = not_before
+        # (board time, run time, rate) of the current piece
+        self._piece: Optional[tuple] = None
+        # (board time, receipt - board time) of the row with the smallest latency of each interval
+        self._minima = deque(maxlen=Constants.clock_sync_points)
+        self._interval_min: Optional[tuple] = None
+        self._interval_end = 0.0
+        self._implausible = False
+        self.drift = 0.0
+
+    def started(self) -> None:
+        """The board reported it started measuring, board time 0."""
+        self.start_offset = self.run.now()
+        self.observe(0.0, self.start_offset)
+
+    def stamp(self, times: np.ndarray) -> None:
+        """Maps the board times of rows just received onto the run clock, in place."""
+        if not len(times):
+            return
+        receipt = self.run.now()
+        last = float(times[-1])
+        if self._piece is None:
+            first = float(times[0])
+            if self._not_before is not None and self.start_offset is not None and receipt <= self._not_before:
+                self._start_piece(first, self.start_offset + first)
+            else:
+                self._start_piece(first, receipt)
+        board_t0, run_t0, rate = self._piece
+        times[:] = run_t0 + rate * (times - board_t0)
+        # after mapping, so a new piece starts where these rows end
+        self.observe(last, receipt)
+
+    def observe(self, board_time: float, receipt: float) -> None:
+        """A row stamped board_time was received at receipt (run clock)."""
+        if self._piece is None:
+            self._start_piece(board_time, receipt)
+        latency = receipt - self.to_run_time(board_time)
+        if self._interval_min is None or latency < self._interval_min[0]:
+            self._interval_min = (latency, board_time, receipt - board_time)
+        if board_time >= self._interval_end:
+            self._minima.append(self._interval_min[1:])
+            self._interval_min = None
+            self._interval_end = board_time + Constants.clock_sync_interval_s
+            self._correct(board_time)
+
+    def _start_piece(self, board_time: float, run_time: float) -> None:
+        self._piece = (board_time, run_time, 1.0)
+        self._interval_end = board_time + Constants.clock_sync_interval_s
+
+    def to_run_time(self, board_time: float) -> float:
+        board_t0, run_t0, rate = self._piece
+        return run_t0 + rate * (board_time - board_t0)
+
+    def _correct(self, board_time: float) -> None:
+        """Starts a new piece at board_time from the drift fitted to the interval minima."""
+        if len(self._minima) < 2:
+            return
+        points = np.array(self._minima)
+        drift, offset = np.polyfit(points[:, 0], points[:, 1], 1)
+        if abs(drift) > Constants.clock_max_drift:
+            if not self._implausible:
+                get_logger().log(f"Board clock drifts by {drift:.2%} against the host, "
+                                 f"not correcting it (limit {Constants.clock_max_drift:.2%})")
+                self._implausible = True
+            return
+        run_time = self.to_run_time(board_time)
+        error = board_time + offset + drift * board_time - run_time
+        slew = float(np.clip(error / Constants.clock_sync_interval_s,
+                             -Constants.clock_max_drift, Constants.clock_max_drift))
+        self._piece = (board_time, run_time, 1.0 + drift + slew)
+        self.drift = float(drift)
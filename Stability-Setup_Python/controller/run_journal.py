@@ -0,0 +1,344 @@
+# run_journal.py
+"""
+Append-only journal of a run, for recovering its files after a crash.
+
+Next to every run csv the run writer (controller/run_writer.py) keeps a
+"<run file>.journal" with one JSON record per line:
+
+    {"event": "start", ...}       board, mode, port and HW_ID of the board,
+                                  metadata, headers and csv file of the run
+    {"event": "checkpoint", ...}  byte offset of every file of the run, rows
+                                  and last Time written, crc32 of the csv bytes
+                                  since the previous checkpoint
+    {"event": "resume", ...}      a checkpoint written when a restarted app
+                                  continues the run
+    {"event": "attach_failed", ...}
+                                  a restarted app could not re-attach to the
+                                  board of the run
+    {"event": "end", ...}         the run finished and its files were closed,
+                                  or was given up (see give_up_reason)
+
+Checkpoints are added every Constants.run_journal_interval_s and after
+every fsync, always after the bytes they describe were flushed.
+
+recover_run() reads the first line and the tail of the journal and the
+csv bytes from the last checkpoint it can verify, so recovering a run
+that went on for days costs as much as recovering a short one. It cuts
+off a trailing partial row and truncates the compressed files to the
+checkpoint, and returns what SingleController.attach()/resume() need to
+re-attach to the board and keep appending to the same files.
+"""
+import glob
+import json
+import os
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from constants import Constants, Mode
+from core.row_buffer import AcquisitionBuffer
+from controller.sample_bus import get_sample_bus
+from core.run_data import binary_path_for
+from helper.global_helpers import get_logger
+
+JOURNAL_EXTENSION = ".journal"
+JOURNAL_VERSION = 1
+# bytes read from the end of a journal to find its last checkpoints
+TAIL_BYTES = 64 * 1024
+
+START = "start"
+CHECKPOINT = "checkpoint"
+RESUME = "resume"
+ATTACH_FAILED = "attach_failed"
+END = "end"
+
+
+def journal_path_for(csv_path: str) -> str:
+    """Path of the journal belonging to a csv run file."""
+    return os.path.splitext(csv_path)[0] + JOURNAL_EXTENSION
+
+
+class RunJournal:
+    """Appends records to the journal of one run, used by the run writer thread."""
+
+    def __init__(self, path: str, append: bool = False):
+        self.path = path
+        self.file = open(path, "ab" if append else "wb")
+
+    def record(self, event: str, **fields) -> None:
+        line = json.dumps({"event": event, **fields}, separators=(",", ":"))
+        self.file.write(line.encode() + b"\n")
+
+    def flush(self, sync: bool) -> None:
+        self.file.flush()
+        if sync:
+            os.fsync(self.file.fileno())
+
+    def close(self) -> None:
+        self.file.close()
+
+
+@dataclass
+class RecoveredRun:
+    """
+    An unfinished run found by recover_run().
+
+    offsets are the lengths its files were truncated to (keyed by path),
+    tail the rows after the checkpoint: they are in the csv, but not in the
+    compressed files yet. crc_from/crc32 cover the csv bytes of the tail.
+    checkpoint_time is when the checkpoint was written (0 if unknown),
+    attach_failures the failed attaches recorded since the newest checkpoint.
+    """
+    path: str
+    journal_path: str
+    board: str
+    mode: Mode
+    device: Dict[str, str]
+    metadata: Dict[str, str]
+    headers: List[str]
+    offsets: Dict[str, int]
+    rows: int
+    last_time: float
+    tail: np.ndarray
+    crc_from: int
+    crc32: int
+    verified: bool
+    checkpoint_time: float = 0.0
+    attach_failures: int = 0
+
+    @property
+    def port(self) -> str:
+        return self.device.get("port", "")
+
+    @property
+    def hw_id(self) -> str:
+        return self.device.get("hw_id", "")
+
+
+def _parse_record(line: bytes) -> Optional[dict]:
+    """A journal line as a dict, None for torn or damaged lines."""
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    return record if isinstance(record, dict) and "event" in record else None
+
+
+def read_journal(journal_path: str) -> Tuple[Optional[dict], List[dict]]:
+    """
+    The start record and the complete records at the end of a journal.
+
+    Only the last TAIL_BYTES are parsed, unless they hold no checkpoint.
+    """
+    with open(journal_path, "rb") as f:
+        start = _parse_record(f.readline())
+        size = f.seek(0, os.SEEK_END)
+        tail_bytes = TAIL_BYTES
+        while True:
+            tail_start = max(size - tail_bytes, 0)
+            f.seek(tail_start)
+            lines = f.read().split(b"\n")
+            # the first line is cut when reading from the middle, the last
+            # one is empty or a record that was being written
+            lines = lines[1 if tail_start else 0:-1]
+            records = [record for record in map(_parse_record, lines) if record is not None]
+            if tail_start == 0 or any(record["event"] != START for record in records):
+                return start, records
+            tail_bytes *= 4
+
+
+def _read_tail(csv_path: str, offset: int, width: int) -> Tuple[np.ndarray, int, int]:
+    """
+    The complete rows of a csv after offset, where they end and their crc32.
+
+    Reading stops at the first line that is not a complete row: the partial
+    row of a crash, or the zeros a power loss can leave at the end of a file.
+    """
+    with open(csv_path, "rb") as f:
+        f.seek(offset)
+        data = f.read()
+    lines = data.split(b"\n")[:-1]
+    buffer = AcquisitionBuffer(width, capacity=len(lines) + 1)
+    end = 0
+    for line in lines:
+        if b"\0" in line or not buffer.append_line(line.decode("utf-8", errors="replace").strip()):
+            break
+        end += len(line) + 1
+    return buffer.view().copy(), offset + end, zlib.crc32(data[:end])
+
+
+def _crc_matches(csv_path: str, record: dict) -> bool:
+    start, end = record["crc_from"], record["offsets"][os.path.basename(csv_path)]
+    with open(csv_path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return len(data) == end - start and zlib.crc32(data) == record["crc32"]
+
+
+def _last_checkpoint(csv_path: str, records: List[dict]) -> Tuple[Optional[dict], bool]:
+    """
+    The newest checkpoint whose csv bytes are on disk and match its crc32,
+    or the newest one inside the file (unverified) if none matches.
+    """
+    name = os.path.basename(csv_path)
+    size = os.path.getsize(csv_path)
+    checkpoints = [
+        record for record in records
+        if record["event"] in (CHECKPOINT, RESUME) and record["offsets"].get(name, size + 1) <= size
+    ]
+    for record in reversed(checkpoints):
+        if _crc_matches(csv_path, record):
+            return record, True
+    return (checkpoints[-1], False) if checkpoints else (None, False)
+
+
+def _truncate(path: str, length: int) -> None:
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return
+    if size > length:
+        with open(path, "r+b") as f:
+            f.truncate(length)
+        get_logger().log(f"Recovered {path}: cut {size - length} trailing bytes")
+
+
+def recover_run(path: str, truncate: bool = True) -> Optional[RecoveredRun]:
+    """
+    Recovers the files of an unfinished run from its journal, given the csv
+    or the journal path. None if the run has no journal or finished cleanly.
+
+    With truncate, the csv is cut after its last complete row, the
+    compressed files back to the checkpoint and the binary copy is removed
+    (it can not be continued, load_run() reads the csv instead).
+    """
+    journal_path = path if path.endswith(JOURNAL_EXTENSION) else journal_path_for(path)
+    if not os.path.exists(journal_path):
+        return None
+    start, records = read_journal(journal_path)
+    if start is None or start["event"] != START:
+        get_logger().log(f"Run journal {journal_path} has no start record")
+        return None
+    if records and records[-1]["event"] == END:
+        return None
+
+    directory = os.path.dirname(journal_path)
+    csv_path = os.path.join(directory, start["path"])
+    try:
+        checkpoint, verified = _last_checkpoint(csv_path, records)
+    except OSError as e:
+        get_logger().log(f"Cannot recover {csv_path}: {e}")
+        return None
+    if checkpoint is None:
+        get_logger().log(f"Cannot recover {csv_path}: its journal has no usable checkpoint")
+        return None
+    if not verified:
+        get_logger().log(f"Recovering {csv_path}: no checkpoint matches its checksum, the file may be damaged")
+
+    offsets = {os.path.join(directory, name): offset for name, offset in checkpoint["offsets"].items()}
+    tail, end, crc = _read_tail(csv_path, offsets[csv_path], len(start["headers"]))
+    crc_from = offsets[csv_path]
+    offsets[csv_path] = end
+    if truncate:
+        for file_path, length in offsets.items():
+            _truncate(file_path, length)
+        binary_path = binary_path_for(csv_path)
+        if os.path.exists(binary_path):
+            os.remove(binary_path)
+            get_logger().log(f"Recovered {csv_path}: removed its incomplete binary copy")
+
+    return RecoveredRun(
+        path=csv_path,
+        journal_path=journal_path,
+        board=str(start["board"]),
+        mode=Mode[start["mode"]],
+        device=dict(start.get("device", {})),
+        metadata=dict(start["metadata"]),
+        headers=list(start["headers"]),
+        offsets=offsets,
+        rows=int(checkpoint["rows"]) + len(tail),
+        last_time=float(tail[-1, 0]) if len(tail) else float(checkpoint["last_time"]),
+        tail=tail,
+        crc_from=crc_from,
+        crc32=crc,
+        verified=verified,
+        checkpoint_time=float(checkpoint.get("time", 0.0)),
+        attach_failures=_attach_failures(records),
+    )
+
+
+def _attach_failures(records: List[dict]) -> int:
+    """Failed attaches recorded after the newest checkpoint of a journal."""
+    failures = 0
+    for record in reversed(records):
+        if record["event"] in (CHECKPOINT, RESUME):
+            break
+        failures += record["event"] == ATTACH_FAILED
+    return failures
+
+
+def recover_unfinished_runs(data_dir: str) -> List[RecoveredRun]:
+    """
+    Recovers every unfinished run in data_dir and its trial folders, except
+    runs this process is still writing.
+    """
+    journals = glob.glob(os.path.join(data_dir, "*" + JOURNAL_EXTENSION))
+    journals += glob.glob(os.path.join(data_dir, "*", "*" + JOURNAL_EXTENSION))
+    runs = []
+    for journal_path in sorted(journals):
+        try:
+            with open(journal_path, "rb") as f:
+                start = _parse_record(f.readline())
+        except OSError:
+            continue
+        if start is None:
+            continue
+        if get_sample_bus().active_run(os.path.join(os.path.dirname(journal_path), start.get("path", ""))):
+            continue
+        try:
+            run = recover_run(journal_path)
+        except (OSError, KeyError, ValueError) as e:
+            get_logger().log(f"Cannot recover the run of {journal_path}: {e}")
+            continue
+        if run is not None:
+            runs.append(run)
+    return runs
+
+
+def give_up_reason(run: RecoveredRun, now: Optional[float] = None) -> Optional[str]:
+    """
+    Why a recovered run should be ended instead of re-attached to its board,
+    None while it is worth another attach.
+    """
+    if not run.port:
+        return "no port recorded for the board"
+    if run.attach_failures >= Constants.resume_max_attach_attempts:
+        return f"board did not answer {run.attach_failures} attach attempts"
+    now = time.time() if now is None else now
+    if run.checkpoint_time and now - run.checkpoint_time > Constants.resume_max_age_s:
+        return f"last checkpoint is {(now - run.checkpoint_time) / 3600:.1f} h old"
+    return None
+
+
+def _append_record(run: RecoveredRun, event: str, **fields) -> None:
+    journal = RunJournal(run.journal_path, append=True)
+    try:
+        journal.record(event, **fields)
+        journal.flush(sync=False)
+    finally:
+        journal.close()
+
+
+def record_attach_failure(run: RecoveredRun, reason: str) -> None:
+    """Notes a failed attach in the journal, counted by give_up_reason() at the next recovery."""
+    run.attach_failures += 1
+    _append_record(run, ATTACH_FAILED, attempt=run.attach_failures, reason=reason, time=time.time())
+
+
+def end_journal(run: RecoveredRun, reason: str) -> None:
+    """Marks a recovered run that can not be continued as finished."""
+    _append_record(run, END, offsets={os.path.basename(path): offset for path, offset in run.offsets.items()},
+                   rows=run.rows, reason=reason, time=time.time())
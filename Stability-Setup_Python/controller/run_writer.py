@@ -0,0 +1,404 @@
+# run_writer.py
+"""
+Background writer for the run files of all controllers.
+
+The controllers only parse lines and publish the rows on the sample bus
+(controller/sample_bus.py); a single writer thread subscribes to the bus
+and does all file I/O, so a slow network share or a virus scanner stalls
+the writer but never the serial reads. Per run it writes:
+
+- the csv file: the metadata/header block when the run starts, then the
+  rows in batches every Constants.run_writer_flush_interval_s
+- the binary copy of the csv (core/run_data.py)
+- for mppt, the compressed files of every compression tier
+  (controller/mppt_compressor.py)
+
+Files stay open for the whole run; they are flushed after every batch so
+readers (the live view, the Results Viewer) see the rows, and fsync'ed
+every Constants.run_writer_fsync_interval_s (0 disables fsync). The
+journal of the run (controller/run_journal.py) gets a checkpoint after
+every fsync and every Constants.run_journal_interval_s, and a run
+recovered from its journal is continued in the same files.
+
+SingleController._wait_for_run_files waits for its run to be written and
+closed, so the files are complete once scan()/mppt() return (the asyncio
+backend waits in an executor, off its loop).
+"""
+import atexit
+import io
+import os
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from constants import Constants, Mode
+from core.row_buffer import DATA_FMT
+from controller.mppt_compressor import TieredCompressor
+from controller.run_journal import (
+    CHECKPOINT, END, JOURNAL_VERSION, RESUME, START, RecoveredRun, RunJournal, journal_path_for,
+)
+from controller.sample_bus import KEEP_ALL, RunInfo, SampleBlock, get_sample_bus
+from core.run_data import open_run_writer
+from helper.global_helpers import get_logger
+
+
+def _format_rows(rows: np.ndarray, fmt: str) -> bytes:
+    out = io.BytesIO()
+    np.savetxt(out, rows, delimiter=",", fmt=fmt)
+    return out.getvalue()
+
+
+class _RunFile:
+    """
+    One csv file of a run and its binary copy.
+
+    offset counts the bytes in the csv, crc is the crc32 of the bytes
+    written since crc_from (the offset of the last journal checkpoint).
+    With append the file is continued: a recovered run keeps its rows and
+    gets no binary copy, load_run() reads the csv instead.
+    """
+
+    def __init__(self, path: str, header_block: np.ndarray, metadata: Dict[str, str], headers: List[str],
+                 append: bool = False):
+        self.path = path
+        self.file = open(path, "ab" if append else "wb")
+        self.offset = self.file.seek(0, os.SEEK_END)
+        self.crc_from = self.offset
+        self.crc = 0
+        self.binary = None
+        if self.offset:
+            return
+        self._write_bytes(_format_rows(header_block, "%s"))
+        try:
+            self.binary = open_run_writer(path, metadata, headers)
+        except OSError as e:
+            get_logger().log(f"Failed to create binary run file for {path}: {e}")
+
+    def _write_bytes(self, data: bytes) -> None:
+        self.file.write(data)
+        self.offset += len(data)
+        self.crc = zlib.crc32(data, self.crc)
+
+    def take_crc(self) -> Tuple[int, int]:
+        """(crc_from, crc32) of the bytes written since the previous call."""
+        span = (self.crc_from, self.crc)
+        self.crc_from, self.crc = self.offset, 0
+        return span
+
+    def write(self, rows: np.ndarray) -> None:
+        self._write_bytes(_format_rows(rows, DATA_FMT))
+        if self.binary is None:
+            return
+        try:
+            self.binary.append(rows)
+        except OSError as e:
+            get_logger().log(f"Failed to write binary run file for {self.path}: {e}")
+            self.binary = None
+
+    def flush(self, sync: bool) -> None:
+        self.file.flush()
+        if sync:
+            os.fsync(self.file.fileno())
+
+    def close(self, complete: bool = True) -> None:
+        """Closes the file, the binary copy is only marked closed for a complete run."""
+        self.file.close()
+        if self.binary is not None:
+            try:
+                if complete:
+                    self.binary.close()
+                else:
+                    self.binary.flush()
+            except OSError as e:
+                get_logger().log(f"Failed to close binary run file for {self.path}: {e}")
+
+
+class _RunState:
+    """Rows waiting to be written for one run, its open files and journal."""
+
+    def __init__(self, run: RunInfo, header_block: np.ndarray, tiers: Sequence,
+                 device: Dict[str, str], resume: Optional[RecoveredRun]):
+        self.run = run
+        self.header_block = header_block
+        self.device = device
+        self.resume = resume
+        self.compressor = TieredCompressor(tiers) if run.mode == Mode.MPPT else None
+        self.files: List[_RunFile] = []
+        self.compressed_files: List[_RunFile] = []
+        self.journal: Optional[RunJournal] = None
+        self.rows = 0
+        self.last_time = 0.0
+        self.last_checkpoint = 0.0
+        self.pending: List[np.ndarray] = []
+        self.pending_rows = 0
+        self.next_seq: Optional[int] = None
+        self.finishing = False
+        # the final block ends the run without an "end" record, see RunWriter.abandon()
+        self.abandoned = False
+        self.last_flush = 0.0
+        self.last_sync = time.monotonic()
+        self.done = threading.Event()
+
+    def open(self) -> None:
+        run, resume = self.run, self.resume
+        append = resume is not None
+        self.files = [_RunFile(run.path, self.header_block, run.metadata, run.headers, append)]
+        if self.compressor is not None:
+            self.compressed_files = [
+                _RunFile(path, self.header_block, run.metadata, run.headers, append)
+                for path in self.compressor.paths(run.path)
+            ]
+        if resume is None:
+            self.journal = RunJournal(journal_path_for(run.path))
+            self.journal.record(
+                START, version=JOURNAL_VERSION, path=os.path.basename(run.path), board=run.board,
+                mode=run.mode.name, device=self.device, metadata=run.metadata, headers=run.headers,
+                started=run.started,
+            )
+            self.flush(sync=False)
+            self.checkpoint()
+            return
+
+        # the rows after the recovered checkpoint are in the csv, but not compressed yet
+        self.rows, self.last_time = resume.rows, resume.last_time
+        self.files[0].crc_from, self.files[0].crc = resume.crc_from, resume.crc32
+        if self.compressor is not None and len(resume.tail):
+            self._write_compressed(self.compressor.push(resume.tail))
+        self.journal = RunJournal(resume.journal_path, append=True)
+        self.flush(sync=False)
+        self.checkpoint(RESUME)
+
+    def checkpoint(self, event: str = CHECKPOINT, sync: bool = False) -> None:
+        """Records the offsets of the files in the journal, call after they were flushed."""
+        if self.journal is None:
+            return
+        crc_from, crc = self.files[0].take_crc()
+        self.journal.record(
+            event, offsets=self._offsets(), rows=self.rows, last_time=self.last_time,
+            crc_from=crc_from, crc32=crc, time=time.time(),
+        )
+        self.journal.flush(sync)
+        self.last_checkpoint = time.monotonic()
+
+    def _offsets(self) -> Dict[str, int]:
+        return {os.path.basename(run_file.path): run_file.offset for run_file in self.files + self.compressed_files}
+
+    def write(self, final: bool = False) -> int:
+        rows = np.concatenate(self.pending) if len(self.pending) > 1 else self.pending[0] if self.pending else None
+        self.pending = []
+        self.pending_rows = 0
+        written = 0
+        if rows is not None and len(rows):
+            self.files[0].write(rows)
+            written = len(rows)
+            self.rows += written
+            self.last_time = float(rows[-1, 0])
+            if self.compressor is not None:
+                self._write_compressed(self.compressor.push(rows))
+        if final and self.compressor is not None:
+            self._write_compressed(self.compressor.finish())
+        return written
+
+    def _write_compressed(self, tier_rows) -> None:
+        for run_file, rows in zip(self.compressed_files, tier_rows):
+            if len(rows):
+                run_file.write(rows)
+
+    def flush(self, sync: bool) -> None:
+        for run_file in self.files + self.compressed_files:
+            run_file.flush(sync)
+
+    def close(self, sync: bool) -> None:
+        for run_file in self.files + self.compressed_files:
+            run_file.close(complete=not self.abandoned)
+        if self.journal is not None and self.abandoned:
+            self.journal.close()
+        elif self.journal is not None:
+            self.journal.record(END, offsets=self._offsets(), rows=self.rows, last_time=self.last_time,
+                                time=time.time())
+            self.journal.flush(sync)
+            self.journal.close()
+
+
+class RunWriter:
+    """
+    Writes the runs registered with start_run() from the sample bus.
+
+    stats() reports the queue depth (blocks waiting on the bus and rows
+    waiting for the next batch). The writer never makes a controller wait
+    and never loses a block: one that falls more than
+    Constants.run_writer_queue_blocks behind keeps the rest in memory and
+    logs an error.
+    """
+
+    def __init__(self, flush_interval_s: float = Constants.run_writer_flush_interval_s,
+                 fsync_interval_s: float = Constants.run_writer_fsync_interval_s,
+                 max_batch_rows: int = Constants.run_writer_max_batch_rows):
+        self.flush_interval_s = flush_interval_s
+        self.fsync_interval_s = fsync_interval_s
+        self.max_batch_rows = max_batch_rows
+        self._runs: Dict[int, _RunState] = {}
+        self._lock = threading.Lock()
+        self._subscription = get_sample_bus().subscribe(
+            "run writer", maxlen=Constants.run_writer_queue_blocks, policy=KEEP_ALL,
+        )
+        self._stop = threading.Event()
+        self.rows_written = 0
+        self.batches_written = 0
+        self.write_seconds = 0.0
+        self.max_write_seconds = 0.0
+        self.max_queue_blocks = 0
+        self._thread = threading.Thread(target=self._run, name="RunWriter", daemon=True)
+        self._thread.start()
+
+    def start_run(self, run: RunInfo, header_block: np.ndarray,
+                  tiers: Sequence = Constants.mppt_compression_tiers,
+                  device: Optional[Dict[str, str]] = None,
+                  resume: Optional[RecoveredRun] = None) -> None:
+        """
+        Registers a run announced on the sample bus; its files are created
+        with header_block (the metadata and header rows) by the writer thread.
+
+        device (port and HW_ID of the board) goes into the journal, so a
+        restarted app can re-attach to the board. With resume the files of a
+        recovered run are continued instead.
+        """
+        with self._lock:
+            self._runs[id(run)] = _RunState(
+                run, np.array(header_block, dtype=object), tiers, dict(device or {}), resume
+            )
+        self._subscription.wake()
+
+    def abandon(self, run: RunInfo) -> None:
+        """
+        Closes the files of run at its final block without ending it in its
+        journal, for a run cut off by a communication error: the rows are
+        flushed and checkpointed and recover_unfinished_runs() can continue it.
+        Call before the final block is published.
+        """
+        with self._lock:
+            state = self._runs.get(id(run))
+            if state is not None and state.run is run:
+                state.abandoned = True
+
+    def wait(self, run: RunInfo, timeout: Optional[float] = None) -> bool:
+        """Waits until the final block of run was written and its files closed."""
+        state = self._runs.get(id(run))
+        if state is None:
+            return True
+        return state.done.wait(timeout)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            pending_rows = {state.run.path: state.pending_rows for state in self._runs.values()}
+        return {
+            "queue_blocks": self._subscription.pending(),
+            "max_queue_blocks": self.max_queue_blocks,
+            "pending_rows": pending_rows,
+            "overflow_blocks": dict(self._subscription.overflowed),
+            "rows_written": self.rows_written,
+            "batches_written": self.batches_written,
+            "write_seconds": self.write_seconds,
+            "max_write_seconds": self.max_write_seconds,
+        }
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Writes everything that is queued, closes all files and stops the thread."""
+        self._stop.set()
+        self._subscription.wake()
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while True:
+            stopping = self._stop.is_set()
+            self.max_queue_blocks = max(self.max_queue_blocks, self._subscription.pending())
+            for block in self._subscription.get(timeout=self.flush_interval_s):
+                self._receive(block)
+            self._write_due(force=stopping)
+            if stopping:
+                break
+        get_sample_bus().unsubscribe(self._subscription)
+
+    def _receive(self, block: SampleBlock) -> None:
+        state = self._runs.get(id(block.run))
+        if state is None or state.run is not block.run:
+            return  # a run this writer was not asked to write
+        if state.next_seq is not None and block.seq != state.next_seq:
+            get_logger().log(
+                f"Run writer lost {block.seq - state.next_seq} blocks of ARDUINO {block.board} ({state.run.path})"
+            )
+        state.next_seq = block.seq + 1
+        if len(block.rows):
+            state.pending.append(block.rows)
+            state.pending_rows += len(block.rows)
+        state.finishing = state.finishing or block.final
+
+    def _write_due(self, force: bool = False) -> None:
+        now = time.monotonic()
+        with self._lock:
+            states = list(self._runs.values())
+        for state in states:
+            try:
+                if not state.files:
+                    state.open()
+                due = (
+                    force or state.finishing or state.pending_rows >= self.max_batch_rows
+                    or now - state.last_flush >= self.flush_interval_s
+                )
+                if not due:
+                    continue
+                if state.pending_rows or state.finishing or not state.last_flush:
+                    self._write(state, now)
+            except (OSError, ValueError) as e:
+                get_logger().log(f"Failed to write run file {state.run.path}: {e}")
+                state.pending = []
+                state.pending_rows = 0
+                if not state.files:
+                    state.finishing = True
+            if state.finishing or force:
+                self._close(state)
+
+    def _write(self, state: _RunState, now: float) -> None:
+        start = time.perf_counter()
+        written = state.write(final=state.finishing and not state.abandoned)
+        sync = self.fsync_interval_s > 0 and (state.finishing or now - state.last_sync >= self.fsync_interval_s)
+        state.flush(sync)
+        if sync:
+            state.last_sync = now
+        state.last_flush = now
+        if state.finishing and state.abandoned:
+            state.checkpoint(sync=sync)
+        elif not state.finishing and (sync or time.monotonic() - state.last_checkpoint >= Constants.run_journal_interval_s):
+            state.checkpoint(sync=sync)
+        elapsed = time.perf_counter() - start
+        self.rows_written += written
+        self.batches_written += 1
+        self.write_seconds += elapsed
+        self.max_write_seconds = max(self.max_write_seconds, elapsed)
+
+    def _close(self, state: _RunState) -> None:
+        try:
+            state.close(sync=self.fsync_interval_s > 0)
+        except OSError as e:
+            get_logger().log(f"Failed to close run file {state.run.path}: {e}")
+        with self._lock:
+            self._runs.pop(id(state.run), None)
+        state.done.set()
+
+
+_global_run_writer: Optional[RunWriter] = None
+_global_run_writer_lock = threading.Lock()
+
+
+def get_run_writer() -> RunWriter:
+    """Get the global run writer instance, started on first use."""
+    global _global_run_writer
+    with _global_run_writer_lock:
+        if _global_run_writer is None:
+            _global_run_writer = RunWriter()
+            # rows still queued when the application exits are written first
+            atexit.register(_global_run_writer.close)
+    return _global_run_writer
@@ -0,0 +1,321 @@
+# sample_bus.py
+"""
+In-process publish/subscribe bus for the rows parsed by the controllers.
+
+SingleController publishes the rows of every batch it reads from its board
+as a SampleBlock. Consumers (live plots, alarm checks, stats) subscribe
+instead of re-reading the run files:
+
+    subscription = get_sample_bus().subscribe("alarms", boards=[3])
+    for block in subscription.drain():
+        check(block.run.path, block.rows)
+
+Every subscription has one bounded queue per board. When a queue is full
+the policy decides what happens:
+
+- DROP_OLDEST: the oldest block is discarded (live views want the newest data)
+- DROP_NEWEST: the new block is discarded
+- BLOCK:       the publishing controller waits up to block_timeout_s for
+               the consumer, then drops the new block
+- KEEP_ALL:    the queue grows past maxlen, nothing is dropped and the
+               controller never waits (the run writer, which must not lose
+               rows); the backlog is logged as an error
+
+The final block of a run is never dropped, consumers wait for it. Dropped
+and overflowing blocks are counted per board. Publishing never takes a
+lock: the subscriber list is replaced instead of mutated, and deque appends
+are atomic, so a slow consumer only ever slows down the controller that
+feeds it when it asked for BLOCK.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from constants import Constants, Mode
+from helper.global_helpers import get_logger
+
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+BLOCK = "block"
+KEEP_ALL = "keep_all"
+POLICIES = (DROP_OLDEST, DROP_NEWEST, BLOCK, KEEP_ALL)
+
+
+@dataclass(frozen=True)
+class RunInfo:
+    """One scan or mppt run of one board (its Arduino ID, as in the file names)."""
+    board: str
+    mode: Mode
+    path: str
+    metadata: Dict[str, str]
+    headers: List[str]
+    started: float = field(default_factory=time.time)
+
+
+@dataclass(frozen=True)
+class SampleBlock:
+    """
+    Rows parsed from one read of a board, in the column layout of run.headers.
+
+    seq counts the blocks of a board, so a consumer can tell where blocks
+    were dropped. final is set on the (empty) block that ends a run.
+    """
+    run: RunInfo
+    rows: np.ndarray
+    seq: int
+    final: bool = False
+
+    @property
+    def board(self) -> str:
+        return self.run.board
+
+
+class Subscription:
+    """The per board queues of one consumer, filled by SampleBus.publish()."""
+
+    def __init__(self, name: str, maxlen: int, policy: str, boards: Optional[Iterable],
+                 block_timeout_s: float):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown sample bus policy {policy!r}, expected one of {POLICIES}")
+        self.name = name
+        self.maxlen = max(maxlen, 1)
+        self.policy = policy
+        self.boards = None if boards is None else frozenset(str(board) for board in boards)
+        self.block_timeout_s = block_timeout_s
+        self.dropped: Dict[str, int] = defaultdict(int)
+        # KEEP_ALL: blocks queued beyond maxlen, and the boards over it right now
+        self.overflowed: Dict[str, int] = defaultdict(int)
+        self._overflowing = set()
+        self.delivered = 0
+        self._queues: Dict[str, Deque[SampleBlock]] = {}
+        self._ready = threading.Event()
+        # only used by BLOCK publishers waiting for space
+        self._space = threading.Condition()
+        self.closed = False
+
+    def wants(self, block: SampleBlock) -> bool:
+        return not self.closed and (self.boards is None or block.board in self.boards)
+
+    def offer(self, block: SampleBlock) -> bool:
+        """Queues a block for this consumer, False if it was dropped."""
+        queue = self._queues.get(block.board)
+        if queue is None:
+            queue = self._queues.setdefault(block.board, deque())
+        if len(queue) >= self.maxlen:
+            if self.policy == KEEP_ALL or block.final:
+                self._overflow(block.board, len(queue))
+            elif self.policy == DROP_OLDEST:
+                try:
+                    queue.popleft()
+                except IndexError:
+                    pass
+                self.dropped[block.board] += 1
+            elif self.policy == BLOCK and self._wait_for_space(queue):
+                pass
+            else:
+                self.dropped[block.board] += 1
+                return False
+        queue.append(block)
+        self.delivered += 1
+        self._ready.set()
+        return True
+
+    def _overflow(self, board: str, queued: int) -> None:
+        self.overflowed[board] += 1
+        if board not in self._overflowing:
+            self._overflowing.add(board)
+            get_logger().log(f"Sample bus consumer '{self.name}' is {queued} blocks behind on ARDUINO {board}, "
+                             f"keeping the rows in memory until it catches up", level=logging.ERROR)
+
+    def _wait_for_space(self, queue: Deque[SampleBlock]) -> bool:
+        deadline = time.monotonic() + self.block_timeout_s
+        with self._space:
+            while len(queue) >= self.maxlen and not self.closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._space.wait(remaining)
+        return not self.closed
+
+    def drain(self, board=None) -> List[SampleBlock]:
+        """Every queued block (of one board, or of all boards board by board) without waiting."""
+        self._ready.clear()
+        boards = [str(board)] if board is not None else list(self._queues)
+        blocks = []
+        for key in boards:
+            queue = self._queues.get(key)
+            while queue:
+                blocks.append(queue.popleft())
+            self._overflowing.discard(key)
+        if blocks and self.policy == BLOCK:
+            with self._space:
+                self._space.notify_all()
+        return blocks
+
+    def get(self, timeout: Optional[float] = None) -> List[SampleBlock]:
+        """Waits up to timeout for at least one block, then drains every queue."""
+        if not self.pending():
+            self._ready.wait(timeout)
+        return self.drain()
+
+    def wake(self) -> None:
+        """Makes a consumer waiting in get() return now, e.g. to handle a new run."""
+        self._ready.set()
+
+    def pending(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "policy": self.policy,
+            "delivered": self.delivered,
+            "pending": {board: len(queue) for board, queue in self._queues.items()},
+            "dropped": dict(self.dropped),
+            "overflowed": dict(self.overflowed),
+        }
+
+    def close(self) -> None:
+        self.closed = True
+        self._ready.set()
+        with self._space:
+            self._space.notify_all()
+
+
+class SampleBus:
+    """
+    Routes SampleBlocks from the controllers to the subscriptions.
+
+    The last history_blocks blocks of every board are kept, so a consumer
+    that subscribes while a run is going (e.g. a live plot that was opened
+    from the run file) can replay the rows that are not on disk yet.
+    """
+
+    def __init__(self, history_blocks: int = Constants.sample_bus_history_blocks):
+        self.history_blocks = history_blocks
+        self._subscriptions: Tuple[Subscription, ...] = ()
+        self._runs: Dict[str, RunInfo] = {}
+        self._history: Dict[str, Deque[SampleBlock]] = {}
+        self._seq: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def subscribe(self, name: str, maxlen: int = Constants.sample_bus_queue_blocks,
+                  policy: str = DROP_OLDEST, boards: Optional[Iterable] = None,
+                  replay: bool = False,
+                  block_timeout_s: float = Constants.sample_bus_block_timeout_s) -> Subscription:
+        subscription = Subscription(name, maxlen, policy, boards, block_timeout_s)
+        with self._lock:
+            if replay:
+                for history in list(self._history.values()):
+                    for block in list(history):
+                        if subscription.wants(block):
+                            subscription.offer(block)
+            self._subscriptions = self._subscriptions + (subscription,)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscription.close()
+        with self._lock:
+            self._subscriptions = tuple(s for s in self._subscriptions if s is not subscription)
+
+    def start_run(self, board, mode: Mode, path: str, metadata: Dict[str, str],
+                  headers: List[str]) -> RunInfo:
+        """Announces a run, board is the Arduino ID (int or str)."""
+        run = RunInfo(str(board), mode, path, dict(metadata), list(headers))
+        with self._lock:
+            self._runs[path] = run
+            self._history[run.board] = deque(maxlen=self.history_blocks)
+        return run
+
+    def publish(self, run: RunInfo, rows: np.ndarray, final: bool = False) -> SampleBlock:
+        """Sends a copy of rows to every subscription that wants the board."""
+        rows = np.array(rows, dtype=np.float64, copy=True)
+        rows.flags.writeable = False
+        seq = self._seq[run.board]
+        self._seq[run.board] = seq + 1
+        block = SampleBlock(run, rows, seq, final)
+        history = self._history.get(run.board)
+        if history is not None:
+            history.append(block)
+        for subscription in self._subscriptions:
+            if subscription.wants(block):
+                subscription.offer(block)
+        self.published += 1
+        return block
+
+    def end_run(self, run: RunInfo) -> None:
+        """Publishes the final block of a run, the run is no longer listed as active."""
+        self.publish(run, np.empty((0, len(run.headers))), final=True)
+        with self._lock:
+            if self._runs.get(run.path) is run:
+                del self._runs[run.path]
+
+    def active_run(self, path: str) -> Optional[RunInfo]:
+        """The run currently writing path in this process, if any."""
+        return self._runs.get(path)
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        return {subscription.name: subscription.stats() for subscription in self._subscriptions}
+
+
+class RunFollower:
+    """
+    Rows of one active run from the bus, with the same poll() interface as
+    core.run_data.RunTail.
+
+    The first poll also returns catch_up.poll(), i.e. the rows written to the
+    file since it was loaded, merged with the replayed bus history; rows are
+    only returned once, in time order.
+    """
+
+    def __init__(self, run: RunInfo, catch_up=None, bus: Optional[SampleBus] = None):
+        self.run = run
+        self.path = run.path
+        self.metadata = run.metadata
+        self.headers = run.headers
+        self.finished = False
+        self._bus = bus or get_sample_bus()
+        self._catch_up = catch_up
+        self._last_time = -np.inf
+        self._subscription = self._bus.subscribe(f"follow {run.path}", boards=[run.board], replay=True)
+
+    def poll(self) -> np.ndarray:
+        parts = []
+        if self._catch_up is not None:
+            parts.append(self._catch_up.poll())
+            self._catch_up = None
+        for block in self._subscription.drain():
+            if block.run is self.run:
+                parts.append(block.rows)
+                self.finished = self.finished or block.final
+        parts = [part for part in parts if len(part)]
+        if not parts:
+            return np.empty((0, len(self.headers)))
+        rows = np.concatenate(parts)
+        time_column = rows[:, 0]
+        newest_before = np.maximum.accumulate(np.r_[self._last_time, time_column])[:-1]
+        rows = rows[time_column > newest_before]
+        if len(rows):
+            self._last_time = float(rows[-1, 0])
+        return rows
+
+    def close(self) -> None:
+        self._bus.unsubscribe(self._subscription)
+
+
+_global_sample_bus: Optional[SampleBus] = None
+_global_sample_bus_lock = threading.Lock()
+
+
+def get_sample_bus() -> SampleBus:
+    """Get the global sample bus instance."""
+    global _global_sample_bus
+    with _global_sample_bus_lock:
+        if _global_sample_bus is None:
+            _global_sample_bus = SampleBus()
+        return _global_sample_bus
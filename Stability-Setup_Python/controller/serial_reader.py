@@ -0,0 +1,215 @@
+# serial_reader.py
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from controller.binary_frames import BINARY_ACK, FrameDecoder
+from helper.global_helpers import get_logger
+
+# Upper bound for a single read call, keeps one read from holding the lock too long
+MAX_READ_BYTES = 4096
+# line after which the data of a measurement follows
+MEASUREMENT_STARTED = "Measurement Started"
+
+
+@dataclass
+class ThroughputCounter:
+    """Bytes and lines (text lines and binary frames) received on one serial port."""
+    port: str
+    bytes_total: int = 0
+    lines_total: int = 0
+    started: float = field(default_factory=time.monotonic)
+    last_activity: Optional[float] = None
+
+    def record(self, num_bytes: int, num_lines: int) -> None:
+        self.bytes_total += num_bytes
+        self.lines_total += num_lines
+        self.last_activity = time.monotonic()
+
+    @property
+    def elapsed(self) -> float:
+        return max(time.monotonic() - self.started, 1e-9)
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.bytes_total / self.elapsed
+
+    @property
+    def lines_per_second(self) -> float:
+        return self.lines_total / self.elapsed
+
+    def reset(self) -> None:
+        self.bytes_total = 0
+        self.lines_total = 0
+        self.started = time.monotonic()
+        self.last_activity = None
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "port": self.port,
+            "bytes_total": self.bytes_total,
+            "lines_total": self.lines_total,
+            "bytes_per_second": self.bytes_per_second,
+            "lines_per_second": self.lines_per_second,
+        }
+
+
+_port_counters: Dict[str, ThroughputCounter] = {}
+_port_counters_lock = threading.Lock()
+
+
+def get_port_throughput(port: str) -> ThroughputCounter:
+    """Get (or create) the throughput counter for a serial port."""
+    with _port_counters_lock:
+        if port not in _port_counters:
+            _port_counters[port] = ThroughputCounter(port)
+        return _port_counters[port]
+
+
+class SerialLineReader:
+    """
+    Blocking line reader for an open serial port.
+
+    Each call to read_lines blocks inside pyserial until at least one byte
+    arrives (or the port timeout expires), then drains whatever is waiting
+    and returns every complete line. Partial lines stay in the bytearray
+    buffer until their terminating newline arrives, so the calling thread
+    only wakes when there is data instead of polling in_waiting.
+
+    Once binary frames are started (start_frames, or expect_frames and the
+    board acknowledging them) the received bytes go through a FrameDecoder
+    first: the rows of the frames are collected for take_rows() and only
+    the text between them is split into lines.
+    """
+
+    def __init__(self, ser, port: str, lock: Optional[threading.Lock] = None):
+        self.ser = ser
+        self.port = port
+        self.lock = lock if lock is not None else threading.Lock()
+        self.counter = get_port_throughput(port)
+        self.decoder: Optional[FrameDecoder] = None
+        self._buffer = bytearray()
+        self._rows: List[np.ndarray] = []
+        # width of the frames requested from the board, until it starts the measurement
+        self._frame_width = 0
+        self._frames_acked = False
+
+    def expect_frames(self, width: int) -> None:
+        """
+        Binary frames of width columns were requested: switch to them after
+        the "Measurement Started" line if the board acknowledged them first,
+        keep reading text lines otherwise.
+        """
+        self.decoder = None
+        self._frame_width = width
+        self._frames_acked = False
+
+    def start_frames(self, width: int) -> None:
+        """Decode everything from the bytes buffered now on as binary frames of width columns."""
+        self.decoder = FrameDecoder(width)
+        self._frame_width = 0
+        pending = bytes(self._buffer)
+        self._buffer.clear()
+        self._decode_frames(pending)
+
+    def has_rows(self) -> bool:
+        return bool(self._rows)
+
+    def take_rows(self) -> Optional[np.ndarray]:
+        """The rows of the binary frames received since the last call, None if there were none."""
+        if not self._rows:
+            return None
+        rows = self._rows[0] if len(self._rows) == 1 else np.concatenate(self._rows)
+        self._rows.clear()
+        return rows
+
+    def read_lines(self) -> List[str]:
+        """
+        Wait for serial data and return the complete, stripped lines received.
+
+        Returns an empty list if the port timeout expired without a full line.
+        Raises serial.SerialException if the port fails.
+        """
+        with self.lock:
+            chunk = self.ser.read(min(max(1, self.ser.in_waiting), MAX_READ_BYTES))
+        return self.feed(chunk)
+
+    def feed(self, chunk: bytes) -> List[str]:
+        """
+        Add received bytes to the buffer and return the lines they complete,
+        the rows of completed binary frames are kept for take_rows().
+        """
+        if not chunk:
+            return []
+        frames = 0
+        if self.decoder is not None:
+            frames = self.decoder.frames_total
+            self._decode_frames(chunk)
+        else:
+            self._buffer += chunk
+        lines = self._split_lines()
+        if self.decoder is not None:
+            frames = self.decoder.frames_total - frames
+        self.counter.record(len(chunk), len(lines) + frames)
+        return lines
+
+    def _decode_frames(self, data: bytes) -> None:
+        rows, text = self.decoder.feed(data)
+        if len(rows):
+            self._rows.append(rows)
+        self._buffer += text
+
+    def _split_lines(self) -> List[str]:
+        if self._frame_width:
+            return self._split_until_frames()
+        end = self._buffer.rfind(b"\n")
+        if end < 0:
+            return []
+
+        raw_lines = self._buffer[:end].split(b"\n")
+        del self._buffer[: end + 1]
+
+        lines = []
+        for raw in raw_lines:
+            line = self._decode_line(raw)
+            if line:
+                lines.append(line)
+        return lines
+
+    def _split_until_frames(self) -> List[str]:
+        """Splits lines one by one while waiting for the measurement of expect_frames() to start."""
+        lines = []
+        while self._frame_width:
+            end = self._buffer.find(b"\n")
+            if end < 0:
+                return lines
+            line = self._decode_line(self._buffer[:end])
+            del self._buffer[: end + 1]
+            if not line:
+                continue
+            lines.append(line)
+            if BINARY_ACK in line:
+                self._frames_acked = True
+            elif MEASUREMENT_STARTED in line:
+                if self._frames_acked:
+                    self.start_frames(self._frame_width)
+                self._frame_width = 0
+        return lines + self._split_lines()
+
+    @staticmethod
+    def _decode_line(raw) -> str:
+        try:
+            return raw.decode("utf-8").strip()
+        except UnicodeDecodeError as e:
+            get_logger().log(f"Unicode decode error: {e}. Line: {bytes(raw)}")
+            return ""  # Skip corrupted line
+
+    def clear(self) -> None:
+        """Drop any partially received line or frame and go back to text lines."""
+        self._buffer.clear()
+        self._rows.clear()
+        self.decoder = None
+        self._frame_width = 0
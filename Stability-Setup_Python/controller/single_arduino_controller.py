@@ -4,7 +4,21 @@ from email import header
 from fileinput import filename
 from constants import Mode, Constants
 from data_visualization import data_plotter
-from helper.global_helpers import get_logger
+from helper.global_helpers import get_logger, DATA
+from controller.acquisition_buffer import header_for_mode
+from core.row_buffer import AcquisitionBuffer
+from controller.serial_reader import SerialLineReader, get_port_throughput
+from controller.binary_frames import BINARY_ACK
+from controller.parameter_block import START_COMMAND, StartBarrier, block_reply, encode_block
+from controller.baud_negotiation import negotiate_baud_rate
+from controller.device_registry import DeviceRecord, get_device_registry
+from controller.mppt_compressor import compressed_path_for
+from controller.run_writer import get_run_writer
+from controller.run_clock import RUN_EPOCH, START_OFFSET, BoardClock, RunClock
+from controller.run_journal import RecoveredRun
+from controller.sample_bus import get_sample_bus
+from core.run_data import load_run
+from core.config_manager import ArduinoConfig
 import serial
 import time
 from datetime import datetime
@@ -15,6 +29,7 @@ import matplotlib.pyplot as plt
 import threading
 import copy
 import logging
+from typing import Optional
 
 class SingleController:
     def __init__(
@@ -23,6 +38,7 @@ class SingleController:
         trial_name: str,
         trial_dir: str,
         arduino_ids,
+        link_config: Optional[ArduinoConfig] = None,
     ) -> None:
         """
         Parameters
@@ -30,15 +46,17 @@ class SingleController:
         COM : str
             com port to communicate with arduino
             typically "COM5" or "COM3"
-            serial rate to communicate with arduino
-            set to 115200 in arduino code
+        link_config : ArduinoConfig
+            serial rate the arduino boots at (115200 in arduino code)
+            and the faster rates negotiated after connecting
         """
         self.port = COM
         self.ser = None
         self.reading_lock = threading.Lock()
         self.write_lock = threading.Lock()
         self.should_run = True
-        self.baud_rate = 115200
+        self.link_config = link_config if link_config is not None else ArduinoConfig()
+        self.baud_rate = self.link_config.baud_rate
         self.run_finished = False
         self.arduino_ids = arduino_ids
 
@@ -46,6 +64,11 @@ class SingleController:
         self.scan_filepath = None
         self.file_path = ""
         self.mppt_compressed_file_path = ""
+        # the run on the sample bus and how many rows of self.buffer were published
+        self.bus_run = None
+        self._published_rows = 0
+        # the run ended by the last "Done!", see _handle_line
+        self.ended_run = None
 
         self.HW_ID = 0
         self.arduinoID = Constants.unknown_Arduino_ID
@@ -56,44 +79,196 @@ class SingleController:
 
         self.scan_arr_width = 0
         self.mppt_arr_width = 0
+        self.buffer = None
+        self.reader = None
+        # the board acknowledged binary data frames for the current run
+        self.binary_frames = False
+        # the board is connected and idle, waiting for parameters (controller/controller_pool.py)
+        self.ready = False
+        # set by MultiController for the next run, so all boards start together
+        self.start_barrier: Optional[StartBarrier] = None
+        # set by MultiController for the next run, shared by its boards (controller/run_clock.py)
+        self.run_clock: Optional[RunClock] = None
+        # maps the times of the current run onto its run clock
+        self.clock: Optional[BoardClock] = None
 
     def connect(self):
-        failed_connect = False
+        """
+        Connects to the arduino on self.port. A board known to the device
+        registry is asked for its HW_ID without a reset first (fast_connect),
+        others are reset and must boot within Constants.connect_timeout_s.
+
+        Returns (HW_ID, Arduino ID), () if the connection failed
+        """
+        # a controller kept by the pool (controller/controller_pool.py) may still hold its port
+        self.disconnect()
+        record = get_device_registry().lookup(self.port)
+        if record is not None and self.fast_connect(record):
+            return (self.HW_ID, self.arduinoID)
+
+        deadline = time.monotonic() + Constants.connect_timeout_s
         try:
-            self.ser = serial.Serial(self.port, self.baud_rate, timeout=1)
+            # serial_for_url also opens simulated boards (sim://, see board_emulator.py)
+            self.ser = serial.serial_for_url(self.port, self.baud_rate, timeout=1)
             self.reset_arduino()
             # time.sleep(0.5)
-            done = False
-            while not done:
+            boot_result = None
+            while boot_result is None and time.monotonic() < deadline:
                 with self.reading_lock:
-                    line = self.ser.readline().decode().strip()
+                    line = self.ser.readline().decode(errors="replace").strip()
                     # line = self.ser.readline().decode('unicode_escape').rstrip()
-                    if line:
-                        get_logger().log(
-                            f"Boot Stage Arduino {self.arduinoID} Output:", line
-                        )
-                    if "HW_ID" in line:
-                        self.HW_ID = line.split(":")[-1]
-                        if self.HW_ID in self.arduino_ids:
-                            self.arduinoID = str(self.arduino_ids[self.HW_ID])
-                    elif "Arduino Ready" in line:
-                        done = True
-                    elif "Sensor Initialization Failed." in line:
-                        done = True
-                        failed_connect = True
+                    boot_result = self._handle_boot_line(line)
+            if boot_result is None:
+                get_logger().log(f"No boot banner on {self.port} within {Constants.connect_timeout_s} s")
+            failed_connect = not boot_result
             self.ser.reset_input_buffer()
+            if not failed_connect:
+                self.negotiate_baud_rate()
 
         except serial.SerialException as e:
             get_logger().log(f"Failed to connect to {self.port}. Error: {e}")
             return ()
         if failed_connect:
             get_logger().log(f"Arduino Connection to {self.arduinoID} Failed. Disconnecting...")
+            get_device_registry().forget(self.port)
             self.disconnect()
             return ()
         else:
+            self.remember_device()
+            self.ready = True
             return (self.HW_ID, self.arduinoID)
 
+    def fast_connect(self, record: DeviceRecord) -> bool:
+        """
+        Connects to the board last seen on self.port without resetting it:
+        opens the port with DTR deasserted at the rate the link was left at
+        and sends "id", an idle board answers with its HW_ID and
+        "Arduino Ready". Boards that are measuring, were power cycled or run
+        older firmware do not answer within Constants.fast_connect_timeout_s.
+
+        Returns True if connected, otherwise the port is closed again
+        """
+        connected = False
+        try:
+            self.ser = serial.serial_for_url(self.port, record.baud_rate, timeout=0.05, do_not_open=True)
+            self.ser.dtr = False
+            self.ser.open()
+            self.ser.reset_input_buffer()
+            with self.write_lock:
+                self.ser.write(b"id\n")
+            connected = bool(self._read_id_answer())
+            if connected:
+                self.ser.timeout = 1
+                if self.ser.baudrate == self.baud_rate:
+                    self.negotiate_baud_rate()
+                self.ser.reset_input_buffer()
+        except serial.SerialException as e:
+            get_logger().log(f"Fast connect to {self.port} failed. Error: {e}")
+            connected = False
+
+        if not connected:
+            get_logger().log(f"No answer without a reset on {self.port}, resetting the arduino")
+            self.disconnect()
+            return False
+        if self.HW_ID != record.hw_id:
+            get_logger().log(f"{self.port} now has arduino {self.HW_ID} (was {record.hw_id})")
+        get_logger().log(f"Connected to arduino {self.arduinoID} on {self.port} without a reset")
+        self.remember_device()
+        self.ready = True
+        return True
+
+    def _read_id_answer(self) -> Optional[bool]:
+        """
+        _handle_boot_line() of the answer to "id", None if the board did not
+        answer within Constants.fast_connect_timeout_s. Needs a short port timeout.
+        """
+        # the short timeout returns partial lines, the reader keeps them until they are complete
+        reader = SerialLineReader(self.ser, self.port, self.reading_lock)
+        deadline = time.monotonic() + Constants.fast_connect_timeout_s
+        while time.monotonic() < deadline:
+            for line in reader.read_lines():
+                boot_result = self._handle_boot_line(line)
+                if boot_result is not None:
+                    return boot_result
+        return None
+
+    def check_idle(self) -> bool:
+        """
+        Asks a connected board that should be idle for its HW_ID with "id",
+        as fast_connect does. A board that is measuring, or runs firmware
+        without "id" (which also keeps the parameters of its last run and
+        would ignore the next ones), does not answer and is marked not ready.
+        """
+        hw_id = self.HW_ID
+        idle = False
+        try:
+            timeout, self.ser.timeout = self.ser.timeout, 0.05
+            try:
+                self.ser.reset_input_buffer()
+                with self.write_lock:
+                    self.ser.write(b"id\n")
+                idle = bool(self._read_id_answer()) and self.HW_ID == hw_id
+            finally:
+                self.ser.timeout = timeout
+        except serial.SerialException as e:
+            get_logger().log(f"Communication error on {self.port}. Error: {e}")
+        if not idle:
+            get_logger().log(f"ARDUINO {self.arduinoID} on {self.port} is not idle, connecting it again")
+            self.ready = False
+        return idle
+
+    def remember_device(self):
+        """Records the connected board and its link rate in the device registry."""
+        get_device_registry().remember(self.port, self.HW_ID, self.ser.baudrate)
+
+    def _handle_boot_line(self, line: str):
+        """
+        Processes one line printed by the arduino while it boots.
+
+        Returns
+        -------
+        None while booting, True once the arduino is ready,
+        False if its sensors failed to initialize
+        """
+        if line:
+            get_logger().log(
+                f"Boot Stage Arduino {self.arduinoID} Output:", line
+            )
+        if "HW_ID" in line:
+            self.HW_ID = line.split(":")[-1]
+            if self.HW_ID in self.arduino_ids:
+                self.arduinoID = str(self.arduino_ids[self.HW_ID])
+        elif "Arduino Ready" in line:
+            return True
+        elif "Sensor Initialization Failed." in line:
+            return False
+        return None
+
+    def negotiate_baud_rate(self) -> int:
+        """
+        Switches the link of the freshly booted arduino to the fastest rate of
+        self.link_config.baud_rates that passes the link check
+        (controller/baud_negotiation.py), returns the rate in use.
+        """
+        with self.reading_lock, self.write_lock:
+            return negotiate_baud_rate(self.ser, self.link_config.baud_rates, self.baud_rate, self.port)
+
+    def set_trial(self, trial_name: str, trial_dir: str, arduino_ids, link_config: Optional[ArduinoConfig] = None):
+        """Points a connected controller at a new trial, the Arduino ID follows the new arduino_ids."""
+        self.trial_name = trial_name
+        self.trial_dir = trial_dir
+        self.arduino_ids = arduino_ids
+        if link_config is not None:
+            # the rates apply from the next handshake
+            self.link_config = link_config
+            self.baud_rate = link_config.baud_rate
+        if self.HW_ID in arduino_ids:
+            self.arduinoID = str(arduino_ids[self.HW_ID])
+        else:
+            self.arduinoID = Constants.unknown_Arduino_ID
+
     def disconnect(self):
+        self.ready = False
         if self.ser is not None:
             self.ser.close()
             self.ser = None
@@ -102,19 +277,23 @@ class SingleController:
         """
         Resets the specified Arduino by toggling the DTR signal.
         """
+        self.ready = False
         try:
             if self.ser and self.ser.is_open:
                 self.ser.setDTR(False)
                 time.sleep(0.1)  # Wait for 100ms
+                # the arduino boots at the boot rate again
+                self.ser.baudrate = self.baud_rate
                 self.ser.setDTR(True)
+                if self.HW_ID:
+                    self.remember_device()
                 get_logger().log(f"Arduino has been reset.")
             else:
                 get_logger().log(f"Arduino is not connected.")
         except Exception as e:
             get_logger().log(f"Failed to reset Arduino: {e}")
 
-    def _send_command(self, mode, params:dict[str, str]):
-        measurement_started = False
+    def _build_commands(self, mode, params:dict[str, str]) -> list[str]:
         # Create commands array to send to arduino one by one
         # This is for easier management and less variables on arduino side
         # add "\n" to indicate end of command
@@ -130,34 +309,149 @@ class SingleController:
                 commands.append(translated_key + "," + vset_arr + '\n')
             else:
                 commands.append(translated_key + "," + str(params[key]) + '\n')
+        if Constants.serial_binary_frames:
+            commands.append(Constants.binary_frames_command)
         commands.append("done \n")
+        return commands
+
+    def _start_measurement(self, mode, params: dict[str, str]) -> bool:
+        """
+        Sends the run to the board. A board that does not start it (older
+        firmware still holding the last run, a lost link) is connected again
+        and gets the run once more, without the start barrier.
+
+        Returns True once the board reports "Measurement Started"
+        """
+        if self._send_command(mode, params):
+            return True
+        if not self.should_run:
+            return False
+        get_logger().log(f"ARDUINO {self.arduinoID} did not start the measurement within "
+                         f"{Constants.measurement_start_timeout_s} s, connecting it again")
+        if self.connect() and self._send_command(mode, params):
+            return True
+        get_logger().log(f"ARDUINO {self.arduinoID} did not start the measurement, leaving it out of this run")
+        return False
+
+    def _send_command(self, mode, params:dict[str, str]) -> bool:
+        """Uploads the parameters and starts the run, returns True once the board reports it started."""
+        measurement_started = False
+        self.binary_frames = False
+        self.ready = False
+        commands = self._build_commands(mode, params)
+        # the last command ("done") starts the run
+        start_command = commands.pop()
         line = ""
         get_logger().log("Sending Commands to Arduino: ", commands)
-        while commands:
-            try:
-                with self.write_lock:
-                    command = commands.pop(0)
-                    self.ser.write(command.encode())  # send data to arduino
-                    # get_logger().log(f"Sent to Arduino: {command}")
-                    time.sleep(0.1)
-            except serial.SerialException as e:
-                get_logger().log(f"Communication error on {self.port}. Error: {e}")
-                break
+        try:
+            if Constants.serial_parameter_blocks and self._upload_block(commands):
+                start_command = START_COMMAND
+            else:
+                self._upload_lines(commands)
+        except serial.SerialException as e:
+            get_logger().log(f"Communication error on {self.port}. Error: {e}")
 
-        while not measurement_started:
+        barrier, self.start_barrier = self.start_barrier, None
+        if barrier is not None:
+            barrier.wait(lambda: self._send_start(start_command))
+        else:
+            self._send_start(start_command)
+
+        # a stop resets the board, which then never starts the measurement
+        deadline = time.monotonic() + Constants.measurement_start_timeout_s
+        while self.should_run and not measurement_started and time.monotonic() < deadline:
             try:
                 with self.reading_lock:
-                    line = self.ser.readline().decode().strip()
+                    line = self.ser.readline().decode(errors="replace").strip()
                     # line = self.ser.readline().decode('unicode_escape').rstrip()
                     get_logger().log(f"INIT STAGE ARDUINO {self.arduinoID} OUTPUT:", line)
+                    if BINARY_ACK in line:
+                        self.binary_frames = True
                     if "Measurement Started" in line:
+                        self.clock.started()
                         measurement_started = True
             except serial.SerialException as e:
                 get_logger().log(f"Communication error on {self.port}. Error: {e}")
                 break
 
+        # the data follows "Measurement Started", as frames if the board acknowledged them
+        self.reader = SerialLineReader(self.ser, self.port, self.reading_lock)
+        if self.binary_frames:
+            self.reader.start_frames(len(header_for_mode(mode)))
+        return measurement_started
+
+    def _send_start(self, command: str):
+        # the run clock starts with the first board of the run
+        self.clock.run.mark_start()
+        try:
+            with self.write_lock:
+                self.ser.write(command.encode())
+        except serial.SerialException as e:
+            get_logger().log(f"Communication error on {self.port}. Error: {e}")
+
+    def _upload_lines(self, commands: list[str]):
+        """Sends the parameter lines one by one, for firmware without parameter blocks."""
+        for command in commands:
+            with self.write_lock:
+                self.ser.write(command.encode())  # send data to arduino
+                # get_logger().log(f"Sent to Arduino: {command}")
+                time.sleep(0.1)
+
+    def _upload_block(self, commands: list[str]) -> bool:
+        """
+        Sends the parameter lines as one block (controller/parameter_block.py),
+        returns False if the board did not accept it.
+        """
+        header, payload = encode_block(commands)
+        with self.write_lock:
+            self.ser.write(header)
+        accepted = self._read_block_reply()
+        if accepted:
+            with self.write_lock:
+                self.ser.write(payload)
+            accepted = self._read_block_reply()
+        if not accepted:
+            get_logger().log(f"ARDUINO {self.arduinoID} did not take the parameter block, sending the lines one by one")
+        return bool(accepted)
+
+    def _read_block_reply(self) -> Optional[bool]:
+        """block_reply() of the board's answer, None if there was none in time."""
+        deadline = time.monotonic() + Constants.parameter_block_timeout_s
+        while time.monotonic() < deadline:
+            with self.reading_lock:
+                line = self.ser.readline().decode(errors="replace").strip()
+            if not line:
+                continue
+            get_logger().log(f"INIT STAGE ARDUINO {self.arduinoID} OUTPUT:", line)
+            if BINARY_ACK in line:
+                self.binary_frames = True
+            reply = block_reply(line)
+            if reply is not None:
+                return reply
+        return None
+
+    def _begin_run(self):
+        """Takes the run clock MultiController set for this run, or starts one for this board alone."""
+        run_clock, self.run_clock = self.run_clock, None
+        if run_clock is None:
+            run_clock = RunClock(self.date)
+        self.date = run_clock.date
+        self.clock = BoardClock(run_clock)
+
     def scan(self, params: dict[str, str]):
         get_logger().log("Scan Initiated")
+        self._begin_run()
+        run_params, header_arr = self._prepare_scan(params)
+
+        # Run measurement
+        if not self._start_measurement(Mode.SCAN, run_params):
+            return
+        self._create_array(run_params, header_arr)
+        self._save_data()
+        self._read_data()
+
+    def _prepare_scan(self, params: dict[str, str]):
+        """Sets up the scan file path and mode, returns (params, header_arr) for the run."""
 
         LIGHT_STATUS = params[Constants.scan_mode_param]
         if LIGHT_STATUS == 0:
@@ -182,22 +476,27 @@ class SingleController:
         get_logger().log(f"Starting scan with parameters: {params}")
 
         # Create header array
-        voltage_lambda = lambda value: "Pixel_" + str(value + 1) + " V"
-        amperage_lambda = lambda value: "Pixel_" + str(value + 1) + " mA"
-        header_arr = ["Time", "Voltage_Applied"]
-        header_arr.extend(
-            [f(value) for value in range(8) for f in (voltage_lambda, amperage_lambda)]
-        )
-        header_arr.append("ARUDUINOID")
+        header_arr = header_for_mode(Mode.SCAN)
         self.scan_arr_width = len(header_arr)
+        return params, header_arr
+
+    def mppt(self, params: dict[str, str]):
+        self._begin_run()
+        copied_params, header_arr = self._prepare_mppt(params)
 
         # Run measurement
-        self._send_command(Mode.SCAN, params)
-        self._create_array(params, header_arr)
+        get_logger().log(f"Starting MPPT with parameters:  {copied_params}")
+        if not self._start_measurement(Mode.MPPT, copied_params):
+            return
+        self._create_array(copied_params, header_arr)
         self._save_data()
         self._read_data()
 
-    def mppt(self, params: dict[str, str]):
+    def _prepare_mppt(self, params: dict[str, str]):
+        """
+        Sets up the mppt file paths and starting voltages,
+        returns (params, header_arr) for the run.
+        """
         file_name_base = (
             self.date
             + self.trial_name
@@ -209,7 +508,7 @@ class SingleController:
         multiplier = float(params["Starting Voltage Multiplier (%)"])
 
         self.file_path = os.path.join(self.trial_dir, file_name_base+ "mppt.csv")
-        self.mppt_compressed_file_path = os.path.join(self.trial_dir, file_name_base+ "compressedmppt.csv")
+        self.mppt_compressed_file_path = compressed_path_for(self.file_path)
 
         self.mode = Mode.MPPT
         copied_params = copy.deepcopy(params)
@@ -226,24 +525,12 @@ class SingleController:
         copied_params[Constants.mppt_voltage_range_param] = starting_V
 
         # Create header array
-        voltage_lambda = lambda value: "Pixel_" + str(value + 1) + " V"
-        amperage_lambda = lambda value: "Pixel_" + str(value + 1) + " mA"
-        header_arr = ["Time"]
-        header_arr.extend(
-            [f(value) for value in range(8) for f in (voltage_lambda, amperage_lambda)]
-        )
-        header_arr.append("ARUDUINOID")
+        header_arr = header_for_mode(Mode.MPPT)
         self.mppt_arr_width = len(header_arr)
-
-        # Run measurement
-        get_logger().log(f"Starting MPPT with parameters:  {copied_params}")
-        self._send_command(Mode.MPPT, copied_params)
-        self._create_array(copied_params, header_arr)
-        self._save_data()
-        self._read_data()
+        return copied_params, header_arr
 
     def _create_array(self, params, header_arr):
-        num_params = len(params) + 2
+        num_params = len(params) + 4
         self.arr = np.empty([num_params, len(header_arr)], dtype="object")
         for idx, key in enumerate(params):
             self.arr[idx][0] = key
@@ -254,114 +541,243 @@ class SingleController:
                 value_to_store = params[key]
             self.arr[idx][1] = value_to_store
 
-        self.arr[num_params - 2][0] = "Start Date"
-        self.arr[num_params - 2][1] = self.date
+        self.arr[num_params - 4][0] = "Start Date"
+        self.arr[num_params - 4][1] = self.date
+        # the Time column counts from the epoch shared by the boards of the run
+        self.arr[num_params - 3][0] = RUN_EPOCH
+        self.arr[num_params - 3][1] = self.clock.run.epoch()
+        self.arr[num_params - 2][0] = START_OFFSET
+        self.arr[num_params - 2][1] = f"{self.clock.start_offset or 0.0:.6f}"
         self.arr[num_params - 1] = header_arr
+        self.buffer = AcquisitionBuffer(len(header_arr))
+        self._start_run()
+
+    def _start_run(self, resume: Optional[RecoveredRun] = None):
+        """Announces the run on the sample bus and has the run writer write (or continue) its files."""
+        self._published_rows = 0
+        self.bus_run = get_sample_bus().start_run(
+            self.arduinoID, self.mode, self.file_path, self._metadata(), list(self.arr[-1])
+        )
+        device = {
+            "port": self.port,
+            "hw_id": str(self.HW_ID),
+            "data_format": "binary" if self.binary_frames else "text",
+            "baud_rate": self.ser.baudrate if self.ser is not None else self.baud_rate,
+        }
+        get_run_writer().start_run(self.bus_run, self.arr, device=device, resume=resume)
+
+    def attach(self, recovered: RecoveredRun) -> Optional[bool]:
+        """
+        Opens the port of a board that may still be measuring a run recovered
+        from its journal (controller/run_journal.py), without the DTR reset
+        connect() does, and waits for a data line of that board.
+
+        Returns
+        -------
+        True once the board sends data again (kept in self.buffer for resume()),
+        False if it rebooted or finished the run, None if it did not answer
+        within Constants.resume_attach_timeout_s
+        """
+        self.HW_ID = recovered.hw_id
+        self.arduinoID = recovered.board
+        self.mode = recovered.mode
+        self.file_path = recovered.path
+        self.binary_frames = recovered.device.get("data_format") == "binary"
+        self.buffer = AcquisitionBuffer(len(recovered.headers))
+        try:
+            # the link still runs at the rate negotiated when the run started
+            baud_rate = int(recovered.device.get("baud_rate", self.baud_rate))
+            self.ser = serial.serial_for_url(self.port, baud_rate, timeout=1, do_not_open=True)
+            # opening with DTR asserted would reset the board
+            self.ser.dtr = False
+            self.ser.open()
+        except serial.SerialException as e:
+            get_logger().log(f"Failed to attach to {self.port}. Error: {e}")
+            self.ser = None
+            return None
+
+        self.reader = SerialLineReader(self.ser, self.port, self.reading_lock)
+        if self.binary_frames:
+            self.reader.start_frames(len(recovered.headers))
+        unique_id = int(self.HW_ID, 16) if self.HW_ID else None
+        deadline = time.monotonic() + Constants.resume_attach_timeout_s
+        try:
+            while time.monotonic() < deadline:
+                lines = self.reader.read_lines()
+                rows = self.reader.take_rows()
+                if rows is not None:
+                    self.buffer.append_rows(rows)
+                for line in lines:
+                    if "HW_ID" in line or "Arduino Ready" in line or "Done!" in line:
+                        get_logger().log(f"ARDUINO {self.arduinoID} is no longer measuring {self.file_path}: {line}")
+                        return False
+                    self.buffer.append_line(line)
+                if len(self.buffer):
+                    if unique_id is None or self.buffer.view()[-1, -1] == unique_id:
+                        get_logger().log(f"Attached to ARDUINO {self.arduinoID} on {self.port}, resuming {self.file_path}")
+                        return True
+                    self.buffer.clear()
+        except serial.SerialException as e:
+            get_logger().log(f"Communication error on {self.port}. Error: {e}")
+            return None
+        get_logger().log(f"ARDUINO {self.arduinoID} on {self.port} sent no data within "
+                         f"{Constants.resume_attach_timeout_s} s")
+        return None
+
+    def resume(self, recovered: RecoveredRun):
+        """Continues a recovered run in its files after attach() returned True."""
+        if self.mode == Mode.SCAN:
+            self.scan_filepath = self.file_path
+        self.arr = np.empty([len(recovered.metadata) + 1, len(recovered.headers)], dtype="object")
+        for idx, (key, value) in enumerate(recovered.metadata.items()):
+            self.arr[idx][0] = key
+            self.arr[idx][1] = value
+        self.arr[-1] = recovered.headers
+        # runs written before the run clock keep the board times
+        run_clock = RunClock.from_metadata(recovered.metadata)
+        self.clock = None
+        if run_clock is not None:
+            start_offset = float(recovered.metadata.get(START_OFFSET, 0.0))
+            self.clock = BoardClock(run_clock, start_offset, not_before=recovered.last_time)
+        self._start_run(resume=recovered)
+        self._read_data()
 
     def _read_data(self):
         """
-        Reads data from the serial bus with a timeout.
+        Reads data from the serial bus, waking only when bytes arrive
+        (or the port timeout expires so should_run is re-checked).
         """
         self.run_finished = False
-        start_time = time.time()
+        if self.reader is None or self.reader.ser is not self.ser:
+            self.reader = SerialLineReader(self.ser, self.port, self.reading_lock)
 
         while self.should_run:
             try:
-                with self.reading_lock:
-                    if self.ser.in_waiting > 0:
-                        line = self.ser.readline().decode("utf-8").strip()
-                        if not line:
-                            continue
+                lines = self.reader.read_lines()
+            except serial.SerialException as e:
+                get_logger().log(f"Communication error on {self.port}. Error: {e}")
+                self._wait_for_run_files(self._abandon_run())
+                self.run_finished = True
+                return
 
-                        get_logger().log(f"ARDUINO{self.arduinoID}: {line}")
+            self._handle_rows(self.reader.take_rows())
+            for line in lines:
+                if self._handle_line(line):
+                    self._wait_for_run_files(self.ended_run)
+                    self.ready = True
+                    self.ser.flush()
+                    self.run_finished = True
+                    return
+            self._publish_rows()
+
+        self._finish_run()  # Save any partial data
+        self.run_finished = True
 
-                        if "Done!" in line:
-                            self._save_data()
-                            self.ser.flush()
-                            self.run_finished = True
-                            return
+    def _handle_line(self, line: str) -> bool:
+        """
+        Processes one line received during a measurement.
 
-                        data_list = line.split(",")
-                        if len(data_list) > 13:
-                            self.arr = np.append(
-                                self.arr, np.array([data_list], dtype="object"), axis=0
-                            )
+        Returns
+        -------
+        bool
+            True once the arduino reports the measurement is done
+        """
+        get_logger().logf("ARDUINO%s: %s", self.arduinoID, line, category=DATA)
 
-                        if self.arr.shape[0] > Constants.line_per_save:
-                            self._save_data()
+        if "Done!" in line:
+            # the caller waits for the files of self.ended_run and marks the board ready
+            self.ended_run = self._end_run()
+            return True
 
-            except serial.SerialException as e:
-                get_logger().log(f"Communication error on {self.port}. Error: {e}")
-                self.run_finished = True
-                return
-            except UnicodeDecodeError as e:
-                get_logger().log(f"Unicode decode error: {e}. Line: {line}")
-                continue  # Skip corrupted line
+        self.buffer.append_line(line)
 
-            time.sleep(0.01)  # Prevent busy-waiting
+        if len(self.buffer) >= Constants.line_per_save:
+            self._save_data()
+        return False
 
-        self._save_data()  # Save any partial data
-        self.run_finished = True
+    def _handle_rows(self, rows: Optional[np.ndarray]):
+        """Processes the rows of binary data frames (controller/binary_frames.py) received during a measurement."""
+        if rows is None:
+            return
+        get_logger().logf("ARDUINO%s: %d frames, last: %s", self.arduinoID, len(rows), rows[-1], category=DATA)
+        self.buffer.append_rows(rows)
+
+        if len(self.buffer) >= Constants.line_per_save:
+            self._save_data()
 
     def _save_data(self) -> str:
         """
-        - saves numpy array to csv file with the option to save at different time intervals
-        - wipes self.arr to reduce memory usage
+        - publishes the buffered rows on the sample bus, the run writer thread
+          (controller/run_writer.py) appends them to the csv, binary and
+          compressed mppt files without blocking this thread
+        - clears self.buffer so its storage is reused for the next block
 
         Returns
         -------
         file_name
-            file_name for file that was just saved
-        """
-        if not os.path.exists(self.file_path):
-            np.savetxt(self.file_path, self.arr, delimiter=",", fmt="%s")
-            if self.mode == Mode.SCAN:
-                self.arr = np.empty([1, self.scan_arr_width], dtype="object")
-            elif self.mode == Mode.MPPT:
-                np.savetxt(self.mppt_compressed_file_path, self.arr, delimiter=",", fmt="%s")
-                self.arr = np.empty([1, self.mppt_arr_width], dtype="object")
-        else:
-            with open(self.file_path, "ab") as f:
-                np.savetxt(f, self.arr[1:, :], delimiter=",", fmt="%s")
-            if self.mode == Mode.SCAN:
-                self.arr = np.empty([1, self.scan_arr_width], dtype="object")
-            elif self.mode == Mode.MPPT:
-                float_array = self.arr[1:, :].astype(float)
-                result_array = np.nan_to_num(float_array, nan=0.0)
-                avg_array = np.mean(result_array, axis=0)[np.newaxis,:]
-                with open(self.mppt_compressed_file_path, "ab") as f:
-                    np.savetxt(f, avg_array.astype(str), delimiter=",", fmt="%s")
+            file_name of the run the rows belong to
+        """
+        self._publish_rows()
+        self.buffer.clear()
+        self._published_rows = 0
+
+        get_logger().logf("ARDUINO %s QUEUED DATA", self.arduinoID, category=DATA)
+        return self.file_path
+
+    def _publish_rows(self):
+        """Moves the rows parsed since the last call onto the run clock and publishes them on the sample bus."""
+        if self.bus_run is None:
+            return
+        rows = self.buffer.view()[self._published_rows:]
+        if len(rows):
+            if self.clock is not None:
+                self.clock.stamp(rows[:, 0])
+            get_sample_bus().publish(self.bus_run, rows)
+            self._published_rows = len(self.buffer)
+
+    def _metadata(self) -> dict[str, str]:
+        """The metadata rows of self.arr as a dict."""
+        return {str(row[0]): str(row[1]) for row in self.arr[:-1]}
+
+    def _finish_run(self):
+        """Ends the run and waits for its files, once the measurement is over."""
+        self._wait_for_run_files(self._end_run())
+
+    def _end_run(self):
+        """Publishes the remaining buffered rows and ends the run on the sample bus, returns the run (None without one)."""
+        self._save_data()
+        if self.bus_run is None:
+            return None
+        run, self.bus_run = self.bus_run, None
+        get_sample_bus().end_run(run)
+        return run
 
-                self.arr = np.empty([1, self.mppt_arr_width], dtype="object")
+    def _abandon_run(self):
+        """
+        Like _end_run(), for a run cut off by a communication error: its files
+        are closed without ending it in its journal, so it can be recovered
+        (controller/run_journal.py). Returns the run (None without one).
+        """
+        if self.bus_run is not None:
+            get_run_writer().abandon(self.bus_run)
+        return self._end_run()
 
-        get_logger().log(f"ARDUINO {self.arduinoID} SAVED DATA")
+    def _wait_for_run_files(self, run):
+        """
+        Waits until the run writer has written and closed the files of a run
+        ended by _end_run(). This blocks, the asyncio backend calls it in an
+        executor so the other boards on its loop are still read.
+        """
+        if run is None:
+            return
+        if not get_run_writer().wait(run, Constants.run_writer_finish_timeout_s):
+            get_logger().log(f"ARDUINO {self.arduinoID}: run files still being written after "
+                             f"{Constants.run_writer_finish_timeout_s} s: {run.path}")
 
     def find_vmpp(self, scan_file_name):
-        arr = np.loadtxt(scan_file_name, delimiter=",", dtype=str)
-        scan_file_name = scan_file_name.split("\\")
-        # get_logger().log(arr)
-        headers = arr[6, :]
-        headerDict = {value: index for index, value in enumerate(headers)}
-        # get_logger().log(headerDict)
-        arr = arr[7:, :]
-        length = len(headers) - 1
-        # get_logger().log(length)
-
-        jv_list = []
-
-        for i in range(2, length):
-            jv_list.append(arr[:, i])
-
-        j_list = []  # current
-        v_list = []  # voltage
-        for i in range(0, len(jv_list), 2):
-            # get_logger().log(i)
-            j_list.append([float(j) for j in jv_list[i + 1]])
-            v_list.append([float(x) for x in jv_list[i]])
-            # jv_list[i+1] = [float(x) / 0.128 for x in jv_list[i+1]]
-
-        j_list = np.array(j_list).T
-        v_list = np.array(v_list).T
+        run = load_run(scan_file_name)
+        j_list = run.pixel_mA  # current
+        v_list = np.round(run.pixel_V, 4)  # voltage, binary run files store it as float32
         pceList = j_list * v_list
         vmpp_encode_string = ""
         max_V_idx = np.argmax(pceList, axis=0)  # find index of max pce value
@@ -378,19 +794,10 @@ class SingleController:
         return vmpp_encode_string
 
     def find_starting_voltage(self, scan_filename, multiplier):
-        arr = np.loadtxt(scan_filename, delimiter=",", dtype=str)
-        header_row = np.where(arr == "Time")[0][0]
-
-        meta_data = {}
-        for data in arr[:header_row, :2]:
-            meta_data[data[0]] = data[1]
+        run = load_run(scan_filename)
 
-        arr = arr[header_row + 1 :, :]
-
-        data = arr[:, 2:-1]
-
-        pixel_V = data[:, ::2][:, ::-1].astype(float)
-        pixel_mA = data[:, 1::2][:, ::-1].astype(float)
+        pixel_V = run.pixel_V[:, ::-1]
+        pixel_mA = run.pixel_mA[:, ::-1]
         voc = []
         for pixel_idx in range(8):
             voc_idx = min(
@@ -403,6 +810,10 @@ class SingleController:
 
         return voc
 
+    def get_throughput(self):
+        """Bytes/lines received on this controller's port since it was first read."""
+        return get_port_throughput(self.port).snapshot()
+
     def printTime(self):
         end = time.time()
         total_time = end - self.start
@@ -7,7 +7,7 @@ Replaces scattered JSON loading throughout the application.
 import json
 import os
 from pathlib import Path
-from typing import Dict, Any, Optional, Union
+from typing import Dict, Any, List, Optional, Union
 from dataclasses import dataclass, field
 from helper.global_helpers import get_logger
 
@@ -27,7 +27,9 @@ class EmailConfig:
 class ArduinoConfig:
     """Arduino configuration settings."""
     ids: Dict[str, int] = field(default_factory=dict)
+    # rate the boards boot at, and faster rates offered after connecting (fastest that passes the link check wins)
     baud_rate: int = 115200
+    baud_rates: List[int] = field(default_factory=lambda: [2000000, 1000000, 500000, 250000])
     timeout: float = 1.0
     
     def get_arduino_id(self, hw_id: str) -> Optional[int]:
@@ -112,6 +114,9 @@ class ConfigManager:
         # Arduino settings
         arduino_data = data.get("arduino_ids", {})
         self.arduino.ids = {str(k): int(v) for k, v in arduino_data.items()}
+        link_data = data.get("arduino_settings", {})
+        self.arduino.baud_rate = int(link_data.get("baud_rate", self.arduino.baud_rate))
+        self.arduino.baud_rates = [int(rate) for rate in link_data.get("baud_rates", self.arduino.baud_rates)]
         
         # UI settings
         ui_data = data.get("ui_settings", {})
@@ -137,6 +142,10 @@ class ConfigManager:
                 "pass": self.email.password
             },
             "arduino_ids": self.arduino.ids,
+            "arduino_settings": {
+                "baud_rate": self.arduino.baud_rate,
+                "baud_rates": self.arduino.baud_rates
+            },
             "ui_settings": {
                 "theme": self.ui.theme,
                 "window_geometry": self.ui.window_geometry
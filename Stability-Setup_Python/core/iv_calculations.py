@@ -0,0 +1,138 @@
+"""
+Vectorized I-V parameter extraction for scan data.
+
+Used by the Results Viewer stats tables (gui/results_viewer/calculations.py)
+and the scan plots of data_visualization/data_plotter.py, so it lives outside
+the GUI package.
+"""
+import numpy as np
+
+
+class BatchIVCalculations:
+    """Vectorized I-V parameter extraction for many curves at once.
+
+    Curves are passed as arrays with the points on the last axis, e.g.
+    (files, pixels, points). Every result has the shape of the leading axes.
+    """
+
+    # A pixel is dead if its mean |V| or mean |I| is below this
+    DEAD_THRESHOLD = 0.2
+
+    @staticmethod
+    def _crossing(x, y):
+        """Interpolate y at x=0 along the last axis, like np.interp on x-sorted data.
+
+        Returns:
+            tuple: (y at x=0, dy/dx of the segment bracketing x=0 or nan)
+        """
+        order = np.argsort(x, axis=-1)  # nan sorts last
+        xs = np.take_along_axis(x, order, axis=-1)
+        ys = np.take_along_axis(y, order, axis=-1)
+        n_valid = np.sum(~np.isnan(xs), axis=-1, keepdims=True)
+        n_below = np.sum(xs <= 0, axis=-1, keepdims=True)
+
+        j = np.clip(n_below - 1, 0, max(xs.shape[-1] - 2, 0))
+        x0 = np.take_along_axis(xs, j, axis=-1)
+        y0 = np.take_along_axis(ys, j, axis=-1)
+        x1 = np.take_along_axis(xs, np.minimum(j + 1, xs.shape[-1] - 1), axis=-1)
+        y1 = np.take_along_axis(ys, np.minimum(j + 1, xs.shape[-1] - 1), axis=-1)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            slope = np.where(x1 != x0, (y1 - y0) / (x1 - x0), np.nan)
+        value = np.where(x1 != x0, y0 - x0 * slope, y0)
+
+        # outside the data np.interp clamps to the first/last value
+        first = ys[..., :1]
+        last = np.take_along_axis(ys, np.maximum(n_valid - 1, 0), axis=-1)
+        bracketed = (n_below > 0) & (n_below < n_valid)
+        value = np.where(n_below == 0, first, np.where(n_below >= n_valid, last, value))
+        slope = np.where(bracketed, slope, np.nan)
+        return value[..., 0], slope[..., 0]
+
+    @staticmethod
+    def curve_stats(voltage, current):
+        """FF, PCE, Jsc, Voc, Vmp, Imp, Rs and Rsh for every curve.
+
+        Args:
+            voltage: (..., points) array of voltages [V]
+            current: (..., points) array of current densities [mA/cm²]
+
+        Returns:
+            dict: arrays shaped like voltage[..., 0]; Rs and Rsh in Ohm·cm²
+        """
+        V = np.asarray(voltage, dtype=float)
+        I = np.asarray(current, dtype=float)
+        if V.shape != I.shape:
+            raise ValueError("voltages and currents must have the same shape")
+
+        # Voc: V at I=0, its dV/dI is the series resistance
+        Voc, dV_dI = BatchIVCalculations._crossing(I, V)
+        # Jsc: I at V=0, its dI/dV is the inverse shunt resistance
+        Jsc, dI_dV = BatchIVCalculations._crossing(V, I)
+
+        # Maximum power point
+        P = V * I
+        idx_mp = np.argmax(np.where(np.isnan(P), -np.inf, P), axis=-1)[..., np.newaxis]
+        Vmp = np.take_along_axis(V, idx_mp, axis=-1)[..., 0]
+        Imp = np.take_along_axis(I, idx_mp, axis=-1)[..., 0]
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            denom = Voc * Jsc
+            FF = np.where(denom != 0, (Vmp * Imp) / denom, np.nan)
+            # V / (mA/cm²) -> Ohm·cm²
+            Rs = np.abs(dV_dI) * 1000
+            Rsh = np.abs(1 / dI_dV) * 1000
+
+        # PCE assuming 100 mW/cm² illumination
+        PCE = (Vmp * Imp) / 100 * 100
+
+        return {"FF": FF, "PCE": PCE, "Jsc": Jsc, "Voc": Voc,
+                "Vmp": Vmp, "Imp": Imp, "Rs": Rs, "Rsh": Rsh}
+
+    @staticmethod
+    def _trend(values):
+        """Least squares slope of values against their index, along the last axis."""
+        t = np.arange(values.shape[-1], dtype=float)
+        t -= t.mean()
+        denom = np.sum(t * t)
+        if denom == 0:
+            return np.zeros(values.shape[:-1])
+        return np.sum(t * values, axis=-1) / denom
+
+    @staticmethod
+    def analyze_sweeps(voltage, current, dead_current=None):
+        """Split every scan into its sweeps and extract the parameters of each.
+
+        The scan is cut in half; the half whose voltage trend is larger is
+        the forward (increasing voltage) sweep.
+
+        Args:
+            voltage: (..., points) scan voltages
+            current: (..., points) scan currents
+            dead_current: currents used for the dead-pixel mask
+                (e.g. raw mA when current is a density), defaults to current
+
+        Returns:
+            dict: "Forward" and "Reverse" curve_stats dicts and a boolean
+            "dead" mask, all shaped like voltage[..., 0]
+        """
+        V = np.asarray(voltage, dtype=float)
+        I = np.asarray(current, dtype=float)
+        half = V.shape[-1] // 2
+
+        first = BatchIVCalculations.curve_stats(V[..., :half], I[..., :half])
+        second = BatchIVCalculations.curve_stats(V[..., half:], I[..., half:])
+        first_is_forward = (
+            BatchIVCalculations._trend(V[..., :half]) > BatchIVCalculations._trend(V[..., half:])
+        )
+
+        forward = {key: np.where(first_is_forward, first[key], second[key]) for key in first}
+        reverse = {key: np.where(first_is_forward, second[key], first[key]) for key in first}
+
+        dead_I = I if dead_current is None else np.asarray(dead_current, dtype=float)
+        with np.errstate(invalid="ignore"):
+            dead = (np.mean(np.abs(V), axis=-1) < BatchIVCalculations.DEAD_THRESHOLD) | (
+                np.mean(np.abs(dead_I), axis=-1) < BatchIVCalculations.DEAD_THRESHOLD
+            )
+
+        return {"Forward": forward, "Reverse": reverse, "dead": dead}
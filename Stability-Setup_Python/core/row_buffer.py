@@ -0,0 +1,90 @@
+# row_buffer.py
+"""
+Parsing the numeric data rows of run csv files into float64 arrays, shared
+by the controllers (rows arriving from the boards) and core.run_data (rows
+read back from the files), and the format the rows are written with.
+"""
+import numpy as np
+
+from constants import Constants
+
+# Format used when writing buffered float rows back out to the run csv files
+DATA_FMT = "%.10g"
+
+
+def _parse_field(field: str) -> float:
+    try:
+        return float(field)
+    except ValueError:
+        # sensor overflow (" ovf") or otherwise corrupted value
+        return np.nan
+
+
+class AcquisitionBuffer:
+    """
+    Preallocated float64 buffer holding parsed data lines between saves.
+
+    Rows are parsed once when the line arrives and written straight into
+    the backing array, so appending a sample never copies the samples that
+    are already buffered. The buffer is drained in blocks (see
+    SingleController._save_data) and reuses the same storage afterwards.
+    If more rows arrive than the current capacity before a flush, the
+    storage doubles in size.
+    """
+
+    def __init__(self, width: int, capacity: int = Constants.line_per_save * 4):
+        self.width = width
+        self._data = np.empty((max(capacity, 1), width), dtype=np.float64)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def capacity(self) -> int:
+        return self._data.shape[0]
+
+    def append_line(self, line: str) -> bool:
+        """
+        Parse a comma separated data line into the next free row.
+
+        Returns
+        -------
+        bool
+            False if the line does not match the buffer width and was dropped
+        """
+        fields = line.split(",")
+        if len(fields) != self.width:
+            return False
+        row = self._next_row()
+        try:
+            row[:] = fields
+        except ValueError:
+            row[:] = [_parse_field(field) for field in fields]
+        self._size += 1
+        return True
+
+    def append_rows(self, rows: np.ndarray) -> None:
+        """Copy a block of already parsed rows into the buffer."""
+        rows = np.asarray(rows, dtype=np.float64).reshape(-1, self.width)
+        while self._size + rows.shape[0] > self.capacity:
+            self._grow()
+        self._data[self._size : self._size + rows.shape[0]] = rows
+        self._size += rows.shape[0]
+
+    def view(self) -> np.ndarray:
+        """Rows buffered since the last clear. Only valid until the next append."""
+        return self._data[: self._size]
+
+    def clear(self) -> None:
+        self._size = 0
+
+    def _next_row(self) -> np.ndarray:
+        if self._size == self.capacity:
+            self._grow()
+        return self._data[self._size]
+
+    def _grow(self) -> None:
+        grown = np.empty((self.capacity * 2, self.width), dtype=np.float64)
+        grown[: self._size] = self._data[: self._size]
+        self._data = grown
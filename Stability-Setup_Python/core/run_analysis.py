@@ -0,0 +1,80 @@
+"""
+Process pool helpers for analysing many run files at once.
+
+Shared by the Results Viewer (gui/results_viewer/analysis_pipeline.py) and
+the batch plots of data_visualization/data_plotter.py. Work functions run
+in worker processes, so they and their arguments must be picklable
+(module level functions, not lambdas or bound methods of widgets).
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from core.run_cache import file_signature, get_run_cache
+
+
+def default_workers() -> int:
+    return max(1, (os.cpu_count() or 1) - 1)
+
+
+def analyze_run_file(path: str,
+                     stats_functions: Optional[Dict[str, Callable[[str], Any]]] = None) -> Dict[str, Any]:
+    """
+    Parses a run file and computes the named stats of stats_functions on it.
+
+    Runs in a worker process; the result is sent back to the calling process
+    where the stats can be put into the run cache (RunCache.put_stats). The
+    parsed rows are not sent back, pickling large runs would copy them over
+    IPC: the calling process reads them from the binary copy (or the run
+    cache sidecar written here) when it needs them.
+    """
+    signature = file_signature(path)
+    get_run_cache().get_run(path)
+    result = {"path": path, "signature": signature, "stats": {}}
+    for name, compute in (stats_functions or {}).items():
+        result["stats"][name] = compute(path)
+    return result
+
+
+def analyze_run_files(paths: List[str],
+                      batch_stats_functions: Optional[Dict[str, Callable[[List[str]], Dict[str, Any]]]] = None
+                      ) -> List[Dict[str, Any]]:
+    """
+    analyze_run_file for a batch of files in one work item.
+
+    The batch stats functions get all readable paths at once and return
+    {path: stats} for the files they apply to, so they can vectorize across
+    the files. A file that cannot be read gets an "error" message instead.
+    """
+    results, readable = [], []
+    for path in paths:
+        try:
+            results.append(analyze_run_file(path))
+            readable.append(path)
+        except Exception as e:
+            results.append({"path": path, "error": str(e)})
+    for name, compute_many in (batch_stats_functions or {}).items():
+        stats = compute_many(readable) if readable else {}
+        for result in results:
+            if result["path"] in stats:
+                result["stats"][name] = stats[result["path"]]
+    return results
+
+
+def iter_parallel(func: Callable[[Any], Any], items: Iterable,
+                  max_workers: Optional[int] = None) -> Iterator[Tuple[Any, Any, Optional[Exception]]]:
+    """
+    Runs func over items in a process pool.
+
+    Yields (item, result, error) in completion order, error is None on success.
+    """
+    items = list(items)
+    if not items:
+        return
+    with ProcessPoolExecutor(max_workers=min(max_workers or default_workers(), len(items))) as pool:
+        futures = {pool.submit(func, item): item for item in items}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except Exception as e:
+                yield futures[future], None, e
@@ -0,0 +1,263 @@
+"""
+Process-wide cache of parsed run files and the stats derived from them.
+
+Entries are keyed by the absolute path of the run file and stay valid
+while the file's mtime and size are unchanged, so a run that is still
+being written is re-read on the next request. The least recently used
+runs are evicted once the cached arrays exceed the memory budget.
+
+Optionally a sidecar "<run>.runcache.npz" is written next to csv-only runs
+so the parse is skipped in later sessions as well.
+"""
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from constants import Constants
+from core.run_data import RunData, load_run
+from helper.global_helpers import get_logger
+
+SIDECAR_SUFFIX = ".runcache.npz"
+# Derived results are mostly small, so they are bounded by count; results with
+# an nbytes attribute (arrays, plot pyramids) also count against the memory budget
+MAX_STATS_ENTRIES = 1024
+
+Signature = Tuple[int, int]
+
+
+def file_signature(path: str) -> Signature:
+    """(mtime_ns, size) of a file, raises OSError if it does not exist."""
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def sidecar_path_for(path: str) -> str:
+    return os.path.splitext(path)[0] + SIDECAR_SUFFIX
+
+
+@dataclass
+class CacheEntry:
+    signature: Signature
+    run: RunData
+
+    @property
+    def nbytes(self) -> int:
+        return self.run.data.nbytes
+
+
+class RunCache:
+    """
+    LRU cache of RunData objects and derived stats with a memory budget.
+
+    get_run() returns a cached RunData when the file has not changed since
+    it was parsed. get_stats() caches the result of a computation on a run
+    file (e.g. the stats table rows) under a name with the same invalidation.
+    Callers must treat the returned data as read only.
+    """
+
+    def __init__(self, max_bytes: int = Constants.run_cache_max_mb * 1024 * 1024,
+                 use_sidecar: bool = Constants.run_cache_sidecar):
+        self.max_bytes = max_bytes
+        self.use_sidecar = use_sidecar
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._stats: "OrderedDict[Tuple[str, str], Tuple[Signature, Any]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def nbytes(self) -> int:
+        with self._lock:
+            return self._runs_nbytes() + self._stats_nbytes()
+
+    def _runs_nbytes(self) -> int:
+        return sum(entry.nbytes for entry in self._entries.values())
+
+    def _stats_nbytes(self) -> int:
+        return sum(getattr(result, "nbytes", 0) for _, result in self._stats.values())
+
+    def get_run(self, path: str) -> RunData:
+        """Parsed run file, re-read if it changed on disk."""
+        return self._get_entry(path).run
+
+    def get_stats(self, path: str, name: str, compute: Callable[[str], Any]) -> Any:
+        """
+        Result of compute(path), cached under name until the file changes.
+
+        compute is called without the cache lock held, so it may use
+        get_run() itself. Files that cannot be stat'ed are not cached.
+        """
+        key = (os.path.abspath(path), name)
+        try:
+            signature = file_signature(path)
+        except OSError:
+            return compute(path)
+
+        with self._lock:
+            cached = self._stats.get(key)
+            if cached is not None and cached[0] == signature:
+                self._stats.move_to_end(key)
+                self.hits += 1
+                return cached[1]
+
+        result = compute(path)
+        self.put_stats(path, name, signature, result)
+        return result
+
+    def get_stats_many(self, paths: List[str], name: str,
+                       compute_many: Callable[[List[str]], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        get_stats() for many files, the files without a valid cached result
+        are computed in one compute_many(paths) call returning {path: result},
+        so the computation can batch across them.
+        """
+        results, signatures, missing = {}, {}, []
+        with self._lock:
+            for path in paths:
+                try:
+                    signatures[path] = file_signature(path)
+                except OSError:
+                    missing.append(path)
+                    continue
+                cached = self._stats.get((os.path.abspath(path), name))
+                if cached is not None and cached[0] == signatures[path]:
+                    self._stats.move_to_end((os.path.abspath(path), name))
+                    self.hits += 1
+                    results[path] = cached[1]
+                else:
+                    missing.append(path)
+
+        if missing:
+            computed = compute_many(missing)
+            for path in missing:
+                if path in computed and path in signatures:
+                    self.put_stats(path, name, signatures[path], computed[path])
+            results.update(computed)
+        return results
+
+    def put_run(self, path: str, signature: Signature, run: RunData) -> None:
+        """Adds a run parsed elsewhere (e.g. in a worker process) to the cache."""
+        entry = CacheEntry(signature, run)
+        with self._lock:
+            if entry.nbytes <= self.max_bytes:
+                self._entries[os.path.abspath(path)] = entry
+                self._entries.move_to_end(os.path.abspath(path))
+                self._evict()
+
+    def put_stats(self, path: str, name: str, signature: Signature, result: Any) -> None:
+        """Adds a derived result computed elsewhere to the cache."""
+        key = (os.path.abspath(path), name)
+        with self._lock:
+            self._stats[key] = (signature, result)
+            self._stats.move_to_end(key)
+            while len(self._stats) > MAX_STATS_ENTRIES:
+                self._stats.popitem(last=False)
+            self._evict()
+
+    def invalidate(self, path: Optional[str] = None) -> None:
+        """Drop one run (or every run) from the cache."""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                self._stats.clear()
+                return
+            key = os.path.abspath(path)
+            self._entries.pop(key, None)
+            for stats_key in [k for k in self._stats if k[0] == key]:
+                del self._stats[stats_key]
+
+    def clear(self) -> None:
+        self.invalidate()
+        self.hits = 0
+        self.misses = 0
+
+    def _get_entry(self, path: str) -> CacheEntry:
+        key = os.path.abspath(path)
+        signature = file_signature(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.signature == signature:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        self.misses += 1
+        run = self._load(path, signature)
+        entry = CacheEntry(signature, run)
+        self.put_run(path, signature, run)
+        return entry
+
+    def _evict(self) -> None:
+        runs = self._runs_nbytes()
+        stats = self._stats_nbytes()
+        # large derived results go first, they are cheaper to rebuild than a parse
+        for key in list(self._stats)[:-1]:
+            if runs + stats <= self.max_bytes:
+                break
+            size = getattr(self._stats[key][1], "nbytes", 0)
+            if size:
+                del self._stats[key]
+                stats -= size
+        while runs + stats > self.max_bytes and len(self._entries) > 1:
+            _, entry = self._entries.popitem(last=False)
+            runs -= entry.nbytes
+
+    def _load(self, path: str, signature: Signature) -> RunData:
+        if self.use_sidecar:
+            run = self._read_sidecar(path, signature)
+            if run is not None:
+                return run
+
+        run = load_run(path)
+        if self.use_sidecar and not run.from_binary:
+            self._write_sidecar(path, signature, run)
+        return run
+
+    def _read_sidecar(self, path: str, signature: Signature) -> Optional[RunData]:
+        sidecar = sidecar_path_for(path)
+        if not os.path.exists(sidecar):
+            return None
+        try:
+            with np.load(sidecar, allow_pickle=False) as npz:
+                if tuple(int(value) for value in npz["signature"]) != signature:
+                    return None
+                metadata = dict(zip(npz["metadata_keys"].tolist(), npz["metadata_values"].tolist()))
+                return RunData(metadata, npz["headers"].tolist(), npz["data"], source=path)
+        except (OSError, KeyError, ValueError) as e:
+            get_logger().log(f"Ignoring unreadable run cache {sidecar}: {e}")
+            return None
+
+    def _write_sidecar(self, path: str, signature: Signature, run: RunData) -> None:
+        sidecar = sidecar_path_for(path)
+        try:
+            with open(sidecar, "wb") as f:
+                np.savez(
+                    f,
+                    signature=np.array(signature, dtype=np.int64),
+                    metadata_keys=np.array(list(run.metadata.keys()), dtype=str),
+                    metadata_values=np.array(list(run.metadata.values()), dtype=str),
+                    headers=np.array(run.headers, dtype=str),
+                    data=run.data,
+                )
+        except OSError as e:
+            get_logger().log(f"Failed to write run cache {sidecar}: {e}")
+
+
+_global_run_cache: Optional[RunCache] = None
+_global_run_cache_lock = threading.Lock()
+
+
+def get_run_cache() -> RunCache:
+    """Get the global run cache instance."""
+    global _global_run_cache
+    with _global_run_cache_lock:
+        if _global_run_cache is None:
+            _global_run_cache = RunCache()
+        return _global_run_cache
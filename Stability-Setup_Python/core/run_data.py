@@ -0,0 +1,394 @@
+"""
+Run data storage for the Results Viewer and the controllers.
+
+Every run is written as a csv file (metadata rows, a header row starting
+with "Time", then numeric data rows). Next to it the controller writes a
+chunked binary copy with the same name and a ".npz" extension:
+
+    __meta__.json          metadata, headers and column dtypes
+    chunk_000000/0.npy     one typed array per column and chunk
+    chunk_000000/1.npy
+    ...
+    __closed__             written once the run finished cleanly
+
+Chunks are appended to the zip archive as the run progresses, so the file
+never has to be rewritten. load_run() reads the binary copy when it is
+complete and falls back to parsing the csv otherwise.
+"""
+import json
+import os
+import re
+import warnings
+import zipfile
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+from constants import Constants
+from core.row_buffer import AcquisitionBuffer
+
+BINARY_EXTENSION = ".npz"
+FORMAT_VERSION = 1
+META_ENTRY = "__meta__.json"
+CLOSED_ENTRY = "__closed__"
+# Rows collected in memory before a chunk is appended to the archive
+CHUNK_ROWS = 4096
+DEFAULT_CELL_AREA = 0.128
+
+_CHUNK_ENTRY = re.compile(r"^chunk_(\d+)/(\d+)\.npy$")
+# Columns that need full double precision, everything else is stored as float32
+_FLOAT64_COLUMNS = ("Time", "ARUDUINOID")
+
+
+def binary_path_for(csv_path: str) -> str:
+    """Path of the binary copy belonging to a csv run file."""
+    return os.path.splitext(csv_path)[0] + BINARY_EXTENSION
+
+
+def column_dtype(name: str) -> np.dtype:
+    return np.dtype(np.float64 if name in _FLOAT64_COLUMNS else np.float32)
+
+
+@dataclass
+class RunData:
+    """Metadata, headers and float64 data of one run file."""
+    metadata: Dict[str, str]
+    headers: List[str]
+    data: np.ndarray
+    source: str = ""
+    from_binary: bool = False
+    _index: Dict[str, int] = field(default_factory=dict, repr=False)
+    _pixel_index: Dict[str, Union[slice, List[int]]] = field(default_factory=dict, repr=False)
+
+    def __post_init__(self):
+        self._index = {name: idx for idx, name in enumerate(self.headers)}
+        self._pixel_index = {suffix: self._pixel_indices(suffix) for suffix in (" V", " mA")}
+
+    def __len__(self) -> int:
+        return self.data.shape[0]
+
+    def has_column(self, name: str) -> bool:
+        return name in self._index
+
+    def column(self, name: str) -> np.ndarray:
+        return self.data[:, self._index[name]]
+
+    @property
+    def time(self) -> np.ndarray:
+        return self.column("Time")
+
+    @property
+    def pixel_V(self) -> np.ndarray:
+        """(rows, pixels) read-only voltages, ordered by pixel number."""
+        return self._pixel_columns(" V")
+
+    @property
+    def pixel_mA(self) -> np.ndarray:
+        """(rows, pixels) read-only currents in mA, ordered by pixel number."""
+        return self._pixel_columns(" mA")
+
+    @property
+    def file_id(self) -> str:
+        match = re.search(r"ID(\d+)", os.path.basename(self.source), re.IGNORECASE)
+        return match.group(1) if match else "Unknown"
+
+    def cell_area(self, default: float = DEFAULT_CELL_AREA) -> float:
+        return float(self.metadata.get("Cell Area (mm^2)", default))
+
+    def metadata_block(self) -> np.ndarray:
+        """
+        The metadata rows and header row as a string array,
+        in the layout the csv files use (rows padded with "None").
+        """
+        width = len(self.headers)
+        block = np.full((len(self.metadata) + 1, width), "None", dtype=object)
+        for idx, (key, value) in enumerate(self.metadata.items()):
+            block[idx, 0] = key
+            block[idx, 1] = value
+        block[-1] = self.headers
+        return block.astype(str)
+
+    def _pixel_indices(self, suffix: str) -> Union[slice, List[int]]:
+        """
+        Columns of the pixels in pixel order, as a slice when they are evenly
+        spaced (the interleaved V/mA layout of the run files) so that indexing
+        returns a view instead of a copy.
+        """
+        indices = [
+            idx for name, idx in self._index.items()
+            if name.startswith("Pixel_") and name.endswith(suffix)
+        ]
+        indices.sort(key=lambda idx: int(self.headers[idx][len("Pixel_"):-len(suffix)]))
+        if len(indices) < 2:
+            return indices
+        step = indices[1] - indices[0]
+        if step > 0 and all(b - a == step for a, b in zip(indices, indices[1:])):
+            return slice(indices[0], indices[-1] + 1, step)
+        return indices
+
+    def _pixel_columns(self, suffix: str) -> np.ndarray:
+        columns = self.data[:, self._pixel_index[suffix]]
+        # a view into data, which the run cache shares between callers
+        columns.flags.writeable = False
+        return columns
+
+
+class ChunkedRunWriter:
+    """
+    Appends rows of a run to the binary copy of its csv file.
+
+    Rows are collected until CHUNK_ROWS are pending, then every column is
+    written to the archive as its own typed .npy entry. close() flushes the
+    remainder and marks the file complete, an unclosed file (crash, lost
+    connection) is ignored by load_run in favour of the csv.
+    """
+
+    def __init__(self, path: str, metadata: Dict[str, str], headers: Sequence[str],
+                 chunk_rows: int = CHUNK_ROWS):
+        self.path = path
+        self.headers = list(headers)
+        self.chunk_rows = chunk_rows
+        self.dtypes = [column_dtype(name) for name in self.headers]
+        self._pending: List[np.ndarray] = []
+        self._pending_rows = 0
+        self._chunk_count = 0
+        self.closed = False
+
+        meta = {
+            "version": FORMAT_VERSION,
+            "metadata": [[str(key), str(value)] for key, value in metadata.items()],
+            "headers": self.headers,
+            "dtypes": [dtype.str for dtype in self.dtypes],
+        }
+        with zipfile.ZipFile(self.path, "w") as zf:
+            zf.writestr(META_ENTRY, json.dumps(meta))
+
+    def append(self, rows: np.ndarray) -> None:
+        if self.closed or not len(rows):
+            return
+        rows = np.asarray(rows, dtype=np.float64).reshape(-1, len(self.headers))
+        self._pending.append(rows.copy())
+        self._pending_rows += rows.shape[0]
+        if self._pending_rows >= self.chunk_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._pending_rows:
+            return
+        rows = np.concatenate(self._pending)
+        self._pending.clear()
+        self._pending_rows = 0
+
+        chunk = f"chunk_{self._chunk_count:06d}"
+        with zipfile.ZipFile(self.path, "a") as zf:
+            for idx, dtype in enumerate(self.dtypes):
+                with zf.open(f"{chunk}/{idx}.npy", "w") as f:
+                    np.lib.format.write_array(f, np.ascontiguousarray(rows[:, idx], dtype=dtype))
+        self._chunk_count += 1
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.flush()
+        with zipfile.ZipFile(self.path, "a") as zf:
+            zf.writestr(CLOSED_ENTRY, "")
+        self.closed = True
+
+
+def read_binary_run(path: str, require_closed: bool = True) -> Optional[RunData]:
+    """
+    Reads a chunked binary run file.
+
+    Returns None if the file is incomplete (and require_closed is set).
+    """
+    with zipfile.ZipFile(path, "r") as zf:
+        names = zf.namelist()
+        if require_closed and CLOSED_ENTRY not in names:
+            return None
+        meta = json.loads(zf.read(META_ENTRY))
+        headers = list(meta["headers"])
+
+        chunks: Dict[int, Dict[int, str]] = {}
+        for name in names:
+            match = _CHUNK_ENTRY.match(name)
+            if match:
+                chunks.setdefault(int(match.group(1)), {})[int(match.group(2))] = name
+
+        num_rows = 0
+        blocks = []
+        for chunk_idx in sorted(chunks):
+            entries = chunks[chunk_idx]
+            columns = []
+            for col_idx in range(len(headers)):
+                with zf.open(entries[col_idx]) as f:
+                    columns.append(np.lib.format.read_array(f))
+            blocks.append(columns)
+            num_rows += len(columns[0])
+
+    data = np.empty((num_rows, len(headers)), dtype=np.float64)
+    start = 0
+    for columns in blocks:
+        end = start + len(columns[0])
+        for col_idx, column in enumerate(columns):
+            data[start:end, col_idx] = column
+        start = end
+
+    metadata = {key: value for key, value in meta["metadata"]}
+    return RunData(metadata, headers, data, source=path, from_binary=True)
+
+
+def _read_csv_header(f, path: str):
+    """Reads the metadata rows up to and including the "Time" header row."""
+    metadata = {}
+    while True:
+        line = f.readline()
+        if not line:
+            raise ValueError(f"No 'Time' column found in {path}")
+        fields = [value.strip() for value in line.rstrip("\r\n").split(",")]
+        if fields[0] == "Time":
+            return metadata, fields
+        if fields[0]:
+            metadata[fields[0]] = fields[1] if len(fields) > 1 else ""
+
+
+def _read_csv_body(f, width: int) -> np.ndarray:
+    """
+    Parses the data rows straight into a float64 array.
+
+    Sensor overflow tokens (" ovf") are read as nan. If the body has rows
+    of the wrong length (e.g. the last line of a file that is still being
+    written), it is parsed again line by line and those rows are dropped.
+    """
+    start = f.tell()
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)  # empty body
+            data = np.loadtxt(
+                (line.replace("ovf", "nan") for line in f),
+                delimiter=",", dtype=np.float64, ndmin=2,
+            )
+        if data.size == 0:
+            return np.empty((0, width), dtype=np.float64)
+        if data.shape[1] == width:
+            return data
+    except ValueError:
+        pass
+
+    f.seek(start)
+    buffer = AcquisitionBuffer(width)
+    for line in iter(f.readline, ""):
+        buffer.append_line(line.strip())
+    return buffer.view().copy()
+
+
+def read_csv_run(path: str) -> RunData:
+    """
+    Reads a csv run file (metadata rows, "Time" header row, data rows)
+    in a single pass without building an intermediate string matrix.
+    """
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        metadata, headers = _read_csv_header(f, path)
+        data = _read_csv_body(f, len(headers))
+    return RunData(metadata, headers, data, source=path)
+
+
+def load_run(path: str, prefer_binary: bool = True) -> RunData:
+    """
+    Loads a run file, given either the csv path or the binary path.
+
+    The binary copy is used when it exists and was closed, otherwise the
+    csv is parsed. source on the result is always the csv path when there
+    is one, so file names/IDs stay the same for callers.
+    """
+    if path.endswith(BINARY_EXTENSION):
+        run = read_binary_run(path, require_closed=False)
+        run.source = path
+        return run
+
+    binary_path = binary_path_for(path)
+    if prefer_binary and os.path.exists(binary_path):
+        try:
+            run = read_binary_run(binary_path)
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+            run = None
+        if run is not None:
+            run.source = path
+            return run
+    return read_csv_run(path)
+
+
+def open_run_writer(csv_path: str, metadata: Dict[str, str],
+                    headers: Sequence[str]) -> Optional[ChunkedRunWriter]:
+    """Creates the binary copy for a csv run file if binary runs are enabled."""
+    if not Constants.write_binary_runs:
+        return None
+    return ChunkedRunWriter(binary_path_for(csv_path), metadata, headers)
+
+
+class RunTail:
+    """
+    Reads the rows appended to a csv run file that is still being written.
+
+    poll() parses only the bytes added since the previous call and returns
+    the complete new rows, a trailing partial line is kept until its newline
+    arrives. Starting at offset skips the rows before it, e.g. the part of
+    the file that was already loaded; an offset inside a line skips that line.
+    If the file shrinks (it was replaced), reading starts over from the top.
+    """
+
+    def __init__(self, path: str, offset: int = 0):
+        self.path = path
+        self.offset = offset
+        self.metadata: Dict[str, str] = {}
+        self.headers: List[str] = []
+        self._partial = b""
+        self._skip_line = False
+
+    def poll(self) -> np.ndarray:
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return np.empty((0, len(self.headers)))
+        if size < self.offset:
+            self.offset = 0
+            self.headers = []
+            self._partial = b""
+        if not self.headers and not self._read_header():
+            return np.empty((0, 0))
+
+        with open(self.path, "rb") as f:
+            if self.offset > 0 and not self._partial and not self._skip_line:
+                f.seek(self.offset - 1)
+                # an offset in the middle of a line drops the rest of that line
+                self._skip_line = f.read(1) != b"\n"
+            f.seek(self.offset)
+            chunk = f.read(size - self.offset)
+        self.offset += len(chunk)
+
+        lines = (self._partial + chunk).split(b"\n")
+        self._partial = lines.pop()
+        if self._skip_line and lines:
+            lines = lines[1:]
+            self._skip_line = False
+
+        buffer = AcquisitionBuffer(len(self.headers), capacity=len(lines))
+        for line in lines:
+            buffer.append_line(line.decode("utf-8", errors="replace").strip())
+        return buffer.view()
+
+    def close(self) -> None:
+        """Nothing to release, the file is only opened during poll()."""
+
+    def _read_header(self) -> bool:
+        """Reads the metadata and header rows, False while the file has no "Time" row yet."""
+        try:
+            with open(self.path, "r", encoding="utf-8", errors="replace") as f:
+                self.metadata, self.headers = _read_csv_header(f, self.path)
+                data_start = f.tell()
+        except (OSError, ValueError):
+            return False
+        if self.offset < data_start:
+            self.offset = data_start
+            self._partial = b""
+        return True
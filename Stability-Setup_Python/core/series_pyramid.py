@@ -0,0 +1,151 @@
+"""
+Multi-resolution min/max/mean pyramid of a multi-channel time series.
+
+Level 0 is the series itself, every further level combines `factor`
+buckets of the level below into one, keeping the per channel minimum,
+maximum and mean and the time span of the bucket. query() picks the
+finest level that shows a time range with at most max_points points, so a
+plot can re-query on every zoom and pan in O(log n) plus the points drawn,
+and short spikes or dips stay visible in the min/max envelope at any zoom.
+"""
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_FACTOR = 4
+# levels stop once they have fewer buckets than this
+MIN_BUCKETS = 256
+
+
+@dataclass
+class PyramidLevel:
+    """
+    Buckets of one level; t_start/t_end are the times of the first and last sample,
+    count the number of non-nan samples per channel behind each mean.
+    """
+    t_start: np.ndarray
+    t_end: np.ndarray
+    low: np.ndarray
+    high: np.ndarray
+    mean: np.ndarray
+    count: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.t_start)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in (self.t_start, self.t_end, self.low, self.high, self.mean, self.count))
+
+
+class SeriesPyramid:
+    """
+    Pyramid over time (n,) and data (n, channels), time must be non-decreasing.
+
+    Data is stored as float32, the levels above 0 add about 1/(factor - 1)
+    of the series size three times (low, high, mean).
+    """
+
+    def __init__(self, time: np.ndarray, data: np.ndarray, factor: int = DEFAULT_FACTOR,
+                 min_buckets: int = MIN_BUCKETS):
+        if factor < 2:
+            raise ValueError("pyramid factor must be at least 2")
+        time = np.asarray(time, dtype=np.float64)
+        data = np.asarray(data, dtype=np.float32)
+        if data.ndim == 1:
+            data = data[:, np.newaxis]
+        self.factor = factor
+        self.channels = data.shape[1]
+
+        count = (~np.isnan(data)).astype(np.uint8)
+        self.levels: List[PyramidLevel] = [PyramidLevel(time, time, data, data, data, count)]
+        while len(self.levels[-1]) > max(min_buckets, 1) * factor:
+            self.levels.append(self._coarsen(self.levels[-1]))
+
+    def __len__(self) -> int:
+        return len(self.levels[0])
+
+    @property
+    def nbytes(self) -> int:
+        # level 0 shares one array for low/high/mean
+        base = self.levels[0]
+        return base.t_start.nbytes + base.low.nbytes + base.count.nbytes + sum(level.nbytes for level in self.levels[1:])
+
+    @property
+    def time_range(self) -> Tuple[float, float]:
+        if not len(self):
+            return 0.0, 0.0
+        return float(self.levels[0].t_start[0]), float(self.levels[0].t_end[-1])
+
+    def max(self) -> float:
+        """Largest finite value over all channels, nan for an empty series."""
+        top = self.levels[-1].high
+        return float(np.nanmax(top)) if top.size and not np.isnan(top).all() else float("nan")
+
+    def _coarsen(self, level: PyramidLevel) -> PyramidLevel:
+        starts = np.arange(0, len(level), self.factor)
+        ends = np.minimum(starts + self.factor, len(level)) - 1
+        counts = np.add.reduceat(level.count, starts, axis=0, dtype=np.int64)
+        sums = np.add.reduceat(np.where(level.count > 0, level.mean, 0.0) * level.count, starts, axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = (sums / counts).astype(np.float32)
+            low = np.fmin.reduceat(level.low, starts, axis=0)
+            high = np.fmax.reduceat(level.high, starts, axis=0)
+        return PyramidLevel(
+            level.t_start[starts], level.t_end[ends], low, high, mean,
+            counts.astype(np.int32),
+        )
+
+    def level_for(self, t0: float, t1: float, max_points: int) -> int:
+        """Finest level whose envelope over [t0, t1] has at most max_points points."""
+        for index, level in enumerate(self.levels):
+            lo, hi = self._span(level, t0, t1)
+            # level 0 draws one point per sample, the others two (low and high)
+            if (hi - lo) * (1 if index == 0 else 2) <= max_points:
+                return index
+        return len(self.levels) - 1
+
+    @staticmethod
+    def _span(level: PyramidLevel, t0: float, t1: float) -> Tuple[int, int]:
+        # one extra bucket on each side so lines run off the edges of the axes
+        lo = max(int(np.searchsorted(level.t_end, t0, side="left")) - 1, 0)
+        hi = min(int(np.searchsorted(level.t_start, t1, side="right")) + 1, len(level))
+        return lo, hi
+
+    def query(self, t0: Optional[float] = None, t1: Optional[float] = None,
+              max_points: int = 5000) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (time, values) covering [t0, t1] with at most about max_points rows.
+
+        Above level 0 each bucket becomes two rows, its minimum at t_start and
+        its maximum at t_end, which draws as the envelope of the samples.
+        """
+        start, end = self.time_range
+        t0 = start if t0 is None else t0
+        t1 = end if t1 is None else t1
+        index = self.level_for(t0, t1, max_points)
+        level = self.levels[index]
+        lo, hi = self._span(level, t0, t1)
+        if index == 0:
+            return level.t_start[lo:hi], level.mean[lo:hi]
+
+        time = np.empty(2 * (hi - lo))
+        time[0::2] = level.t_start[lo:hi]
+        time[1::2] = level.t_end[lo:hi]
+        values = np.empty((2 * (hi - lo), self.channels), dtype=np.float32)
+        values[0::2] = level.low[lo:hi]
+        values[1::2] = level.high[lo:hi]
+        return time, values
+
+    def query_mean(self, t0: Optional[float] = None, t1: Optional[float] = None,
+                   max_points: int = 5000) -> Tuple[np.ndarray, np.ndarray]:
+        """(bucket mid time, bucket mean) over [t0, t1] with at most about max_points rows."""
+        start, end = self.time_range
+        t0 = start if t0 is None else t0
+        t1 = end if t1 is None else t1
+        # the mean needs one point per bucket, so allow twice the buckets of query()
+        index = self.level_for(t0, t1, 2 * max_points)
+        level = self.levels[index]
+        lo, hi = self._span(level, t0, t1)
+        return (level.t_start[lo:hi] + level.t_end[lo:hi]) / 2, level.mean[lo:hi]
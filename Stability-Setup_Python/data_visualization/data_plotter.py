@@ -10,6 +10,9 @@ import sys
 import warnings
 from typing import List
 from helper.global_helpers import get_logger
+from core.run_cache import get_run_cache
+from core.iv_calculations import BatchIVCalculations
+from core.run_analysis import iter_parallel
 from matplotlib.font_manager import FontProperties
 import matplotlib.ticker as ticker
 
@@ -19,10 +22,12 @@ np.set_printoptions(threshold=sys.maxsize)
 warnings.filterwarnings("ignore", category=UserWarning, module="matplotlib")
 warnings.filterwarnings("ignore", category=RuntimeWarning)
 
-def plot_all_in_folder(directory_path):
+def plot_all_in_folder(directory_path, max_workers=None):
+    # rendering is independent per file, so spread it over a process pool
     all_files = load_unplotted_files(directory_path)
-    for filepath in all_files:
-        create_graph(filepath)
+    for filepath, _, error in iter_parallel(create_graph, all_files, max_workers):
+        if error is not None:
+            get_logger().log(f"Failed to create plot for {filepath}: {error}")
     return
 
 def create_graph(file_location):
@@ -44,21 +49,15 @@ def create_pce_graph(file_location,
                     pixels = None,
                     devices = None):
     plot_size = (12,8)
-    arr = np.loadtxt(file_location,
-                     delimiter=",",
-                     dtype=str)
+    run = get_run_cache().get_run(file_location)
 
     if lightScanName != "":
         dead_pixels = get_dead_pixels(lightScanName)
     else:
         dead_pixels = []
-    headers = arr[6,:]
-    header_dict = {value: index for index, value in enumerate(headers)}
-    pce_indicies = [header_dict[value] for value in header_dict if "PCE" in value]
-    arr = arr[7:, :]
+    pce_indicies = [idx for idx, value in enumerate(run.headers) if "PCE" in value]
 
-    time = np.array(arr[:,header_dict["Time"]]).astype('float')
-    pce_list = np.array(arr)
+    time = run.time.copy()
 
     png_save_location = "/".join(file_location.replace('\\', '/').split('/')[:-1])
     plot_title = file_location.replace('\\', '/').split('/')[-1][:-4]
@@ -66,13 +65,13 @@ def create_pce_graph(file_location,
     if not os.path.exists(png_save_location):
         os.mkdir(png_save_location)
 
-    pce_list = pce_list[:, pce_indicies]
-    # pce_list = pce_list[:,0:-1]
-    for i in range(len(pce_list)):
-        pce_list[i] = [float(j) if j != " ovf" else 0.0 for j in pce_list[i]]
-        pce_list[i] = [float(j) if j != "nan" else 0.0 for j in pce_list[i]]
-
-    pce_list = pce_list.astype(float)
+    if pce_indicies:
+        pce_list = run.data[:, pce_indicies]
+    else:
+        # current files store V and mA per pixel instead of PCE
+        pce_list = ((run.pixel_V * run.pixel_mA / 1000) / (0.1 * run.cell_area())) * 100
+    # overflowed / missing readings are plotted as 0
+    pce_list = np.nan_to_num(pce_list, nan=0.0)
 
     data = []
 
@@ -132,7 +131,7 @@ def create_scan_graph(file_location,
                  show_dead_pixels = False,
                  fixed_window = False):
     plot_size = (10,8)
-    arr = np.loadtxt(file_location, delimiter=",", dtype=str)
+    run = get_run_cache().get_run(file_location)
 
     # get_logger().log("PC -> Graph Name", graph_name)
     if saveInFolder:
@@ -152,18 +151,10 @@ def create_scan_graph(file_location,
     png_save_path = png_save_dir + plot_title
     dead_pixel = get_dead_pixels(file_location)
 
-    headers = arr[6,:]
-    header_dict = {value: index for index, value in enumerate(headers)}
-    arr = arr[7:, :]
-    voltage = arr[:, 1]
-    time = arr[:, 0]
-    length = (len(headers) - 1)
-    data = arr[:, 2:-1]
-
-    pixel_V = data[:, ::2].astype(float)  # Selects even columns (0, 2, ...)
-    pixel_mA = data[:, 1::2].astype(float) # Selects odd columns (1, 3, ...)
+    pixel_V = run.pixel_V
+    pixel_mA = run.pixel_mA
     if current_density:
-        pixel_mA/=0.128
+        pixel_mA = pixel_mA / 0.128
 
     # generate graphs
     plt.figure(figsize=plot_size)
@@ -240,98 +231,30 @@ def create_scan_graph(file_location,
     return png_save_dir
 
 def get_dead_pixels(graph_name) -> List[int]:
-    arr = np.loadtxt(graph_name, delimiter=",", dtype=str)
-    headers = arr[6,:]
-    arr = arr[7:, :]
+    run = get_run_cache().get_run(graph_name)
 
-    # get_logger().log(arr)
-    length = (len(headers) - 1)
+    # a pixel is dead if its mean |V| or mean |I| is below 0.2
+    mean_V = np.mean(np.absolute(run.pixel_V), axis=0)
+    mean_mA = np.mean(np.absolute(run.pixel_mA), axis=0)
+    dead_pixels = np.where((mean_V < 0.2) | (mean_mA < 0.2))[0]
 
-    jvList = []
-    for i in range(2, length): # remove timing and volts output
-        jvList.append(arr[:,i])
-
-    dead_pixels = []
-    for i in range(0,len(jvList),2):
-        # get_logger().log(i)
-        # get_logger().log(jvList[i], jvList[i+1])
-        jvList[i] = [float(j) for j in jvList[i]]
-        jvList[i+1] = [float(x) for x in jvList[i+1]]
-        if np.mean(np.absolute(np.array(jvList[i]))) < 0.2 or np.mean(np.absolute(np.array(jvList[i+1]))) < 0.2:
-            dead_pixels.append(int(i/2))#[9, 12, 13, 19, 21, 27, 30, 31]
-
-    return dead_pixels
+    return [int(i) for i in dead_pixels]
 
 def scan_calcs(graph_name):
     '''
     returns: reverse:[fillFactorListSplit, jscListSplit, vocListSplit], forward:[fillFactorListSplit, jscListSplit, vocListSplit]
     '''
-    arr = np.loadtxt(graph_name, delimiter=",", dtype=str)
-    dead_pixels = get_dead_pixels(graph_name)
-    # get_logger().log(dead_pixels)
-    graph_name = graph_name.split('\\')
-    # get_logger().log(arr)
-
-    headers = arr[6,:]
-
-    header_dict = {value: index for index, value in enumerate(headers)}
-    # get_logger().log(header_dict)
-    arr = arr[7:, :]
-    length = (len(headers) - 1)
-    # get_logger().log(length)
-
-    jvList = []
-
-    for i in range(2, length):
-        jvList.append(arr[:,i])
-
-
-    jList = [] #current
-    vList = [] #voltage
-    for i in range(0,len(jvList),2):
-        # get_logger().log(i)
-        jList.append([float(j) for j in jvList[i+1]])
-        vList.append([float(x) for x in jvList[i]])
-        # jvList[i+1] = [float(x) / 0.128 for x in jvList[i+1]]
-
-    jList = np.array(jList).T
-    vList = np.array(vList).T
-    jListReverse, jListForward = np.array_split(jList, 2)
-    vListReverse, vListForward = np.array_split(vList, 2)
-
-    def calc(jList, vList):
-
-        # find Jsc (V = 0)
-        jscList = np.zeros((vList.shape[1]))
-        for i in range(vList.shape[1]):
-            difference_array = np.absolute(vList[:,i])
-            idx = difference_array.argmin()
-            jscList[i] = jList[idx,i]
-
-        # find Voc (J = 0)
-        vocList = np.zeros((jList.shape[1]))
-        for i in range(jList.shape[1]):
-            difference_array = np.absolute(jList[:,i])
-            idx = difference_array.argmin()
-            vocList[i] = vList[idx,i]
-
-        # find Fill Factor
-        pce_list = jList*vList
-        # get_logger().log(np.array(pce_list).shape)
-        maxVIdx = np.argmax(pce_list, axis=0) # find index of max pce value
-        # get_logger().log(np.array(maxVIdx).shape)
-        vmppList = []
-        jmppList = []
-        for i in range(len(maxVIdx)): # for i in number of pixels
-            # if vList[maxVIdx[i],i]>0:
-            vmppList.append(vList[maxVIdx[i],i])
-            jmppList.append(jList[maxVIdx[i],i])
-        vmppList = np.array(vmppList)
-        jmppList = np.array(jmppList)
-
-        fillFactorList = 100*vmppList*jmppList/(jscList*vocList)
-        jscList = jscList/0.128
+    run = get_run_cache().get_run(graph_name)
+
+    # (pixels, points) curves, dead pixels are masked in the same pass
+    results = BatchIVCalculations.analyze_sweeps(run.pixel_V.T, run.pixel_mA.T)
+    dead_pixels = np.where(results["dead"])[0]
+
+    def calc(stats):
+        fillFactorList = 100*stats["FF"]
+        jscList = stats["Jsc"]/0.128
         # jscList = jscList/0.0625
+        vocList = stats["Voc"]
 
         fillFactorList = np.delete(fillFactorList, dead_pixels)
         jscList = np.delete(jscList, dead_pixels)
@@ -340,7 +263,7 @@ def scan_calcs(graph_name):
         # fillFactorList, jscList, vocList
         return (fillFactorList, jscList, vocList)
 
-    return calc(jListReverse, vListReverse), calc(jListForward, vListForward)
+    return calc(results["Reverse"]), calc(results["Forward"])
 
 def list_files_in_directory(directory):
     filepaths = []
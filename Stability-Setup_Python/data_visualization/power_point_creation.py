@@ -6,6 +6,8 @@ import numpy as np
 from pptx.enum.text import PP_ALIGN
 import os
 
+from core.run_data import load_run
+
 # Create a new PowerPoint presentation
 class PowerPointCreator:
     '''
@@ -65,7 +67,7 @@ class PowerPointCreator:
 
     def slide1Title(self):
         slide_layout = self.prs.slide_layouts[1]
-        measurementParams = np.loadtxt(self.PnOcsv, delimiter=",", dtype=str)[0:5,0:2]
+        measurementParams = load_run(self.PnOcsv).metadata_block()[0:5,0:2].astype(str)
         # startDate = self.pno["csv"].split('\\')[-1].split(" ")[0][3:]
 
         slide = self.prs.slides.add_slide(slide_layout)
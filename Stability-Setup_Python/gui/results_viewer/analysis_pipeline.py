@@ -0,0 +1,166 @@
+# analysis_pipeline.py
+import os
+import threading
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from PySide6.QtCore import QObject, Signal
+
+from core.run_analysis import analyze_run_files, default_workers
+from core.run_cache import get_run_cache
+from helper.global_helpers import get_logger
+from .calculations import MPPT_PYRAMID, MPPT_STATS, SCAN_STATS, MPPTCalculations, ScanCalculations
+
+
+def _scan_stats(paths: List[str]) -> Dict[str, Any]:
+    return ScanCalculations.calculate_scan_stats_by_file([path for path in paths if path.endswith("scan.csv")])
+
+
+def _mppt_stats(paths: List[str]) -> Dict[str, Any]:
+    return {path: MPPTCalculations.calculate_mppt_file_stats(path) for path in paths if path.endswith("mppt.csv")}
+
+
+def _mppt_pce_pyramid(paths: List[str]) -> Dict[str, Any]:
+    return {path: MPPTCalculations.pyramid(path, "pce") for path in paths if path.endswith("mppt.csv")}
+
+
+def analyze_results_files(paths: List[str]) -> List[Dict[str, Any]]:
+    """
+    analyze_run_files with the stats tables and the (default) pce plot
+    pyramid the Results Viewer shows; the scan stats of all scan files in
+    paths are computed in one batch.
+    """
+    return analyze_run_files(paths, {
+        SCAN_STATS: _scan_stats,
+        MPPT_STATS: _mppt_stats,
+        MPPT_PYRAMID.format("pce"): _mppt_pce_pyramid,
+    })
+
+
+class AnalysisPipeline(QObject):
+    """
+    Fans run-file analysis out to a process pool and streams results back.
+
+    Scan files are analysed per folder in batches (see _work_items), every
+    other file on its own. Signals are emitted from the pool's callback
+    thread, so receivers in the GUI thread get them through queued
+    connections. The stats of analyze_results_files are put into the run
+    cache before file_done is emitted, so plotting the file afterwards does
+    not compute them again.
+
+    file_done and file_failed carry the generation of the batch; a batch
+    that was cancelled may still have signals queued to the GUI thread,
+    receivers drop those whose generation is not the current one.
+    """
+
+    file_done = Signal(int, str, object)  # generation, path, result
+    file_failed = Signal(int, str, str)  # generation, path, error message
+    progress = Signal(int, int)  # finished, total
+    finished = Signal()
+
+    def __init__(self, max_workers: Optional[int] = None, parent=None):
+        super().__init__(parent)
+        self.max_workers = max_workers or default_workers()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._futures: List = []
+        self._total = 0
+        self._done = 0
+        self._generation = 0
+        self._lock = threading.RLock()
+
+    @property
+    def generation(self) -> int:
+        """Generation of the current batch, every start() or cancel() begins a new one."""
+        return self._generation
+
+    @property
+    def is_running(self) -> bool:
+        return self._done < self._total
+
+    def start(self, paths: List[str],
+              func: Callable[[List[str]], List[Dict[str, Any]]] = analyze_results_files) -> None:
+        """
+        Analyses paths in the background, cancelling any unfinished batch.
+
+        func gets the paths of one work item and returns one result per path.
+        """
+        self.cancel()
+        generation = self._generation
+        self._total = len(paths)
+        self._done = 0
+        if not paths:
+            self.finished.emit()
+            return
+
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        get_logger().log(f"Analysing {len(paths)} files on {self.max_workers} processes")
+        self.progress.emit(0, self._total)
+        for item in self._work_items(paths):
+            future = self._pool.submit(func, item)
+            future.add_done_callback(
+                lambda f, item=item: self._on_done(generation, item, f)
+            )
+            self._futures.append(future)
+
+    def _work_items(self, paths: List[str]) -> List[List[str]]:
+        """The scan files of a folder in one batch per worker, every other file on its own."""
+        scans = defaultdict(list)
+        items = []
+        for path in paths:
+            if path.endswith("scan.csv"):
+                scans[os.path.dirname(path)].append(path)
+            else:
+                items.append([path])
+        for folder_scans in scans.values():
+            size = -(-len(folder_scans) // self.max_workers)
+            items.extend(folder_scans[i:i + size] for i in range(0, len(folder_scans), size))
+        return items
+
+    def cancel(self) -> None:
+        with self._lock:
+            for future in self._futures:
+                future.cancel()
+            self._futures.clear()
+            self._generation += 1
+            self._total = self._done = 0
+
+    def shutdown(self) -> None:
+        self.cancel()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _on_done(self, generation: int, paths: List[str], future) -> None:
+        # callbacks run on the pool's management thread (or the caller's
+        # thread if the future already finished)
+        with self._lock:
+            self._handle_done(generation, paths, future)
+
+    def _handle_done(self, generation: int, paths: List[str], future) -> None:
+        if generation != self._generation or future.cancelled():
+            return
+        try:
+            results = future.result()
+        except Exception as e:
+            results = [{"path": path, "error": str(e)} for path in paths]
+        for result in results:
+            self._handle_result(generation, result)
+
+    def _handle_result(self, generation: int, result: Dict[str, Any]) -> None:
+        path = result["path"]
+        if "error" in result:
+            get_logger().log(f"Error analysing {path}: {result['error']}")
+            self.file_failed.emit(generation, path, result["error"])
+        else:
+            cache = get_run_cache()
+            for name, stats in result.get("stats", {}).items():
+                cache.put_stats(path, name, result["signature"], stats)
+            self.file_done.emit(generation, path, result)
+
+        self._done += 1
+        self.progress.emit(self._done, self._total)
+        if self._done == self._total:
+            self._futures.clear()
+            self.finished.emit()
@@ -1,9 +1,16 @@
 # calculations.py
-import os
-import re
 import numpy as np
+from core.iv_calculations import BatchIVCalculations  # re-exported for the Results Viewer
+from core.run_cache import get_run_cache
+from core.series_pyramid import SeriesPyramid
 from helper.global_helpers import get_logger
 
+# Names of the stats table rows in the run cache
+SCAN_STATS = "scan_stats"
+MPPT_STATS = "mppt_stats"
+# Name of the plot pyramid of an mppt data type ("pce", "voltage" or "current") in the run cache
+MPPT_PYRAMID = "pyramid/{}"
+
 class ScanCalculations:
     """Handles all calculations related to scan data analysis."""
 
@@ -11,6 +18,9 @@ class ScanCalculations:
     def get_stats(voltage, current):
         """Calculate photovoltaic statistics for a single pixel's I-V curve.
 
+        Per curve reference for BatchIVCalculations.curve_stats, which the
+        stats tables use; tests/test_calculations.py checks they agree.
+
         Args:
             voltage: 1D array of voltage values
             current: 1D array of current values
@@ -52,157 +62,128 @@ class ScanCalculations:
     @staticmethod
     def calculate_scan_stats(csv_file):
         """Calculate statistics for all pixels in a single CSV file."""
-        try:
-            arr = np.loadtxt(csv_file, delimiter=",", dtype=str)
-            header_row = np.where(arr == "Time")[0][0]
-
-            meta_data = {}
-            for data in arr[:header_row, :2]:
-                meta_data[data[0]] = data[1]
-
-            arr = arr[header_row + 1 :, :]
-            data = arr[:, 2:-1]  # Gets rid of time and voltage applied columns
-            pixel_V = data[:, ::2].astype(float)
-            pixel_mA = data[:, 1::2].astype(float)
-
-            # Get cell area for current density calculation
-            cell_area = float(meta_data.get("Cell Area (mm^2)", 0.128))
-
-            # Convert to current density (mA/cm²)
-            pixel_mA_cm2 = pixel_mA / cell_area
-
-            # Split data into two halves
-            jvLen = pixel_V.shape[0] // 2
-
-            # Extract file ID from filename
-            basename = os.path.basename(csv_file)
-            match = re.search(r"ID(\d+)", basename, re.IGNORECASE)
-            file_id = match.group(1) if match else "Unknown"
-
-            stats_list = []
+        return ScanCalculations.calculate_scan_stats_batch([csv_file])
 
-            # Process each pixel
-            for pixel_idx in range(pixel_V.shape[1]):
-                # Split voltage and current data into two halves
-                V_first_half = pixel_V[0:jvLen, pixel_idx]
-                I_first_half = pixel_mA_cm2[0:jvLen, pixel_idx]
-
-                V_second_half = pixel_V[jvLen:, pixel_idx]
-                I_second_half = pixel_mA_cm2[jvLen:, pixel_idx]
-
-                # Determine which half is forward (increasing voltage) and which is reverse (decreasing voltage)
-                first_half_trend = (
-                    np.polyfit(range(len(V_first_half)), V_first_half, 1)[0]
-                    if len(V_first_half) > 1
-                    else 0
-                )
-                second_half_trend = (
-                    np.polyfit(range(len(V_second_half)), V_second_half, 1)[0]
-                    if len(V_second_half) > 1
-                    else 0
-                )
+    @staticmethod
+    def calculate_scan_stats_batch(csv_files):
+        """Calculate statistics for all pixels in many scan files in one vectorized pass.
 
-                # Assign forward (increasing voltage) and reverse (decreasing voltage) based on trends
-                if first_half_trend > second_half_trend:
-                    # First half is forward (increasing), second half is reverse (decreasing)
-                    V_forward, I_forward = V_first_half, I_first_half
-                    V_reverse, I_reverse = V_second_half, I_second_half
-                else:
-                    # Second half is forward (increasing), first half is reverse (decreasing)
-                    V_forward, I_forward = V_second_half, I_second_half
-                    V_reverse, I_reverse = V_first_half, I_first_half
-
-                # Calculate stats for reverse sweep
-                try:
-                    reverse_stats = ScanCalculations.get_stats(V_reverse, I_reverse)
-                    stats_list.append(
-                        {
-                            "file_id": file_id,
-                            "pixel": pixel_idx + 1,
-                            "sweep": "Reverse",
-                            "FF": reverse_stats["FF"] * 100,  # Convert to percentage
-                            "PCE": reverse_stats["PCE"],
-                            "Jsc": abs(reverse_stats["Jsc"]),  # Take absolute value
-                            "Voc": reverse_stats["Voc"],
-                        }
-                    )
-                except Exception as e:
-                    get_logger().log(
-                        f"Error calculating reverse stats for pixel {pixel_idx + 1}: {e}"
-                    )
+        Returns:
+            list: One dict per file, pixel and sweep, in file order
+        """
+        stats_by_file = ScanCalculations.calculate_scan_stats_by_file(csv_files)
+        stats_list = []
+        for csv_file in csv_files:
+            stats_list.extend(stats_by_file[csv_file])
+        return stats_list
 
-                # Calculate stats for forward sweep
-                try:
-                    forward_stats = ScanCalculations.get_stats(V_forward, I_forward)
-                    stats_list.append(
-                        {
-                            "file_id": file_id,
-                            "pixel": pixel_idx + 1,
-                            "sweep": "Forward",
-                            "FF": forward_stats["FF"] * 100,  # Convert to percentage
-                            "PCE": forward_stats["PCE"],
-                            "Jsc": abs(forward_stats["Jsc"]),  # Take absolute value
-                            "Voc": forward_stats["Voc"],
-                        }
-                    )
-                except Exception as e:
-                    get_logger().log(
-                        f"Error calculating forward stats for pixel {pixel_idx + 1}: {e}"
-                    )
+    @staticmethod
+    def calculate_scan_stats_by_file(csv_files):
+        """Like calculate_scan_stats_batch, with the rows of each file kept apart.
 
-            return stats_list
+        Files with the same number of points are stacked into one
+        (files, pixels, points) tensor and analysed by BatchIVCalculations.
 
-        except Exception as e:
-            get_logger().log(f"Error processing file {csv_file}: {e}")
-            return []
+        Returns:
+            dict: csv file -> its stats rows ([] if it could not be analysed)
+        """
+        runs = {}
+        for csv_file in csv_files:
+            try:
+                runs[csv_file] = get_run_cache().get_run(csv_file)
+            except Exception as e:
+                get_logger().log(f"Error processing file {csv_file}: {e}")
+
+        # group files by curve length so each group is one tensor
+        groups = {}
+        for csv_file, run in runs.items():
+            groups.setdefault(len(run), []).append(csv_file)
+
+        stats_by_file = {csv_file: [] for csv_file in csv_files}
+        for group_files in groups.values():
+            group_runs = [runs[csv_file] for csv_file in group_files]
+            try:
+                # (files, points, pixels) -> (files, pixels, points)
+                V = np.stack([run.pixel_V for run in group_runs]).transpose(0, 2, 1)
+                mA = np.stack([run.pixel_mA for run in group_runs]).transpose(0, 2, 1)
+                # Convert to current density (mA/cm²)
+                cell_areas = np.array([run.cell_area() for run in group_runs])
+                J = mA / cell_areas[:, np.newaxis, np.newaxis]
+                results = BatchIVCalculations.analyze_sweeps(V, J, dead_current=mA)
+            except Exception as e:
+                get_logger().log(f"Error processing files {group_files}: {e}")
+                continue
+
+            for file_idx, (csv_file, run) in enumerate(zip(group_files, group_runs)):
+                stats_list = []
+                for pixel_idx in range(V.shape[1]):
+                    for sweep in ("Reverse", "Forward"):
+                        sweep_stats = results[sweep]
+                        stats_list.append(
+                            {
+                                "file_id": run.file_id,
+                                "pixel": pixel_idx + 1,
+                                "sweep": sweep,
+                                "FF": sweep_stats["FF"][file_idx, pixel_idx] * 100,  # Convert to percentage
+                                "PCE": sweep_stats["PCE"][file_idx, pixel_idx],
+                                "Jsc": abs(sweep_stats["Jsc"][file_idx, pixel_idx]),  # Take absolute value
+                                "Voc": sweep_stats["Voc"][file_idx, pixel_idx],
+                                "Vmp": sweep_stats["Vmp"][file_idx, pixel_idx],
+                                "Imp": sweep_stats["Imp"][file_idx, pixel_idx],
+                                "Rs": sweep_stats["Rs"][file_idx, pixel_idx],
+                                "Rsh": sweep_stats["Rsh"][file_idx, pixel_idx],
+                                "dead": bool(results["dead"][file_idx, pixel_idx]),
+                            }
+                        )
+                stats_by_file[csv_file] = stats_list
+        return stats_by_file
 
 
 class MPPTCalculations:
     """Handles all calculations related to MPPT data analysis."""
 
+    @staticmethod
+    def pixel_values(run, data_type):
+        """Pixel pce, voltage or current density of the rows of a run."""
+        if data_type == "pce":
+            cell_area = float(run.metadata["Cell Area (mm^2)"])
+            return ((run.pixel_V * run.pixel_mA / 1000) / (0.1 * cell_area)) * 100
+        if data_type == "voltage":
+            return run.pixel_V
+        cell_area = float(run.metadata["Cell Area (mm^2)"])
+        return run.pixel_mA / (0.1 * cell_area)  # Convert to current density (mA/cm²)
+
+    @staticmethod
+    def pyramid(csv_file, data_type):
+        """Min/max/mean pyramid of one mppt file's pixel pce, voltage or current density."""
+        run = get_run_cache().get_run(csv_file)
+        return SeriesPyramid(run.time, MPPTCalculations.pixel_values(run, data_type))
+
     @staticmethod
     def calculate_mppt_file_stats(csv_file, combined=False):
         """Calculate MPPT statistics for all pixels in a single CSV file."""
         try:
-            arr = np.loadtxt(csv_file, delimiter=",", dtype=str)
+            run = get_run_cache().get_run(csv_file)
         except Exception as e:
             get_logger().log(f"Error processing MPPT file {csv_file}: {e}")
             return []
 
-
-        header_row = np.where(arr == "Time")[0][0]
-
-        meta_data = {}
-        for data in arr[:header_row, :2]:
-            meta_data[data[0]] = data[1]
-
-        headers = arr[header_row, :]
-        arr = arr[header_row + 1 :, :]
-
-        header_dict = {value: index for index, value in enumerate(headers)}
-        if "Time" not in header_dict:
-            get_logger().log(f"'Time' header not found in {csv_file}")
-            return []
-
-        pixel_V = arr[:, 1::2][:, 0:8].astype(float)
-        pixel_mA = arr[:, 2::2][:, 0:8].astype(float)
-        time = np.array(arr[:, header_dict["Time"]]).astype("float")
+        pixel_V = run.pixel_V
+        pixel_mA = run.pixel_mA
+        time = run.time
 
         if len(time) < 1:
             return []
 
         # Get cell area for PCE calculation
-        cell_area = float(meta_data.get("Cell Area (mm^2)", 0.128))
+        cell_area = run.cell_area()
 
         # Calculate PCE for each pixel: (V * I / 1000) / (0.1 * cell_area) * 100
         data = ((pixel_V * pixel_mA / 1000) / (0.1 * cell_area)) * 100
         # Convert time to minutes
         time_minutes = time / 60.0
 
-        # Extract file ID from filename
-        basename = os.path.basename(csv_file)
-        match = re.search(r"ID(\d+)", basename, re.IGNORECASE)
-        file_id = match.group(1) if match else "Unknown"
+        file_id = run.file_id
 
         stats_list = []
 
@@ -4,6 +4,7 @@ from datetime import datetime
 from typing import List, Dict
 from helper.global_helpers import get_logger
 from constants import Constants
+from core.run_data import load_run
 import numpy as np
 
 MINIMUM_MINUTES = 20
@@ -190,23 +191,13 @@ def load_and_validate_mppt_file(file_path):
     """
     print(f"Loading {os.path.basename(file_path)}...")
 
-    # Load the file as string array
-    arr = np.loadtxt(file_path, delimiter=",", dtype=str)
-
-    # Find the header row (contains "Time")
-    header_row_idx = np.where(arr == "Time")[0]
-    if len(header_row_idx) == 0:
-        raise ValueError(f"No 'Time' column found in {file_path}")
-
-    header_row = header_row_idx[0]
+    # Binary copy if there is one, otherwise the csv (raises ValueError without a "Time" row)
+    run = load_run(file_path)
 
     # Extract components
-    headers = arr[header_row, :]
-    metadata = arr[:header_row + 1, :]
-    data = arr[header_row + 1:, :]
-
-    # Convert data to appropriate types
-    data_numeric = data.astype(float)
+    headers = np.array(run.headers)
+    metadata = run.metadata_block()
+    data_numeric = run.data
 
     print(f"  - Data shape: {data_numeric.shape}")
     print(f"  - Time range: {data_numeric[0, 0]:.1f} to {data_numeric[-1, 0]:.1f} seconds")
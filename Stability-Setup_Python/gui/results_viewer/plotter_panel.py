@@ -7,13 +7,17 @@ from PySide6.QtWidgets import (
     QFormLayout,
     QLineEdit,
     QPushButton,
+    QCheckBox,
     QHBoxLayout,
     QFileDialog,
     QTabWidget,
     QMessageBox,
+    QProgressBar,
+    QApplication,
 )
 from PySide6.QtCore import Qt
 from gui.results_viewer.plotter_widget import PlotterWidget
+from gui.results_viewer.analysis_pipeline import AnalysisPipeline
 from gui.results_viewer.combine_plots import combine_plots_main
 from gui.results_viewer.combine_plots import MINIMUM_MINUTES
 from helper.global_helpers import get_logger
@@ -26,6 +30,18 @@ class PlotterPanel(QWidget):
     def __init__(self, default_folder: str = "", parent=None):
         super().__init__(parent)
         self.default_folder = default_folder
+        self.plot_groups = {}
+        self.pending_groups = {}
+        self.group_order = []
+        self.plot_tab_widget = None
+        self.analysis_pipeline = AnalysisPipeline(parent=self)
+        self.analysis_pipeline.file_done.connect(self.on_file_analyzed)
+        self.analysis_pipeline.file_failed.connect(self.on_file_analyzed)
+        self.analysis_pipeline.progress.connect(self.on_analysis_progress)
+        # the panel is a tab of the main window and gets no close event of its own
+        app = QApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.analysis_pipeline.shutdown)
         self.init_ui()
 
     def init_ui(self):
@@ -56,10 +72,24 @@ class PlotterPanel(QWidget):
         combine_plots_button.clicked.connect(self.combine_plots)
         h_layout.addWidget(combine_plots_button)
 
+        # Follow files that are still being written.
+        self.live_view_checkbox = QCheckBox("Live View")
+        self.live_view_checkbox.setToolTip(
+            f"Append new rows to the plots every {Constants.live_plot_interval_ms} ms while a trial is running"
+        )
+        self.live_view_checkbox.toggled.connect(self.set_live_view)
+        h_layout.addWidget(self.live_view_checkbox)
+
         form_layout.addRow("CSV Folder", container)
 
         layout.addLayout(form_layout)
 
+        # --- Analysis progress, only shown while files are being analysed ---
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setFormat("Analysing files %v/%m")
+        self.progress_bar.setVisible(False)
+        layout.addWidget(self.progress_bar)
+
         # --- Plot Container for QTabWidget of Plotters ---
         self.plot_container = QWidget()
         self.plot_container.setLayout(QVBoxLayout())
@@ -106,7 +136,12 @@ class PlotterPanel(QWidget):
             QMessageBox.information(self, "Error", "Invalid Plotting Folder.")
 
     def update_plot_tabs(self, plot_groups: dict):
-        """Clear the plot container and create a QTabWidget with a tab for each plot group."""
+        """
+        Clear the plot container and create a QTabWidget with a tab for each plot group.
+
+        The files are parsed and their stats computed in the analysis process
+        pool; each tab is added as soon as all files of its group are done.
+        """
         plot_layout = self.plot_container.layout()
         # Remove any existing widgets
         while plot_layout.count():
@@ -114,12 +149,56 @@ class PlotterPanel(QWidget):
             if child.widget():
                 child.widget().deleteLater()
 
-        plot_tab_widget = QTabWidget()
-        for title, filepaths in reversed(plot_groups.items()):
-            plotter_widget = PlotterWidget()
-            plotter_widget.update_plot(title, filepaths)
-            plot_tab_widget.addTab(plotter_widget, title)
-        plot_layout.addWidget(plot_tab_widget)
+        self.plot_tab_widget = QTabWidget()
+        plot_layout.addWidget(self.plot_tab_widget)
+
+        self.group_order = list(reversed(plot_groups.keys()))
+        self.pending_groups = {
+            title: set(filepaths) for title, filepaths in plot_groups.items()
+        }
+        self.plot_groups = plot_groups
+        files = sorted({f for filepaths in plot_groups.values() for f in filepaths})
+        self.analysis_pipeline.start(files)
+
+    def on_file_analyzed(self, generation, path, _result=None):
+        """Adds the tabs of every group whose files have all been analysed."""
+        if generation != self.analysis_pipeline.generation:
+            return  # queued before the current batch was started
+        for title in list(self.pending_groups):
+            remaining = self.pending_groups[title]
+            remaining.discard(path)
+            if not remaining:
+                del self.pending_groups[title]
+                self.add_plot_tab(title, self.plot_groups[title])
+
+    def add_plot_tab(self, title: str, filepaths):
+        """Inserts a plot tab at its position in the group order."""
+        plotter_widget = PlotterWidget()
+        plotter_widget.update_plot(title, filepaths)
+        added = {self.plot_tab_widget.tabText(i) for i in range(self.plot_tab_widget.count())}
+        index = sum(1 for other in self.group_order[:self.group_order.index(title)] if other in added)
+        self.plot_tab_widget.insertTab(index, plotter_widget, title)
+        plotter_widget.set_live(self.live_view_checkbox.isChecked())
+        if index == 0:
+            self.plot_tab_widget.setCurrentIndex(0)
+
+    def set_live_view(self, enabled: bool):
+        """Turns live view on or off for every plot tab."""
+        get_logger().log(f"Live view {'enabled' if enabled else 'disabled'}")
+        if self.plot_tab_widget is None:
+            return
+        for i in range(self.plot_tab_widget.count()):
+            self.plot_tab_widget.widget(i).set_live(enabled)
+
+    def on_analysis_progress(self, finished: int, total: int):
+        self.progress_bar.setMaximum(total)
+        self.progress_bar.setValue(finished)
+        self.progress_bar.setVisible(finished < total)
+
+    def closeEvent(self, event):
+        # stop the worker processes of the analysis pool
+        self.analysis_pipeline.shutdown()
+        super().closeEvent(event)
 
     def get_plot_groups(self, folder_path: str) -> dict:
         """
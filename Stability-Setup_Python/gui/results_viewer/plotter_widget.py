@@ -1,6 +1,8 @@
 # plotter.py
 import os
 import re
+from dataclasses import dataclass, field
+from typing import List
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.font_manager import FontProperties
@@ -20,10 +22,45 @@ from PySide6.QtWidgets import (
 )
 from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.backends.backend_qtagg import NavigationToolbar2QT as NavigationToolbar
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, QTimer
+from constants import Constants
+from core.run_cache import file_signature, get_run_cache
+from core.run_data import RunData, RunTail
+from controller.sample_bus import RunFollower, get_sample_bus
 from helper.global_helpers import get_logger
+from .calculations import MPPT_PYRAMID, MPPTCalculations
 from .stats_tables import StatsTableFactory
 
+@dataclass
+class LiveSeries:
+    """The lines of one mppt file in live view and the rows appended since the plot was made."""
+    tail: object  # RunTail, or RunFollower for a run of this process
+    last_time: float
+    seconds_per_unit: float
+    lines: List = field(default_factory=list)
+    time: np.ndarray = field(default_factory=lambda: np.empty(0))
+    values: np.ndarray = field(default_factory=lambda: np.empty((0, 0)))
+
+    def append(self, time, values):
+        """Adds rows, halving the stored points with a min/max envelope once there are too many."""
+        self.time = np.concatenate([self.time, time])
+        self.values = np.concatenate([self.values.reshape(-1, values.shape[1]), values])
+        self.last_time = float(time[-1])
+        while len(self.time) > 2 * Constants.mppt_plot_max_points:
+            groups = len(self.time) // 4
+            head_t = self.time[: groups * 4].reshape(groups, 4)
+            head_v = self.values[: groups * 4].reshape(groups, 4, -1)
+            envelope_t = np.column_stack([head_t[:, 0], head_t[:, -1]]).ravel()
+            envelope_v = np.stack([np.nanmin(head_v, axis=1), np.nanmax(head_v, axis=1)], axis=1)
+            self.time = np.concatenate([envelope_t, self.time[groups * 4:]])
+            self.values = np.concatenate([envelope_v.reshape(-1, self.values.shape[1]), self.values[groups * 4:]])
+
+    def update_lines(self):
+        x = self.time / self.seconds_per_unit
+        for line, pixel in self.lines:
+            line.set_data(x, self.values[:, pixel])
+
+
 #TODO: add raw current/current density measurement
 class PlotterWidget(QWidget):
     def __init__(self, parent=None):
@@ -40,6 +77,19 @@ class PlotterWidget(QWidget):
         self.current_plot_title = ""
         self.current_ax = None
         self.current_canvas = None
+        # (line, pyramid, pixel, seconds per x unit, file) of the mppt plot, re-queried on zoom
+        self.pyramid_lines = []
+        self.current_data_type = "pce"
+        # csv size when each mppt file was plotted, live view reads from there
+        self.plotted_sizes = {}
+        # Live view: files are tailed every live_plot_interval_ms and new points blitted
+        self.live = False
+        self.live_series = []
+        self._live_background = None
+        self._live_draw_cid = None
+        self.live_timer = QTimer(self)
+        self.live_timer.setInterval(Constants.live_plot_interval_ms)
+        self.live_timer.timeout.connect(self._live_tick)
 
     def _init_ui(self):
         self.layout = QVBoxLayout(self)
@@ -63,8 +113,10 @@ class PlotterWidget(QWidget):
         self.current_plot_title = plot_title
 
         # Clear any previous content.
+        self._stop_live_series()
         self._clear_layout(self.plot_container_layout)
         self.mppt = False
+        self.pyramid_lines = []
 
         # Create the plot.
         fig, ax = plt.subplots(tight_layout=True)
@@ -75,6 +127,8 @@ class PlotterWidget(QWidget):
             self._plot_mppt(ax, csv_files, plot_title)
             self.mppt = True
         else:
+            for csv_file in csv_files:
+                self._record_plotted_size(csv_file)
             self._plot_scan(ax, csv_files, plot_title)
 
         # Build the canvas and toolbar.
@@ -131,6 +185,8 @@ class PlotterWidget(QWidget):
 
         canvas.draw()
         plt.close(fig)
+        if self.live and self.mppt:
+            self._start_live_series()
 
     def _clear_layout(self, layout):
         while layout.count():
@@ -158,61 +214,41 @@ class PlotterWidget(QWidget):
         else:
             colors = plt.cm.hsv(np.linspace(0, 1, len(csv_files), endpoint=False))
 
-        for file_idx, csv_file in enumerate(csv_files):
-            arr = np.loadtxt(csv_file, delimiter=",", dtype=str)
-            header_row = np.where(arr == "Time")[0][0]
-
-            meta_data = {}
-            for data in arr[:header_row, :2]:
-                meta_data[data[0]] = data[1]
+        y_labels = {"pce": "PCE [%]", "voltage": "Voltage [V]", "current": "Current Density [mA/cm²]"}
+        if data_type not in y_labels:
+            raise ValueError(f"Invalid data_type: {data_type}. Must be 'pce', 'voltage', or 'current'")
+        y_label = y_labels[data_type]
+        self.current_data_type = data_type
 
-            headers = arr[header_row, :]
-            arr = arr[header_row + 1 :, :]
-
-            header_dict = {value: index for index, value in enumerate(headers)}
-            pixel_V = arr[:, 1::2][:, 0:8].astype(float)
-            pixel_mA = arr[:, 2::2][:, 0:8].astype(float)
-            time = np.array(arr[:, header_dict["Time"]]).astype("float")
-            if len(time) < 1:
+        self.pyramid_lines = []
+        for file_idx, csv_file in enumerate(csv_files):
+            self._record_plotted_size(csv_file)
+            pyramid = get_run_cache().get_stats(
+                csv_file, MPPT_PYRAMID.format(data_type), lambda path: MPPTCalculations.pyramid(path, data_type)
+            )
+            if len(pyramid) < 1:
                 return
 
-            # Calculate data based on type
-            if data_type == "pce":
-                cell_area = float(meta_data["Cell Area (mm^2)"])
-                data = ((pixel_V * pixel_mA / 1000) / (0.1 * cell_area)) * 100
-                y_label = "PCE [%]"
-            elif data_type == "voltage":
-                data = pixel_V
-                y_label = "Voltage [V]"
-            elif data_type == "current":
-                cell_area = float(meta_data["Cell Area (mm^2)"])
-                data = pixel_mA / (0.1 * cell_area)  # Convert to current density (mA/cm²)
-                y_label = "Current Density [mA/cm²]"
-            else:
-                raise ValueError(f"Invalid data_type: {data_type}. Must be 'pce', 'voltage', or 'current'")
-
-            # Sample data if necessary
-            if len(time) > 5000:
-                step = int(np.ceil(len(time) / 5000))
-                time = time[::step]
-                data = data[::step, :]
-
+            # Lines start with the envelope of the whole run, zooming re-queries finer levels
+            time, data = pyramid.query(max_points=Constants.mppt_plot_max_points)
             time = time / 60.0  # convert to minutes from seconds
+            seconds_per_unit = 60.0
 
             # Update overall ranges
             if overall_min_time is None:
                 overall_min_time = min(time)
                 overall_max_time = max(time)
-                overall_max_value = np.max(data)
+                overall_max_value = pyramid.max()
             else:
                 overall_min_time = min(overall_min_time, min(time))
                 overall_max_time = max(overall_max_time, max(time))
-                overall_max_value = max(overall_max_value, np.max(data))
+                overall_max_value = max(overall_max_value, pyramid.max())
 
             # Convert time units if necessary
             if overall_max_time > 60:
                 time /= 60.0
                 overall_max_time /= 60
+                seconds_per_unit = 3600.0
                 time_label = "Time [hrs]"
             else:
                 time_label = "Time [min]"
@@ -226,7 +262,8 @@ class PlotterWidget(QWidget):
                 id_str = match.group(1) if match else ""
                 label_suffix = f" (ID {id_str})" if id_str else ""
                 lineName = f"Pixel {i+1}{label_suffix}"
-                ax.plot(time, data[:, i], label=lineName, color=file_color)
+                line, = ax.plot(time, data[:, i], label=lineName, color=file_color)
+                self.pyramid_lines.append((line, pyramid, i, seconds_per_unit, csv_file))
 
         if overall_min_time is None or overall_max_time is None:
             overall_min_time, overall_max_time = 0, 1
@@ -237,6 +274,8 @@ class PlotterWidget(QWidget):
         ax.set_xlabel(time_label)
         ax.set_ylabel(y_label)
         ax.grid(True)
+        # Axes.clear() drops the callbacks, so this is connected again on every replot
+        ax.callbacks.connect("xlim_changed", self._on_mppt_xlim_changed)
 
         # # Create line labels
         # self.line_label_texts = {}
@@ -257,6 +296,153 @@ class PlotterWidget(QWidget):
         #     )
         #     self.line_label_texts = dict(zip(lines, label_texts))
 
+    def _on_mppt_xlim_changed(self, ax):
+        """Replaces the line data with the pyramid level matching the new x range."""
+        x_min, x_max = ax.get_xlim()
+        queried = {}
+        for line, pyramid, pixel, seconds_per_unit, _ in self.pyramid_lines:
+            # the pixels of one file share a pyramid, query it once
+            key = (id(pyramid), seconds_per_unit)
+            if key not in queried:
+                queried[key] = pyramid.query(
+                    x_min * seconds_per_unit, x_max * seconds_per_unit, Constants.mppt_plot_max_points
+                )
+            time, data = queried[key]
+            line.set_data(time / seconds_per_unit, data[:, pixel])
+        # plt.close() in update_plot detaches the figure from its canvas, so use ours
+        if self.current_canvas is not None:
+            self.current_canvas.draw_idle()
+
+    def _record_plotted_size(self, csv_file):
+        try:
+            self.plotted_sizes[csv_file] = file_signature(csv_file)[1]
+        except OSError:
+            self.plotted_sizes[csv_file] = 0
+
+    def set_live(self, enabled):
+        """Starts or stops following the plotted files while they are being written."""
+        if enabled == self.live:
+            return
+        self.live = enabled
+        if enabled:
+            if self.mppt:
+                self._start_live_series()
+            self.live_timer.start()
+        else:
+            self.live_timer.stop()
+            self._stop_live_series()
+
+    def _start_live_series(self):
+        """
+        Tails every plotted mppt file from the size it had when it was loaded,
+        or follows it on the sample bus when a controller of this process is
+        writing it. The lines become animated, so new points are blitted over
+        a cached background instead of redrawing the whole figure.
+        """
+        self._stop_live_series()
+        by_file = {}
+        for line, pyramid, pixel, seconds_per_unit, csv_file in self.pyramid_lines:
+            series = by_file.get(csv_file)
+            if series is None:
+                tail = RunTail(csv_file, self.plotted_sizes.get(csv_file, 0))
+                run = get_sample_bus().active_run(csv_file)
+                if run is not None:
+                    tail = RunFollower(run, catch_up=tail)
+                series = by_file[csv_file] = LiveSeries(tail, pyramid.time_range[1], seconds_per_unit)
+                series.time, series.values = pyramid.query(max_points=Constants.mppt_plot_max_points)
+            line.set_animated(True)
+            series.lines.append((line, pixel))
+        self.live_series = list(by_file.values())
+        for series in self.live_series:
+            series.update_lines()
+        # the pyramids stop at the loaded rows, zooming now shows the live buffers
+        self.pyramid_lines = []
+        if self.current_canvas is not None:
+            self._live_draw_cid = self.current_canvas.mpl_connect("draw_event", self._on_live_draw)
+            self.current_canvas.draw_idle()
+
+    def _stop_live_series(self):
+        for series in self.live_series:
+            series.tail.close()
+            for line, _ in series.lines:
+                line.set_animated(False)
+        if self._live_draw_cid is not None and self.current_canvas is not None:
+            self.current_canvas.mpl_disconnect(self._live_draw_cid)
+            self.current_canvas.draw_idle()
+        self._live_draw_cid = None
+        self._live_background = None
+        self.live_series = []
+
+    def _on_live_draw(self, _event):
+        """After a full redraw: keep the figure without the live lines as the blit background."""
+        self._live_background = self.current_canvas.copy_from_bbox(self.current_ax.bbox)
+        self._draw_live_lines()
+
+    def _draw_live_lines(self):
+        # ax.draw_artist() would use the figure's (detached) canvas
+        renderer = self.current_canvas.get_renderer()
+        for series in self.live_series:
+            for line, _ in series.lines:
+                line.draw(renderer)
+        self.current_canvas.blit(self.current_ax.bbox)
+
+    def _live_tick(self):
+        """Appends the rows written since the last tick, at most every live_plot_interval_ms."""
+        if not self.mppt:
+            self._replot_changed_files()
+            return
+        ax, canvas = self.current_ax, self.current_canvas
+        if ax is None or canvas is None or not self.live_series:
+            return
+
+        x_min, x_max = ax.get_xlim()
+        y_min, y_max = ax.get_ylim()
+        new_x_max, new_y_max = x_max, y_max
+        updated = False
+        for series in self.live_series:
+            rows = series.tail.poll()
+            if not len(rows):
+                continue
+            run = RunData(series.tail.metadata, series.tail.headers, rows)
+            # rows the plot was made from are skipped by time
+            keep = run.time > series.last_time
+            if not keep.any():
+                continue
+            # follow the newest data unless the view was moved away from it
+            following = x_max >= series.last_time / series.seconds_per_unit
+            values = MPPTCalculations.pixel_values(run, self.current_data_type)[keep]
+            series.append(run.time[keep], values)
+            series.update_lines()
+            updated = True
+
+            end = series.last_time / series.seconds_per_unit
+            if following and end > new_x_max:
+                new_x_max = end * 1.01
+            if not np.isnan(values).all() and np.nanmax(values) > new_y_max:
+                new_y_max = np.nanmax(values) * 1.15
+
+        if not updated:
+            return
+        if new_x_max != x_max or new_y_max != y_max:
+            # the axes change, so the cached background is stale
+            ax.set_xlim(x_min, new_x_max)
+            ax.set_ylim(y_min, new_y_max)
+            canvas.draw_idle()
+        elif self._live_background is not None:
+            canvas.restore_region(self._live_background)
+            self._draw_live_lines()
+
+    def _replot_changed_files(self):
+        """Scan files are small, in live view a grown scan is plotted again."""
+        for csv_file in self.current_csv_files:
+            try:
+                size = file_signature(csv_file)[1]
+            except OSError:
+                continue
+            if size != self.plotted_sizes.get(csv_file):
+                self.update_plot(self.current_plot_title, self.current_csv_files)
+                return
+
     def _plot_scan(self, ax, csv_files, plot_title):
         # Get a color cycle for different CSV files
         # Use tab10 for up to 10 files, then cycle through or use other colormaps
@@ -270,21 +456,9 @@ class PlotterWidget(QWidget):
 
         for file_idx, csv_file in enumerate(csv_files):
             try:
-                arr = np.loadtxt(csv_file, delimiter=",", dtype=str)
-                header_row = np.where(arr == "Time")[0][0]
-
-                meta_data = {}
-                for data in arr[:header_row, :2]:
-                    meta_data[data[0]] = data[1]
-
-                arr = arr[header_row + 1 :, :]
-                data = arr[:, 2:-1] # Gets rid of time and voltage applied columns
-                pixel_V = data[:, ::2].astype(float)
-                pixel_mA = data[:, 1::2].astype(float)
-                if ("Cell Area (mm^2)" in meta_data):
-                    pixel_mA /= float(meta_data["Cell Area (mm^2)"])
-                else:
-                    pixel_mA /= 0.128
+                run = get_run_cache().get_run(csv_file)
+                pixel_V = run.pixel_V
+                pixel_mA = run.pixel_mA / run.cell_area()
                 jvLen = pixel_V.shape[0] // 2
                 file_color = colors[file_idx]
 
@@ -569,6 +743,8 @@ class PlotterWidget(QWidget):
 
             # Restore visibility states to the new plot
             self._restore_line_visibility_states(visibility_states)
+            if self.live:
+                self._start_live_series()
 
             # Redraw the canvas
             if self.current_canvas:
@@ -7,8 +7,9 @@ from PySide6.QtWidgets import (
     QTableWidgetItem,
     QHeaderView,
 )
+from core.run_cache import get_run_cache
 from helper.global_helpers import get_logger
-from .calculations import ScanCalculations, MPPTCalculations
+from .calculations import ScanCalculations, MPPTCalculations, SCAN_STATS, MPPT_STATS
 
 
 class StatsTableFactory:
@@ -29,12 +30,13 @@ class StatsTableFactory:
         # Create table
         table = QTableWidget()
 
-        # Calculate statistics for all files
+        # Calculate statistics for all files, the ones not cached yet in one batch
+        stats_by_file = get_run_cache().get_stats_many(
+            csv_files, SCAN_STATS, ScanCalculations.calculate_scan_stats_by_file
+        )
         all_stats = []
         for csv_file in csv_files:
-            file_stats = ScanCalculations.calculate_scan_stats(csv_file)
-            if file_stats:
-                all_stats.extend(file_stats)
+            all_stats.extend(stats_by_file.get(csv_file) or [])
 
         if not all_stats:
             # No data to display
@@ -87,7 +89,9 @@ class StatsTableFactory:
         # Calculate MPPT statistics for all files
         all_stats = []
         for csv_file in csv_files:
-            file_stats = MPPTCalculations.calculate_mppt_file_stats(csv_file)
+            file_stats = get_run_cache().get_stats(
+                csv_file, MPPT_STATS, MPPTCalculations.calculate_mppt_file_stats
+            )
             if file_stats:
                 all_stats.extend(file_stats)
 
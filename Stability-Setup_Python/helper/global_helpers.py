@@ -1,45 +1,181 @@
 # get_logger().py
-import inspect
+import logging
+import logging.handlers
+import os
+import sys
+import threading
+from collections import deque
 from datetime import datetime
-from PySide6.QtCore import QObject, Signal
+from PySide6.QtCore import QObject, QTimer
+from constants import Constants
+
+# Categories a message can be logged under, each with its own level/sampling
+GENERAL = "general"
+DATA = "data"  # every line received from an arduino during a measurement
 
 
 class Logger(QObject):
-    log_signal = Signal(str)
+    """
+    Application logger writing to stdout and to the Log Viewer widget.
+
+    Messages below the level of their category (see set_level) or skipped by
+    sampling (see set_sampling) are dropped before any formatting happens.
+    The caller's file/line is taken from sys._getframe instead of
+    inspect.stack().
+
+    Messages for the widget go into a bounded ring of recent lines that a
+    GUI-thread timer flushes in one append every log_flush_interval_ms, and
+    the widget itself keeps at most log_view_max_lines blocks. The complete
+    log is written to a rotating file once set_log_file has been called.
+    Stdout and the file are handlers of one logging.Logger, so messages from
+    the board threads are written whole under the handler locks and never
+    interleave.
+    """
 
     def __init__(self):
         super().__init__()
         self.output_widget = None
-        self.log_signal.connect(self._append_message)
+        self.include_caller = True
+        self.default_level = logging.INFO
+        self.levels = {}
+        self.sampling = {}
+        self._sample_counts = {}
+        self._pending = deque(maxlen=Constants.log_view_max_lines)
+        self._lock = threading.Lock()
+        self._flush_timer = None
+        self._output = logging.getLogger("stability_setup.log")
+        self._output.propagate = False
+        self._output.setLevel(logging.INFO)
+        self.file_handler = None
+        self.stdout_handler = None
+        self.set_stdout(True)
+        self.set_sampling(DATA, Constants.data_log_every_n)
 
     def set_output_widget(self, widget):
+        """Shows the log in widget (a QPlainTextEdit), must be called from the GUI thread."""
         self.output_widget = widget
+        if widget is not None and hasattr(widget, "setMaximumBlockCount"):
+            widget.setMaximumBlockCount(Constants.log_view_max_lines)
+        if self._flush_timer is None:
+            self._flush_timer = QTimer()
+            self._flush_timer.timeout.connect(self.flush)
+            self._flush_timer.start(Constants.log_flush_interval_ms)
+
+    def set_stdout(self, enabled):
+        """Echoes every logged message to stdout (on by default)."""
+        if self.stdout_handler is not None:
+            self._output.removeHandler(self.stdout_handler)
+            self.stdout_handler = None
+        if enabled:
+            self.stdout_handler = logging.StreamHandler(sys.stdout)
+            self.stdout_handler.setFormatter(logging.Formatter("%(message)s"))
+            self._output.addHandler(self.stdout_handler)
+
+    def set_log_file(self, path, max_bytes=Constants.log_file_max_mb * 1024 * 1024,
+                     backup_count=Constants.log_file_backups):
+        """Writes every logged message to path, rotated into path.1 ... path.<backup_count>."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+
+        if self.file_handler is not None:
+            self._output.removeHandler(self.file_handler)
+            self.file_handler.close()
+        self._output.addHandler(handler)
+        self.file_handler = handler
+
+    def set_level(self, category, level):
+        """Only log messages of category at or above level (logging.* levels)."""
+        self.levels[category] = level
+
+    def set_sampling(self, category, every_n):
+        """Only log every n-th message of category, 1 logs all of them."""
+        self.sampling[category] = max(1, int(every_n))
+        self._sample_counts[category] = 0
 
-    def log(self, *args, **kwargs):
-        caller_frame = inspect.stack()[1]
-        filepath = caller_frame.filename
-        filename = filepath.split("\\")[-1]
-        line_number = caller_frame.lineno
+    def mute(self, category):
+        self.set_level(category, logging.CRITICAL + 1)
 
+    def is_enabled(self, category=GENERAL, level=logging.INFO):
+        return level >= self.levels.get(category, self.default_level)
+
+    def log(self, *args, category=GENERAL, level=logging.INFO):
+        """Logs the args joined by spaces, like print."""
+        if not self._accept(category, level):
+            return
+        self._emit(" ".join(map(str, args)), sys._getframe(1), level)
+
+    def logf(self, fmt, *args, category=GENERAL, level=logging.INFO):
+        """Logs fmt % args, only formatting if the message is actually logged."""
+        if not self._accept(category, level):
+            return
+        self._emit(fmt % args if args else fmt, sys._getframe(1), level)
+
+    def _accept(self, category, level):
+        if level < self.levels.get(category, self.default_level):
+            return False
+        every_n = self.sampling.get(category, 1)
+        if every_n > 1:
+            count = self._sample_counts.get(category, 0)
+            self._sample_counts[category] = count + 1
+            return count % every_n == 0
+        return True
+
+    def _emit(self, text, caller_frame, level):
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        message = f"[{timestamp}] [{filename}:{line_number}] " + " ".join(map(str, args))
+        if self.include_caller:
+            filename = caller_frame.f_code.co_filename.split("\\")[-1]
+            message = f"[{timestamp}] [{filename}:{caller_frame.f_lineno}] {text}"
+        else:
+            message = f"[{timestamp}] {text}"
 
-        print(message, **kwargs)
-        self.log_signal.emit(message)
+        # a ready made record skips the caller lookup of logging.Logger.info
+        self._output.handle(logging.makeLogRecord(
+            {"msg": message, "levelno": level, "levelname": logging.getLevelName(level)}
+        ))
+        with self._lock:
+            self._pending.append(message)
 
-    def _append_message(self, message):
-        if self.output_widget:
-            self.output_widget.append(message)
-            self.output_widget.verticalScrollBar().setValue(
-                self.output_widget.verticalScrollBar().maximum()
-            )
+    def _take_pending(self):
+        with self._lock:
+            messages = list(self._pending)
+            self._pending.clear()
+        return messages
+
+    def flush(self):
+        """Appends everything logged since the last flush to the widget in one block."""
+        if not self.output_widget or not self._pending:
+            return
+        messages = self._take_pending()
+        self.output_widget.appendPlainText("\n".join(messages))
+        self.output_widget.verticalScrollBar().setValue(
+            self.output_widget.verticalScrollBar().maximum()
+        )
 
     def clear(self):
         if self.output_widget:
             self.output_widget.clear()
 
+    def log_file_paths(self):
+        """Current log file and its rotated backups, oldest first."""
+        if self.file_handler is None:
+            return []
+        base = self.file_handler.baseFilename
+        backups = [f"{base}.{i}" for i in range(self.file_handler.backupCount, 0, -1)]
+        return [path for path in backups + [base] if os.path.exists(path)]
+
     def save(self, path):
-        if self.output_widget:
+        """Saves the full log from the rotating files, or the widget contents without them."""
+        if self.file_handler is not None:
+            self.file_handler.flush()
+            with open(path, "w", encoding="utf-8") as out:
+                for log_path in self.log_file_paths():
+                    with open(log_path, "r", encoding="utf-8", errors="replace") as f:
+                        for chunk in iter(lambda: f.read(1024 * 1024), ""):
+                            out.write(chunk)
+        elif self.output_widget:
             with open(path, "w", encoding="utf-8") as f:
                 f.write(self.output_widget.toPlainText())
 
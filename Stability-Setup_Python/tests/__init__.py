@@ -1 +1,59 @@
 # Tests module for the improved architecture
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+
+from controller.board_emulator import simulated_hw_id, simulated_port
+from controller.run_writer import get_run_writer
+from controller.sample_bus import KEEP_ALL, get_sample_bus
+from controller.single_arduino_controller import SingleController
+
+
+class SimulatedControllerTestCase(unittest.TestCase):
+    """
+    Base class for tests that run SingleControllers against a simulated board
+    (controller/board_emulator.py) in a temporary directory.
+
+    tearDown stops and disconnects every controller made by
+    simulated_controller() (or added to self.controllers), waits until the
+    run writer closed the files of the runs started in the directory and
+    removes it.
+    """
+
+    # simulated_hw_id() index of the board
+    hw_index = 0
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.hw_id = simulated_hw_id(self.hw_index)
+        self.controllers = []
+        # the final blocks of the runs, see tearDown
+        self._run_blocks = get_sample_bus().subscribe("test runs", maxlen=10 ** 6, policy=KEEP_ALL)
+
+    def tearDown(self):
+        runs = []
+        for controller in self.controllers:
+            controller.should_run = False
+            runs.append(controller.bus_run)
+            controller.disconnect()
+        runs += [block.run for block in self._run_blocks.drain() if block.final]
+        get_sample_bus().unsubscribe(self._run_blocks)
+        for run in runs:
+            if run is not None and run.path.startswith(self.temp_dir):
+                self.assertTrue(get_run_writer().wait(run, timeout=5))
+        shutil.rmtree(self.temp_dir)
+
+    def simulated_controller(self, arduino_id: int = 1, name: str = "__test", rate: float = 0,
+                             **options) -> SingleController:
+        """A SingleController for the simulated board, options go into its sim:// url."""
+        controller = SingleController(
+            simulated_port(self.hw_id, rate=rate, **options), name, self.temp_dir, {self.hw_id: arduino_id}
+        )
+        controller.date = "Jan-01-2025_00-00-00"
+        self.controllers.append(controller)
+        return controller
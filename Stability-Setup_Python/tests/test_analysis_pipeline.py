@@ -0,0 +1,111 @@
+"""
+Unit tests for the Results Viewer analysis in gui.results_viewer.analysis_pipeline.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6.QtWidgets import QApplication
+
+from constants import Mode
+from controller.acquisition_buffer import header_for_mode
+from core.row_buffer import DATA_FMT
+from core.run_cache import get_run_cache
+from gui.results_viewer.analysis_pipeline import AnalysisPipeline, analyze_results_files
+from gui.results_viewer.calculations import MPPT_PYRAMID, MPPT_STATS, SCAN_STATS
+
+
+class TestAnalysisPipeline(unittest.TestCase):
+    """Test cases for the work items and signals of the analysis pipeline."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        get_run_cache().clear()
+
+    def tearDown(self):
+        get_run_cache().clear()
+        shutil.rmtree(self.temp_dir)
+
+    def _write_run(self, name, mode, rows):
+        path = os.path.join(self.temp_dir, name)
+        headers = header_for_mode(mode)
+        with open(path, "w") as f:
+            f.write(",".join(["Cell Area (mm^2)", "0.128"] + ["None"] * (len(headers) - 2)) + "\n")
+            f.write(",".join(headers) + "\n")
+        with open(path, "ab") as f:
+            np.savetxt(f, rows, delimiter=",", fmt=DATA_FMT)
+        return path
+
+    def _scan(self, name):
+        voltage = np.r_[np.linspace(1.2, -0.2, 30), np.linspace(-0.2, 1.2, 30)]
+        current = 2.0 - 0.02 * np.exp(voltage * 5)
+        rows = np.zeros((len(voltage), len(header_for_mode(Mode.SCAN))))
+        rows[:, 0] = np.arange(len(voltage))
+        rows[:, 1] = voltage
+        rows[:, 2:-1:2] = voltage[:, np.newaxis]
+        rows[:, 3:-1:2] = current[:, np.newaxis]
+        return self._write_run(name, Mode.SCAN, rows)
+
+    def _mppt(self, name):
+        rows = np.zeros((2000, len(header_for_mode(Mode.MPPT))))
+        rows[:, 0] = np.arange(2000) * 0.5
+        rows[:, 1:-1:2] = 0.8
+        rows[:, 2:-1:2] = 1.5
+        return self._write_run(name, Mode.MPPT, rows)
+
+    def test_results_carry_stats_not_rows(self):
+        """Test that a work item returns the stats and the pce pyramid of each file, not its rows."""
+        scans = [self._scan(f"a__ID{i}__scan.csv") for i in range(3)]
+        mppt = self._mppt("a__ID1__mppt.csv")
+        missing = os.path.join(self.temp_dir, "a__ID9__scan.csv")
+
+        results = {result["path"]: result for result in analyze_results_files(scans + [missing])}
+        self.assertIn("error", results[missing])
+        for path in scans:
+            self.assertNotIn("run", results[path])
+            self.assertEqual(len(results[path]["stats"][SCAN_STATS]), 16)
+
+        [result] = analyze_results_files([mppt])
+        self.assertEqual(set(result["stats"]), {MPPT_STATS, MPPT_PYRAMID.format("pce")})
+        self.assertEqual(len(result["stats"][MPPT_PYRAMID.format("pce")]), 2000)
+
+    def test_signals_carry_their_generation(self):
+        """Test that the signals of a cancelled batch can be told apart from the current one."""
+        scans = [self._scan(f"a__ID{i}__scan.csv") for i in range(4)]
+        pipeline = AnalysisPipeline(max_workers=2)
+        done = []
+        pipeline.file_done.connect(lambda generation, path, _: done.append((generation, path)))
+        try:
+            pipeline.start(scans)
+            first = pipeline.generation
+            self.assertEqual(len(pipeline._work_items(scans)), 2)
+            pipeline.start(scans)
+            current = pipeline.generation
+            self.assertNotEqual(current, first)
+            deadline = time.monotonic() + 30
+            while pipeline.is_running and time.monotonic() < deadline:
+                self.app.processEvents()
+                time.sleep(0.02)
+            self.app.processEvents()
+        finally:
+            pipeline.shutdown()
+
+        self.assertEqual(sorted(path for generation, path in done if generation == current), scans)
+
+
+if __name__ == "__main__":
+    unittest.main()
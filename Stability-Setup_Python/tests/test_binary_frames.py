@@ -0,0 +1,106 @@
+"""
+Unit tests for the binary data frames in controller.binary_frames.
+"""
+import copy
+import sys
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+
+from constants import Constants, Mode
+from controller.binary_frames import FrameDecoder, encode_frame
+from controller.run_clock import START_OFFSET
+from controller.serial_reader import SerialLineReader
+from core.run_data import load_run
+from tests import SimulatedControllerTestCase
+
+
+class TestFrameDecoder(unittest.TestCase):
+    """Test cases for FrameDecoder and binary frames in SerialLineReader."""
+
+    def setUp(self):
+        self.width = 18
+        rng = np.random.default_rng(0)
+        self.values = rng.uniform(-1, 25, (50, self.width - 2)).astype(np.float32)
+        self.frames = [encode_frame(500 * (i + 1), values, 0xBEEF) for i, values in enumerate(self.values)]
+
+    def test_frames_between_text(self):
+        corrupted = bytearray(self.frames[20])
+        corrupted[10] ^= 0xFF
+        stream = (
+            b"Measurement Started\r\nDelay: 5\r\n"
+            + b"".join(self.frames[:20])
+            + bytes(corrupted)
+            + b"".join(self.frames[21:])
+            + b"Done!\r\n"
+        )
+        reader = SerialLineReader(None, "test")
+        reader.expect_frames(self.width)
+        lines = reader.feed(b"Data format: binary\r\n")
+        # chunks that end in the middle of frames and lines
+        for start in range(0, len(stream), 37):
+            lines += reader.feed(stream[start:start + 37])
+        rows = reader.take_rows()
+
+        self.assertEqual(lines[:3], ["Data format: binary", "Measurement Started", "Delay: 5"])
+        self.assertIn("Done!", lines[-1])
+        self.assertEqual(len(rows), 49)
+        expected = np.delete(self.values, 20, axis=0)
+        np.testing.assert_array_equal(rows[:, 1:-1], expected)
+        np.testing.assert_allclose(rows[:, 0], np.delete(np.arange(1, 51) * 0.5, 20))
+        np.testing.assert_array_equal(rows[:, -1], 0xBEEF)
+
+    def test_text_without_acknowledgement(self):
+        reader = SerialLineReader(None, "test")
+        reader.expect_frames(self.width)
+        lines = reader.feed(b"Measurement Started\r\n1.0,2.0\r\n" + self.frames[0][:10])
+        self.assertEqual(lines, ["Measurement Started", "1.0,2.0"])
+        self.assertIsNone(reader.decoder)
+        self.assertIsNone(reader.take_rows())
+
+    def test_partial_frame_kept(self):
+        decoder = FrameDecoder(self.width)
+        rows, text = decoder.feed(self.frames[0][:-1])
+        self.assertEqual((len(rows), text), (0, b""))
+        rows, text = decoder.feed(self.frames[0][-1:] + b"Z")
+        self.assertEqual((len(rows), text), (1, b""))
+        rows, text = decoder.feed(b"ero\n")
+        self.assertEqual(text, b"Zero\n")
+
+
+class TestBinaryRuns(SimulatedControllerTestCase):
+    """Test that runs in binary frames match the same runs in text lines."""
+
+    hw_index = 3
+
+    def _scan(self, name, **options):
+        controller = self.simulated_controller(name=name, seed=1, **options)
+        controller.connect()
+        controller.scan(copy.deepcopy(Constants.params[Mode.SCAN]))
+        return controller
+
+    @staticmethod
+    def _board_times(controller):
+        """The data of the run, its times counting from the start of the board like the board's."""
+        run = load_run(controller.scan_filepath)
+        data = run.data.copy()
+        data[:, 0] -= float(run.metadata[START_OFFSET])
+        return data
+
+    def test_scan_binary_and_text(self):
+        binary = self._scan("__binary")
+        text = self._scan("__text", binary=0)
+        self.assertTrue(binary.binary_frames)
+        self.assertFalse(text.binary_frames)
+
+        binary_data, text_data = (self._board_times(controller) for controller in (binary, text))
+        self.assertEqual(binary_data.shape, (82, 19))
+        np.testing.assert_allclose(binary_data, text_data, rtol=1e-6, atol=1e-5)
+
+
+if __name__ == "__main__":
+    unittest.main()
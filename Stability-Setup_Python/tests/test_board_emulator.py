@@ -0,0 +1,178 @@
+"""
+Unit tests for the simulated Arduino board in controller.board_emulator.
+"""
+import binascii
+import copy
+import sys
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import serial
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+
+from constants import Constants, Mode
+from controller.board_emulator import simulated_port
+from controller.device_registry import get_device_registry
+from controller.parameter_block import StartBarrier, encode_block
+from core.run_data import load_run
+from tests import SimulatedControllerTestCase
+
+
+class TestBoardEmulator(SimulatedControllerTestCase):
+    """Test cases for sim:// boards."""
+
+    def setUp(self):
+        super().setUp()
+        get_device_registry().clear()
+
+    def _controller(self, **options):
+        return self.simulated_controller(**options)
+
+    def test_scan(self):
+        """Test a full scan through SingleController against a simulated board."""
+        controller = self._controller(dead="3")
+        self.assertEqual(controller.connect(), (self.hw_id, "1"))
+        controller.scan(copy.deepcopy(Constants.params[Mode.SCAN]))
+
+        run = load_run(controller.scan_filepath)
+        # 0..1.2 V in 0.03 V steps, forward then backward
+        self.assertEqual(run.data.shape, (82, 19))
+        applied = run.column("Voltage_Applied")
+        self.assertAlmostEqual(applied[0], 0.0)
+        self.assertAlmostEqual(applied[41], 1.2, places=5)
+        np.testing.assert_array_equal(run.data[:, -1], int(self.hw_id, 16))
+        # short circuit current of a live pixel, none on the dead one
+        self.assertTrue(2.0 < run.pixel_mA[0, 0] < 3.1)
+        self.assertLess(abs(run.pixel_mA[0, 2]), 0.1)
+
+    def test_second_run_without_reset(self):
+        """Test that like the firmware a board takes new parameters once a run is done."""
+        ser = serial.serial_for_url(simulated_port(self.hw_id, rate=0), 115200, timeout=1)
+        try:
+            self.assertEqual(ser.readline().strip(), f"HW_ID:{self.hw_id}".encode())
+            self.assertEqual(ser.readline().strip(), b"Arduino Ready")
+            commands = ["mppt,null\n", "1,0.5,0.5,0.5,0.5,0.5,0.5,0.5,0.5\n", "3,0\n", "done \n"]
+            ser.write("".join(commands).encode())
+            lines = iter(ser.readline, b"")
+            self.assertIn(b"Measurement Started\r\n", lines)
+            self.assertIn(b"Done!\r\n", lines)
+
+            ser.write(b"id\n")
+            self.assertEqual(ser.readline().strip(), b"Received line: id")
+            self.assertEqual(ser.readline().strip(), f"HW_ID:{self.hw_id}".encode())
+            self.assertEqual(ser.readline().strip(), b"Arduino Ready")
+            ser.write("".join(commands).encode())
+            self.assertIn(b"Measurement Started\r\n", lines)
+            self.assertIn(b"Done!\r\n", lines)
+
+            ser.setDTR(False)
+            ser.setDTR(True)
+            self.assertEqual(ser.readline().strip(), f"HW_ID:{self.hw_id}".encode())
+        finally:
+            ser.close()
+
+    def test_parameter_block(self):
+        """Test that a parameter block is checked, acknowledged and started by "go"."""
+        ser = serial.serial_for_url(simulated_port(self.hw_id, rate=0), 115200, timeout=1)
+        try:
+            self.assertIn(b"Arduino Ready\r\n", iter(ser.readline, b""))
+            header, payload = encode_block(["mppt,null\n", "1,0.5,0.5,0.5,0.5,0.5,0.5,0.5,0.5\n", "3,0\n"])
+            lines = iter(ser.readline, b"")
+            ser.write(header)
+            self.assertIn(f"Block ready: {len(payload)}\r\n".encode(), lines)
+            ser.write(payload[:-2] + b"1\n")
+            self.assertIn(b"Block error: crc\r\n", lines)
+
+            ser.write(header)
+            self.assertIn(f"Block ready: {len(payload)}\r\n".encode(), lines)
+            ser.write(payload)
+            self.assertIn(f"Block ok: {binascii.crc_hqx(payload, 0xFFFF):X}\r\n".encode(), lines)
+            self.assertEqual(ser.read(1), b"")
+            ser.write(b"go\n")
+            self.assertEqual(ser.readline().strip(), b"Received line: go")
+            self.assertEqual(ser.readline().strip(), b"Measurement Started")
+        finally:
+            ser.close()
+
+    def test_start_barrier(self):
+        """Test that a controller leaving the start barrier does not start the others early."""
+        barrier = StartBarrier(3)
+        started = []
+        first = threading.Thread(target=barrier.wait, args=(lambda: started.append(1),))
+        first.start()
+        barrier.leave()
+        first.join(0.2)
+        self.assertEqual(started, [])
+        barrier.wait(lambda: started.append(2))
+        first.join(1)
+        self.assertEqual(sorted(started), [1, 2])
+
+    def test_parameters_without_blocks(self):
+        """Test that firmware without parameter blocks gets the parameters line by line."""
+        params = copy.deepcopy(Constants.params[Mode.SCAN])
+        runs = []
+        for options in ({"seed": 1}, {"seed": 1, "blocks": 0}):
+            controller = self._controller(**options)
+            controller.connect()
+            controller.scan(copy.deepcopy(params))
+            runs.append(load_run(controller.scan_filepath).data)
+            controller.disconnect()
+        self.assertEqual(runs[1].shape, (82, 19))
+        np.testing.assert_array_equal(runs[0][:, 1:], runs[1][:, 1:])
+
+    def test_baud_rate_negotiation(self):
+        """Test that the link runs at the fastest rate that passes the link check."""
+        controller = self._controller()
+        controller.connect()
+        self.assertEqual(controller.ser.baudrate, 2000000)
+
+        # 2M and 1M corrupt bytes on this link, firmware without negotiation stays at the boot rate
+        for options, expected in (({"maxbaud": 500000}, 500000), ({"baud": 0}, 115200)):
+            controller.disconnect()
+            controller = self._controller(**options)
+            self.assertEqual(controller.connect(), (self.hw_id, "1"))
+            self.assertEqual(controller.ser.baudrate, expected)
+        controller.scan(copy.deepcopy(Constants.params[Mode.SCAN]))
+        self.assertEqual(load_run(controller.scan_filepath).data.shape, (82, 19))
+
+    def test_connect_without_reset(self):
+        """Test that a board known to the device registry is connected without a reset."""
+        controller = self._controller()
+        controller.connect()
+        boots = controller.ser.board.boots
+        controller.disconnect()
+        controller = self._controller()
+        self.assertEqual(controller.connect(), (self.hw_id, "1"))
+        self.assertEqual(controller.ser.baudrate, 2000000)
+        self.assertEqual(controller.ser.board.boots, boots)
+        controller.scan(copy.deepcopy(Constants.params[Mode.SCAN]))
+        self.assertEqual(load_run(controller.scan_filepath).data.shape, (82, 19))
+
+    def test_board_without_id(self):
+        """Test that firmware from before "id", still holding its last run, is reset for the next one."""
+        controller = self._controller(id=0)
+        controller.connect()
+        controller.scan(copy.deepcopy(Constants.params[Mode.SCAN]))
+        self.assertTrue(controller.ready)
+        self.assertFalse(controller.check_idle())
+        self.assertFalse(controller.ready)
+
+        # without the check the board ignores the run until it is connected again
+        boots = controller.ser.board.boots
+        with mock.patch.object(Constants, "measurement_start_timeout_s", 0.5):
+            controller.scan(copy.deepcopy(Constants.params[Mode.SCAN]))
+        self.assertGreater(controller.ser.board.boots, boots)
+        self.assertEqual(load_run(controller.scan_filepath).data.shape, (82, 19))
+
+    def test_failed_sensor_init(self):
+        """Test that a board reporting failed sensors is not connected."""
+        self.assertEqual(self._controller(fail=1).connect(), ())
+
+
+if __name__ == "__main__":
+    unittest.main()
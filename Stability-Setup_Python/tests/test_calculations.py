@@ -0,0 +1,66 @@
+"""
+Unit tests for the vectorized I-V calculations.
+"""
+import sys
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+
+from core.iv_calculations import BatchIVCalculations
+from gui.results_viewer.calculations import ScanCalculations
+
+
+def diode_curve(V, voc=1.0):
+    return 20 * (1 - np.exp((V - voc) / 0.05))
+
+
+class TestBatchIVCalculations(unittest.TestCase):
+    """Test cases for BatchIVCalculations."""
+
+    def test_matches_single_curve_stats(self):
+        """Test that batched results match ScanCalculations.get_stats per curve."""
+        rng = np.random.default_rng(0)
+        V = np.tile(np.linspace(-0.1, 1.2, 40), (3, 8, 1))
+        I = diode_curve(V, rng.uniform(0.8, 1.1, size=(3, 8, 1))) + rng.normal(0, 0.05, V.shape)
+
+        batch = BatchIVCalculations.curve_stats(V, I)
+        self.assertEqual(batch["FF"].shape, (3, 8))
+        for f in range(3):
+            for p in range(8):
+                single = ScanCalculations.get_stats(V[f, p], I[f, p])
+                for key, value in single.items():
+                    self.assertAlmostEqual(batch[key][f, p], value, places=9)
+
+    def test_series_and_shunt_resistance(self):
+        """Test Rs/Rsh on a piecewise linear curve with known slopes."""
+        V = np.linspace(0, 1, 101)[np.newaxis]
+        # 0.01 mA/cm² per V around 0 V, 100 mA/cm² per V around Voc=0.9 V
+        I = np.where(V < 0.8, 10 - 0.01 * V, 10 - 0.008 - 100 * (V - 0.8))
+        stats = BatchIVCalculations.curve_stats(V, I)
+        self.assertAlmostEqual(stats["Rsh"][0], 1000 / 0.01, places=3)
+        self.assertAlmostEqual(stats["Rs"][0], 1000 / 100, places=6)
+
+    def test_sweep_direction_and_dead_pixels(self):
+        """Test forward/reverse detection and the dead pixel mask."""
+        up = np.linspace(0, 1.1, 30)
+        V = np.stack([np.concatenate([up[::-1], up]), np.concatenate([up, up[::-1]])])
+        I = diode_curve(V)
+        # mark the increasing-voltage half of each scan with a 1 mA/cm² offset
+        I[0, 30:] += 1
+        I[1, :30] += 1
+        V = np.concatenate([V, np.zeros((1, 60))])
+        I = np.concatenate([I[:2], np.zeros((1, 60))])
+
+        results = BatchIVCalculations.analyze_sweeps(V, I)
+        np.testing.assert_array_equal(results["dead"], [False, False, True])
+        np.testing.assert_allclose(results["Forward"]["Jsc"][:2], diode_curve(0.0) + 1)
+        np.testing.assert_allclose(results["Reverse"]["Jsc"][:2], diode_curve(0.0))
+        np.testing.assert_allclose(results["Reverse"]["Voc"][:2], 1.0, atol=0.01)
+
+
+if __name__ == "__main__":
+    unittest.main()
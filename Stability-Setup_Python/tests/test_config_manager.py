@@ -78,6 +78,10 @@ class TestConfigManager(unittest.TestCase):
         # Verify data settings
         self.assertEqual(config.data.base_dir, "/test/data")
         self.assertEqual(config.data.auto_save_interval, 30)
+        
+        # Link settings default when missing
+        self.assertEqual(config.arduino.baud_rate, 115200)
+        self.assertEqual(config.arduino.baud_rates[0], 2000000)
     
     def test_create_default_config(self):
         """Test creation of default configuration."""
@@ -103,6 +107,7 @@ class TestConfigManager(unittest.TestCase):
         config.email.user = "new@example.com"
         config.email.password = "new_password"
         config.arduino.set_arduino_id("NEW123", 3)
+        config.arduino.baud_rates = [500000]
         config.ui.theme = "dark"
         
         # Save configuration
@@ -113,6 +118,7 @@ class TestConfigManager(unittest.TestCase):
         self.assertEqual(new_config.email.user, "new@example.com")
         self.assertEqual(new_config.email.password, "new_password")
         self.assertEqual(new_config.arduino.get_arduino_id("NEW123"), 3)
+        self.assertEqual(new_config.arduino.baud_rates, [500000])
         self.assertEqual(new_config.ui.theme, "dark")
     
     def test_arduino_id_management(self):
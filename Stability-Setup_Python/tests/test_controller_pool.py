@@ -0,0 +1,95 @@
+"""
+Unit tests for the controllers kept across presets in controller.controller_pool.
+"""
+import copy
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+
+from PySide6.QtCore import Qt
+
+from constants import Constants, Mode
+from controller import arduino_assignment
+from controller.device_registry import get_device_registry
+from controller.multi_arduino_controller import MultiController
+from controller.run_clock import RUN_EPOCH
+from core.run_data import load_run
+
+
+class TestControllerPool(unittest.TestCase):
+    """Test that MultiController only connects the boards that need a handshake."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.ids_path = os.path.join(self.temp_dir, "arduino_ids.json")
+        with open(self.ids_path, "w") as f:
+            json.dump({"arduino_ids": arduino_assignment.simulated_arduino_ids(2)}, f)
+        os.environ[arduino_assignment.SIMULATED_BOARDS_ENV] = "2"
+        os.environ[arduino_assignment.SIMULATED_RATE_ENV] = "0"
+        get_device_registry().clear()
+        self.multi = MultiController(backend="thread")
+        self.done = threading.Event()
+        self.multi.finished.connect(self.done.set, Qt.DirectConnection)
+
+    def tearDown(self):
+        self.multi.pool.close_all()
+        os.environ.pop(arduino_assignment.SIMULATED_BOARDS_ENV, None)
+        os.environ.pop(arduino_assignment.SIMULATED_RATE_ENV, None)
+        shutil.rmtree(self.temp_dir)
+
+    def _initialize(self, name):
+        return self.multi.initializeMeasurement(name, self.temp_dir, "", "", "", "Jan-01-2025", self.ids_path)
+
+    def _scan(self):
+        self.done.clear()
+        self.multi.run(Mode.SCAN, copy.deepcopy(Constants.params[Mode.SCAN]))
+        self.assertTrue(self.done.wait(30))
+
+    def test_presets_reuse_controllers(self):
+        self.assertTrue(self._initialize("first"))
+        controllers = dict(self.multi.controllers)
+        boots = {ID: controller.ser.board.boots for ID, controller in controllers.items()}
+        self._scan()
+        # the files of a run share its date and time base
+        metadata = [load_run(controller.scan_filepath).metadata for controller in controllers.values()]
+        self.assertEqual(len({(m["Start Date"], m[RUN_EPOCH]) for m in metadata}), 1)
+
+        self.assertTrue(self._initialize("second"))
+        self.assertEqual(self.multi.controllers, controllers)
+        self._scan()
+        for ID, controller in controllers.items():
+            self.assertEqual(controller.ser.board.boots, boots[ID])
+            self.assertIn("__second__", os.path.basename(controller.scan_filepath))
+
+        # a stopped run leaves its board measuring, it is reset before the next trial
+        self.multi.run(Mode.MPPT, copy.deepcopy(Constants.params[Mode.MPPT]))
+        self.multi.run(Mode.STOP, {})
+        self.assertFalse(any(controller.ready for controller in controllers.values()))
+        self.multi.refresh_connections()
+        self.assertTrue(all(controller.ready for controller in controllers.values()))
+
+        # a board that does not answer "id" is connected again between trials
+        boots = controllers[1].ser.board.boots
+        controllers[1].ser.board.id_command = False
+        controllers[1].ser.board.done_recv = True
+        self.multi.refresh_connections()
+        self.assertTrue(controllers[1].ready)
+        self.assertGreater(controllers[1].ser.board.boots, boots)
+        controllers[1].ser.board.id_command = True
+
+        os.environ[arduino_assignment.SIMULATED_BOARDS_ENV] = "1"
+        self.assertTrue(self._initialize("third"))
+        self.assertEqual(list(self.multi.controllers), [1])
+        self.assertIsNone(controllers[2].ser)
+
+
+if __name__ == "__main__":
+    unittest.main()
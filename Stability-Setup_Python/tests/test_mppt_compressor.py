@@ -0,0 +1,83 @@
+"""
+Unit tests for the streaming MPPT downsampling in controller.mppt_compressor.
+"""
+import sys
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+
+from controller.mppt_compressor import MPPTCompressor, compressed_path_for
+
+
+def mppt_rows(count: int, step_s: float = 0.5, seed: int = 0) -> np.ndarray:
+    """Time column followed by 8 (V, mA) pairs and the board id."""
+    rng = np.random.default_rng(seed)
+    rows = np.empty((count, 18))
+    rows[:, 0] = (np.arange(count) + 1) * step_s
+    rows[:, 1:-1:2] = rng.uniform(0.7, 0.9, (count, 8))
+    rows[:, 2:-1:2] = rng.uniform(1.0, 3.0, (count, 8))
+    rows[:, -1] = 7
+    return rows
+
+
+def compress(compressor: MPPTCompressor, rows: np.ndarray, chunk: int) -> np.ndarray:
+    out = [compressor.push(rows[start:start + chunk]) for start in range(0, len(rows), chunk)]
+    out.append(compressor.finish())
+    return np.concatenate(out)
+
+
+class TestMPPTCompressor(unittest.TestCase):
+    """Test cases for the mean, minmax and lttb policies."""
+
+    def setUp(self):
+        self.rows = mppt_rows(1000)  # 0.5 .. 500 s
+
+    def test_mean_independent_of_chunking(self):
+        expected = compress(MPPTCompressor(10, "mean"), self.rows, len(self.rows))
+        for chunk in (1, 7, 20, 333):
+            np.testing.assert_allclose(compress(MPPTCompressor(10, "mean"), self.rows, chunk), expected)
+
+        # floor(t / 10) puts 0.5..9.5 s in the first bucket, 10..19.5 s in the next
+        self.assertEqual(len(expected), 51)
+        np.testing.assert_allclose(expected[0], self.rows[:19].mean(axis=0))
+        np.testing.assert_allclose(expected[1], self.rows[19:39].mean(axis=0))
+
+    def test_mean_ignores_nan(self):
+        rows = self.rows[:19].copy()
+        rows[0, 2] = np.nan
+        rows[:, 4] = np.nan
+        out = compress(MPPTCompressor(10, "mean"), rows, 5)
+        self.assertAlmostEqual(out[0, 2], rows[1:, 2].mean())
+        self.assertEqual(out[0, 4], 0.0)
+
+    def test_minmax_envelope(self):
+        out = compress(MPPTCompressor(60, "minmax"), self.rows, 20)
+        self.assertEqual(len(out), 2 * 9)
+        bucket = self.rows[:119]  # 0.5 .. 59.5 s
+        np.testing.assert_allclose(out[0, 1:], bucket[:, 1:].min(axis=0))
+        np.testing.assert_allclose(out[1, 1:], bucket[:, 1:].max(axis=0))
+        self.assertEqual(out[0, 0], bucket[0, 0])
+        self.assertEqual(out[1, 0], bucket[-1, 0])
+
+    def test_lttb_selects_original_rows(self):
+        out = compress(MPPTCompressor(10, "lttb"), self.rows, 20)
+        # first row, one row per bucket and the last row
+        np.testing.assert_array_equal(out[0], self.rows[0])
+        np.testing.assert_array_equal(out[-1], self.rows[-1])
+        self.assertEqual(len(out), 51 + 1)
+        self.assertTrue(all((self.rows == row).all(axis=1).any() for row in out))
+        self.assertTrue(np.all(np.diff(out[:, 0]) > 0))
+        np.testing.assert_array_equal(out, compress(MPPTCompressor(10, "lttb"), self.rows, 3))
+
+    def test_compressed_path(self):
+        self.assertEqual(compressed_path_for("d/run__ID1__mppt.csv"), "d/run__ID1__compressedmppt.csv")
+        self.assertEqual(compressed_path_for("d/run__ID1__mppt.csv", "1min"),
+                         "d/run__ID1__compressedmppt_1min.csv")
+
+
+if __name__ == "__main__":
+    unittest.main()
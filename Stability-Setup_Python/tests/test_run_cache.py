@@ -0,0 +1,114 @@
+"""
+Unit tests for the parsed-run cache in core.run_cache.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+
+from core.run_cache import RunCache, sidecar_path_for
+
+
+class TestRunCache(unittest.TestCase):
+    """Test cases for RunCache."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _write_run(self, name, rows):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, "w") as f:
+            f.write("Cell Area (mm^2),0.128,None\n")
+            f.write("Time,Pixel_1 V,Pixel_1 mA\n")
+            for i in range(rows):
+                f.write(f"{i},0.5,1.0\n")
+        return path
+
+    def test_cache_hit_and_invalidation(self):
+        """Test that unchanged files are served from the cache and changed ones re-read."""
+        path = self._write_run("a__ID1__mppt.csv", 10)
+        cache = RunCache(use_sidecar=False)
+
+        first = cache.get_run(path)
+        self.assertIs(cache.get_run(path), first)
+        self.assertEqual(cache.hits, 1)
+
+        with open(path, "a") as f:
+            f.write("10,0.5,1.0\n")
+        second = cache.get_run(path)
+        self.assertIsNot(second, first)
+        self.assertEqual(len(second), 11)
+
+    def test_stats_cached_until_file_changes(self):
+        """Test that derived stats are only recomputed after the file changes."""
+        path = self._write_run("a__ID1__mppt.csv", 10)
+        cache = RunCache(use_sidecar=False)
+        calls = []
+
+        def compute(p):
+            calls.append(p)
+            return len(cache.get_run(p))
+
+        self.assertEqual(cache.get_stats(path, "rows", compute), 10)
+        self.assertEqual(cache.get_stats(path, "rows", compute), 10)
+        self.assertEqual(len(calls), 1)
+
+        with open(path, "a") as f:
+            f.write("10,0.5,1.0\n")
+        self.assertEqual(cache.get_stats(path, "rows", compute), 11)
+        self.assertEqual(len(calls), 2)
+
+    def test_stats_many_computes_missing_files_in_one_call(self):
+        """Test that get_stats_many only passes the files without a valid cached result."""
+        paths = [self._write_run(f"{i}__ID{i}__scan.csv", 10 + i) for i in range(3)]
+        cache = RunCache(use_sidecar=False)
+        calls = []
+
+        def compute_many(batch):
+            calls.append(list(batch))
+            return {p: len(cache.get_run(p)) for p in batch}
+
+        self.assertEqual(cache.get_stats(paths[0], "rows", lambda p: len(cache.get_run(p))), 10)
+        self.assertEqual(cache.get_stats_many(paths, "rows", compute_many), dict(zip(paths, [10, 11, 12])))
+        self.assertEqual(calls, [paths[1:]])
+        self.assertEqual(cache.get_stats_many(paths, "rows", compute_many), dict(zip(paths, [10, 11, 12])))
+        self.assertEqual(len(calls), 1)
+
+    def test_memory_budget_evicts_least_recently_used(self):
+        """Test that the oldest run is dropped once the budget is exceeded."""
+        paths = [self._write_run(f"{i}__ID{i}__mppt.csv", 100) for i in range(3)]
+        run_bytes = 100 * 3 * 8
+        cache = RunCache(max_bytes=2 * run_bytes, use_sidecar=False)
+
+        for path in paths:
+            cache.get_run(path)
+        self.assertEqual(len(cache), 2)
+        self.assertLessEqual(cache.nbytes, 2 * run_bytes)
+
+        cache.get_run(paths[0])
+        self.assertEqual(cache.misses, 4)
+
+    def test_sidecar(self):
+        """Test that a sidecar is written and reused by a fresh cache."""
+        path = self._write_run("a__ID1__mppt.csv", 10)
+        RunCache(use_sidecar=True).get_run(path)
+        self.assertTrue(os.path.exists(sidecar_path_for(path)))
+
+        run = RunCache(use_sidecar=True).get_run(path)
+        self.assertEqual(run.metadata, {"Cell Area (mm^2)": "0.128"})
+        self.assertEqual(run.source, path)
+        np.testing.assert_array_equal(run.time, np.arange(10))
+
+
+if __name__ == "__main__":
+    unittest.main()
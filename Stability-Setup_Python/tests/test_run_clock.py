@@ -0,0 +1,62 @@
+"""
+Unit tests for the run clock in controller.run_clock.
+"""
+import sys
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+
+from controller.run_clock import RUN_EPOCH, START_OFFSET, BoardClock, RunClock
+
+
+class TestBoardClock(unittest.TestCase):
+    """Test that BoardClock follows the host clock through the rows it receives."""
+
+    def _run(self, board_rate, hours=2.0, period=0.5, start=0.02, seed=0):
+        """Run times of a board whose clock runs at board_rate, received with 1-30 ms latency."""
+        rng = np.random.default_rng(seed)
+        clock = BoardClock(RunClock())
+        clock.observe(0.0, start + 0.001)
+        host = np.arange(period, hours * 3600, period)
+        run_times = np.empty_like(host)
+        for i, t in enumerate(host):
+            board_time = (t - start) * board_rate
+            run_times[i] = clock.to_run_time(board_time)
+            clock.observe(board_time, t + rng.uniform(0.001, 0.03))
+        return host, run_times, clock
+
+    def test_drift_corrected(self):
+        host, run_times, clock = self._run(board_rate=1.002)
+        self.assertTrue(np.all(np.diff(run_times) > 0))
+        self.assertAlmostEqual(clock.drift, 1 / 1.002 - 1, places=5)
+        # uncorrected the board would be 14 s ahead after 2 hours
+        last_hour = host > 3600
+        np.testing.assert_allclose(run_times[last_hour], host[last_hour], atol=0.003)
+
+    def test_implausible_drift_ignored(self):
+        # like the emulator sending as fast as it can
+        host, run_times, clock = self._run(board_rate=10.0, hours=0.5)
+        np.testing.assert_allclose(run_times, 0.021 + (host - 0.02) * 10.0)
+        self.assertEqual(clock.drift, 0.0)
+
+    def test_resume(self):
+        run = RunClock()
+        metadata = {"Start Date": run.date, RUN_EPOCH: run.epoch(), START_OFFSET: "0.5"}
+        resumed = RunClock.from_metadata(metadata)
+        self.assertEqual(resumed.date, run.date)
+        self.assertAlmostEqual(resumed.epoch_monotonic, run.epoch_monotonic, delta=0.01)
+        self.assertIsNone(RunClock.from_metadata({"Start Date": run.date}))
+
+        # rows that would land before those written continue from the start offset
+        clock = BoardClock(resumed, start_offset=0.5, not_before=1000.0)
+        times = np.array([1001.0, 1001.5])
+        clock.stamp(times)
+        np.testing.assert_allclose(times, [1001.5, 1002.0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+"""
+Unit tests for the run file reader/writer in core.run_data.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+
+from constants import Mode
+from controller.acquisition_buffer import header_for_mode
+from core.row_buffer import DATA_FMT
+from core.run_data import (
+    ChunkedRunWriter,
+    RunTail,
+    binary_path_for,
+    load_run,
+    read_binary_run,
+)
+
+
+class TestRunData(unittest.TestCase):
+    """Test cases for csv and binary run files."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.csv_path = os.path.join(self.temp_dir, "Jan-01-2025_00-00-00test__ID3__mppt.csv")
+        self.headers = header_for_mode(Mode.MPPT)
+        self.metadata = {"Cell Area (mm^2)": "0.2", "Start Date": "Jan-01-2025_00-00-00"}
+
+        rng = np.random.default_rng(0)
+        self.data = rng.uniform(0, 1, size=(50, len(self.headers)))
+        self.data[:, 0] = np.arange(50) * 0.5
+        self.data[:, -1] = 3
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _write_csv(self):
+        block = np.full((len(self.metadata) + 1, len(self.headers)), "None", dtype=object)
+        for idx, (key, value) in enumerate(self.metadata.items()):
+            block[idx, :2] = key, value
+        block[-1] = self.headers
+        np.savetxt(self.csv_path, block, delimiter=",", fmt="%s")
+        with open(self.csv_path, "ab") as f:
+            np.savetxt(f, self.data, delimiter=",", fmt=DATA_FMT)
+
+    def _write_binary(self, close=True, chunk_rows=16):
+        writer = ChunkedRunWriter(binary_path_for(self.csv_path), self.metadata,
+                                  self.headers, chunk_rows=chunk_rows)
+        for start in range(0, len(self.data), 20):
+            writer.append(self.data[start:start + 20])
+        if close:
+            writer.close()
+        return writer
+
+    def test_csv_run(self):
+        """Test reading metadata, headers and columns from a csv run."""
+        self._write_csv()
+        run = load_run(self.csv_path)
+
+        self.assertEqual(run.metadata, self.metadata)
+        self.assertEqual(run.headers, self.headers)
+        self.assertEqual(run.file_id, "3")
+        self.assertAlmostEqual(run.cell_area(), 0.2)
+        np.testing.assert_allclose(run.time, self.data[:, 0])
+        np.testing.assert_allclose(run.pixel_V, self.data[:, 1:17:2])
+        np.testing.assert_allclose(run.pixel_mA, self.data[:, 2:17:2])
+        # the interleaved pixel columns are read-only views, not copies
+        self.assertTrue(np.shares_memory(run.pixel_V, run.data))
+        self.assertFalse(run.pixel_mA.flags.writeable)
+
+    def test_csv_overflow_and_partial_rows(self):
+        """Test that ovf/nan tokens become nan and truncated rows are dropped."""
+        self._write_csv()
+        with open(self.csv_path, "a") as f:
+            f.write(",".join(["30"] + [" ovf", "nan"] * 8 + ["3"]) + "\n")
+            f.write("30.5,0.1,0.2")  # run still being written
+        run = load_run(self.csv_path)
+
+        self.assertEqual(len(run), len(self.data) + 1)
+        self.assertEqual(run.time[-1], 30)
+        self.assertTrue(np.isnan(run.pixel_V[-1]).all())
+        self.assertTrue(np.isnan(run.pixel_mA[-1]).all())
+        np.testing.assert_allclose(run.data[:-1], self.data)
+
+    def test_binary_round_trip(self):
+        """Test that chunked binary files keep metadata and typed columns."""
+        self._write_binary()
+        run = read_binary_run(binary_path_for(self.csv_path))
+
+        self.assertEqual(run.metadata, self.metadata)
+        self.assertEqual(run.headers, self.headers)
+        self.assertEqual(run.data.shape, self.data.shape)
+        np.testing.assert_array_equal(run.time, self.data[:, 0])
+        np.testing.assert_allclose(run.pixel_V, self.data[:, 1:17:2], rtol=1e-6)
+
+    def test_load_run_prefers_closed_binary(self):
+        """Test that load_run only uses a binary copy that was closed."""
+        self._write_csv()
+        self._write_binary(close=False)
+        run = load_run(self.csv_path)
+        self.assertEqual(len(run), len(self.data))
+        self.assertEqual(run.data.dtype, np.float64)
+
+        self._write_binary(close=True)
+        run = load_run(self.csv_path)
+        self.assertEqual(run.source, self.csv_path)
+        np.testing.assert_array_equal(run.time, self.data[:, 0])
+
+    def test_metadata_block(self):
+        """Test that the metadata block matches the csv layout."""
+        self._write_csv()
+        block = load_run(self.csv_path).metadata_block()
+        self.assertEqual(block.shape, (3, len(self.headers)))
+        self.assertEqual(list(block[0, :3]), ["Cell Area (mm^2)", "0.2", "None"])
+        self.assertEqual(list(block[-1]), self.headers)
+
+    def test_tail_reads_appended_rows(self):
+        """Test that RunTail returns only the complete rows added since the last poll."""
+        data, self.data = self.data, self.data[:10]
+        self._write_csv()
+        tail = RunTail(self.csv_path)
+        np.testing.assert_allclose(tail.poll(), data[:10], rtol=1e-6)
+        self.assertEqual(tail.metadata["Cell Area (mm^2)"], "0.2")
+        self.assertEqual(len(tail.poll()), 0)
+
+        # an offset inside a row skips that row
+        offset = os.path.getsize(self.csv_path) - 5
+        late = RunTail(self.csv_path, offset)
+        with open(self.csv_path, "ab") as f:
+            np.savetxt(f, data[10:20], delimiter=",", fmt=DATA_FMT)
+            f.write(b"12.5,0.1")
+        np.testing.assert_allclose(tail.poll(), data[10:20], rtol=1e-6)
+        np.testing.assert_allclose(late.poll(), data[10:20], rtol=1e-6)
+
+        # the partial row is returned once its newline arrives
+        with open(self.csv_path, "ab") as f:
+            f.write(b"," + b",".join(b"1" for _ in self.headers[2:]) + b"\n")
+        rows = tail.poll()
+        self.assertEqual(rows.shape, (1, len(self.headers)))
+        self.assertEqual(rows[0, 0], 12.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
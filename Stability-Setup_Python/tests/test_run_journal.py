@@ -0,0 +1,281 @@
+"""
+Unit tests for the run journal and crash recovery in controller.run_journal.
+"""
+import copy
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+
+from constants import Constants, Mode
+from controller.acquisition_buffer import header_for_mode
+from controller.async_backend import AsyncControllerBackend
+from controller.mppt_compressor import MPPTCompressor, compressed_path_for
+from controller.run_journal import (
+    end_journal, give_up_reason, journal_path_for, record_attach_failure, recover_run, recover_unfinished_runs,
+)
+from controller.run_clock import RunClock
+from controller.run_writer import RunWriter, get_run_writer
+from controller.sample_bus import get_sample_bus
+from controller.single_arduino_controller import SingleController
+from core.run_data import binary_path_for, load_run
+from tests import SimulatedControllerTestCase
+
+
+def _snapshot(csv_path, directory):
+    """Copies the files of a run as a crash would leave them, returns the copied csv path."""
+    for path in (csv_path, journal_path_for(csv_path), compressed_path_for(csv_path), binary_path_for(csv_path)):
+        if os.path.exists(path):
+            shutil.copy(path, directory)
+    return os.path.join(directory, os.path.basename(csv_path))
+
+
+def _rows_in(path):
+    """Rows of a run file written so far, 0 while it or its header is not on disk yet."""
+    try:
+        return len(load_run(path).data)
+    except (OSError, ValueError):
+        return 0
+
+
+def _wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.02)
+
+
+class TestRunJournal(unittest.TestCase):
+    """Test cases for recover_run() and continuing a recovered run."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.crash_dir = os.path.join(self.temp_dir, "crash")
+        os.mkdir(self.crash_dir)
+        self.writer = RunWriter(flush_interval_s=0.02, fsync_interval_s=0)
+        self.headers = header_for_mode(Mode.MPPT)
+        self.bus = get_sample_bus()
+
+    def tearDown(self):
+        self.writer.close()
+        shutil.rmtree(self.temp_dir)
+
+    def _rows(self, start, count):
+        rows = np.zeros((count, len(self.headers)))
+        rows[:, 0] = (np.arange(start, start + count) + 1) * 0.5
+        rows[:, 1:-1] = np.random.default_rng(start).uniform(0, 3, (count, len(self.headers) - 2))
+        rows[:, -1] = 99
+        return rows
+
+    def _start(self, path, resume=None):
+        run = self.bus.start_run(99, Mode.MPPT, path, {"Cell Area (mm^2)": "0.128"}, self.headers)
+        header_block = [["Cell Area (mm^2)", "0.128"] + [None] * (len(self.headers) - 2), self.headers]
+        self.writer.start_run(run, header_block, device={"port": "sim://63", "hw_id": "63"}, resume=resume)
+        return run
+
+    def test_recover_and_continue(self):
+        path = os.path.join(self.temp_dir, "x__ID99__mppt.csv")
+        run = self._start(path)
+        for start in range(0, 300, 30):
+            self.bus.publish(run, self._rows(start, 30))
+        _wait_for(lambda: self.writer.stats()["rows_written"] == 300)
+        crashed = _snapshot(path, self.crash_dir)
+        self.bus.end_run(run)
+        self.assertTrue(self.writer.wait(run, timeout=5))
+        self.assertIsNone(recover_run(path))
+
+        # a crash in the middle of a row
+        complete_size = os.path.getsize(crashed)
+        with open(crashed, "ab") as f:
+            f.write(b"150.5,1.25,0.3")
+        recovered = recover_run(crashed)
+        self.assertEqual(os.path.getsize(crashed), complete_size)
+        self.assertEqual(recovered.rows, 300)
+        self.assertEqual(recovered.last_time, 150.0)
+        self.assertEqual(recovered.hw_id, "63")
+        self.assertTrue(recovered.verified)
+        self.assertFalse(os.path.exists(binary_path_for(crashed)))
+
+        run = self._start(crashed, resume=recovered)
+        self.bus.publish(run, self._rows(300, 100))
+        self.bus.end_run(run)
+        self.assertTrue(self.writer.wait(run, timeout=5))
+
+        data = load_run(crashed).data
+        np.testing.assert_allclose(data[:, 0], (np.arange(400) + 1) * 0.5)
+        # the compressed file continues as if the run had not been interrupted
+        expected = MPPTCompressor(10, "mean")
+        expected = np.vstack([expected.push(data), expected.finish()])
+        np.testing.assert_allclose(load_run(compressed_path_for(crashed)).data, expected, rtol=1e-6)
+        with open(journal_path_for(crashed)) as f:
+            events = [json.loads(line)["event"] for line in f]
+        self.assertEqual(events[0], "start")
+        self.assertIn("resume", events)
+        self.assertEqual(events[-1], "end")
+        self.assertIsNone(recover_run(crashed))
+
+    def test_abandoned_run_stays_recoverable(self):
+        path = os.path.join(self.temp_dir, "x__ID99__mppt.csv")
+        run = self._start(path)
+        self.bus.publish(run, self._rows(0, 30))
+        # a communication error: the rows so far are written and the files closed, without an end record
+        self.writer.abandon(run)
+        self.bus.end_run(run)
+        self.assertTrue(self.writer.wait(run, timeout=5))
+        self.assertEqual(self.writer.stats()["pending_rows"], {})
+        with open(journal_path_for(path)) as f:
+            events = [json.loads(line)["event"] for line in f]
+        self.assertEqual(events[-1], "checkpoint")
+
+        recovered = recover_run(path)
+        self.assertEqual(recovered.rows, 30)
+        self.assertEqual(recovered.last_time, 15.0)
+        self.assertEqual([r.path for r in recover_unfinished_runs(self.temp_dir)], [path])
+
+    def test_give_up_after_failed_attaches(self):
+        path = os.path.join(self.temp_dir, "x__ID99__mppt.csv")
+        run = self._start(path)
+        self.bus.publish(run, self._rows(0, 30))
+        _wait_for(lambda: self.writer.stats()["rows_written"] == 30)
+        crashed = _snapshot(path, self.crash_dir)
+        self.bus.end_run(run)
+        self.assertTrue(self.writer.wait(run, timeout=5))
+
+        recovered = recover_run(crashed)
+        self.assertEqual(recovered.attach_failures, 0)
+        self.assertIsNone(give_up_reason(recovered))
+        # the failures are counted across app starts
+        for attempt in range(Constants.resume_max_attach_attempts):
+            record_attach_failure(recover_run(crashed), "no data")
+        recovered = recover_run(crashed)
+        self.assertEqual(recovered.attach_failures, Constants.resume_max_attach_attempts)
+        self.assertIsNotNone(give_up_reason(recovered))
+        end_journal(recovered, give_up_reason(recovered))
+        self.assertIsNone(recover_run(crashed))
+        self.assertEqual(recover_unfinished_runs(self.crash_dir), [])
+
+    def test_give_up_old_or_portless_runs(self):
+        path = os.path.join(self.temp_dir, "x__ID99__mppt.csv")
+        run = self._start(path)
+        self.bus.publish(run, self._rows(0, 30))
+        _wait_for(lambda: self.writer.stats()["rows_written"] == 30)
+        crashed = _snapshot(path, self.crash_dir)
+        self.bus.end_run(run)
+        self.assertTrue(self.writer.wait(run, timeout=5))
+
+        recovered = recover_run(crashed)
+        self.assertGreater(recovered.checkpoint_time, 0)
+        self.assertIsNone(give_up_reason(recovered, now=recovered.checkpoint_time + 1))
+        self.assertIsNotNone(
+            give_up_reason(recovered, now=recovered.checkpoint_time + Constants.resume_max_age_s + 1)
+        )
+        recovered.device = {}
+        self.assertIsNotNone(give_up_reason(recovered, now=recovered.checkpoint_time + 1))
+
+
+class TestControllerResume(SimulatedControllerTestCase):
+    """Test that a controller re-attaches to a board that kept measuring."""
+
+    hw_index = 5
+
+    def setUp(self):
+        super().setUp()
+        self.crash_dir = os.path.join(self.temp_dir, "crash")
+        os.mkdir(self.crash_dir)
+        self.controller = self.simulated_controller(arduino_id=6, rate=200)
+
+    def test_attach_and_resume(self):
+        self.controller.connect()
+        thread = threading.Thread(
+            target=self.controller.mppt, args=(copy.deepcopy(Constants.params[Mode.MPPT]),), daemon=True
+        )
+        thread.start()
+        _wait_for(lambda: _rows_in(self.controller.file_path) > 100)
+        # the app loses the port while the board keeps measuring, the run is closed but not ended
+        run = self.controller.bus_run
+        self.controller.disconnect()
+        thread.join(timeout=5)
+        self.assertIsNone(self.controller.bus_run)
+        self.assertTrue(get_run_writer().wait(run, timeout=5))
+        time.sleep(0.6)
+        crashed = _snapshot(self.controller.file_path, self.crash_dir)
+
+        recovered_runs = recover_unfinished_runs(self.crash_dir)
+        self.assertEqual([run.path for run in recovered_runs], [crashed])
+        recovered = recovered_runs[0]
+        resumed = SingleController(recovered.port, "", self.crash_dir, {})
+        self.controllers.append(resumed)
+        self.assertTrue(resumed.attach(recovered))
+        thread = threading.Thread(target=resumed.resume, args=(recovered,), daemon=True)
+        thread.start()
+        _wait_for(lambda: _rows_in(crashed) > recovered.rows + 100)
+        resumed.should_run = False
+        resumed.reset_arduino()
+        thread.join(timeout=10)
+        resumed.disconnect()
+
+        data = load_run(crashed).data
+        self.assertGreater(len(data), recovered.rows + 100)
+        self.assertTrue(np.all(np.diff(data[:, 0]) > 0))
+        np.testing.assert_array_equal(data[:, -1], int(self.hw_id, 16))
+        self.assertEqual(recover_unfinished_runs(self.crash_dir), [])
+
+    def test_async_stop_finishes_run(self):
+        backend = AsyncControllerBackend()
+        try:
+            self.assertTrue(backend.connect_all([self.controller])[0])
+            boots = self.controller.ser.board.boots
+            finished = backend.run({6: self.controller}, Mode.MPPT, copy.deepcopy(Constants.params[Mode.MPPT]))
+            _wait_for(lambda: _rows_in(self.controller.file_path) > 100)
+            backend.stop(6, self.controller).result(timeout=10)
+            finished.result(timeout=10)
+            # the board reboots on its own thread
+            _wait_for(lambda: self.controller.ser.board.boots > boots)
+        finally:
+            backend.shutdown()
+
+        # a stopped run is complete, not recovered at the next start
+        with open(journal_path_for(self.controller.file_path)) as f:
+            self.assertEqual(json.loads(f.readlines()[-1])["event"], "end")
+        self.assertEqual(recover_unfinished_runs(self.temp_dir), [])
+
+    def test_async_run_stops_running_run(self):
+        backend = AsyncControllerBackend()
+        finished = []
+        try:
+            self.assertTrue(backend.connect_all([self.controller])[0])
+            first = backend.run({6: self.controller}, Mode.MPPT, copy.deepcopy(Constants.params[Mode.MPPT]),
+                                on_finished=lambda: finished.append("first"))
+            _wait_for(lambda: _rows_in(self.controller.file_path) > 100)
+            first_path = self.controller.file_path
+            self.controller.run_clock = RunClock("Jan-02-2025_00-00-00")
+            second = backend.run({6: self.controller}, Mode.MPPT, copy.deepcopy(Constants.params[Mode.MPPT]),
+                                 on_finished=lambda: finished.append("second"))
+            first.result(timeout=10)
+            # the first run is finished and no longer read once the second one starts
+            with open(journal_path_for(first_path)) as f:
+                self.assertEqual(json.loads(f.readlines()[-1])["event"], "end")
+            _wait_for(lambda: self.controller.file_path != first_path and _rows_in(self.controller.file_path) > 100)
+            size = os.path.getsize(first_path)
+            time.sleep(0.3)
+            self.assertEqual(os.path.getsize(first_path), size)
+            backend.stop(6, self.controller).result(timeout=10)
+            second.result(timeout=10)
+        finally:
+            backend.shutdown()
+        self.assertEqual(finished, ["first", "second"])
+
+
+if __name__ == "__main__":
+    unittest.main()
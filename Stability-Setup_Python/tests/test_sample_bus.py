@@ -0,0 +1,152 @@
+"""
+Unit tests for the controller sample bus in controller.sample_bus.
+"""
+import copy
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+
+from constants import Constants, Mode
+from controller.run_writer import RunWriter
+from controller.sample_bus import BLOCK, DROP_NEWEST, DROP_OLDEST, KEEP_ALL, RunFollower, SampleBus, get_sample_bus
+from core.run_data import load_run
+from tests import SimulatedControllerTestCase
+
+
+class TestSampleBus(unittest.TestCase):
+    """Test cases for SampleBus and its subscriptions."""
+
+    def setUp(self):
+        self.bus = SampleBus(history_blocks=4)
+        self.run = self.bus.start_run(1, Mode.MPPT, "a__ID1__mppt.csv", {"Cell Area (mm^2)": "0.128"}, ["Time", "x"])
+
+    def _publish(self, start, count, run=None):
+        for i in range(start, start + count):
+            self.bus.publish(run or self.run, np.array([[i, i * 2.0]]))
+
+    def test_drop_policies(self):
+        oldest = self.bus.subscribe("oldest", maxlen=3, policy=DROP_OLDEST)
+        newest = self.bus.subscribe("newest", maxlen=3, policy=DROP_NEWEST)
+        other = self.bus.subscribe("other board", boards=[2])
+        self._publish(0, 5)
+
+        self.assertEqual([block.rows[0, 0] for block in oldest.drain()], [2, 3, 4])
+        self.assertEqual([block.rows[0, 0] for block in newest.drain()], [0, 1, 2])
+        self.assertEqual(oldest.dropped["1"], 2)
+        self.assertEqual(newest.dropped["1"], 2)
+        self.assertEqual(other.pending(), 0)
+        self.assertEqual([block.seq for block in self.bus._history["1"]], [1, 2, 3, 4])
+
+    def test_block_waits_for_consumer(self):
+        slow = self.bus.subscribe("writer", maxlen=2, policy=BLOCK, block_timeout_s=5)
+        received = []
+
+        def consume():
+            while len(received) < 6:
+                received.extend(slow.get(timeout=1))
+                time.sleep(0.01)
+
+        consumer = threading.Thread(target=consume)
+        consumer.start()
+        self._publish(0, 6)
+        consumer.join(timeout=5)
+        self.assertEqual([block.seq for block in received], list(range(6)))
+        self.assertEqual(slow.dropped["1"], 0)
+
+        # nobody consumes: the publisher gives up after the timeout and drops
+        slow.block_timeout_s = 0.05
+        self._publish(6, 3)
+        self.assertEqual(slow.dropped["1"], 1)
+
+    def test_keep_all_never_drops(self):
+        writer = self.bus.subscribe("writer", maxlen=2, policy=KEEP_ALL)
+        newest = self.bus.subscribe("newest", maxlen=2, policy=DROP_NEWEST)
+        start = time.monotonic()
+        self._publish(0, 5)
+        self.bus.end_run(self.run)
+        self.assertLess(time.monotonic() - start, 0.1)
+
+        self.assertEqual([block.seq for block in writer.drain()], list(range(6)))
+        self.assertEqual(writer.dropped["1"], 0)
+        self.assertEqual(writer.overflowed["1"], 4)
+        # the final block gets through a full queue whatever the policy
+        self.assertTrue(newest.drain()[-1].final)
+
+    def test_follower_replays_and_deduplicates(self):
+        self._publish(0, 3)
+        catch_up = type("Tail", (), {"poll": lambda self: np.array([[0, 0.0], [1, 2.0]])})()
+        follower = RunFollower(self.run, catch_up=catch_up, bus=self.bus)
+        np.testing.assert_array_equal(follower.poll()[:, 0], [0, 1, 2])
+        self._publish(3, 2)
+        self.bus.end_run(self.run)
+        np.testing.assert_array_equal(follower.poll()[:, 0], [3, 4])
+        self.assertTrue(follower.finished)
+        self.assertIsNone(self.bus.active_run(self.run.path))
+        follower.close()
+        self.assertEqual(self.bus.stats(), {})
+
+
+class TestControllerPublishing(SimulatedControllerTestCase):
+    """Test that SingleController publishes the rows it writes."""
+
+    def setUp(self):
+        super().setUp()
+        self.controller = self.simulated_controller()
+
+    def test_scan_rows_published(self):
+        subscription = get_sample_bus().subscribe("test", boards=[1], maxlen=10_000)
+        try:
+            self.controller.connect()
+            self.controller.scan(copy.deepcopy(Constants.params[Mode.SCAN]))
+            blocks = subscription.drain()
+        finally:
+            get_sample_bus().unsubscribe(subscription)
+
+        self.assertTrue(blocks[-1].final)
+        self.assertEqual([block.seq for block in blocks], list(range(blocks[0].seq, blocks[0].seq + len(blocks))))
+        self.assertEqual(blocks[0].run.path, self.controller.scan_filepath)
+        rows = np.concatenate([block.rows for block in blocks])
+        # the csv rounds to DATA_FMT
+        np.testing.assert_allclose(rows, load_run(self.controller.scan_filepath, prefer_binary=False).data, rtol=1e-8)
+
+
+class TestRunWriter(unittest.TestCase):
+    """Test that RunWriter writes the runs published on the bus in batches."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.writer = RunWriter(flush_interval_s=0.05, fsync_interval_s=0)
+
+    def tearDown(self):
+        self.writer.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_rows_written_when_run_ends(self):
+        bus = get_sample_bus()
+        path = str(Path(self.temp_dir) / "a__ID7__scan.csv")
+        run = bus.start_run(7, Mode.SCAN, path, {"Cell Area (mm^2)": "0.128"}, ["Time", "Voltage"])
+        self.writer.start_run(run, [["Cell Area (mm^2)", "0.128"], ["Time", "Voltage"]])
+        for i in range(50):
+            bus.publish(run, np.array([[i * 0.01, i * 0.1]]))
+        bus.end_run(run)
+
+        self.assertTrue(self.writer.wait(run, timeout=5))
+        stats = self.writer.stats()
+        self.assertEqual(stats["rows_written"], 50)
+        self.assertLess(stats["batches_written"], 50)
+        self.assertEqual(stats["pending_rows"], {})
+        data = load_run(path, prefer_binary=False).data
+        np.testing.assert_allclose(data[:, 1], np.arange(50) * 0.1, rtol=1e-8)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+"""
+Unit tests for the min/max/mean pyramid in core.series_pyramid.
+"""
+import sys
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+
+from core.series_pyramid import SeriesPyramid
+
+
+class TestSeriesPyramid(unittest.TestCase):
+    """Test cases for SeriesPyramid."""
+
+    def setUp(self):
+        # 100 hours of mppt rows every 0.5 s for 2 pixels
+        self.time = (np.arange(720_000) + 1) * 0.5
+        rng = np.random.default_rng(0)
+        self.data = np.column_stack([
+            15 + rng.normal(0, 0.1, len(self.time)),
+            np.linspace(20, 10, len(self.time)),
+        ])
+        # a 5 s dropout on pixel 1
+        self.spike = slice(400_000, 400_010)
+        self.data[self.spike, 0] = 1.0
+
+    def test_full_range_keeps_the_envelope(self):
+        pyramid = SeriesPyramid(self.time, self.data)
+        time, values = pyramid.query(max_points=5000)
+        self.assertLessEqual(len(time), 5000 + 4)
+        self.assertTrue(np.all(np.diff(time) >= 0))
+        self.assertAlmostEqual(float(values[:, 0].min()), 1.0, places=5)
+        self.assertAlmostEqual(float(values[:, 0].max()), float(self.data[:, 0].max()), places=4)
+        self.assertAlmostEqual(pyramid.max(), float(self.data.max()), places=4)
+
+    def test_zoom_returns_raw_samples(self):
+        pyramid = SeriesPyramid(self.time, self.data)
+        t0, t1 = self.time[self.spike][0] - 100, self.time[self.spike][-1] + 100
+        time, values = pyramid.query(t0, t1, max_points=5000)
+        # fine enough for level 0: the samples themselves plus one on each side
+        inside = (self.time >= t0) & (self.time <= t1)
+        self.assertEqual(len(time), inside.sum() + 2)
+        np.testing.assert_allclose(values[1:-1], self.data[inside], rtol=1e-6)
+
+    def test_mean_levels(self):
+        pyramid = SeriesPyramid(self.time[:4096], self.data[:4096], factor=4, min_buckets=16)
+        level = pyramid.levels[2]
+        self.assertEqual(len(level), 4096 // 16)
+        np.testing.assert_allclose(level.mean[0], self.data[:16].mean(axis=0), rtol=1e-5)
+        self.assertEqual(level.t_start[1], self.time[16])
+        self.assertEqual(level.t_end[1], self.time[31])
+
+    def test_nan_ignored(self):
+        data = self.data[:64].copy()
+        data[:8, 1] = np.nan
+        pyramid = SeriesPyramid(self.time[:64], data, factor=4, min_buckets=1)
+        top = pyramid.levels[-1]
+        self.assertEqual(len(top), 4)
+        np.testing.assert_allclose(top.mean[0, 1], np.nanmean(data[:16, 1]), rtol=1e-5)
+        np.testing.assert_array_equal(top.count[:, 1], [8, 16, 16, 16])
+        self.assertFalse(np.isnan(top.low).any())
+
+
+if __name__ == "__main__":
+    unittest.main()